@@ -32,7 +32,7 @@ import hashlib
 from math import ceil
 from RNS.Cryptography import HMAC
 
-def hkdf(length=None, derive_from=None, salt=None, context=None):
+def hkdf(length=None, derive_from=None, salt=None, context=None, salt_hmac=None):
     hash_len = 32
 
     def hmac_sha256(key, data):
@@ -50,13 +50,24 @@ def hkdf(length=None, derive_from=None, salt=None, context=None):
     if context == None:
         context = b""
 
-    pseudorandom_key = hmac_sha256(salt, derive_from)
+    # Callers deriving many keys from the same salt can
+    # pass an HMAC already keyed with it, which is copied
+    # instead of being rekeyed for every derivation.
+    if salt_hmac != None:
+        extract = salt_hmac.copy()
+        extract.update(derive_from)
+        pseudorandom_key = extract.digest()
+    else:
+        pseudorandom_key = hmac_sha256(salt, derive_from)
 
+    prk_hmac = HMAC.new(pseudorandom_key)
     block = b""
-    derived = b""
+    blocks = []
 
     for i in range(ceil(length / hash_len)):
-        block = hmac_sha256(pseudorandom_key, block + context + bytes([(i + 1)%(0xFF+1)]))
-        derived += block
+        expand = prk_hmac.copy()
+        expand.update(block + context + bytes([(i + 1)%(0xFF+1)]))
+        block = expand.digest()
+        blocks.append(block)
 
-    return derived[:length]
+    return b"".join(blocks)[:length]
@@ -34,6 +34,7 @@ import time
 import threading
 import RNS
 
+
 from RNS.Cryptography import Token
 from .vendor import umsgpack as umsgpack
 
@@ -161,6 +162,8 @@ class Destination:
         self.proof_strategy = Destination.PROVE_NONE
         self.ratchets = None
         self.ratchets_path = None
+        self.ratchet_keys = None
+        self.ratchet_ids = {}
         self.ratchet_interval = Destination.RATCHET_INTERVAL
         self.ratchet_file_lock = threading.Lock()
         self.retained_ratchets = Destination.RATCHET_COUNT
@@ -208,6 +211,33 @@ class Destination:
             if len (self.ratchets) > self.retained_ratchets:
                 self.ratchets = self.ratchets[:Destination.RATCHET_COUNT]
 
+        self._update_ratchet_keys()
+
+    def _update_ratchet_keys(self):
+        # Keeps private key objects and IDs for the retained ratchets
+        # ready for decryption. Newly added ratchets are attempted first,
+        # followed by the others in order of most recent successful use.
+        if self.ratchets == None:
+            self.ratchet_keys = None
+            self.ratchet_ids = {}
+
+        else:
+            previous_keys = self.ratchet_keys if self.ratchet_keys != None else {}
+            ratchet_keys = RNS.Identity._ratchet_keys(self.ratchets, known_ids=self.ratchet_ids)
+            ratchet_ids = {}
+            for ratchet, ratchet_id in zip(self.ratchets, ratchet_keys): ratchet_ids[ratchet] = ratchet_id
+            for ratchet_id in previous_keys:
+                if ratchet_id in ratchet_keys: ratchet_keys.move_to_end(ratchet_id)
+
+            self.ratchet_ids = ratchet_ids
+            self.ratchet_keys = ratchet_keys
+
+    def _ratchet_used(self, ratchet_id):
+        ratchet_keys = self.ratchet_keys
+        if ratchet_keys != None and ratchet_id != None and ratchet_id in ratchet_keys:
+            try: ratchet_keys.move_to_end(ratchet_id, last=False)
+            except KeyError: pass
+
     def _persist_ratchets(self):
         try:
             with self.ratchet_file_lock:
@@ -223,6 +253,7 @@ class Destination:
             RNS.trace_exception(e)
             self.ratchets = None
             self.ratchets_path = None
+            self._update_ratchet_keys()
             raise OSError("Could not write ratchet file contents for "+str(self)+". The contained exception was: "+str(e), RNS.LOG_ERROR)
 
     def rotate_ratchets(self):
@@ -444,6 +475,7 @@ class Destination:
                         if self.identity.validate(persisted_data["signature"], persisted_data["ratchets"]):
                             self.ratchets = umsgpack.unpackb(persisted_data["ratchets"])
                             self.ratchets_path = ratchets_path
+                            self._update_ratchet_keys()
                         else:
                             raise KeyError("Invalid ratchet file signature")
                 
@@ -461,6 +493,7 @@ class Destination:
                 except Exception as e:
                     self.ratchets = None
                     self.ratchets_path = None
+                    self._update_ratchet_keys()
                     RNS.trace_exception(e)
                     RNS.log(f"The ratchet file located at {ratchets_path} could not be loaded. This could indicate that the ratchet file has become corrupt.", RNS.LOG_CRITICAL)
                     RNS.log(f"You can attempt to manually recover the ratchet file, or simply remove it to have Reticulum recreate it on the next use.", RNS.LOG_CRITICAL)
@@ -472,6 +505,7 @@ class Destination:
             RNS.log("No existing ratchet data found, initialising new ratchet file for "+str(self), RNS.LOG_DEBUG)
             self.ratchets = []
             self.ratchets_path = ratchets_path
+            self._update_ratchet_keys()
             self._persist_ratchets()
 
     def enable_ratchets(self, ratchets_path):
@@ -619,11 +653,12 @@ class Destination:
             else:
                 raise ValueError("No private key held by GROUP destination. Did you create or load one?")
 
-    def decrypt(self, ciphertext):
+    def decrypt(self, ciphertext, ratchet_id=None):
         """
         Decrypts information for ``RNS.Destination.SINGLE`` or ``RNS.Destination.GROUP`` type destination.
 
         :param ciphertext: *Bytes* containing the ciphertext to be decrypted.
+        :param ratchet_id: Optional ID of the ratchet the ciphertext was encrypted for. If specified, decryption with this ratchet is attempted first.
         :raises: ``ValueError`` if destination does not hold a necessary key for decryption.
         """
         if self.type == Destination.PLAIN:
@@ -633,7 +668,7 @@ class Destination:
             if self.ratchets:
                 decrypted = None
                 try:
-                    decrypted = self.identity.decrypt(ciphertext, ratchets=self.ratchets, enforce_ratchets=self.__enforce_ratchets, ratchet_id_receiver=self)
+                    decrypted = self.identity.decrypt(ciphertext, ratchets=self.ratchet_keys, enforce_ratchets=self.__enforce_ratchets, ratchet_id_receiver=self, ratchet_id=ratchet_id)
                 except:
                     decrypted = None
 
@@ -641,13 +676,14 @@ class Destination:
                     try:
                         RNS.log(f"Decryption with ratchets failed on {self}, reloading ratchets from storage and retrying", RNS.LOG_ERROR)
                         self._reload_ratchets(self.ratchets_path)
-                        decrypted = self.identity.decrypt(ciphertext, ratchets=self.ratchets, enforce_ratchets=self.__enforce_ratchets, ratchet_id_receiver=self)
+                        decrypted = self.identity.decrypt(ciphertext, ratchets=self.ratchet_keys, enforce_ratchets=self.__enforce_ratchets, ratchet_id_receiver=self, ratchet_id=ratchet_id)
                     except Exception as e:
                         RNS.log(f"Decryption still failing after ratchet reload. The contained exception was: {e}", RNS.LOG_ERROR)
                         raise e
 
                     if decrypted: RNS.log("Decryption succeeded after ratchet reload", RNS.LOG_NOTICE)
 
+                if decrypted: self._ratchet_used(self.latest_ratchet_id)
                 return decrypted
 
             else:
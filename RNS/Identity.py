@@ -35,9 +35,14 @@ import time
 import atexit
 import hashlib
 import threading
+from collections import OrderedDict
+from collections.abc import Mapping, MutableMapping
 
 from .vendor import umsgpack as umsgpack
 
+try: import sqlite3
+except ImportError: sqlite3 = None
+
 from RNS.Cryptography import X25519PrivateKey, X25519PublicKey, Ed25519PrivateKey, Ed25519PublicKey
 from RNS.Cryptography import Token
 
@@ -90,12 +95,30 @@ class Identity:
     DERIVED_KEY_LENGTH        = 512//8
     DERIVED_KEY_LENGTH_LEGACY = 256//8
 
+    VERIFIED_ANNOUNCES_MAX    = 8192        # Maximum number of verified announce signatures to remember
+    IDENTITY_CACHE_SIZE       = 4096        # Default number of recalled public identities to keep ready
+
     # Storage
     known_destinations = {}
+    known_identities = {}
     known_ratchets = {}
+    ratchet_store = None
+
+    # Verified announce cache
+    verified_announces = OrderedDict()
+    verified_announce_hits = 0
+    verified_announce_misses = 0
+
+    # Recalled identity cache
+    identity_cache = OrderedDict()
+    identity_cache_size = IDENTITY_CACHE_SIZE
+    identity_cache_hits = 0
+    identity_cache_misses = 0
 
     ratchet_persist_lock = threading.Lock()
     known_destinations_lock = threading.Lock()
+    verified_announces_lock = threading.Lock()
+    identity_cache_lock = threading.Lock()
 
     @staticmethod
     def remember(packet_hash, destination_hash, public_key, app_data = None):
@@ -105,12 +128,19 @@ class Identity:
             with Identity.known_destinations_lock:
                 if not destination_hash in Identity.known_destinations:
                     Identity.known_destinations[destination_hash] = [time.time(), packet_hash, public_key, app_data, 0]
+                    Identity._index_identity(destination_hash, public_key)
                 else:
                     entry = Identity.known_destinations[destination_hash]
+                    if entry[2] != public_key:
+                        Identity._unindex_identity(destination_hash, entry[2])
+                        Identity._index_identity(destination_hash, public_key)
+
+                    if entry[2] != public_key or entry[3] != app_data: Identity._invalidate_cached_identity(destination_hash)
                     entry[0] = time.time()
                     entry[1] = packet_hash
                     entry[2] = public_key
                     entry[3] = app_data
+                    Identity.known_destinations[destination_hash] = entry
 
     @staticmethod
     def recall(target_hash, from_identity_hash=False, _no_use=False):
@@ -127,16 +157,11 @@ class Identity:
         :returns: An :ref:`RNS.Identity<api-identity>` instance that can be used to create an outgoing :ref:`RNS.Destination<api-destination>`, or *None* if the destination is unknown.
         """
         if from_identity_hash:
-            with Identity.known_destinations_lock: destination_hashes = list(Identity.known_destinations.keys())
-            for destination_hash in destination_hashes:
+            for destination_hash in Identity._destinations_for_identity(target_hash):
                 entry = Identity.known_destinations.get(destination_hash)
-                if not entry: continue
-                if target_hash == Identity.truncated_hash(entry[2]):
+                if entry and target_hash == Identity.truncated_hash(entry[2]):
                     if not _no_use: RNS.Reticulum.get_instance()._used_destination_data(destination_hash)
-                    identity = Identity(create_keys=False)
-                    identity.load_public_key(entry[2])
-                    identity.app_data = entry[3]
-                    return identity
+                    return Identity._cached_identity(destination_hash, entry)
 
             return None
 
@@ -144,10 +169,7 @@ class Identity:
             if target_hash in Identity.known_destinations:
                 if not _no_use: RNS.Reticulum.get_instance()._used_destination_data(target_hash)
                 identity_data = Identity.known_destinations[target_hash]
-                identity = Identity(create_keys=False)
-                identity.load_public_key(identity_data[2])
-                identity.app_data = identity_data[3]
-                return identity
+                return Identity._cached_identity(target_hash, identity_data)
             else:
                 for registered_destination in RNS.Transport.destinations:
                     if target_hash == registered_destination.hash:
@@ -158,6 +180,56 @@ class Identity:
 
                 return None
 
+    @staticmethod
+    def _cached_identity(destination_hash, entry):
+        # Returns a ready-to-use public identity for a known
+        # destination entry. Cached identities are shared
+        # between callers, and must not be modified.
+        with Identity.identity_cache_lock:
+            if destination_hash in Identity.identity_cache:
+                Identity.identity_cache.move_to_end(destination_hash)
+                Identity.identity_cache_hits += 1
+                return Identity.identity_cache[destination_hash]
+            else: Identity.identity_cache_misses += 1
+
+        identity = Identity(create_keys=False)
+        identity.load_public_key(entry[2])
+        identity.app_data = entry[3]
+
+        with Identity.identity_cache_lock:
+            if Identity.identity_cache_size > 0:
+                Identity.identity_cache[destination_hash] = identity
+                while len(Identity.identity_cache) > Identity.identity_cache_size: Identity.identity_cache.popitem(last=False)
+
+        return identity
+
+    @staticmethod
+    def _invalidate_cached_identity(destination_hash):
+        with Identity.identity_cache_lock: Identity.identity_cache.pop(destination_hash, None)
+
+    @staticmethod
+    def set_identity_cache_size(size):
+        """
+        Sets the maximum number of recalled identities to keep ready for use.
+
+        :param size: The number of identities to cache as *int*. Setting this to zero disables the cache.
+        """
+        with Identity.identity_cache_lock:
+            Identity.identity_cache_size = max(0, int(size))
+            while len(Identity.identity_cache) > Identity.identity_cache_size: Identity.identity_cache.popitem(last=False)
+
+    @staticmethod
+    def identity_cache_stats():
+        """
+        :returns: A dictionary containing the size, hit and miss counts and hit rate of the recalled identity cache.
+        """
+        with Identity.identity_cache_lock:
+            hits    = Identity.identity_cache_hits
+            misses  = Identity.identity_cache_misses
+            lookups = hits+misses
+            return {"entries": len(Identity.identity_cache), "hits": hits, "misses": misses,
+                    "hit_rate": hits/lookups if lookups > 0 else 0.0}
+
     @staticmethod
     def recall_app_data(destination_hash, _no_use=False):
         """
@@ -191,6 +263,11 @@ class Identity:
 
             Identity.saving_known_destinations = True
             save_start = time.time()
+            if isinstance(Identity.known_destinations, KnownDestinationStore):
+                written = Identity.known_destinations.flush()
+                RNS.log(f"Wrote {written} changed known destinations to storage in {RNS.prettyshorttime(time.time()-save_start)}", RNS.LOG_DEBUG) if RNS.sl(RNS.LOG_DEBUG) else None
+                return
+
             RNS.log("Saving "+str(len(Identity.known_destinations))+" known destinations to storage...", RNS.LOG_DEBUG) if RNS.sl(RNS.LOG_DEBUG) else None
 
             temp_file = RNS.Reticulum.storagepath+f"/known_destinations.tmp.{time.time()}"
@@ -212,24 +289,57 @@ class Identity:
 
         finally: Identity.saving_known_destinations = False
 
+    @staticmethod
+    def _read_known_destinations_file(path):
+        with open(path,"rb") as file: loaded_known_destinations = umsgpack.load(file)
+
+        known_destinations = {}
+        for known_destination in loaded_known_destinations:
+            if len(known_destination) == RNS.Reticulum.TRUNCATED_HASHLENGTH//8:
+                if len(loaded_known_destinations[known_destination]) < 5:
+                    e = loaded_known_destinations[known_destination]
+                    loaded_known_destinations[known_destination] = [e[0], e[1], e[2], e[3], 0]
+
+                known_destinations[known_destination] = loaded_known_destinations[known_destination]
+
+        return known_destinations
+
     @staticmethod
     def load_known_destinations():
-        if os.path.isfile(RNS.Reticulum.storagepath+"/known_destinations"):
+        known_destinations_path = RNS.Reticulum.storagepath+"/known_destinations"
+        if sqlite3 != None:
             st = time.time()
             try:
-                with open(RNS.Reticulum.storagepath+"/known_destinations","rb") as file:
-                    loaded_known_destinations = umsgpack.load(file)
+                store_path = RNS.Reticulum.storagepath+"/known_destinations.db"
+                reticulum = RNS.Reticulum.get_instance()
+                read_only = reticulum != None and reticulum.is_connected_to_shared_instance
+                store = KnownDestinationStore(store_path, read_only=read_only)
+                if not read_only and os.path.isfile(known_destinations_path) and not store.legacy_imported():
+                    RNS.log("Importing known destinations into indexed storage...", RNS.LOG_NOTICE)
+                    store.import_entries(Identity._read_known_destinations_file(known_destinations_path))
+
+                with Identity.known_destinations_lock:
+                    for destination_hash in Identity.known_destinations: store[destination_hash] = Identity.known_destinations[destination_hash]
+                    Identity.known_destinations = store
+                    Identity.known_identities = {}
+                    with Identity.identity_cache_lock: Identity.identity_cache.clear()
 
-                Identity.known_destinations = {}
-                for known_destination in loaded_known_destinations:
-                    if len(known_destination) == RNS.Reticulum.TRUNCATED_HASHLENGTH//8:
-                        if len(loaded_known_destinations[known_destination]) < 5:
-                            e = loaded_known_destinations[known_destination]
-                            loaded_known_destinations[known_destination] = [e[0], e[1], e[2], e[3], 0]
+                RNS.log(f"Opened storage with {len(Identity.known_destinations)} known destinations in {RNS.prettyshorttime(time.time()-st)}", RNS.LOG_VERBOSE)
+                return
 
-                        with Identity.known_destinations_lock:
-                            Identity.known_destinations[known_destination] = loaded_known_destinations[known_destination]
+            except Exception as e:
+                RNS.log(f"Could not open indexed storage for known destinations, the contained exception was: {e}", RNS.LOG_ERROR)
+                RNS.log("Falling back to in-memory known destinations", RNS.LOG_ERROR)
 
+        if os.path.isfile(known_destinations_path):
+            st = time.time()
+            try:
+                loaded_known_destinations = Identity._read_known_destinations_file(known_destinations_path)
+                with Identity.known_destinations_lock:
+                    Identity.known_destinations = loaded_known_destinations
+                    Identity.known_identities = {}
+                    with Identity.identity_cache_lock: Identity.identity_cache.clear()
+                    for destination_hash in Identity.known_destinations: Identity._index_identity(destination_hash, Identity.known_destinations[destination_hash][2])
                 RNS.log(f"Loaded {len(Identity.known_destinations)} known destination from storage in {RNS.prettyshorttime(time.time()-st)}", RNS.LOG_VERBOSE)
 
             except Exception as e:
@@ -238,12 +348,44 @@ class Identity:
         else:
             RNS.log("Destinations file does not exist, no known destinations loaded", RNS.LOG_VERBOSE)
 
+    # The identity hash index is only held in memory for
+    # the in-memory known destinations, the indexed store
+    # maintains its own.
+    @staticmethod
+    def _index_identity(destination_hash, public_key):
+        if isinstance(Identity.known_destinations, KnownDestinationStore): return
+        identity_hash = Identity.truncated_hash(public_key)
+        if not identity_hash in Identity.known_identities: Identity.known_identities[identity_hash] = set()
+        Identity.known_identities[identity_hash].add(destination_hash)
+
+    @staticmethod
+    def _unindex_identity(destination_hash, public_key):
+        if isinstance(Identity.known_destinations, KnownDestinationStore): return
+        identity_hash = Identity.truncated_hash(public_key)
+        if identity_hash in Identity.known_identities:
+            Identity.known_identities[identity_hash].discard(destination_hash)
+            if len(Identity.known_identities[identity_hash]) == 0: Identity.known_identities.pop(identity_hash)
+
+    @staticmethod
+    def _destinations_for_identity(identity_hash):
+        if isinstance(Identity.known_destinations, KnownDestinationStore): return Identity.known_destinations.destinations_for_identity(identity_hash)
+        else:
+            with Identity.known_destinations_lock: return list(Identity.known_identities.get(identity_hash, []))
+
+    @staticmethod
+    def _known_destination_entries():
+        if isinstance(Identity.known_destinations, KnownDestinationStore): return Identity.known_destinations.entries()
+        else:
+            with Identity.known_destinations_lock: return list(Identity.known_destinations.items())
+
     @staticmethod
     def _used_destination_data(destination_hash):
         with Identity.known_destinations_lock:
             if destination_hash in Identity.known_destinations:
-                if not Identity.known_destinations[destination_hash][4] < 0:
-                    Identity.known_destinations[destination_hash][4] = time.time()
+                entry = Identity.known_destinations[destination_hash]
+                if not entry[4] < 0:
+                    entry[4] = time.time()
+                    Identity.known_destinations[destination_hash] = entry
                     return True
 
         return False
@@ -252,7 +394,9 @@ class Identity:
     def _retain_destination_data(destination_hash):
         with Identity.known_destinations_lock:
             if destination_hash in Identity.known_destinations:
-                Identity.known_destinations[destination_hash][4] = -1
+                entry = Identity.known_destinations[destination_hash]
+                entry[4] = -1
+                Identity.known_destinations[destination_hash] = entry
                 return True
 
         return False
@@ -261,7 +405,9 @@ class Identity:
     def _unretain_destination_data(destination_hash):
         with Identity.known_destinations_lock:
             if destination_hash in Identity.known_destinations:
-                Identity.known_destinations[destination_hash][4] = time.time()
+                entry = Identity.known_destinations[destination_hash]
+                entry[4] = time.time()
+                Identity.known_destinations[destination_hash] = entry
                 return True
 
         return False
@@ -270,11 +416,9 @@ class Identity:
     def _retain_identity(identity_hash):
         try:
             retained = False
-            with Identity.known_destinations_lock: destination_hashes = list(Identity.known_destinations.keys())
-            for destination_hash in destination_hashes:
+            for destination_hash in Identity._destinations_for_identity(identity_hash):
                 entry = Identity.known_destinations.get(destination_hash)
-                if not entry: continue
-                if identity_hash == Identity.truncated_hash(entry[2]):
+                if entry and identity_hash == Identity.truncated_hash(entry[2]):
                     if Identity._retain_destination_data(destination_hash): retained = True
 
             return retained
@@ -291,11 +435,11 @@ class Identity:
         retained   = 0
         never_used = 0
         ratchetdir = RNS.Reticulum.storagepath+"/ratchets"
+        ratchet_store = Identity._ratchet_store()
 
         RNS.log(f"Cleaning known destinations{' at background priority' if background else ''}...", RNS.LOG_DEBUG) if RNS.sl(RNS.LOG_DEBUG) else None
 
-        with Identity.known_destinations_lock: destination_hashes = list(Identity.known_destinations.keys())
-        for destination_hash in destination_hashes:
+        for destination_hash, entry in Identity._known_destination_entries():
             try:
                 if background: time.sleep(0.001) # Low priority, yield thread
                 RNS.Transport.destinations_last_cleaned = time.time()
@@ -304,30 +448,28 @@ class Identity:
                     has_path = False
                     no_path += 1
 
-                with Identity.known_destinations_lock:
-                    if destination_hash in Identity.known_destinations:
-                        last_announce =  Identity.known_destinations[destination_hash][0]
-                        last_use = 0
-                        was_used = False
-                        is_retained = False
+                last_announce = entry[0]
+                last_use = 0
+                was_used = False
+                is_retained = False
 
-                        if Identity.known_destinations[destination_hash][4] > 0:
-                            was_used = True
-                            last_use = Identity.known_destinations[destination_hash][4]
+                if entry[4] > 0:
+                    was_used = True
+                    last_use = entry[4]
 
-                        elif Identity.known_destinations[destination_hash][4] == 0:
-                            was_used = False
-                            never_used += 1
+                elif entry[4] == 0:
+                    was_used = False
+                    never_used += 1
 
-                        elif Identity.known_destinations[destination_hash][4] == -1:
-                            is_retained = True
-                            retained += 1
+                elif entry[4] == -1:
+                    is_retained = True
+                    retained += 1
 
-                        unused_for = time.time() - Identity.known_destinations[destination_hash][4]
+                unused_for = time.time() - entry[4]
 
-                        if not is_retained and not has_path:
-                            if not was_used and now - last_announce > RNS.Transport.UNUSED_DESTINATION_LINGER: stale.append(destination_hash)
-                            elif unused_for > RNS.Transport.DESTINATION_TIMEOUT*1.25:                          stale.append(destination_hash)
+                if not is_retained and not has_path:
+                    if not was_used and now - last_announce > RNS.Transport.UNUSED_DESTINATION_LINGER: stale.append(destination_hash)
+                    elif unused_for > RNS.Transport.DESTINATION_TIMEOUT*1.25:                          stale.append(destination_hash)
 
             except Exception as e: RNS.log(f"Faulty entry for {RNS.prettyhexrep(destination_hash)} while cleaning known destinations: {e}", RNS.LOG_DEBUG) if RNS.sl(RNS.LOG_DEBUG) else None
 
@@ -335,14 +477,21 @@ class Identity:
         for destination_hash in stale:
             with Identity.known_destinations_lock:
                 if destination_hash in Identity.known_destinations:
-                    Identity.known_destinations.pop(destination_hash)
+                    entry = Identity.known_destinations.pop(destination_hash)
+                    Identity._unindex_identity(destination_hash, entry[2])
+                    Identity._invalidate_cached_identity(destination_hash)
                     removed += 1
 
-            try:
-                hexhash = RNS.hexrep(destination_hash, delimit=False)
-                ratchet_path = f"{ratchetdir}/{hexhash}"
-                if os.path.isfile(ratchet_path): os.unlink(ratchet_path)
-            except Exception as e: RNS.log(f"Could not clean stale ratchets for {RNS.prettyhexrep(destination_hash)}: {e}", RNS.LOG_WARNING)
+            if ratchet_store == None:
+                try:
+                    hexhash = RNS.hexrep(destination_hash, delimit=False)
+                    ratchet_path = f"{ratchetdir}/{hexhash}"
+                    if os.path.isfile(ratchet_path): os.unlink(ratchet_path)
+                except Exception as e: RNS.log(f"Could not clean stale ratchets for {RNS.prettyhexrep(destination_hash)}: {e}", RNS.LOG_WARNING)
+
+        if ratchet_store != None and len(stale) > 0:
+            try: ratchet_store.remove(stale)
+            except Exception as e: RNS.log(f"Could not clean stale ratchets: {e}", RNS.LOG_WARNING)
 
         RNS.log(f"Cleaned known destinations in {RNS.prettyshorttime(time.time()-st)}", RNS.LOG_DEBUG) if RNS.sl(RNS.LOG_DEBUG) else None
         RNS.log(f"Total: {total}, stale: {len(stale)}, removed: {removed}, no path: {no_path}, never used: {never_used}, with path: {total-no_path}, used: {total-never_used}, retained: {retained}", RNS.LOG_PATHING) if RNS.sl(RNS.LOG_PATHING) else None
@@ -400,6 +549,19 @@ class Identity:
     def _ratchet_public_bytes(ratchet):
         return X25519PrivateKey.from_private_bytes(ratchet).public_key().public_bytes()
 
+    @staticmethod
+    def _ratchet_keys(ratchets, known_ids=None):
+        # Returns an ordered mapping of ratchet IDs to private
+        # key objects, reusing IDs already computed in known_ids
+        ratchet_keys = OrderedDict()
+        for ratchet in ratchets:
+            ratchet_prv = X25519PrivateKey.from_private_bytes(ratchet)
+            if known_ids != None and ratchet in known_ids: ratchet_id = known_ids[ratchet]
+            else: ratchet_id = Identity._get_ratchet_id(ratchet_prv.public_key().public_bytes())
+            ratchet_keys[ratchet_id] = ratchet_prv
+
+        return ratchet_keys
+
     @staticmethod
     def _generate_ratchet():
         ratchet_prv = X25519PrivateKey.generate()
@@ -418,6 +580,11 @@ class Identity:
                 RNS.log(f"Remembering ratchet {RNS.prettyhexrep(Identity._get_ratchet_id(ratchet))} for {RNS.prettyhexrep(destination_hash)}", RNS.LOG_EXTREME) if RNS.sl(RNS.LOG_EXTREME) else None
                 Identity.known_ratchets[destination_hash] = ratchet
                 if not RNS.Transport.owner.is_connected_to_shared_instance:
+                    ratchet_store = Identity._ratchet_store()
+                    if ratchet_store != None:
+                        ratchet_store.store(destination_hash, ratchet, time.time())
+                        return
+
                     def persist_job():
                         with Identity.ratchet_persist_lock:
                             hexhash = RNS.hexrep(destination_hash, delimit=False)
@@ -442,6 +609,23 @@ class Identity:
             RNS.log(f"The contained exception was: {e}")
             RNS.trace_exception(e)
 
+    @staticmethod
+    def _ratchet_store():
+        if sqlite3 == None: return None
+        store_path = RNS.Reticulum.storagepath+"/ratchets.db"
+        with Identity.ratchet_persist_lock:
+            if Identity.ratchet_store == None or Identity.ratchet_store.path != store_path:
+                try:
+                    if Identity.ratchet_store != None: Identity.ratchet_store.close()
+                    Identity.ratchet_store = RatchetStore(store_path)
+                except Exception as e:
+                    RNS.log(f"Could not open indexed storage for ratchets, the contained exception was: {e}", RNS.LOG_ERROR)
+                    RNS.log("Falling back to per-destination ratchet files", RNS.LOG_ERROR)
+                    Identity.ratchet_store = None
+                    return None
+
+            return Identity.ratchet_store
+
     @staticmethod
     def _clean_ratchets():
         RNS.log("Cleaning ratchets...", RNS.LOG_DEBUG) if RNS.sl(RNS.LOG_DEBUG) else None
@@ -451,7 +635,17 @@ class Identity:
             not_known = 0
             now = time.time()
             ratchetdir = RNS.Reticulum.storagepath+"/ratchets"
-            if os.path.isdir(ratchetdir):
+            ratchet_store = Identity._ratchet_store()
+            if ratchet_store != None:
+                if os.path.isdir(ratchetdir):
+                    RNS.log("Importing ratchets into indexed storage...", RNS.LOG_NOTICE)
+                    imported = ratchet_store.import_directory(ratchetdir)
+                    RNS.log(f"Imported {imported} ratchets", RNS.LOG_NOTICE)
+
+                count, expired, not_known = ratchet_store.clean(now-Identity.RATCHET_EXPIRY, lambda destination_hash: destination_hash in Identity.known_destinations)
+                removed = expired+not_known
+
+            elif os.path.isdir(ratchetdir):
                 for filename in os.listdir(ratchetdir):
                     count += 1
                     try:
@@ -484,10 +678,26 @@ class Identity:
     @staticmethod
     def get_ratchet(destination_hash):
         if not destination_hash in Identity.known_ratchets:
+            ratchet_store = Identity._ratchet_store()
             ratchetdir = RNS.Reticulum.storagepath+"/ratchets"
             hexhash = RNS.hexrep(destination_hash, delimit=False)
             ratchet_path = f"{ratchetdir}/{hexhash}"
-            if os.path.isfile(ratchet_path):
+            if ratchet_store != None:
+                try:
+                    ratchet_data = ratchet_store.load(destination_hash)
+                    if ratchet_data != None:
+                        ratchet, received = ratchet_data
+                        if time.time() < received+Identity.RATCHET_EXPIRY and len(ratchet) == Identity.RATCHETSIZE//8:
+                            Identity.known_ratchets[destination_hash] = ratchet
+                        else:
+                            return None
+
+                except Exception as e:
+                    RNS.log(f"An error occurred while loading ratchet data for {RNS.prettyhexrep(destination_hash)} from storage.", RNS.LOG_ERROR)
+                    RNS.log(f"The contained exception was: {e}", RNS.LOG_ERROR)
+                    return None
+
+            elif os.path.isfile(ratchet_path):
                 try:
                     with open(ratchet_path, "rb") as ratchet_file:
                         ratchet_data = umsgpack.unpackb(ratchet_file.read())
@@ -507,60 +717,70 @@ class Identity:
             RNS.log(f"Could not load ratchet for {RNS.prettyhexrep(destination_hash)}", RNS.LOG_DEBUG) if RNS.sl(RNS.LOG_DEBUG) else None
             return None
 
+    @staticmethod
+    def unpack_announce(packet):
+        keysize       = Identity.KEYSIZE//8
+        ratchetsize   = Identity.RATCHETSIZE//8
+        name_hash_len = Identity.NAME_HASH_LENGTH//8
+        sig_len       = Identity.SIGLENGTH//8
+        destination_hash = packet.destination_hash
+
+        # Get public key bytes from announce
+        public_key = packet.data[:keysize]
+
+        # If the packet context flag is set,
+        # this announce contains a new ratchet
+        if packet.context_flag == RNS.Packet.FLAG_SET:
+            name_hash   = packet.data[keysize:keysize+name_hash_len ]
+            random_hash = packet.data[keysize+name_hash_len:keysize+name_hash_len+10]
+            ratchet     = packet.data[keysize+name_hash_len+10:keysize+name_hash_len+10+ratchetsize]
+            signature   = packet.data[keysize+name_hash_len+10+ratchetsize:keysize+name_hash_len+10+ratchetsize+sig_len]
+            app_data    = b""
+            if len(packet.data) > keysize+name_hash_len+10+sig_len+ratchetsize:
+                app_data = packet.data[keysize+name_hash_len+10+sig_len+ratchetsize:]
+
+        # If the packet context flag is not set,
+        # this announce does not contain a ratchet
+        else:
+            ratchet     = b""
+            name_hash   = packet.data[keysize:keysize+name_hash_len]
+            random_hash = packet.data[keysize+name_hash_len:keysize+name_hash_len+10]
+            signature   = packet.data[keysize+name_hash_len+10:keysize+name_hash_len+10+sig_len]
+            app_data    = b""
+            if len(packet.data) > keysize+name_hash_len+10+sig_len:
+                app_data = packet.data[keysize+name_hash_len+10+sig_len:]
+
+        signed_data = destination_hash+public_key+name_hash+random_hash+ratchet+app_data
+
+        if not len(packet.data) > Identity.KEYSIZE//8+Identity.NAME_HASH_LENGTH//8+10+Identity.SIGLENGTH//8:
+            app_data = None
+
+        return public_key, name_hash, random_hash, ratchet, signature, app_data, signed_data
+
     @staticmethod
     def validate_announce(packet, only_validate_signature=False):
         try:
             if packet.packet_type == RNS.Packet.ANNOUNCE:
-                keysize       = Identity.KEYSIZE//8
-                ratchetsize   = Identity.RATCHETSIZE//8
-                name_hash_len = Identity.NAME_HASH_LENGTH//8
-                sig_len       = Identity.SIGLENGTH//8
+                # Transport validates announces in several stages. Once
+                # the signature of a packet has been validated, the
+                # unpacked announce is kept on it for the later stages.
                 destination_hash = packet.destination_hash
-
-                # Get public key bytes from announce
-                public_key = packet.data[:keysize]
-
-                # If the packet context flag is set,
-                # this announce contains a new ratchet
-                if packet.context_flag == RNS.Packet.FLAG_SET:
-                    name_hash   = packet.data[keysize:keysize+name_hash_len ]
-                    random_hash = packet.data[keysize+name_hash_len:keysize+name_hash_len+10]
-                    ratchet     = packet.data[keysize+name_hash_len+10:keysize+name_hash_len+10+ratchetsize]
-                    signature   = packet.data[keysize+name_hash_len+10+ratchetsize:keysize+name_hash_len+10+ratchetsize+sig_len]
-                    app_data    = b""
-                    if len(packet.data) > keysize+name_hash_len+10+sig_len+ratchetsize:
-                        app_data = packet.data[keysize+name_hash_len+10+sig_len+ratchetsize:]
-
-                # If the packet context flag is not set,
-                # this announce does not contain a ratchet
+                validated = packet.validated_announce
+                if validated != None: public_key, name_hash, random_hash, ratchet, signature, app_data, signed_data, identity_hash = validated
                 else:
-                    ratchet     = b""
-                    name_hash   = packet.data[keysize:keysize+name_hash_len]
-                    random_hash = packet.data[keysize+name_hash_len:keysize+name_hash_len+10]
-                    signature   = packet.data[keysize+name_hash_len+10:keysize+name_hash_len+10+sig_len]
-                    app_data    = b""
-                    if len(packet.data) > keysize+name_hash_len+10+sig_len:
-                        app_data = packet.data[keysize+name_hash_len+10+sig_len:]
-
-                signed_data = destination_hash+public_key+name_hash+random_hash+ratchet+app_data
-
-                if not len(packet.data) > Identity.KEYSIZE//8+Identity.NAME_HASH_LENGTH//8+10+Identity.SIGLENGTH//8:
-                    app_data = None
-
-                announced_identity = Identity(create_keys=False)
-                announced_identity.load_public_key(public_key)
+                    public_key, name_hash, random_hash, ratchet, signature, app_data, signed_data = Identity.unpack_announce(packet)
+                    identity_hash = Identity.truncated_hash(public_key)
 
                 if len(RNS.Transport.blackholed_identities) > 0:
-                    if announced_identity.hash in RNS.Transport.blackholed_identities:
-                        RNS.log(f"Invalidated and dropped announce from blackholed identity {RNS.prettyhexrep(announced_identity.hash)}", RNS.LOG_EXTREME) if RNS.sl(RNS.LOG_EXTREME) else None
+                    if identity_hash in RNS.Transport.blackholed_identities:
+                        RNS.log(f"Invalidated and dropped announce from blackholed identity {RNS.prettyhexrep(identity_hash)}", RNS.LOG_EXTREME) if RNS.sl(RNS.LOG_EXTREME) else None
                         return False
 
-                if announced_identity.pub != None and announced_identity.validate(signature, signed_data):
-                    if only_validate_signature:
-                        del announced_identity
-                        return True
+                if validated != None or Identity.validate_announce_signature(destination_hash, public_key, signature, signed_data):
+                    if validated == None: packet.validated_announce = (public_key, name_hash, random_hash, ratchet, signature, app_data, signed_data, identity_hash)
+                    if only_validate_signature: return True
 
-                    hash_material = name_hash+announced_identity.hash
+                    hash_material = name_hash+identity_hash
                     expected_hash = RNS.Identity.full_hash(hash_material)[:RNS.Reticulum.TRUNCATED_HASHLENGTH//8]
 
                     if destination_hash == expected_hash:
@@ -575,7 +795,6 @@ class Identity:
                                 return False
 
                         RNS.Identity.remember(packet.get_hash(), destination_hash, public_key, app_data)
-                        del announced_identity
 
                         if packet.rssi != None or packet.snr != None:
                             signal_str = " ["
@@ -602,17 +821,72 @@ class Identity:
 
                 else:
                     RNS.log("Received invalid announce for "+RNS.prettyhexrep(destination_hash)+": Invalid signature.", RNS.LOG_DEBUG) if RNS.sl(RNS.LOG_DEBUG) else None
-                    del announced_identity
                     return False
         
         except Exception as e:
             RNS.log("Error occurred while validating announce. The contained exception was: "+str(e), RNS.LOG_ERROR)
             return False
 
+    @staticmethod
+    def validate_announce_signature(destination_hash, public_key, signature, signed_data):
+        # Positive results are remembered, so the same announce
+        # heard multiple times, or validated in several stages
+        # by Transport, only needs to be verified once.
+        announce_key = (destination_hash, Identity.full_hash(signed_data+signature))
+        with Identity.verified_announces_lock:
+            if announce_key in Identity.verified_announces:
+                Identity.verified_announces.move_to_end(announce_key)
+                Identity.verified_announce_hits += 1
+                return True
+            else: Identity.verified_announce_misses += 1
+
+        if Identity.verify_signature(public_key, signature, signed_data):
+            Identity.remember_verified_announce(destination_hash, signature, signed_data)
+            return True
+
+        else: return False
+
+    @staticmethod
+    def verify_signature(public_key, signature, signed_data):
+        # This does not touch any shared state, and can
+        # be run from worker threads or processes.
+        announced_identity = Identity(create_keys=False)
+        announced_identity.load_public_key(public_key)
+        return announced_identity.pub != None and announced_identity.validate(signature, signed_data)
+
+    @staticmethod
+    def is_verified_announce(destination_hash, signature, signed_data):
+        with Identity.verified_announces_lock:
+            return (destination_hash, Identity.full_hash(signed_data+signature)) in Identity.verified_announces
+
+    @staticmethod
+    def remember_verified_announce(destination_hash, signature, signed_data):
+        announce_key = (destination_hash, Identity.full_hash(signed_data+signature))
+        with Identity.verified_announces_lock:
+            Identity.verified_announces[announce_key] = True
+            Identity.verified_announces.move_to_end(announce_key)
+            while len(Identity.verified_announces) > Identity.VERIFIED_ANNOUNCES_MAX:
+                Identity.verified_announces.popitem(last=False)
+
+    @staticmethod
+    def verified_announce_stats():
+        """
+        :returns: A dictionary containing the size, hit and miss counts and hit rate of the verified announce cache.
+        """
+        with Identity.verified_announces_lock:
+            hits    = Identity.verified_announce_hits
+            misses  = Identity.verified_announce_misses
+            lookups = hits+misses
+            return {"entries": len(Identity.verified_announces), "hits": hits, "misses": misses,
+                    "hit_rate": hits/lookups if lookups > 0 else 0.0}
+
     @staticmethod
     def persist_data(background=False):
         if not RNS.Transport.owner.is_connected_to_shared_instance:
             Identity.save_known_destinations(background=background)
+            if Identity.ratchet_store != None:
+                try: Identity.ratchet_store.flush()
+                except Exception as e: RNS.log(f"Could not write ratchets to storage, the contained exception was: {e}", RNS.LOG_ERROR)
 
     @staticmethod
     def exit_handler():
@@ -845,11 +1119,13 @@ class Identity:
         plaintext = token.decrypt(ciphertext)
         return plaintext
 
-    def decrypt(self, ciphertext_token, ratchets=None, enforce_ratchets=False, ratchet_id_receiver=None):
+    def decrypt(self, ciphertext_token, ratchets=None, enforce_ratchets=False, ratchet_id_receiver=None, ratchet_id=None):
         """
         Decrypts information for the identity.
 
         :param ciphertext: The ciphertext to be decrypted as *bytes*.
+        :param ratchets: Optional ratchet private keys to attempt decryption with, either as a list of *bytes*, or as an ordered mapping of ratchet IDs to precomputed private key objects.
+        :param ratchet_id: Optional ID of the ratchet the ciphertext is expected to be encrypted for. If known, this ratchet is attempted first.
         :returns: Plaintext as *bytes*, or *None* if decryption fails.
         :raises: *KeyError* if the instance does not hold a private key.
         """
@@ -863,14 +1139,17 @@ class Identity:
                     ciphertext = ciphertext_token[Identity.KEYSIZE//8//2:]
 
                     if ratchets:
-                        for ratchet in ratchets:
+                        if not isinstance(ratchets, Mapping): ratchets = Identity._ratchet_keys(ratchets)
+                        candidates = list(ratchets.items())
+                        if ratchet_id != None and ratchet_id in ratchets:
+                            candidates = [(ratchet_id, ratchets[ratchet_id])]+[c for c in candidates if c[0] != ratchet_id]
+
+                        for candidate_id, ratchet_prv in candidates:
                             try:
-                                ratchet_prv = X25519PrivateKey.from_private_bytes(ratchet)
-                                ratchet_id = Identity._get_ratchet_id(ratchet_prv.public_key().public_bytes())
                                 shared_key = ratchet_prv.exchange(peer_pub)
                                 plaintext = self.__decrypt(shared_key, ciphertext)
                                 if ratchet_id_receiver:
-                                    ratchet_id_receiver.latest_ratchet_id = ratchet_id
+                                    ratchet_id_receiver.latest_ratchet_id = candidate_id
                                 
                                 break
                             
@@ -954,3 +1233,346 @@ class Identity:
 
     def __str__(self):
         return RNS.prettyhexrep(self.hash)
+
+
+class KnownDestinationStore(MutableMapping):
+    """
+    Indexed on-disk storage for known destinations. The store behaves like
+    the ``known_destinations`` dict it replaces, but only keeps recently
+    accessed entries in memory. Reads go through to the database, and
+    changes are held in memory until a writer thread writes them out in
+    batches, shortly after they were made. Entries are lists of
+    ``[last_heard, packet_hash, public_key, app_data, last_used]``, and
+    must be assigned back to the store when modified.
+
+    Programs connected to a shared instance open the store read-only,
+    since the shared instance writes the same destinations. Their changes
+    are kept in memory until the shared instance has written them, and
+    are then read from the database like any other entry. Database errors
+    on reads are logged, and the affected entries are treated as unknown.
+    """
+    CACHE_SIZE  = 16384
+    BATCH_SIZE  = 4096
+    WRITE_DELAY = 2
+
+    def __init__(self, path, cache_size=CACHE_SIZE, read_only=False):
+        self.path       = path
+        self.cache_size = cache_size
+        self.read_only  = read_only
+        self.cache      = OrderedDict()
+        self.pending    = {}
+        self.pending_identities = {}
+        self.lock       = threading.RLock()
+        self.wakeup     = threading.Event()
+        self.full       = threading.Event()
+        self.writer     = None
+        self.closed     = False
+        self.db         = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS known_destinations (destination_hash BLOB PRIMARY KEY, last_heard REAL, packet_hash BLOB, public_key BLOB, app_data BLOB, last_used REAL, identity_hash BLOB) WITHOUT ROWID")
+        self.db.execute("CREATE INDEX IF NOT EXISTS known_destinations_identity ON known_destinations (identity_hash)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS store_info (key TEXT PRIMARY KEY, value BLOB) WITHOUT ROWID")
+        self.db.commit()
+        self.count = self.db.execute("SELECT COUNT(*) FROM known_destinations").fetchone()[0]
+
+    def __read(self, destination_hash):
+        try: row = self.db.execute("SELECT last_heard, packet_hash, public_key, app_data, last_used FROM known_destinations WHERE destination_hash = ?", (destination_hash,)).fetchone()
+        except sqlite3.Error as e:
+            RNS.log(f"Could not read known destination {RNS.prettyhexrep(destination_hash)} from storage: {e}", RNS.LOG_ERROR)
+            return None
+
+        if row == None: return None
+        else: return list(row)
+
+    def __changed(self):
+        # Must be called with the store lock held
+        if self.writer == None:
+            self.writer = threading.Thread(target=self.__write_job, daemon=True)
+            self.writer.start()
+
+        self.wakeup.set()
+        if len(self.pending) >= KnownDestinationStore.BATCH_SIZE: self.full.set()
+
+    def __write_job(self):
+        while True:
+            self.wakeup.wait()
+            # Allow further changes to queue up, so they are
+            # written in one batch, unless a full batch is
+            # already waiting
+            self.full.wait(KnownDestinationStore.WRITE_DELAY)
+            self.wakeup.clear()
+            self.full.clear()
+            with self.lock:
+                if self.closed: return
+                try:
+                    if self.read_only: self.__release_stored()
+                    else: self.flush()
+                except Exception as e: RNS.log(f"Could not write known destinations to storage, the contained exception was: {e}", RNS.LOG_ERROR)
+
+    def __release_stored(self):
+        # Must be called with the store lock held. Changes
+        # that the shared instance has already written, or
+        # written a newer version of, are read back from
+        # the database from now on.
+        for destination_hash in list(self.pending):
+            entry = self.pending[destination_hash]
+            stored = self.__read(destination_hash)
+            if entry == None: released = stored == None
+            else: released = stored != None and (stored[2:4] == entry[2:4] or stored[0] >= entry[0])
+            if released:
+                self.pending.pop(destination_hash)
+                if entry != None:
+                    identity_hash = Identity.truncated_hash(entry[2])
+                    if identity_hash in self.pending_identities:
+                        self.pending_identities[identity_hash].discard(destination_hash)
+                        if len(self.pending_identities[identity_hash]) == 0: self.pending_identities.pop(identity_hash)
+
+    def __cache(self, destination_hash, entry):
+        self.cache[destination_hash] = entry
+        self.cache.move_to_end(destination_hash)
+        while len(self.cache) > self.cache_size: self.cache.popitem(last=False)
+
+    def __lookup(self, destination_hash):
+        with self.lock:
+            if destination_hash in self.pending: return self.pending[destination_hash]
+            if destination_hash in self.cache:
+                self.cache.move_to_end(destination_hash)
+                return self.cache[destination_hash]
+
+            entry = self.__read(destination_hash)
+            if entry != None: self.__cache(destination_hash, entry)
+            return entry
+
+    def __contains__(self, destination_hash): return self.__lookup(destination_hash) != None
+
+    def __getitem__(self, destination_hash):
+        entry = self.__lookup(destination_hash)
+        if entry == None: raise KeyError(destination_hash)
+        else: return entry
+
+    def __setitem__(self, destination_hash, entry):
+        with self.lock:
+            if self.__lookup(destination_hash) == None: self.count += 1
+            identity_hash = Identity.truncated_hash(entry[2])
+            if not identity_hash in self.pending_identities: self.pending_identities[identity_hash] = set()
+            self.pending_identities[identity_hash].add(destination_hash)
+
+            self.pending.pop(destination_hash, None)
+            self.pending[destination_hash] = entry
+            self.__cache(destination_hash, entry)
+            self.__changed()
+
+    def __delitem__(self, destination_hash):
+        with self.lock:
+            if self.__lookup(destination_hash) == None: raise KeyError(destination_hash)
+            self.count -= 1
+            self.pending.pop(destination_hash, None)
+            self.pending[destination_hash] = None
+            self.cache.pop(destination_hash, None)
+            self.__changed()
+
+    def __len__(self): return self.count
+
+    def __iter__(self):
+        for destination_hash, entry in self.entries(): yield destination_hash
+
+    def destinations_for_identity(self, identity_hash):
+        with self.lock:
+            destination_hashes = set(self.pending_identities.get(identity_hash, []))
+            try:
+                for row in self.db.execute("SELECT destination_hash FROM known_destinations WHERE identity_hash = ?", (identity_hash,)).fetchall():
+                    destination_hashes.add(row[0])
+            except sqlite3.Error as e: RNS.log(f"Could not read known destinations for identity {RNS.prettyhexrep(identity_hash)} from storage: {e}", RNS.LOG_ERROR)
+
+            # Pending changes may have removed entries
+            # or changed their public keys since
+            matches = []
+            for destination_hash in destination_hashes:
+                if destination_hash in self.pending:
+                    entry = self.pending[destination_hash]
+                    if entry == None or Identity.truncated_hash(entry[2]) != identity_hash: continue
+                matches.append(destination_hash)
+
+            return matches
+
+    def entries(self):
+        # Iterates all entries in batches, without pulling
+        # the entire set into memory or the cache. Changes
+        # not yet written to the database are merged in.
+        with self.lock: pending = self.pending.copy()
+        last_hash = b""
+        while True:
+            with self.lock: rows = self.db.execute("SELECT destination_hash, last_heard, packet_hash, public_key, app_data, last_used FROM known_destinations WHERE destination_hash > ? ORDER BY destination_hash LIMIT ?", (last_hash, KnownDestinationStore.BATCH_SIZE)).fetchall()
+            if len(rows) == 0: break
+            for row in rows:
+                if not row[0] in pending: yield row[0], list(row[1:])
+            last_hash = rows[-1][0]
+
+        for destination_hash in pending:
+            if pending[destination_hash] != None: yield destination_hash, pending[destination_hash]
+
+    def flush(self):
+        with self.lock:
+            if len(self.pending) == 0: return 0
+            pending = self.pending; self.pending = {}
+            pending_identities = self.pending_identities; self.pending_identities = {}
+            removed = [(destination_hash,) for destination_hash in pending if pending[destination_hash] == None]
+            updated = [(destination_hash, *pending[destination_hash][:5], Identity.truncated_hash(pending[destination_hash][2])) for destination_hash in pending if pending[destination_hash] != None]
+            try:
+                with self.db:
+                    if len(removed) > 0: self.db.executemany("DELETE FROM known_destinations WHERE destination_hash = ?", removed)
+                    if len(updated) > 0: self.db.executemany("INSERT OR REPLACE INTO known_destinations VALUES (?, ?, ?, ?, ?, ?, ?)", updated)
+
+            except Exception as e:
+                for destination_hash in pending:
+                    if not destination_hash in self.pending: self.pending[destination_hash] = pending[destination_hash]
+                for identity_hash in pending_identities:
+                    if not identity_hash in self.pending_identities: self.pending_identities[identity_hash] = set()
+                    self.pending_identities[identity_hash] |= pending_identities[identity_hash]
+                raise e
+
+            return len(pending)
+
+    def legacy_imported(self):
+        with self.lock: return self.db.execute("SELECT value FROM store_info WHERE key = 'legacy_imported'").fetchone() != None
+
+    def import_entries(self, known_destinations):
+        # Entries already in the store are newer than the
+        # imported ones. The import is recorded in the same
+        # transaction, so a failed import is retried later.
+        with self.lock:
+            self.flush()
+            with self.db:
+                self.db.executemany("INSERT OR IGNORE INTO known_destinations VALUES (?, ?, ?, ?, ?, ?, ?)", [(destination_hash, *entry[:5], Identity.truncated_hash(entry[2])) for destination_hash, entry in known_destinations.items()])
+                self.db.execute("INSERT OR REPLACE INTO store_info VALUES ('legacy_imported', ?)", (time.time(),))
+            self.count = self.db.execute("SELECT COUNT(*) FROM known_destinations").fetchone()[0]
+            self.cache.clear()
+
+    def copy(self): return {destination_hash: entry for destination_hash, entry in self.entries()}
+
+    def close(self):
+        with self.lock:
+            if not self.read_only: self.flush()
+            self.closed = True
+            self.db.close()
+
+        self.wakeup.set()
+        self.full.set()
+
+
+class RatchetStore():
+    """
+    Indexed storage for the latest ratchet received from each destination.
+    New ratchets are queued in memory and written in batches by a single
+    writer thread. Entries are indexed by the time they were received, so
+    expired ratchets can be removed without reading every stored entry.
+    """
+    WRITE_DELAY = 0.5
+    BATCH_SIZE  = 4096
+
+    def __init__(self, path):
+        self.path    = path
+        self.pending = {}
+        self.lock    = threading.RLock()
+        self.wakeup  = threading.Event()
+        self.db      = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS ratchets (destination_hash BLOB PRIMARY KEY, ratchet BLOB, received REAL) WITHOUT ROWID")
+        self.db.execute("CREATE INDEX IF NOT EXISTS ratchets_received ON ratchets (received)")
+        self.db.commit()
+        self.writer = None
+
+    def store(self, destination_hash, ratchet, received):
+        with self.lock:
+            self.pending[destination_hash] = (ratchet, received)
+            if self.writer == None:
+                self.writer = threading.Thread(target=self.__write_job, daemon=True)
+                self.writer.start()
+
+        self.wakeup.set()
+
+    def load(self, destination_hash):
+        with self.lock:
+            if destination_hash in self.pending: return self.pending[destination_hash]
+            row = self.db.execute("SELECT ratchet, received FROM ratchets WHERE destination_hash = ?", (destination_hash,)).fetchone()
+            if row == None: return None
+            else: return (row[0], row[1])
+
+    def remove(self, destination_hashes):
+        with self.lock:
+            for destination_hash in destination_hashes: self.pending.pop(destination_hash, None)
+            with self.db: self.db.executemany("DELETE FROM ratchets WHERE destination_hash = ?", [(destination_hash,) for destination_hash in destination_hashes])
+
+    def __write_job(self):
+        while True:
+            self.wakeup.wait()
+            self.wakeup.clear()
+            # Allow further ratchets to queue up,
+            # so they are written in one batch
+            time.sleep(RatchetStore.WRITE_DELAY)
+            try: self.flush()
+            except Exception as e: RNS.log(f"Could not write ratchets to storage, the contained exception was: {e}", RNS.LOG_ERROR)
+
+    def flush(self):
+        with self.lock:
+            if len(self.pending) == 0: return 0
+            pending = self.pending; self.pending = {}
+            try:
+                with self.db: self.db.executemany("INSERT OR REPLACE INTO ratchets VALUES (?, ?, ?)", [(destination_hash, *pending[destination_hash]) for destination_hash in pending])
+            except Exception as e:
+                for destination_hash in pending:
+                    if not destination_hash in self.pending: self.pending[destination_hash] = pending[destination_hash]
+                raise e
+
+            return len(pending)
+
+    def clean(self, expired_before, is_known):
+        # Removes expired ratchets through the received index,
+        # and then the ratchets of destinations no longer known
+        with self.lock:
+            self.flush()
+            with self.db: expired = self.db.execute("DELETE FROM ratchets WHERE received < ?", (expired_before,)).rowcount
+
+        unknown = []; count = 0; last_hash = b""
+        while True:
+            with self.lock: rows = self.db.execute("SELECT destination_hash FROM ratchets WHERE destination_hash > ? ORDER BY destination_hash LIMIT ?", (last_hash, RatchetStore.BATCH_SIZE)).fetchall()
+            if len(rows) == 0: break
+            for row in rows:
+                count += 1
+                if not is_known(row[0]): unknown.append(row[0])
+            last_hash = rows[-1][0]
+
+        if len(unknown) > 0: self.remove(unknown)
+        return count+expired, expired, len(unknown)
+
+    def import_directory(self, ratchetdir):
+        # Imports ratchets from the previous storage format of
+        # one file per destination. Files are only removed once
+        # their ratchets have been written to the database, and
+        # files that could not be imported are left in place.
+        imported = []
+        for filename in os.listdir(ratchetdir):
+            try:
+                filepath = f"{ratchetdir}/{filename}"
+                if len(filename) == (RNS.Reticulum.TRUNCATED_HASHLENGTH//8)*2:
+                    with open(filepath, "rb") as rf: ratchet_data = umsgpack.unpackb(rf.read())
+                    with self.lock: self.pending[bytes.fromhex(filename)] = (ratchet_data["ratchet"], ratchet_data["received"])
+                    imported.append(filepath)
+
+            except Exception as e: RNS.log(f"Could not import ratchet from {ratchetdir}/{filename}: {e}", RNS.LOG_ERROR)
+
+        self.flush()
+        for filepath in imported:
+            try: os.unlink(filepath)
+            except Exception as e: RNS.log(f"Could not remove imported ratchet file {filepath}: {e}", RNS.LOG_WARNING)
+
+        try: os.rmdir(ratchetdir)
+        except Exception as e: RNS.log(f"Could not remove ratchet directory {ratchetdir}: {e}", RNS.LOG_WARNING)
+        return len(imported)
+
+    def close(self):
+        with self.lock:
+            self.flush()
+            self.db.close()
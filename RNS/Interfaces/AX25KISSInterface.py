@@ -34,14 +34,9 @@ import sys
 import threading
 import time
 import RNS
+from RNS.Interfaces.util import framing
 
-class KISS():
-    FEND              = 0xC0
-    FESC              = 0xDB
-    TFEND             = 0xDC
-    TFESC             = 0xDD
-    CMD_UNKNOWN       = 0xFE
-    CMD_DATA          = 0x00
+class KISS(framing.KISS):
     CMD_TXDELAY       = 0x01
     CMD_P             = 0x02
     CMD_SLOTTIME      = 0x03
@@ -51,12 +46,6 @@ class KISS():
     CMD_READY         = 0x0F
     CMD_RETURN        = 0xFF
 
-    @staticmethod
-    def escape(data):
-        data = data.replace(bytes([0xdb]), bytes([0xdb, 0xdd]))
-        data = data.replace(bytes([0xc0]), bytes([0xdb, 0xdc]))
-        return data
-
 class AX25():
     PID_NOLAYER3    = 0xF0
     CTRL_UI         = 0x03
@@ -288,9 +277,7 @@ class AX25KISSInterface(Interface):
 
                 data = addr+bytes([AX25.CTRL_UI])+bytes([AX25.PID_NOLAYER3])+data
 
-                data = data.replace(bytes([0xdb]), bytes([0xdb])+bytes([0xdd]))
-                data = data.replace(bytes([0xc0]), bytes([0xdb])+bytes([0xdc]))
-                kiss_frame = bytes([KISS.FEND])+bytes([0x00])+data+bytes([KISS.FEND])
+                kiss_frame = KISS.frame(data)
 
                 written = self.serial.write(kiss_frame)
                 self.txb += datalen
@@ -315,50 +302,25 @@ class AX25KISSInterface(Interface):
 
     def readLoop(self):
         try:
-            in_frame = False
-            escape = False
-            command = KISS.CMD_UNKNOWN
-            data_buffer = b""
+            decoder = framing.KISSDecoder()
             last_read_ms = int(time.time()*1000)
 
             while self.serial.is_open:
                 if self.serial.in_waiting:
-                    byte = ord(self.serial.read(1))
+                    data_in = self.serial.read(self.serial.in_waiting)
                     last_read_ms = int(time.time()*1000)
-
-                    if (in_frame and byte == KISS.FEND and command == KISS.CMD_DATA):
-                        in_frame = False
-                        self.process_incoming(data_buffer)
-                    elif (byte == KISS.FEND):
-                        in_frame = True
-                        command = KISS.CMD_UNKNOWN
-                        data_buffer = b""
-                    elif (in_frame and len(data_buffer) < self.HW_MTU+AX25.HEADER_SIZE):
-                        if (len(data_buffer) == 0 and command == KISS.CMD_UNKNOWN):
-                            # We only support one HDLC port for now, so
-                            # strip off the port nibble
-                            byte = byte & 0x0F
-                            command = byte
-                        elif (command == KISS.CMD_DATA):
-                            if (byte == KISS.FESC):
-                                escape = True
-                            else:
-                                if (escape):
-                                    if (byte == KISS.TFEND):
-                                        byte = KISS.FEND
-                                    if (byte == KISS.TFESC):
-                                        byte = KISS.FESC
-                                    escape = False
-                                data_buffer = data_buffer+bytes([byte])
-                        elif (command == KISS.CMD_READY):
+                    for frame in decoder.feed(data_in, (self.HW_MTU+AX25.HEADER_SIZE)*2):
+                        # We only support one HDLC port for now, so
+                        # strip off the port nibble
+                        command = frame[0] & 0x0F
+                        if command == KISS.CMD_DATA:
+                            if len(frame)-1 <= self.HW_MTU+AX25.HEADER_SIZE: self.process_incoming(frame[1:])
+                        elif command == KISS.CMD_READY:
                             self.process_queue()
+
                 else:
                     time_since_last = int(time.time()*1000) - last_read_ms
-                    if len(data_buffer) > 0 and time_since_last > self.timeout:
-                        data_buffer = b""
-                        in_frame = False
-                        command = KISS.CMD_UNKNOWN
-                        escape = False
+                    if len(decoder) > 0 and time_since_last > self.timeout: decoder.reset()
                     sleep(0.05)
 
                     if self.flow_control:
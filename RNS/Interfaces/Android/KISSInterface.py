@@ -34,14 +34,9 @@ import sys
 import threading
 import time
 import RNS
+from RNS.Interfaces.util import framing
 
-class KISS():
-    FEND              = 0xC0
-    FESC              = 0xDB
-    TFEND             = 0xDC
-    TFESC             = 0xDD
-    CMD_UNKNOWN       = 0xFE
-    CMD_DATA          = 0x00
+class KISS(framing.KISS):
     CMD_TXDELAY       = 0x01
     CMD_P             = 0x02
     CMD_SLOTTIME      = 0x03
@@ -51,12 +46,6 @@ class KISS():
     CMD_READY         = 0x0F
     CMD_RETURN        = 0xFF
 
-    @staticmethod
-    def escape(data):
-        data = data.replace(bytes([0xdb]), bytes([0xdb, 0xdd]))
-        data = data.replace(bytes([0xc0]), bytes([0xdb, 0xdc]))
-        return data
-
 class KISSInterface(Interface):
     MAX_CHUNK = 32768
     BITRATE_GUESS = 1200
@@ -305,9 +294,7 @@ class KISSInterface(Interface):
                     self.interface_ready = False
                     self.flow_control_locked = time.time()
 
-                data = data.replace(bytes([0xdb]), bytes([0xdb])+bytes([0xdd]))
-                data = data.replace(bytes([0xc0]), bytes([0xdb])+bytes([0xdc]))
-                frame = bytes([KISS.FEND])+bytes([0x00])+data+bytes([KISS.FEND])
+                frame = KISS.frame(data)
 
                 written = self.serial.write(frame)
                 self.txb += datalen
@@ -337,53 +324,27 @@ class KISSInterface(Interface):
 
     def readLoop(self):
         try:
-            in_frame = False
-            escape = False
-            command = KISS.CMD_UNKNOWN
-            data_buffer = b""
+            decoder = framing.KISSDecoder()
             last_read_ms = int(time.time()*1000)
 
             while self.serial.is_open:
                 serial_bytes = self.serial.read()
                 got = len(serial_bytes)
 
-                for byte in serial_bytes:
+                if got > 0:
                     last_read_ms = int(time.time()*1000)
-
-                    if (in_frame and byte == KISS.FEND and command == KISS.CMD_DATA):
-                        in_frame = False
-                        self.process_incoming(data_buffer)
-                    elif (byte == KISS.FEND):
-                        in_frame = True
-                        command = KISS.CMD_UNKNOWN
-                        data_buffer = b""
-                    elif (in_frame and len(data_buffer) < self.HW_MTU):
-                        if (len(data_buffer) == 0 and command == KISS.CMD_UNKNOWN):
-                            # We only support one HDLC port for now, so
-                            # strip off the port nibble
-                            byte = byte & 0x0F
-                            command = byte
-                        elif (command == KISS.CMD_DATA):
-                            if (byte == KISS.FESC):
-                                escape = True
-                            else:
-                                if (escape):
-                                    if (byte == KISS.TFEND):
-                                        byte = KISS.FEND
-                                    if (byte == KISS.TFESC):
-                                        byte = KISS.FESC
-                                    escape = False
-                                data_buffer = data_buffer+bytes([byte])
-                        elif (command == KISS.CMD_READY):
+                    for frame in decoder.feed(serial_bytes, self.HW_MTU*2):
+                        # We only support one HDLC port for now, so
+                        # strip off the port nibble
+                        command = frame[0] & 0x0F
+                        if command == KISS.CMD_DATA:
+                            if len(frame)-1 <= self.HW_MTU: self.process_incoming(frame[1:])
+                        elif command == KISS.CMD_READY:
                             self.process_queue()
-                
-                if got == 0:
+
+                else:
                     time_since_last = int(time.time()*1000) - last_read_ms
-                    if len(data_buffer) > 0 and time_since_last > self.timeout:
-                        data_buffer = b""
-                        in_frame = False
-                        command = KISS.CMD_UNKNOWN
-                        escape = False
+                    if len(decoder) > 0 and time_since_last > self.timeout: decoder.reset()
                     sleep(0.05)
 
                     if self.flow_control:
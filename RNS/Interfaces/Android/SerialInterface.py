@@ -34,19 +34,7 @@ import sys
 import threading
 import time
 import RNS
-
-class HDLC():
-    # The Serial Interface packetizes data using
-    # simplified HDLC framing, similar to PPP
-    FLAG              = 0x7E
-    ESC               = 0x7D
-    ESC_MASK          = 0x20
-
-    @staticmethod
-    def escape(data):
-        data = data.replace(bytes([HDLC.ESC]), bytes([HDLC.ESC, HDLC.ESC^HDLC.ESC_MASK]))
-        data = data.replace(bytes([HDLC.FLAG]), bytes([HDLC.ESC, HDLC.FLAG^HDLC.ESC_MASK]))
-        return data
+from RNS.Interfaces.util.framing import HDLC, HDLCDecoder
 
 class SerialInterface(Interface):
     MAX_CHUNK = 32768
@@ -200,7 +188,7 @@ class SerialInterface(Interface):
 
     def process_outgoing(self,data):
         if self.online:
-            data = bytes([HDLC.FLAG])+HDLC.escape(data)+bytes([HDLC.FLAG])
+            data = HDLC.frame(data)
             written = self.serial.write(data)
             self.txb += len(data)            
             if written != len(data):
@@ -208,42 +196,23 @@ class SerialInterface(Interface):
 
     def readLoop(self):
         try:
-            in_frame = False
-            escape = False
-            data_buffer = b""
+            # The Serial Interface packetizes data using
+            # simplified HDLC framing, similar to PPP
+            decoder = HDLCDecoder()
             last_read_ms = int(time.time()*1000)
 
             while self.serial.is_open:
                 serial_bytes = self.serial.read()
                 got = len(serial_bytes)
 
-                for byte in serial_bytes:
+                if got > 0:
                     last_read_ms = int(time.time()*1000)
+                    for frame in decoder.feed(serial_bytes, self.HW_MTU*2):
+                        if len(frame) <= self.HW_MTU: self.process_incoming(frame)
 
-                    if (in_frame and byte == HDLC.FLAG):
-                        in_frame = False
-                        self.process_incoming(data_buffer)
-                    elif (byte == HDLC.FLAG):
-                        in_frame = True
-                        data_buffer = b""
-                    elif (in_frame and len(data_buffer) < self.HW_MTU):
-                        if (byte == HDLC.ESC):
-                            escape = True
-                        else:
-                            if (escape):
-                                if (byte == HDLC.FLAG ^ HDLC.ESC_MASK):
-                                    byte = HDLC.FLAG
-                                if (byte == HDLC.ESC  ^ HDLC.ESC_MASK):
-                                    byte = HDLC.ESC
-                                escape = False
-                            data_buffer = data_buffer+bytes([byte])
-                        
-                if got == 0:
+                else:
                     time_since_last = int(time.time()*1000) - last_read_ms
-                    if len(data_buffer) > 0 and time_since_last > self.timeout:
-                        data_buffer = b""
-                        in_frame = False
-                        escape = False
+                    if len(decoder) > 0 and time_since_last > self.timeout: decoder.reset()
                     # sleep(0.08)
                     
         except Exception as e:
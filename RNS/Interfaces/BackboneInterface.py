@@ -29,24 +29,76 @@
 # SOFTWARE.
 
 from RNS.Interfaces.Interface import Interface
+from RNS.Interfaces.util.framing import HDLC, HDLCDecoder
 import threading
+import itertools
 import socket
 import select
 import time
 import sys
 import os
 import RNS
+from collections import deque
+
+class TransmitBuffer():
+    """
+    Buffer of data waiting to be written to a socket. Data is kept as a
+    list of segments, which are written with a single scatter write. A
+    partially written segment is replaced by a view of its remainder, so
+    buffered data is never copied.
+
+    Once ``max_pending`` bytes are waiting, further data is refused unless
+    forced, so a peer that stops reading can not make the buffer grow
+    without bound. Callers drop refused frames.
+    """
+    MAX_SEGMENTS = 192
+    MAX_PENDING  = 8*1024*1024
+
+    def __init__(self, max_pending=MAX_PENDING):
+        self.segments    = deque()
+        self.pending     = 0
+        self.max_pending = max_pending
+        self.dropped     = 0
+        self.lock        = threading.Lock()
+
+    def __len__(self):
+        return self.pending
+
+    def append(self, *segments, force=False):
+        with self.lock:
+            if self.pending >= self.max_pending and not force:
+                self.dropped += 1
+                return False
 
-class HDLC():
-    FLAG              = 0x7E
-    ESC               = 0x7D
-    ESC_MASK          = 0x20
+            for segment in segments:
+                self.segments.append(segment)
+                self.pending += len(segment)
+
+            return True
+
+    def send(self, target_socket):
+        with self.lock:
+            if self.pending == 0: return 0
+            if len(self.segments) == 1: written = target_socket.send(self.segments[0])
+            else: written = target_socket.sendmsg(itertools.islice(self.segments, TransmitBuffer.MAX_SEGMENTS))
+
+            self.pending -= written
+            remaining = written
+            while remaining > 0:
+                segment_len = len(self.segments[0])
+                if segment_len <= remaining:
+                    self.segments.popleft()
+                    remaining -= segment_len
+                else:
+                    self.segments[0] = memoryview(self.segments[0])[remaining:]
+                    remaining = 0
 
-    @staticmethod
-    def escape(data):
-        data = data.replace(bytes([HDLC.ESC]), bytes([HDLC.ESC, HDLC.ESC^HDLC.ESC_MASK]))
-        data = data.replace(bytes([HDLC.FLAG]), bytes([HDLC.ESC, HDLC.FLAG^HDLC.ESC_MASK]))
-        return data
+            return written
+
+    def clear(self):
+        with self.lock:
+            self.segments.clear()
+            self.pending = 0
 
 class BackboneInterface(Interface):
     HW_MTU            = 1048576
@@ -54,6 +106,8 @@ class BackboneInterface(Interface):
     DEFAULT_IFAC_SIZE = 16
     AUTOCONFIGURE_MTU = True
 
+    LISTEN_BACKLOG      = 128
+
     BLOCK_FAST_FLAPPING = True
     FAST_FLAP_THRESHOLD = 20
     FAST_FLAP_GRACE     = 5
@@ -61,12 +115,17 @@ class BackboneInterface(Interface):
     fast_flapping_lock  = threading.Lock()
     fast_flapping       = {}
 
-    epoll = None
+    # How spawned connections are assigned
+    # to I/O workers when several are used
+    ASSIGN_ROUND_ROBIN = 0x00
+    ASSIGN_LOAD        = 0x01
+
     listener_filenos = {}
-    spawned_interface_filenos = {}
-    epoll = None
-    _job_active = False
-    _job_lock = threading.Lock()
+    workers          = []
+    worker_count     = 1
+    worker_assign    = ASSIGN_ROUND_ROBIN
+    _next_worker     = 0
+    _workers_lock    = threading.Lock()
 
     @staticmethod
     def get_address_for_if(name, bind_port, prefer_ipv6=False):
@@ -222,16 +281,44 @@ class BackboneInterface(Interface):
     def ic_pr_burst_activated(self, value): pass
 
     @staticmethod
-    def start():
-        if not BackboneInterface._job_active: threading.Thread(target=BackboneInterface.__job, daemon=True).start()
+    def set_workers(count, assign=None):
+        # The number of I/O workers can only be changed
+        # before the first socket has been added.
+        with BackboneInterface._workers_lock:
+            if len(BackboneInterface.workers) > 0:
+                RNS.log("Could not change the number of backbone I/O workers, since they are already running", RNS.LOG_WARNING)
+                return False
+
+            BackboneInterface.worker_count = max(1, count)
+            if assign != None: BackboneInterface.worker_assign = assign
+            return True
+
+    @staticmethod
+    def ensure_workers():
+        with BackboneInterface._workers_lock:
+            if len(BackboneInterface.workers) == 0:
+                BackboneInterface.workers = [BackboneWorker(index) for index in range(0, BackboneInterface.worker_count)]
 
     @staticmethod
-    def ensure_epoll():
-        if not BackboneInterface.epoll: BackboneInterface.epoll = select.epoll()
+    def assign_worker():
+        BackboneInterface.ensure_workers()
+        workers = BackboneInterface.workers
+        if len(workers) == 1: return workers[0]
+        elif BackboneInterface.worker_assign == BackboneInterface.ASSIGN_LOAD:
+            return min(workers, key=lambda worker: (len(worker.clients), worker.rxb+worker.txb))
+        else:
+            with BackboneInterface._workers_lock:
+                worker = workers[BackboneInterface._next_worker%len(workers)]
+                BackboneInterface._next_worker += 1
+                return worker
+
+    @staticmethod
+    def worker_stats():
+        return [worker.stats() for worker in BackboneInterface.workers]
 
     @staticmethod
     def add_listener(interface, bind_address, socket_type=socket.AF_INET):
-        BackboneInterface.ensure_epoll()
+        BackboneInterface.ensure_workers()
         if socket_type == socket.AF_INET:
             server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
@@ -245,182 +332,37 @@ class BackboneInterface(Interface):
             server_socket.bind(bind_address)
         else: raise TypeError(f"Invalid socket type {socket_type} for {interface}")
 
-        server_socket.listen(1)
+        # Listeners are always handled by the first worker,
+        # and accepted connections are assigned to workers
+        # as they are spawned.
+        listener_worker = BackboneInterface.workers[0]
+        server_socket.listen(BackboneInterface.LISTEN_BACKLOG)
         server_socket.setblocking(0)
         BackboneInterface.listener_filenos[server_socket.fileno()] = (interface, server_socket)
-        BackboneInterface.epoll.register(server_socket.fileno(), select.EPOLLIN)
-        BackboneInterface.start()
+        listener_worker.epoll.register(server_socket.fileno(), select.EPOLLIN)
+        listener_worker.start()
 
     @staticmethod
     def add_client_socket(client_socket, interface):
-        BackboneInterface.ensure_epoll()
-        BackboneInterface.spawned_interface_filenos[client_socket.fileno()] = interface
-        BackboneInterface.register_in(client_socket.fileno())
-        BackboneInterface.start()
-
-    @staticmethod
-    def register_in(fileno):
-        if fileno < 0:
-            RNS.log(f"Attempt to register invalid file descriptor {fileno}", RNS.LOG_WARNING)
-            return
-
-        try: BackboneInterface.epoll.register(fileno, select.EPOLLIN)
-        except Exception as e:
-            RNS.log(f"An error occurred while registering EPOLL_IN for file descriptor {fileno}: {e}", RNS.LOG_WARNING)
-
-    @staticmethod
-    def deregister_fileno(fileno):
-        if fileno < 0:
-            RNS.log(f"Attempt to deregister invalid file descriptor {fileno}", RNS.LOG_DEBUG)
-            return
-
-        try: BackboneInterface.epoll.unregister(fileno)
-        except Exception as e:
-            if   str(e).endswith("No such file or directory"): pass
-            elif str(e).endswith("Bad file descriptor"):       pass
-            else: RNS.log(f"An error occurred while deregistering file descriptor {fileno}: {e}", RNS.LOG_DEBUG)
+        worker = BackboneInterface.assign_worker()
+        interface.backbone_worker = worker
+        worker.add_client(client_socket, interface)
 
     @staticmethod
     def deregister_listeners():
         for fileno in BackboneInterface.listener_filenos:
             owner_interface, server_socket = BackboneInterface.listener_filenos[fileno]
             fileno = server_socket.fileno()
-            BackboneInterface.deregister_fileno(fileno)
+            BackboneInterface.workers[0].deregister_fileno(fileno)
             server_socket.close()
 
         BackboneInterface.listener_filenos.clear()
 
     @staticmethod
     def tx_ready(interface):
-        if interface.socket:
-            fileno = interface.socket.fileno()
-            if fileno in BackboneInterface.spawned_interface_filenos:
-                try: BackboneInterface.epoll.modify(fileno, select.EPOLLOUT)
-                except Exception as e:
-                    if   str(e).endswith("No such file or directory"): pass
-                    elif str(e).endswith("Bad file descriptor"):       pass
-                    else: RNS.log(f"Error occurred on {interface} while modifying socket EPOLL state: {e}", RNS.LOG_WARNING)
-                    raise e
-
-    @staticmethod
-    def __job():
-        with BackboneInterface._job_lock:
-            if BackboneInterface._job_active: return
-            else:
-                BackboneInterface._job_active = True
-                BackboneInterface.ensure_epoll()
-                try:
-                    while True:
-                        events = BackboneInterface.epoll.poll(1)
-                        for fileno, event in BackboneInterface.epoll.poll(1):
-                            if fileno in BackboneInterface.spawned_interface_filenos:
-                                spawned_interface = BackboneInterface.spawned_interface_filenos[fileno]
-                                client_socket = spawned_interface.socket
-                                if client_socket and fileno == client_socket.fileno() and (event & select.EPOLLIN):
-                                    try: received_bytes = client_socket.recv(spawned_interface.HW_MTU)
-                                    except Exception as e:
-                                        RNS.log(f"Error while reading from {spawned_interface}: {e}", RNS.LOG_PATHING) if RNS.sl(RNS.LOG_PATHING) else None
-                                        received_bytes = b""
-
-                                    if len(received_bytes): spawned_interface.receive(received_bytes)
-                                    else:
-                                        BackboneInterface.deregister_fileno(fileno); client_socket.close()
-                                        try:
-                                            if fileno in BackboneInterface.spawned_interface_filenos: BackboneInterface.spawned_interface_filenos.pop(fileno)
-                                        except Exception as e: RNS.log(f"Error while removing spawned interface file descriptor from BackboneInterface I/O handler: {e}", RNS.LOG_ERROR)
-
-                                        try:
-                                            if spawned_interface.parent_interface:
-                                                pif = spawned_interface.parent_interface
-                                                if pif.spawned_interfaces != None:
-                                                    while spawned_interface in pif.spawned_interfaces: pif.spawned_interfaces.remove(spawned_interface)
-                                        except Exception as e: RNS.log(f"Error while removing spawned interface from {pif}: {e}", RNS.LOG_ERROR)
-
-                                        spawned_interface.receive(received_bytes)
-                                
-                                elif client_socket and fileno == client_socket.fileno() and (event & select.EPOLLOUT):
-                                    try: written = client_socket.send(spawned_interface.transmit_buffer)
-                                    except Exception as e:
-                                        written = 0
-                                        if not spawned_interface.detached:
-                                            if RNS.sl(RNS.LOG_DEBUG):
-                                                if   str(e).endswith("Connection timed out"):     pass
-                                                elif str(e).endswith("Connection reset by peer"): pass
-                                                elif str(e).endswith("No route to host"):         pass
-                                                elif str(e).endswith("Broken pipe"):              pass
-                                                else: RNS.log(f"Error while writing to {spawned_interface}: {e}", RNS.LOG_DEBUG)
-                                        BackboneInterface.deregister_fileno(fileno)
-
-                                        try:
-                                            if fileno in BackboneInterface.spawned_interface_filenos: BackboneInterface.spawned_interface_filenos.pop(fileno)
-                                        except Exception as e: RNS.log(f"Error while removing spawned interface file descriptor from BackboneInterface I/O handler: {e}", RNS.LOG_ERROR)
-                                        
-                                        try:
-                                            if spawned_interface.parent_interface:
-                                                pif = spawned_interface.parent_interface
-                                                if pif.spawned_interfaces != None:
-                                                    while spawned_interface in pif.spawned_interfaces: pif.spawned_interfaces.remove(spawned_interface)
-                                        except Exception as e: RNS.log(f"Error while removing spawned interface from {pif}: {e}", RNS.LOG_ERROR)
-
-                                        try: client_socket.close()
-                                        except Exception as e: RNS.log(f"Error while closing socket for {spawned_interface}: {e}", RNS.LOG_WARNING)
-                                        spawned_interface.receive(b"")
-
-                                    spawned_interface.transmit_buffer = spawned_interface.transmit_buffer[written:]
-                                    try:
-                                        if len(spawned_interface.transmit_buffer) == 0: BackboneInterface.epoll.modify(fileno, select.EPOLLIN)
-                                    except Exception as e:
-                                        RNS.log(f"Error while setting EPOLLIN on {spawned_interface}: {e}", RNS.LOG_ERROR)
-
-                                    spawned_interface.txb += written
-                                    if spawned_interface.parent_interface: spawned_interface.parent_interface.txb += written
-                                
-                                elif client_socket and fileno == client_socket.fileno() and event & (select.EPOLLHUP):
-                                    BackboneInterface.deregister_fileno(fileno)
-                                    try:
-                                        if fileno in BackboneInterface.spawned_interface_filenos: BackboneInterface.spawned_interface_filenos.pop(fileno)
-                                    except Exception as e: RNS.log(f"Error while removing spawned interface file descriptor from BackboneInterface I/O handler: {e}", RNS.LOG_ERROR)
-
-                                    try:
-                                        if spawned_interface.parent_interface:
-                                            pif = spawned_interface.parent_interface
-                                            if pif.spawned_interfaces != None:
-                                                while spawned_interface in pif.spawned_interfaces: pif.spawned_interfaces.remove(spawned_interface)
-                                    except Exception as e: RNS.log(f"Error while removing spawned interface from {pif}: {e}", RNS.LOG_ERROR)
-
-                                    try: client_socket.close()
-                                    except Exception as e: RNS.log(f"Error while closing socket for {spawned_interface}: {e}", RNS.LOG_ERROR)
-                                    spawned_interface.receive(b"")
-
-                            elif fileno in BackboneInterface.listener_filenos:
-                                owner_interface, server_socket = BackboneInterface.listener_filenos[fileno]
-                                if fileno == server_socket.fileno() and (event & select.EPOLLIN):
-                                    try:
-                                        client_socket, address = server_socket.accept()
-                                        client_socket.setblocking(0)
-                                        if not owner_interface.incoming_connection(client_socket):
-                                            try: client_socket.close()
-                                            except Exception as e: RNS.log(f"Error while closing socket for failed incoming connection: {e}", RNS.LOG_WARNING)
-
-                                    except Exception as e:
-                                        RNS.log(f"Accepting socket failed for incoming connection: {e}", RNS.LOG_WARNING)
-                                        try: client_socket.close()
-                                        except Exception as e: RNS.log(f"Error while closing socket for failed incoming socket accept: {e}", RNS.LOG_WARNING)
-                                
-                                elif fileno == server_socket.fileno() and (event & select.EPOLLHUP):
-                                    try: BackboneInterface.deregister_fileno(fileno)
-                                    except Exception as e: RNS.log(f"Error while deregistering listener file descriptor {fileno}: {e}", RNS.LOG_ERROR)
-
-                                    try: server_socket.close()
-                                    except Exception as e: RNS.log(f"Error while closing listener socket for {server_socket}: {e}", RNS.LOG_WARNING)
-
-                except Exception as e:
-                    RNS.log(f"BackboneInterface error: {e}", RNS.LOG_ERROR)
-                    RNS.trace_exception(e)
+        worker = getattr(interface, "backbone_worker", None)
+        if worker != None: worker.tx_ready(interface)
 
-                finally:
-                    BackboneInterface.deregister_listeners()
-    
     def incoming_connection(self, socket):
         try:
             remote_ip = socket.getpeername()[0]
@@ -517,8 +459,8 @@ class BackboneInterface(Interface):
         self.detached = True
         self.online = False
         detached = []
-        for fileno in BackboneInterface.listener_filenos:
-            owner_interface, listener_socket = BackboneInterface.listener_filenos[fileno]
+        # Listeners are removed by the I/O worker as they close
+        for owner_interface, listener_socket in list(BackboneInterface.listener_filenos.values()):
             if owner_interface == self:
                 if hasattr(listener_socket, "shutdown"):
                     if callable(listener_socket.shutdown):
@@ -569,6 +511,10 @@ class BackboneClientInterface(Interface):
     DEFAULT_IFAC_SIZE = 16
     AUTOCONFIGURE_MTU = True
 
+    # Writes are already buffered and
+    # performed by the epoll loop
+    EGRESS_QUEUE = False
+
     RECONNECT_WAIT = 5
     RECONNECT_MAX_TRIES = None
 
@@ -609,8 +555,8 @@ class BackboneClientInterface(Interface):
         self.i2p_tunneled     = i2p_tunneled
         self.mode             = RNS.Interfaces.Interface.Interface.MODE_FULL
         self.bitrate          = BackboneClientInterface.BITRATE_GUESS
-        self.frame_buffer     = b""
-        self.transmit_buffer  = b""
+        self.deframer         = HDLCDecoder()
+        self.transmit_buffer  = TransmitBuffer()
         
         if max_reconnect_tries == None:
             self.max_reconnect_tries = BackboneClientInterface.RECONNECT_MAX_TRIES
@@ -701,6 +647,7 @@ class BackboneClientInterface(Interface):
             self.socket.connect(target_address)
             self.socket.settimeout(None)
 
+            self.deframer.reset()
             BackboneInterface.add_client_socket(self.socket, self)
             self.online  = True
 
@@ -764,8 +711,8 @@ class BackboneClientInterface(Interface):
     def process_outgoing(self, data):
         if self.online and not self.detached:
             try:
-                self.transmit_buffer += bytes([HDLC.FLAG])+HDLC.escape(data)+bytes([HDLC.FLAG])
-                BackboneInterface.tx_ready(self)
+                if self.transmit_buffer.append(HDLC.FLAG_BYTE, HDLC.escape(data), HDLC.FLAG_BYTE): BackboneInterface.tx_ready(self)
+                else: RNS.log(f"Transmit buffer for {self} is full, dropping frame", RNS.LOG_EXTREME) if RNS.sl(RNS.LOG_EXTREME) else None
 
             except Exception as e:
                 RNS.log("Exception occurred while transmitting via "+str(self)+", tearing down interface", RNS.LOG_ERROR)
@@ -783,29 +730,9 @@ class BackboneClientInterface(Interface):
     def receive(self, data_in):
         try:
             if len(data_in) > 0:
-                self.frame_buffer += data_in
-                flags_remaining = True
-                while flags_remaining:
-                    frame_start = self.frame_buffer.find(HDLC.FLAG)
-                    if frame_start != -1:
-                        frame_end = self.frame_buffer.find(HDLC.FLAG, frame_start+1)
-                        if frame_end != -1:
-                            frame = self.frame_buffer[frame_start+1:frame_end]
-                            frame = frame.replace(bytes([HDLC.ESC, HDLC.FLAG ^ HDLC.ESC_MASK]), bytes([HDLC.FLAG]))
-                            frame = frame.replace(bytes([HDLC.ESC, HDLC.ESC  ^ HDLC.ESC_MASK]), bytes([HDLC.ESC]))
-                            frame_len = len(frame)
-                            if frame_len != 0:
-                                if self.check_frame_len(frame_len): self.process_incoming(frame)
-                                else:                               self.invalid_frame(len(frame))
-
-                            self.frame_buffer = self.frame_buffer[frame_end:]
-
-                        else:
-                            if len(self.frame_buffer) > self.HW_MTU*2: self.frame_buffer = b""
-                            flags_remaining = False
-                    else:
-                        self.frame_buffer = b""
-                        flags_remaining = False
+                for frame in self.deframer.feed(data_in, self.HW_MTU*2):
+                    if self.check_frame_len(len(frame)): self.process_incoming(frame)
+                    else:                                self.invalid_frame(len(frame))
 
             else:
                 self.online = False
@@ -870,4 +797,186 @@ class BackboneClientInterface(Interface):
     def __str__(self):
         if ":" in self.target_ip: ip_str = f"[{self.target_ip}]"
         else: ip_str = f"{self.target_ip}"
-        return "BackboneInterface["+str(self.name)+"/"+ip_str+":"+str(self.target_port)+"]"
\ No newline at end of file
+        return "BackboneInterface["+str(self.name)+"/"+ip_str+":"+str(self.target_port)+"]"
+
+class BackboneWorker():
+    """
+    I/O worker for backbone and local client connections. Each worker
+    runs its own epoll loop on a separate thread, and each connection
+    is handled by exactly one worker, so frames from any connection are
+    always processed in the order they were received.
+    """
+    def __init__(self, index):
+        self.index       = index
+        self.epoll       = select.epoll()
+        self.clients     = {}
+        self.active      = False
+        self.lock        = threading.Lock()
+        self.started     = time.time()
+        self.rxb         = 0
+        self.txb         = 0
+        self.events      = 0
+        self.busy        = 0
+
+    def start(self):
+        if not self.active: threading.Thread(target=self.job, daemon=True).start()
+
+    def add_client(self, client_socket, interface):
+        self.clients[client_socket.fileno()] = interface
+        self.register_in(client_socket.fileno())
+        self.start()
+
+    def register_in(self, fileno):
+        if fileno < 0:
+            RNS.log(f"Attempt to register invalid file descriptor {fileno}", RNS.LOG_WARNING)
+            return
+
+        try: self.epoll.register(fileno, select.EPOLLIN)
+        except Exception as e:
+            RNS.log(f"An error occurred while registering EPOLL_IN for file descriptor {fileno}: {e}", RNS.LOG_WARNING)
+
+    def deregister_fileno(self, fileno):
+        if fileno < 0:
+            RNS.log(f"Attempt to deregister invalid file descriptor {fileno}", RNS.LOG_DEBUG)
+            return
+
+        try: self.epoll.unregister(fileno)
+        except Exception as e:
+            if   str(e).endswith("No such file or directory"): pass
+            elif str(e).endswith("Bad file descriptor"):       pass
+            else: RNS.log(f"An error occurred while deregistering file descriptor {fileno}: {e}", RNS.LOG_DEBUG)
+
+    def tx_ready(self, interface):
+        if interface.socket:
+            fileno = interface.socket.fileno()
+            if fileno in self.clients:
+                try: self.epoll.modify(fileno, select.EPOLLIN | select.EPOLLOUT)
+                except Exception as e:
+                    if   str(e).endswith("No such file or directory"): pass
+                    elif str(e).endswith("Bad file descriptor"):       pass
+                    else: RNS.log(f"Error occurred on {interface} while modifying socket EPOLL state: {e}", RNS.LOG_WARNING)
+                    raise e
+
+    def remove_client(self, fileno, spawned_interface, client_socket):
+        # A detached interface may already have closed its socket, and
+        # the file descriptor can have been reused by a new connection
+        if self.clients.get(fileno) == spawned_interface:
+            self.deregister_fileno(fileno)
+            try: self.clients.pop(fileno)
+            except Exception as e: RNS.log(f"Error while removing spawned interface file descriptor from BackboneInterface I/O handler: {e}", RNS.LOG_ERROR)
+
+        try:
+            if spawned_interface.parent_interface:
+                pif = spawned_interface.parent_interface
+                if pif.spawned_interfaces != None:
+                    while spawned_interface in pif.spawned_interfaces: pif.spawned_interfaces.remove(spawned_interface)
+        except Exception as e: RNS.log(f"Error while removing spawned interface from {pif}: {e}", RNS.LOG_ERROR)
+
+        try: client_socket.close()
+        except Exception as e: RNS.log(f"Error while closing socket for {spawned_interface}: {e}", RNS.LOG_WARNING)
+        spawned_interface.receive(b"")
+
+    def stats(self):
+        uptime = time.time()-self.started
+        return {"index": self.index, "clients": len(self.clients), "rxb": self.rxb, "txb": self.txb,
+                "events": self.events, "busy": self.busy, "load": self.busy/uptime if uptime > 0 else 0}
+
+    def job(self):
+        with self.lock:
+            if self.active: return
+            else:
+                self.active  = True
+                self.started = time.time()
+
+                # Data is received into a single preallocated
+                # buffer, and handed to interfaces as a view
+                receive_buffer = bytearray(BackboneInterface.HW_MTU)
+                receive_view   = memoryview(receive_buffer)
+
+                try:
+                    while True:
+                        events = self.epoll.poll(1)
+                        started = time.time()
+                        for fileno, event in events:
+                            if fileno in self.clients:
+                                spawned_interface = self.clients[fileno]
+                                client_socket = spawned_interface.socket
+                                if not client_socket or fileno != client_socket.fileno(): continue
+
+                                # Pending writes are flushed before more data
+                                # is read, since processing inbound frames will
+                                # often generate replies, such as proofs, and
+                                # these should not queue up behind further reads
+                                if event & select.EPOLLOUT:
+                                    try: written = spawned_interface.transmit_buffer.send(client_socket)
+                                    except Exception as e:
+                                        if not spawned_interface.detached:
+                                            if RNS.sl(RNS.LOG_DEBUG):
+                                                if   str(e).endswith("Connection timed out"):     pass
+                                                elif str(e).endswith("Connection reset by peer"): pass
+                                                elif str(e).endswith("No route to host"):         pass
+                                                elif str(e).endswith("Broken pipe"):              pass
+                                                else: RNS.log(f"Error while writing to {spawned_interface}: {e}", RNS.LOG_DEBUG)
+
+                                        self.remove_client(fileno, spawned_interface, client_socket)
+                                        continue
+
+                                    try:
+                                        with spawned_interface.transmit_buffer.lock:
+                                            if spawned_interface.transmit_buffer.pending == 0: self.epoll.modify(fileno, select.EPOLLIN)
+                                    except Exception as e:
+                                        RNS.log(f"Error while setting EPOLLIN on {spawned_interface}: {e}", RNS.LOG_ERROR)
+
+                                    self.txb += written
+                                    spawned_interface.txb += written
+                                    if spawned_interface.parent_interface: spawned_interface.parent_interface.txb += written
+                                
+                                if event & select.EPOLLIN:
+                                    try: received = client_socket.recv_into(receive_view, min(spawned_interface.HW_MTU, len(receive_buffer)))
+                                    except Exception as e:
+                                        RNS.log(f"Error while reading from {spawned_interface}: {e}", RNS.LOG_PATHING) if RNS.sl(RNS.LOG_PATHING) else None
+                                        received = 0
+
+                                    if received:
+                                        self.rxb += received
+                                        spawned_interface.receive(receive_view[:received])
+                                    else:
+                                        self.remove_client(fileno, spawned_interface, client_socket)
+                                        continue
+                                
+                                if not event & (select.EPOLLIN | select.EPOLLOUT) and event & (select.EPOLLHUP | select.EPOLLERR):
+                                    self.remove_client(fileno, spawned_interface, client_socket)
+
+                            elif fileno in BackboneInterface.listener_filenos:
+                                owner_interface, server_socket = BackboneInterface.listener_filenos[fileno]
+                                if fileno == server_socket.fileno() and (event & select.EPOLLIN):
+                                    try:
+                                        client_socket, address = server_socket.accept()
+                                        client_socket.setblocking(0)
+                                        if not owner_interface.incoming_connection(client_socket):
+                                            try: client_socket.close()
+                                            except Exception as e: RNS.log(f"Error while closing socket for failed incoming connection: {e}", RNS.LOG_WARNING)
+
+                                    except Exception as e:
+                                        RNS.log(f"Accepting socket failed for incoming connection: {e}", RNS.LOG_WARNING)
+                                        try: client_socket.close()
+                                        except Exception as e: RNS.log(f"Error while closing socket for failed incoming socket accept: {e}", RNS.LOG_WARNING)
+                                
+                                elif fileno == server_socket.fileno() and (event & select.EPOLLHUP):
+                                    try: self.deregister_fileno(fileno)
+                                    except Exception as e: RNS.log(f"Error while deregistering listener file descriptor {fileno}: {e}", RNS.LOG_ERROR)
+
+                                    try: server_socket.close()
+                                    except Exception as e: RNS.log(f"Error while closing listener socket for {server_socket}: {e}", RNS.LOG_WARNING)
+                                    BackboneInterface.listener_filenos.pop(fileno, None)
+
+                        if len(events) > 0:
+                            self.events += len(events)
+                            self.busy   += time.time()-started
+
+                except Exception as e:
+                    RNS.log(f"BackboneInterface error in I/O worker {self.index}: {e}", RNS.LOG_ERROR)
+                    RNS.trace_exception(e)
+
+                finally:
+                    if self.index == 0: BackboneInterface.deregister_listeners()
@@ -29,6 +29,7 @@
 # SOFTWARE.
 
 from RNS.Interfaces.Interface import Interface
+from RNS.Interfaces.util.framing import HDLC, KISS, HDLCDecoder, KISSDecoder
 import socketserver
 import threading
 import platform
@@ -39,31 +40,6 @@ import os
 import RNS
 import asyncio
 
-class HDLC():
-    FLAG              = 0x7E
-    ESC               = 0x7D
-    ESC_MASK          = 0x20
-
-    @staticmethod
-    def escape(data):
-        data = data.replace(bytes([HDLC.ESC]), bytes([HDLC.ESC, HDLC.ESC^HDLC.ESC_MASK]))
-        data = data.replace(bytes([HDLC.FLAG]), bytes([HDLC.ESC, HDLC.FLAG^HDLC.ESC_MASK]))
-        return data
-
-class KISS():
-    FEND              = 0xC0
-    FESC              = 0xDB
-    TFEND             = 0xDC
-    TFESC             = 0xDD
-    CMD_DATA          = 0x00
-    CMD_UNKNOWN       = 0xFE
-
-    @staticmethod
-    def escape(data):
-        data = data.replace(bytes([0xdb]), bytes([0xdb, 0xdd]))
-        data = data.replace(bytes([0xc0]), bytes([0xdb, 0xdc]))
-        return data
-
 # TODO: Neater shutdown of the event loop and
 # better error handling is needed. Sometimes
 # errors occur in I2P that leave tunnel setup
@@ -549,8 +525,8 @@ class I2PInterfacePeer(Interface):
             try:
                 self.writing = True
 
-                if self.kiss_framing: data = bytes([KISS.FEND])+bytes([KISS.CMD_DATA])+KISS.escape(data)+bytes([KISS.FEND])
-                else:                 data = bytes([HDLC.FLAG])+HDLC.escape(data)+bytes([HDLC.FLAG])
+                if self.kiss_framing: data = KISS.frame(data)
+                else:                 data = HDLC.frame(data)
 
                 self.socket.sendall(data)
                 self.writing = False
@@ -608,66 +584,22 @@ class I2PInterfacePeer(Interface):
 
             wd_thread = threading.Thread(target=self.read_watchdog, daemon=True).start()
 
-            in_frame = False
-            escape = False
-            data_buffer = b""
-            command = KISS.CMD_UNKNOWN
+            if self.kiss_framing: decoder = KISSDecoder()
+            else:                 decoder = HDLCDecoder()
 
             while True:
                 data_in = self.socket.recv(4096)
                 if len(data_in) > 0:
-                    pointer = 0
                     self.last_read = time.time()
-                    while pointer < len(data_in):
-                        byte = data_in[pointer]
-                        pointer += 1
-
+                    for frame in decoder.feed(data_in, self.HW_MTU*2):
                         if self.kiss_framing:
-                            # Read loop for KISS framing
-                            if (in_frame and byte == KISS.FEND and command == KISS.CMD_DATA):
-                                in_frame = False
-                                self.process_incoming(data_buffer)
-                            elif (byte == KISS.FEND):
-                                in_frame = True
-                                command = KISS.CMD_UNKNOWN
-                                data_buffer = b""
-                            elif (in_frame and len(data_buffer) < self.HW_MTU):
-                                if (len(data_buffer) == 0 and command == KISS.CMD_UNKNOWN):
-                                    # We only support one HDLC port for now, so
-                                    # strip off the port nibble
-                                    byte = byte & 0x0F
-                                    command = byte
-                                elif (command == KISS.CMD_DATA):
-                                    if (byte == KISS.FESC):
-                                        escape = True
-                                    else:
-                                        if (escape):
-                                            if (byte == KISS.TFEND):
-                                                byte = KISS.FEND
-                                            if (byte == KISS.TFESC):
-                                                byte = KISS.FESC
-                                            escape = False
-                                        data_buffer = data_buffer+bytes([byte])
-
-                        else:
-                            # Read loop for HDLC framing
-                            if (in_frame and byte == HDLC.FLAG):
-                                in_frame = False
-                                self.process_incoming(data_buffer)
-                            elif (byte == HDLC.FLAG):
-                                in_frame = True
-                                data_buffer = b""
-                            elif (in_frame and len(data_buffer) < self.HW_MTU):
-                                if (byte == HDLC.ESC):
-                                    escape = True
-                                else:
-                                    if (escape):
-                                        if (byte == HDLC.FLAG ^ HDLC.ESC_MASK):
-                                            byte = HDLC.FLAG
-                                        if (byte == HDLC.ESC  ^ HDLC.ESC_MASK):
-                                            byte = HDLC.ESC
-                                        escape = False
-                                    data_buffer = data_buffer+bytes([byte])
+                            # We only support one HDLC port for now, so
+                            # strip off the port nibble of the command
+                            if frame[0] & 0x0F != KISS.CMD_DATA: continue
+                            frame = frame[1:]
+
+                        if len(frame) <= self.HW_MTU: self.process_incoming(frame)
+
                 else:
                     self.online = False
                     self.wd_reset = True
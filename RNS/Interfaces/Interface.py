@@ -30,8 +30,10 @@
 
 import RNS
 import time
+import heapq
+import itertools
 import threading
-from collections import deque
+from collections import deque, OrderedDict
 from RNS.vendor.configobj import ConfigObj
 
 class Interface:
@@ -94,6 +96,18 @@ class Interface:
     AUTOCONFIGURE_MTU = False
     FIXED_MTU         = False
 
+    # Egress queue priority classes, in
+    # the order they are transmitted
+    PRIORITY_CONTROL  = 0x00 # Link requests, proofs and keepalives
+    PRIORITY_DATA     = 0x01 # Other data traffic
+    PRIORITY_ANNOUNCE = 0x02 # Announces and path requests
+    EGRESS_PRIORITIES = [PRIORITY_CONTROL, PRIORITY_DATA, PRIORITY_ANNOUNCE]
+
+    # Whether this interface type should use an egress
+    # queue, if egress queues are enabled in the config
+    EGRESS_QUEUE      = True
+    EGRESS_QUEUE_SIZE = 256
+
     def __init__(self):
         self.rxb      = 0
         self.txb      = 0
@@ -134,8 +148,12 @@ class Interface:
         self.ic_held_release_interval = RNS.Reticulum.get_instance()._default_ic_held_release_interval()
         self.ec_pr_freq               = RNS.Reticulum.get_instance()._default_ec_pr_freq()
         self.egress_control           = RNS.Reticulum.get_instance()._default_egress_control()
+        self.egress_queue_size        = RNS.Reticulum.get_instance()._default_egress_queue_size()
         self.held_announces           = {}
 
+        if self.EGRESS_QUEUE and self.egress_queue_size > 0: self.egress_queue = EgressQueue(self, self.egress_queue_size)
+        else:                                                self.egress_queue = None
+
         self.ia_freq_deque = deque(maxlen=Interface.IA_FREQ_SAMPLES)
         self.oa_freq_deque = deque(maxlen=Interface.OA_FREQ_SAMPLES)
         self.ip_freq_deque = deque(maxlen=Interface.IA_FREQ_SAMPLES)
@@ -325,41 +343,34 @@ class Interface:
         if hasattr(self, "announce_queue"):
             try:
                 now = time.time()
-                stale = []
-                for a in self.announce_queue:
-                    if now > a["time"]+RNS.Reticulum.QUEUED_ANNOUNCE_LIFE:
-                        stale.append(a)
-
-                for s in stale:
-                    if s in self.announce_queue:
-                        self.announce_queue.remove(s)
-
-                if len(self.announce_queue) > 0:
-                    min_hops = min(entry["hops"] for entry in self.announce_queue)
-                    entries = list(filter(lambda e: e["hops"] == min_hops, self.announce_queue))
-                    entries.sort(key=lambda e: e["time"])
-                    selected = entries[0]
-
-                    now       = time.time()
-                    tx_time   = (len(selected["raw"])*8) / self.bitrate
+                self.announce_queue.expire(now-RNS.Reticulum.QUEUED_ANNOUNCE_LIFE)
+                selected = self.announce_queue.pop()
+                if selected != None:
+                    tx_time   = (len(selected.raw)*8) / self.bitrate
                     wait_time = (tx_time / self.announce_cap)
                     self.announce_allowed_at = now + wait_time
 
-                    self.process_outgoing(selected["raw"])
+                    if getattr(self, "egress_queue", None) != None: self.enqueue_outgoing(selected.raw, Interface.PRIORITY_ANNOUNCE)
+                    else: self.process_outgoing(selected.raw)
                     self.sent_announce()
 
-                    if selected in self.announce_queue:
-                        self.announce_queue.remove(selected)
-
-                    if len(self.announce_queue) > 0:
-                        timer = threading.Timer(wait_time, self.process_announce_queue)
-                        timer.start()
+                    if len(self.announce_queue) > 0: AnnounceScheduler.schedule(self, self.announce_allowed_at)
 
             except Exception as e:
-                self.announce_queue = []
+                self.announce_queue.clear()
                 RNS.log("Error while processing announce queue on "+str(self)+". The contained exception was: "+str(e), RNS.LOG_ERROR)
                 RNS.log("The announce queue for this interface has been cleared.", RNS.LOG_ERROR)
 
+    def enqueue_outgoing(self, data, priority=PRIORITY_DATA):
+        if self.egress_queue == None: self.process_outgoing(data); return True
+        else: return self.egress_queue.put(data, priority)
+
+    # This is a generic function for transmitting several queued
+    # frames at once. Interfaces that can write multiple frames in
+    # a single operation should overwrite it, so they can do so.
+    def process_outgoing_batch(self, frames):
+        for data in frames: self.process_outgoing(data)
+
     def final_init(self):
         pass
 
@@ -373,4 +384,226 @@ class Interface:
             try: return ConfigObj(config_in)
             except Exception as e:
                 RNS.log(f"Could not parse supplied configuration data. The contained exception was: {e}", RNS.LOG_ERROR)
-                raise SystemError("Invalid configuration data supplied")
\ No newline at end of file
+                raise SystemError("Invalid configuration data supplied")
+
+class EgressQueue():
+    """
+    Bounded queue of outgoing frames for an interface, with one queue per
+    priority class. Frames are written by a single writer thread for the
+    lifetime of the queue, which takes them in priority order and hands
+    them to the interface in batches, so they can be written in a single
+    operation where the framing allows it. The writer is started when the
+    first frame is queued, and exits when the interface is detached or the
+    queue is stopped.
+
+    When the queue is full, the most recently queued frame of a lower
+    priority class is dropped to make room. If there is none, the new
+    frame is dropped instead.
+    """
+    MAX_BATCH_FRAMES = 64
+    MAX_BATCH_BYTES  = 64*1024
+    DETACH_CHECK     = 5
+
+    def __init__(self, interface, max_queued):
+        self.interface  = interface
+        self.max_queued = max(1, max_queued)
+        self.queues     = [deque() for priority in Interface.EGRESS_PRIORITIES]
+        self.lock       = threading.Lock()
+        self.pending    = threading.Condition(self.lock)
+        self.writer     = None
+        self.stopped    = False
+        self.queued     = 0
+        self.max_depth  = 0
+        self.sent       = 0
+        self.batches    = 0
+        self.dropped    = [0 for priority in Interface.EGRESS_PRIORITIES]
+
+    def put(self, data, priority):
+        with self.lock:
+            if self.stopped: return False
+            if self.queued >= self.max_queued:
+                evicted = False
+                for lower_priority in range(len(self.queues)-1, priority, -1):
+                    if len(self.queues[lower_priority]) > 0:
+                        self.queues[lower_priority].pop()
+                        self.dropped[lower_priority] += 1
+                        self.queued -= 1
+                        evicted = True
+                        break
+
+                if not evicted:
+                    self.dropped[priority] += 1
+                    RNS.log(f"Egress queue for {self.interface} full, dropping frame", RNS.LOG_EXTREME) if RNS.sl(RNS.LOG_EXTREME) else None
+                    return False
+
+            self.queues[priority].append(data)
+            self.queued += 1
+            if self.queued > self.max_depth: self.max_depth = self.queued
+            if self.writer == None:
+                self.writer = threading.Thread(target=self.job, daemon=True)
+                self.writer.start()
+            else: self.pending.notify()
+
+            return True
+
+    def stop(self):
+        with self.lock:
+            self.stopped = True
+            for queue in self.queues: queue.clear()
+            self.queued = 0
+            self.pending.notify()
+
+    def job(self):
+        while True:
+            with self.lock:
+                while self.queued == 0 and not self.stopped and not self.interface.detached: self.pending.wait(EgressQueue.DETACH_CHECK)
+                if self.stopped or self.interface.detached:
+                    self.stopped = True
+                    for queue in self.queues: queue.clear()
+                    self.queued = 0
+                    return
+
+                frames = []; batch_bytes = 0
+                for queue in self.queues:
+                    while len(queue) > 0 and len(frames) < EgressQueue.MAX_BATCH_FRAMES and batch_bytes < EgressQueue.MAX_BATCH_BYTES:
+                        frame = queue.popleft()
+                        frames.append(frame)
+                        batch_bytes += len(frame)
+
+                self.queued -= len(frames)
+
+            try: self.interface.process_outgoing_batch(frames)
+            except Exception as e: RNS.log(f"Error while transmitting queued frames on {self.interface}. The contained exception was: {e}", RNS.LOG_ERROR)
+            self.sent += len(frames)
+            self.batches += 1
+
+    def stats(self):
+        with self.lock:
+            return {"queued": self.queued, "classes": [len(queue) for queue in self.queues], "max_queued": self.max_depth,
+                    "sent": self.sent, "batches": self.batches, "dropped": sum(self.dropped), "dropped_classes": list(self.dropped)}
+
+class QueuedAnnounce():
+    __slots__ = ("destination", "time", "hops", "emitted", "raw")
+
+    def __init__(self, destination, time, hops, emitted, raw):
+        self.destination = destination
+        self.time        = time
+        self.hops        = hops
+        self.emitted     = emitted
+        self.raw         = raw
+
+class AnnounceQueue():
+    """
+    Queue of announces held back by the announce cap of an interface.
+    Announces are kept in a heap ordered by hop count and queue time,
+    so the announce with the fewest hops that has waited the longest
+    is always sent first. Entries are also indexed by destination hash,
+    in the order they were queued, so duplicates can be found and stale
+    entries expired without scanning the queue. Replaced entries are
+    left in the heap and skipped when they reach the top.
+    """
+    def __init__(self):
+        self.lock    = threading.Lock()
+        self.entries = OrderedDict()
+        self.heap    = []
+        self.counter = itertools.count()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, destination_hash):
+        return self.entries.get(destination_hash)
+
+    def put(self, entry):
+        # Adds the entry to the queue, replacing any entry
+        # already queued for the same destination.
+        with self.lock:
+            self.entries.pop(entry.destination, None)
+            self.entries[entry.destination] = entry
+            heapq.heappush(self.heap, (entry.hops, entry.time, next(self.counter), entry))
+            if len(self.heap) > 2*len(self.entries)+64: self.__compact()
+
+    def pop(self):
+        with self.lock:
+            while len(self.heap) > 0:
+                entry = heapq.heappop(self.heap)[3]
+                if self.entries.get(entry.destination) is entry:
+                    del self.entries[entry.destination]
+                    return entry
+
+            return None
+
+    def expire(self, queued_before):
+        with self.lock:
+            expired = 0
+            while len(self.entries) > 0:
+                destination, entry = next(iter(self.entries.items()))
+                if entry.time >= queued_before: break
+                del self.entries[destination]
+                expired += 1
+
+            if expired > 0 and len(self.heap) > 2*len(self.entries)+64: self.__compact()
+            return expired
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.heap = []
+
+    def __compact(self):
+        self.heap = [item for item in self.heap if self.entries.get(item[3].destination) is item[3]]
+        heapq.heapify(self.heap)
+
+class AnnounceScheduler():
+    """
+    Services the announce queues of all interfaces from a single thread.
+    Each interface with queued announces has at most one pending wakeup,
+    at the time its announce cap allows it to send the next announce.
+    The thread exits when there has been nothing to schedule for a
+    while, and is started again when a wakeup is scheduled.
+    """
+    IDLE_TIMEOUT = 5
+
+    lock      = threading.Condition()
+    wakeups   = []
+    scheduled = {}
+    counter   = itertools.count()
+    running   = False
+
+    @staticmethod
+    def schedule(interface, at):
+        with AnnounceScheduler.lock:
+            key = id(interface)
+            if key in AnnounceScheduler.scheduled and AnnounceScheduler.scheduled[key][0] <= at: return
+            wakeup = (at, next(AnnounceScheduler.counter), interface)
+            AnnounceScheduler.scheduled[key] = wakeup
+            heapq.heappush(AnnounceScheduler.wakeups, wakeup)
+
+            if AnnounceScheduler.running: AnnounceScheduler.lock.notify()
+            else:
+                AnnounceScheduler.running = True
+                threading.Thread(target=AnnounceScheduler.job, daemon=True).start()
+
+    @staticmethod
+    def job():
+        while True:
+            with AnnounceScheduler.lock:
+                interface = None
+                while interface == None:
+                    if len(AnnounceScheduler.wakeups) == 0:
+                        AnnounceScheduler.lock.wait(AnnounceScheduler.IDLE_TIMEOUT)
+                        if len(AnnounceScheduler.wakeups) == 0:
+                            AnnounceScheduler.running = False
+                            return
+
+                    wakeup = AnnounceScheduler.wakeups[0]
+                    wait_time = wakeup[0]-time.time()
+                    if wait_time > 0: AnnounceScheduler.lock.wait(wait_time)
+                    else:
+                        heapq.heappop(AnnounceScheduler.wakeups)
+                        key = id(wakeup[2])
+                        if AnnounceScheduler.scheduled.get(key) is wakeup:
+                            del AnnounceScheduler.scheduled[key]
+                            interface = wakeup[2]
+
+            if not interface.detached: interface.process_announce_queue()
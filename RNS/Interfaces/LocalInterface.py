@@ -29,7 +29,9 @@
 # SOFTWARE.
 
 from RNS.Interfaces.Interface import Interface
-from RNS.Interfaces.BackboneInterface import BackboneInterface
+from RNS.Interfaces.BackboneInterface import BackboneInterface, TransmitBuffer
+from RNS.Interfaces.util.framing import HDLC, HDLCDecoder
+from RNS.Interfaces.util.shmring import SharedMemoryChannel
 import socketserver
 import threading
 import socket
@@ -39,17 +41,6 @@ import os
 import RNS
 from threading import Lock
 
-class HDLC():
-    FLAG              = 0x7E
-    ESC               = 0x7D
-    ESC_MASK          = 0x20
-
-    @staticmethod
-    def escape(data):
-        data = data.replace(bytes([HDLC.ESC]), bytes([HDLC.ESC, HDLC.ESC^HDLC.ESC_MASK]))
-        data = data.replace(bytes([HDLC.FLAG]), bytes([HDLC.ESC, HDLC.FLAG^HDLC.ESC_MASK]))
-        return data
-
 class ThreadingTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
     def server_bind(self):
         if RNS.vendor.platformutils.is_windows():
@@ -64,6 +55,16 @@ class LocalClientInterface(Interface):
     AUTOCONFIGURE_MTU = True
     CLIENT_SLEEP_PAUSE_TIMEOUT = 12
 
+    # Control frames are never longer than the minimum
+    # packet size, so instances that do not know them
+    # will silently ignore them.
+    CONTROL            = 0xFF
+    SHM_ATTACH         = 0x01
+    SHM_ACCEPT         = 0x02
+    SHM_REJECT         = 0x03
+    SHM_DOORBELL       = 0x04
+    SHM_ACCEPT_TIMEOUT = 5
+
     def __init__(self, owner, name, target_port = None, connected_socket=None, socket_path=None):
         super().__init__()
 
@@ -83,8 +84,12 @@ class LocalClientInterface(Interface):
         self.detached         = False
         self.name             = name
         self.mode             = RNS.Interfaces.Interface.Interface.MODE_FULL
-        self.frame_buffer     = b""
-        self.transmit_buffer  = b""
+        self.decoder          = HDLCDecoder()
+        self.transmit_buffer  = TransmitBuffer()
+        self.shm_channel      = None
+        self.shm_pending      = None
+        self.shm_lock         = Lock()
+        self.shm_tx_lock      = Lock()
 
         if RNS.vendor.platformutils.use_epoll(): self.epoll_backend = True
 
@@ -152,10 +157,99 @@ class LocalClientInterface(Interface):
         self.never_connected = False
 
         if RNS.vendor.platformutils.is_android(): self.phy_keepalive = True
-        if self.epoll_backend: BackboneInterface.add_client_socket(self.socket, self)
+        self.decoder.reset()
+        if self.epoll_backend:
+            self.socket.setblocking(0)
+            BackboneInterface.add_client_socket(self.socket, self)
+
+        self.close_shared_memory()
+        if RNS.Reticulum.local_shared_memory_enabled(): self.request_shared_memory()
 
         return True
 
+    def send_control(self, command, payload=b""):
+        frame = HDLC.frame(bytes([LocalClientInterface.CONTROL, command])+payload)
+        if self.epoll_backend:
+            self.transmit_buffer.append(frame, force=True)
+            BackboneInterface.tx_ready(self)
+
+        else: self.socket.sendall(frame)
+
+    def request_shared_memory(self):
+        if not SharedMemoryChannel.supported(): return
+        try:
+            channel = SharedMemoryChannel.create()
+            with self.shm_lock: self.shm_pending = channel
+            self.send_control(LocalClientInterface.SHM_ATTACH, channel.name.encode("ascii"))
+
+            def job():
+                time.sleep(LocalClientInterface.SHM_ACCEPT_TIMEOUT)
+                with self.shm_lock:
+                    if self.shm_pending != channel: return
+                    self.shm_pending = None
+
+                RNS.log(f"Shared instance did not accept shared memory transport on {self}, using socket", RNS.LOG_DEBUG)
+                channel.close()
+
+            threading.Thread(target=job, daemon=True).start()
+
+        except Exception as e:
+            RNS.log(f"Could not set up shared memory transport on {self}: {e}", RNS.LOG_DEBUG)
+            self.close_shared_memory()
+
+    def attach_shared_memory(self, name):
+        if RNS.Reticulum.local_shared_memory_enabled() and SharedMemoryChannel.supported():
+            channel = None
+            try:
+                channel = SharedMemoryChannel.attach(name)
+                # The peer must receive the acceptance before any doorbell
+                self.send_control(LocalClientInterface.SHM_ACCEPT)
+                with self.shm_lock: self.shm_channel = channel
+                RNS.log(f"Using shared memory transport on {self}", RNS.LOG_DEBUG)
+                return
+
+            except Exception as e:
+                RNS.log(f"Could not attach shared memory transport on {self}: {e}", RNS.LOG_DEBUG)
+                if channel != None: channel.close()
+
+        self.send_control(LocalClientInterface.SHM_REJECT)
+
+    def close_shared_memory(self):
+        with self.shm_lock:
+            channels = [self.shm_channel, self.shm_pending]
+            self.shm_channel = None
+            self.shm_pending = None
+
+        for channel in channels:
+            if channel != None:
+                try: channel.close()
+                except Exception as e: RNS.log(f"Error while closing shared memory transport on {self}: {e}", RNS.LOG_ERROR)
+
+    def handle_control(self, frame):
+        command = frame[1]
+        if command == LocalClientInterface.SHM_DOORBELL:
+            channel = self.shm_channel
+            if channel != None:
+                for data in channel.rx.drain(): self.process_incoming(data)
+
+        elif command == LocalClientInterface.SHM_ATTACH and not self.is_connected_to_shared_instance:
+            self.attach_shared_memory(bytes(frame[2:]).decode("ascii"))
+
+        elif command == LocalClientInterface.SHM_ACCEPT or command == LocalClientInterface.SHM_REJECT:
+            with self.shm_lock:
+                channel = self.shm_pending
+                self.shm_pending = None
+                if channel != None and command == LocalClientInterface.SHM_ACCEPT: self.shm_channel = channel
+
+            if channel != None:
+                if command == LocalClientInterface.SHM_ACCEPT:
+                    channel.unlink()
+                    RNS.log(f"Using shared memory transport on {self}", RNS.LOG_DEBUG)
+
+                else:
+                    RNS.log(f"Shared instance rejected shared memory transport on {self}, using socket", RNS.LOG_DEBUG)
+                    channel.close()
+
 
     def reconnect(self):
         if self.is_connected_to_shared_instance:
@@ -197,7 +291,7 @@ class LocalClientInterface(Interface):
             RNS.log(f"Sending keepalive on {self}", RNS.LOG_DEBUG) # TODO: Remove
             try:
                 if self.epoll_backend:
-                    self.transmit_buffer += bytes([HDLC.FLAG])+bytes([HDLC.FLAG])
+                    self.transmit_buffer.append(bytes([HDLC.FLAG, HDLC.FLAG]), force=True)
                     BackboneInterface.tx_ready(self)
 
                 else:
@@ -224,9 +318,28 @@ class LocalClientInterface(Interface):
 
         if self.online:
             try:
+                with self.shm_tx_lock:
+                    channel = self.shm_channel
+                    if channel != None and not self._force_bitrate:
+                        wakeup = channel.tx.put(data)
+                        if wakeup != None:
+                            self.txb += len(data)
+                            if self.parent_interface != None: self.parent_interface.txb += len(data)
+                            if wakeup: self.send_control(LocalClientInterface.SHM_DOORBELL)
+                            return
+
+                        elif not channel.tx.closed:
+                            # If the ring is full, this and all later frames
+                            # are sent over the socket instead. The peer drains
+                            # what is left in the ring on the doorbell, before
+                            # it reads them, so frames stay in order.
+                            RNS.log(f"Shared memory ring on {self} is full, sending over socket", RNS.LOG_DEBUG)
+                            channel.tx.close()
+                            self.send_control(LocalClientInterface.SHM_DOORBELL)
+
                 if self.epoll_backend:
-                    self.transmit_buffer += bytes([HDLC.FLAG])+HDLC.escape(data)+bytes([HDLC.FLAG])
-                    BackboneInterface.tx_ready(self)
+                    if self.transmit_buffer.append(HDLC.FLAG_BYTE, HDLC.escape(data), HDLC.FLAG_BYTE): BackboneInterface.tx_ready(self)
+                    else: RNS.log(f"Transmit buffer for {self} is full, dropping frame", RNS.LOG_EXTREME) if RNS.sl(RNS.LOG_EXTREME) else None
 
                 else:
                     self.writing = True
@@ -240,7 +353,7 @@ class LocalClientInterface(Interface):
                             s = len(data) / self.bitrate * 8
                             time.sleep(s)
 
-                    data = bytes([HDLC.FLAG])+HDLC.escape(data)+bytes([HDLC.FLAG])
+                    data = HDLC.frame(data)
                     self.socket.sendall(data)
                     self.writing = False
                     self.txb += len(data)
@@ -254,22 +367,9 @@ class LocalClientInterface(Interface):
                 self.teardown()
 
     def handle_hdlc(self, data_in):
-        self.frame_buffer += data_in
-        flags_remaining = True
-        while flags_remaining:
-            frame_start = self.frame_buffer.find(HDLC.FLAG)
-            if frame_start != -1:
-                frame_end = self.frame_buffer.find(HDLC.FLAG, frame_start+1)
-                if frame_end != -1:
-                    frame = self.frame_buffer[frame_start+1:frame_end]
-                    frame = frame.replace(bytes([HDLC.ESC, HDLC.FLAG ^ HDLC.ESC_MASK]), bytes([HDLC.FLAG]))
-                    frame = frame.replace(bytes([HDLC.ESC, HDLC.ESC  ^ HDLC.ESC_MASK]), bytes([HDLC.ESC]))
-                    if len(frame) > RNS.Reticulum.HEADER_MINSIZE: self.process_incoming(frame)
-                    self.frame_buffer = self.frame_buffer[frame_end:]
-                
-                else: flags_remaining = False
-            
-            else: flags_remaining = False
+        for frame in self.decoder.feed(data_in, self.HW_MTU*2):
+            if len(frame) > RNS.Reticulum.HEADER_MINSIZE: self.process_incoming(frame)
+            elif len(frame) > 1 and frame[0] == LocalClientInterface.CONTROL: self.handle_control(frame)
 
     def receive(self, data_in):
         try:
@@ -296,7 +396,7 @@ class LocalClientInterface(Interface):
 
     def read_loop(self):
         try:
-            self.frame_buffer = b""
+            self.decoder.reset()
             data_in = b""
             while True:
                 data_in = self.socket.recv(4096)
@@ -342,12 +442,15 @@ class LocalClientInterface(Interface):
 
                     self.socket = None
 
+        self.close_shared_memory()
+
     def teardown(self, nowarning=False):
         self.online = False
         self.OUT = False
         self.IN = False
 
         RNS.Transport.remove_interface(self)
+        self.close_shared_memory()
 
         if self in RNS.Transport.local_client_interfaces:
             RNS.Transport.local_client_interfaces.remove(self)
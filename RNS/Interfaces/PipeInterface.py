@@ -29,6 +29,7 @@
 # SOFTWARE.
 
 from RNS.Interfaces.Interface import Interface
+from RNS.Interfaces.util.framing import HDLC, HDLCDecoder
 from time import sleep
 import sys
 import threading
@@ -38,19 +39,6 @@ import RNS
 import subprocess
 import shlex
 
-class HDLC():
-    # The Pipe Interface packetizes data using
-    # simplified HDLC framing, similar to PPP
-    FLAG              = 0x7E
-    ESC               = 0x7D
-    ESC_MASK          = 0x20
-
-    @staticmethod
-    def escape(data):
-        data = data.replace(bytes([HDLC.ESC]), bytes([HDLC.ESC, HDLC.ESC^HDLC.ESC_MASK]))
-        data = data.replace(bytes([HDLC.FLAG]), bytes([HDLC.ESC, HDLC.FLAG^HDLC.ESC_MASK]))
-        return data
-
 class PipeInterface(Interface):
     MAX_CHUNK = 32768
     BITRATE_GUESS = 1*1000*1000
@@ -125,7 +113,7 @@ class PipeInterface(Interface):
 
     def process_outgoing(self,data):
         if self.online:
-            data = bytes([HDLC.FLAG])+HDLC.escape(data)+bytes([HDLC.FLAG])
+            data = HDLC.frame(data)
             written = self.process.stdin.write(data)
             self.process.stdin.flush()
             self.txb += len(data)            
@@ -135,37 +123,21 @@ class PipeInterface(Interface):
 
     def readLoop(self):
         try:
-            in_frame = False
-            escape = False
-            data_buffer = b""
+            # The Pipe Interface packetizes data using
+            # simplified HDLC framing, similar to PPP
+            decoder = HDLCDecoder()
             last_read_ms = int(time.time()*1000)
 
             while True:
-                process_output = self.process.stdout.read(1)
-                if len(process_output) == 0 and self.process.poll() is not None:
-                    break
+                process_output = self.process.stdout.read1(PipeInterface.MAX_CHUNK)
+                if len(process_output) == 0:
+                    if self.process.poll() is not None: break
+                    else: time.sleep(0.01)
 
                 else:
-                    byte = ord(process_output)
                     last_read_ms = int(time.time()*1000)
-
-                    if (in_frame and byte == HDLC.FLAG):
-                        in_frame = False
-                        self.process_incoming(data_buffer)
-                    elif (byte == HDLC.FLAG):
-                        in_frame = True
-                        data_buffer = b""
-                    elif (in_frame and len(data_buffer) < self.HW_MTU):
-                        if (byte == HDLC.ESC):
-                            escape = True
-                        else:
-                            if (escape):
-                                if (byte == HDLC.FLAG ^ HDLC.ESC_MASK):
-                                    byte = HDLC.FLAG
-                                if (byte == HDLC.ESC  ^ HDLC.ESC_MASK):
-                                    byte = HDLC.ESC
-                                escape = False
-                            data_buffer = data_buffer+bytes([byte])
+                    for frame in decoder.feed(process_output, self.HW_MTU*2):
+                        if len(frame) <= self.HW_MTU: self.process_incoming(frame)
 
             RNS.log("Subprocess terminated on "+str(self))
             self.process.kill()
@@ -29,6 +29,8 @@
 # SOFTWARE.
 
 from RNS.Interfaces.Interface import Interface
+from RNS.Interfaces.BackboneInterface import BackboneInterface, TransmitBuffer
+from RNS.Interfaces.util.framing import HDLC, KISS, HDLCDecoder, KISSDecoder
 import socketserver
 import threading
 import platform
@@ -41,31 +43,6 @@ import RNS
 class TCPInterface():
     HW_MTU            = 262144
 
-class HDLC():
-    FLAG              = 0x7E
-    ESC               = 0x7D
-    ESC_MASK          = 0x20
-
-    @staticmethod
-    def escape(data):
-        data = data.replace(bytes([HDLC.ESC]), bytes([HDLC.ESC, HDLC.ESC^HDLC.ESC_MASK]))
-        data = data.replace(bytes([HDLC.FLAG]), bytes([HDLC.ESC, HDLC.FLAG^HDLC.ESC_MASK]))
-        return data
-
-class KISS():
-    FEND              = 0xC0
-    FESC              = 0xDB
-    TFEND             = 0xDC
-    TFESC             = 0xDD
-    CMD_DATA          = 0x00
-    CMD_UNKNOWN       = 0xFE
-
-    @staticmethod
-    def escape(data):
-        data = data.replace(bytes([0xdb]), bytes([0xdb, 0xdd]))
-        data = data.replace(bytes([0xc0]), bytes([0xdb, 0xdc]))
-        return data
-
 class ThreadingTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
     pass
 
@@ -130,6 +107,13 @@ class TCPClientInterface(Interface):
         self.i2p_tunneled     = i2p_tunneled
         self.mode             = RNS.Interfaces.Interface.Interface.MODE_FULL
         self.bitrate          = TCPClientInterface.BITRATE_GUESS
+        self.decoder          = KISSDecoder() if kiss_framing else HDLCDecoder()
+        self.transmit_buffer  = TransmitBuffer()
+
+        # On platforms with epoll, connections are handled
+        # by the shared backbone I/O workers instead of a
+        # dedicated thread for every connection.
+        self.epoll_backend    = RNS.vendor.platformutils.use_epoll()
         
         self.supports_discovery = True
         if max_reconnect_tries == None: self.max_reconnect_tries = TCPClientInterface.RECONNECT_MAX_TRIES
@@ -172,9 +156,10 @@ class TCPClientInterface(Interface):
             thread.daemon = True
             thread.start()
         else:
-            thread = threading.Thread(target=self.read_loop)
-            thread.daemon = True
-            thread.start()
+            if not self.epoll_backend:
+                thread = threading.Thread(target=self.read_loop)
+                thread.daemon = True
+                thread.start()
             if not self.kiss_framing:
                 self.wants_tunnel = True
 
@@ -260,6 +245,12 @@ class TCPClientInterface(Interface):
         elif platform.system() == "Darwin":
             self.set_timeouts_osx()
         
+        self.decoder.reset()
+        self.transmit_buffer.clear()
+        if self.epoll_backend:
+            self.socket.setblocking(0)
+            BackboneInterface.add_client_socket(self.socket, self)
+
         self.online  = True
         self.writing = False
         self.never_connected = False
@@ -291,9 +282,10 @@ class TCPClientInterface(Interface):
                     RNS.log("Reconnected socket for "+str(self)+".", RNS.LOG_INFO)
 
                 self.reconnecting = False
-                thread = threading.Thread(target=self.read_loop)
-                thread.daemon = True
-                thread.start()
+                if not self.epoll_backend:
+                    thread = threading.Thread(target=self.read_loop)
+                    thread.daemon = True
+                    thread.start()
                 if not self.kiss_framing:
                     RNS.Transport.synthesize_tunnel(self)
 
@@ -317,16 +309,51 @@ class TCPClientInterface(Interface):
             try:
                 self.writing = True
 
-                if self.kiss_framing:
-                    data = bytes([KISS.FEND])+bytes([KISS.CMD_DATA])+KISS.escape(data)+bytes([KISS.FEND])
+                if self.kiss_framing: data = KISS.frame(data)
+                else:                 data = HDLC.frame(data)
+
+                if self.epoll_backend:
+                    # Statistics are updated by the I/O
+                    # worker as data is actually written
+                    buffered = self.transmit_buffer.append(data)
+                    self.writing = False
+                    if buffered: BackboneInterface.tx_ready(self)
+                    else: RNS.log(f"Transmit buffer for {self} is full, dropping frame", RNS.LOG_EXTREME) if RNS.sl(RNS.LOG_EXTREME) else None
+
                 else:
-                    data = bytes([HDLC.FLAG])+HDLC.escape(data)+bytes([HDLC.FLAG])
+                    self.socket.sendall(data)
+                    self.writing = False
+                    self.txb += len(data)
+                    if hasattr(self, "parent_interface") and self.parent_interface != None:
+                        self.parent_interface.txb += len(data)
+
+            except Exception as e:
+                RNS.log("Exception occurred while transmitting via "+str(self)+", tearing down interface", RNS.LOG_ERROR)
+                RNS.log("The contained exception was: "+str(e), RNS.LOG_ERROR)
+                self.teardown()
 
-                self.socket.sendall(data)
-                self.writing = False
-                self.txb += len(data)
-                if hasattr(self, "parent_interface") and self.parent_interface != None:
-                    self.parent_interface.txb += len(data)
+    def process_outgoing_batch(self, frames):
+        if self.online and not self.detached:
+            try:
+                self.writing = True
+
+                # Frames are framed individually, and
+                # then written in a single operation
+                if self.kiss_framing: data = KISS.frames(frames)
+                else:                 data = HDLC.frames(frames)
+
+                if self.epoll_backend:
+                    buffered = self.transmit_buffer.append(data)
+                    self.writing = False
+                    if buffered: BackboneInterface.tx_ready(self)
+                    else: RNS.log(f"Transmit buffer for {self} is full, dropping {len(frames)} frames", RNS.LOG_EXTREME) if RNS.sl(RNS.LOG_EXTREME) else None
+
+                else:
+                    self.socket.sendall(data)
+                    self.writing = False
+                    self.txb += len(data)
+                    if hasattr(self, "parent_interface") and self.parent_interface != None:
+                        self.parent_interface.txb += len(data)
 
             except Exception as e:
                 RNS.log("Exception occurred while transmitting via "+str(self)+", tearing down interface", RNS.LOG_ERROR)
@@ -341,74 +368,51 @@ class TCPClientInterface(Interface):
     def invalid_frame(self, frame_len):
         RNS.log(f"Invalid HDLC frame of {RNS.prettysize(frame_len)} received on {self}, dropping frame", RNS.LOG_DEBUG) if RNS.sl(RNS.LOG_DEBUG) else None
 
+    def handle_frames(self, data_in):
+        for frame in self.decoder.feed(data_in, self.HW_MTU*2):
+            if self.kiss_framing:
+                # We only support one HDLC port for now, so
+                # strip off the port nibble of the command
+                if frame[0] & 0x0F != KISS.CMD_DATA: continue
+                frame = frame[1:]
+
+            frame_len = len(frame)
+            if self.check_frame_len(frame_len): self.process_incoming(frame)
+            else:                               self.invalid_frame(frame_len)
+
+    def receive(self, data_in):
+        # Called by the backbone I/O worker handling
+        # this connection, when data was received or
+        # the connection was closed.
+        try:
+            if len(data_in) > 0: self.handle_frames(data_in)
+            else:
+                self.online = False
+                if self.initiator and not self.detached:
+                    RNS.log("The socket for "+str(self)+" was closed, attempting to reconnect...", RNS.LOG_WARNING)
+                    threading.Thread(target=self.reconnect, daemon=True).start()
+                else:
+                    RNS.log("The socket for remote client "+str(self)+" was closed.", RNS.LOG_DEBUG)
+                    self.teardown()
+
+        except Exception as e:
+            self.online = False
+            RNS.log("An interface error occurred for "+str(self)+", the contained exception was: "+str(e), RNS.LOG_WARNING)
+
+            if self.initiator:
+                RNS.log("Attempting to reconnect...", RNS.LOG_WARNING)
+                threading.Thread(target=self.reconnect, daemon=True).start()
+            else:
+                self.teardown()
+
     def read_loop(self):
         try:
-            in_frame = False
-            escape = False
-            frame_buffer = b""
             data_in = b""
-            data_buffer = b""
 
             while True:
                 if self.socket: data_in = self.socket.recv(4096)
                 else: data_in = b""
-                if len(data_in) > 0:
-                    if self.kiss_framing:
-                        # Read loop for KISS framing
-                        pointer = 0
-                        while pointer < len(data_in):
-                            byte = data_in[pointer]
-                            pointer += 1
-                            if (in_frame and byte == KISS.FEND and command == KISS.CMD_DATA):
-                                in_frame = False
-                                self.process_incoming(data_buffer)
-                            elif (byte == KISS.FEND):
-                                in_frame = True
-                                command = KISS.CMD_UNKNOWN
-                                data_buffer = b""
-                            elif (in_frame and len(data_buffer) < self.HW_MTU):
-                                if (len(data_buffer) == 0 and command == KISS.CMD_UNKNOWN):
-                                    # We only support one HDLC port for now, so
-                                    # strip off the port nibble
-                                    byte = byte & 0x0F
-                                    command = byte
-                                elif (command == KISS.CMD_DATA):
-                                    if (byte == KISS.FESC):
-                                        escape = True
-                                    else:
-                                        if (escape):
-                                            if (byte == KISS.TFEND):
-                                                byte = KISS.FEND
-                                            if (byte == KISS.TFESC):
-                                                byte = KISS.FESC
-                                            escape = False
-                                        data_buffer = data_buffer+bytes([byte])
-
-                    else:
-                        # Read loop for standard HDLC framing
-                        frame_buffer += data_in
-                        flags_remaining = True
-                        while flags_remaining:
-                            frame_start = frame_buffer.find(HDLC.FLAG)
-                            if frame_start != -1:
-                                frame_end = frame_buffer.find(HDLC.FLAG, frame_start+1)
-                                if frame_end != -1:
-                                    frame = frame_buffer[frame_start+1:frame_end]
-                                    frame = frame.replace(bytes([HDLC.ESC, HDLC.FLAG ^ HDLC.ESC_MASK]), bytes([HDLC.FLAG]))
-                                    frame = frame.replace(bytes([HDLC.ESC, HDLC.ESC  ^ HDLC.ESC_MASK]), bytes([HDLC.ESC]))
-                                    frame_len = len(frame)
-                                    if frame_len != 0:
-                                        if self.check_frame_len(frame_len): self.process_incoming(frame)
-                                        else:                               self.invalid_frame(len(frame))
-
-                                    frame_buffer = frame_buffer[frame_end:]
-
-                                else:
-                                    if len(frame_buffer) > self.HW_MTU*2: frame_buffer = b""
-                                    flags_remaining = False
-                            else:
-                                frame_buffer = b""
-                                flags_remaining = False
+                if len(data_in) > 0: self.handle_frames(data_in)
 
                 else:
                     self.online = False
@@ -537,6 +541,12 @@ class TCPServerInterface(Interface):
 
         self.i2p_tunneled = i2p_tunneled
         self.mode         = RNS.Interfaces.Interface.Interface.MODE_FULL
+        self.server       = None
+
+        # On platforms with epoll, the listener and all
+        # client connections are handled by the shared
+        # backbone I/O workers.
+        self.epoll_backend = RNS.vendor.platformutils.use_epoll()
 
         if bindport == None:
             raise SystemError(f"No TCP port configured for interface \"{name}\"")
@@ -562,7 +572,15 @@ class TCPServerInterface(Interface):
 
             self.owner = owner
 
-            if len(bind_address) == 4:
+            if self.epoll_backend:
+                if len(bind_address) == 4:
+                    try: BackboneInterface.add_listener(self, bind_address, socket_type=socket.AF_INET6)
+                    except Exception as e:
+                        RNS.log(f"Error while binding IPv6 socket for interface, the contained exception was: {e}", RNS.LOG_ERROR)
+                        raise SystemError("Could not bind IPv6 socket for interface. Please check the specified \"listen_ip\" configuration option")
+                else: BackboneInterface.add_listener(self, bind_address, socket_type=socket.AF_INET)
+
+            elif len(bind_address) == 4:
                 try:
                     ThreadingTCP6Server.allow_reuse_address = True
                     self.server = ThreadingTCP6Server(bind_address, handlerFactory(self.incoming_connection))
@@ -576,9 +594,10 @@ class TCPServerInterface(Interface):
 
             self.bitrate = TCPServerInterface.BITRATE_GUESS
 
-            thread = threading.Thread(target=self.server.serve_forever)
-            thread.daemon = True
-            thread.start()
+            if not self.epoll_backend:
+                thread = threading.Thread(target=self.server.serve_forever)
+                thread.daemon = True
+                thread.start()
 
             self.online = True
 
@@ -586,9 +605,16 @@ class TCPServerInterface(Interface):
             raise SystemError("Insufficient parameters to create TCP listener")
 
     def incoming_connection(self, handler):
+        if self.epoll_backend:
+            client_socket  = handler
+            client_address = client_socket.getpeername()
+        else:
+            client_socket  = handler.request
+            client_address = handler.client_address
+
         RNS.log("Accepting incoming TCP connection", RNS.LOG_VERBOSE)
         spawned_configuration = {"name": "Client on "+self.name, "target_host": None, "target_port": None, "i2p_tunneled": self.i2p_tunneled}
-        spawned_interface = TCPClientInterface(self.owner, spawned_configuration, connected_socket=handler.request)
+        spawned_interface = TCPClientInterface(self.owner, spawned_configuration, connected_socket=client_socket)
         spawned_interface.OUT = self.OUT
         spawned_interface.IN  = self.IN
         
@@ -606,8 +632,8 @@ class TCPServerInterface(Interface):
         spawned_interface.ic_pr_burst_freq_new = self.ic_pr_burst_freq_new
         spawned_interface.ic_pr_burst_freq = self.ic_pr_burst_freq
 
-        spawned_interface.target_ip = handler.client_address[0]
-        spawned_interface.target_port = str(handler.client_address[1])
+        spawned_interface.target_ip = client_address[0]
+        spawned_interface.target_port = str(client_address[1])
         spawned_interface.parent_interface = self
         spawned_interface.bitrate = self.bitrate
         spawned_interface.optimise_mtu()
@@ -644,7 +670,12 @@ class TCPServerInterface(Interface):
         while spawned_interface in self.spawned_interfaces:
             self.spawned_interfaces.remove(spawned_interface)
         self.spawned_interfaces.append(spawned_interface)
-        spawned_interface.read_loop()
+
+        if self.epoll_backend:
+            BackboneInterface.add_client_socket(client_socket, spawned_interface)
+            return True
+
+        else: spawned_interface.read_loop()
 
     def received_announce(self, from_spawned=False):
         if from_spawned: self.ia_freq_deque.append(time.time())
@@ -664,6 +695,16 @@ class TCPServerInterface(Interface):
     def detach(self):
         self.detached = True
         self.online = False
+        if self.epoll_backend:
+            # Listeners are removed by the I/O worker as they close
+            for owner_interface, listener_socket in list(BackboneInterface.listener_filenos.values()):
+                if owner_interface == self:
+                    try: listener_socket.shutdown(socket.SHUT_RDWR)
+                    except Exception as e:
+                        if   str(e).endswith("Transport endpoint is not connected"): pass
+                        elif str(e).endswith("Bad file descriptor"): pass
+                        else: RNS.log("Error while shutting down socket for "+str(self)+": "+str(e), RNS.LOG_ERROR)
+
         if self.server != None:
             if hasattr(self.server, "shutdown"):
                 if callable(self.server.shutdown):
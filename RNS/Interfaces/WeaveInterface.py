@@ -34,17 +34,7 @@ import time
 
 from collections import deque
 from RNS.Interfaces.Interface import Interface
-
-class HDLC():
-    FLAG              = 0x7E
-    ESC               = 0x7D
-    ESC_MASK          = 0x20
-
-    @staticmethod
-    def escape(data):
-        data = data.replace(bytes([HDLC.ESC]), bytes([HDLC.ESC, HDLC.ESC^HDLC.ESC_MASK]))
-        data = data.replace(bytes([HDLC.FLAG]), bytes([HDLC.ESC, HDLC.FLAG^HDLC.ESC_MASK]))
-        return data
+from RNS.Interfaces.util.framing import HDLC, HDLCDecoder
 
 class WDCL():
     WDCL_T_DISCOVER        = 0x00
@@ -124,7 +114,7 @@ class WDCL():
         self.stopbits          = 1
         self.timeout           = 100
         self.online            = False
-        self.frame_buffer      = b""
+        self.decoder           = HDLCDecoder()
         self.next_tx           = 0
         self.should_run        = True
         self.receiver          = None
@@ -228,6 +218,7 @@ class WDCL():
             else: self.owner.wlog(f"Closed serial port {str(self.port.device)} for {str(self)}")
 
     def configure_device(self):
+        self.decoder.reset()
         thread = threading.Thread(target=self.read_loop)
         thread.daemon = True
         thread.start()
@@ -257,7 +248,7 @@ class WDCL():
 
     def process_outgoing(self, data):
         if self.serial.is_open:
-            data = bytes([HDLC.FLAG])+HDLC.escape(data)+bytes([HDLC.FLAG])
+            data = HDLC.frame(data)
             written = self.serial.write(data)
             self.txb += len(data)          
             if written != len(data):
@@ -268,22 +259,9 @@ class WDCL():
             while self.serial.is_open:
                 data_in = self.serial.read(1500)
                 if len(data_in) > 0:
-                    self.frame_buffer += data_in
-                    flags_remaining = True
-                    while flags_remaining:
-                        frame_start = self.frame_buffer.find(HDLC.FLAG)
-                        if frame_start != -1:
-                            frame_end = self.frame_buffer.find(HDLC.FLAG, frame_start+1)
-                            if frame_end != -1:
-                                frame = self.frame_buffer[frame_start+1:frame_end]
-                                frame = frame.replace(bytes([HDLC.ESC, HDLC.FLAG ^ HDLC.ESC_MASK]), bytes([HDLC.FLAG]))
-                                frame = frame.replace(bytes([HDLC.ESC, HDLC.ESC  ^ HDLC.ESC_MASK]), bytes([HDLC.ESC]))
-                                if len(frame) > WDCL.HEADER_MINSIZE: self.process_incoming(frame)
-                                self.frame_buffer = self.frame_buffer[frame_end:]
-
-                            else: flags_remaining = False
-                        else: flags_remaining = False
-                    
+                    for frame in self.decoder.feed(data_in, WDCL.MAX_CHUNK*2):
+                        if len(frame) > WDCL.HEADER_MINSIZE: self.process_incoming(frame)
+
         except Exception as e:
             self.online = False
             self.wdcl_connected = False
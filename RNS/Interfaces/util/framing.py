@@ -0,0 +1,163 @@
+# Reticulum License
+#
+# Copyright (c) 2016-2025 Mark Qvist
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# - The Software shall not be used in any kind of system which includes amongst
+#   its functions the ability to purposefully do harm to human beings.
+#
+# - The Software shall not be used, directly or indirectly, in the creation of
+#   an artificial intelligence, machine learning or language model training
+#   dataset, including but not limited to any use that contributes to the
+#   training or development of such a model or algorithm.
+#
+# - The above copyright notice and this permission notice shall be included in
+#   all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+class HDLC():
+    FLAG              = 0x7E
+    ESC               = 0x7D
+    ESC_MASK          = 0x20
+
+    FLAG_BYTE         = bytes([FLAG])
+    ESC_BYTE          = bytes([ESC])
+    ESCAPED_FLAG      = bytes([ESC, FLAG^ESC_MASK])
+    ESCAPED_ESC       = bytes([ESC, ESC^ESC_MASK])
+
+    @staticmethod
+    def escape(data):
+        data = data.replace(HDLC.ESC_BYTE, HDLC.ESCAPED_ESC)
+        data = data.replace(HDLC.FLAG_BYTE, HDLC.ESCAPED_FLAG)
+        return data
+
+    @staticmethod
+    def unescape(data):
+        if not HDLC.ESC_BYTE in data: return data
+        data = data.replace(HDLC.ESCAPED_FLAG, HDLC.FLAG_BYTE)
+        data = data.replace(HDLC.ESCAPED_ESC, HDLC.ESC_BYTE)
+        return data
+
+    @staticmethod
+    def frame(data):
+        return b"".join((HDLC.FLAG_BYTE, HDLC.escape(data), HDLC.FLAG_BYTE))
+
+    @staticmethod
+    def frames(datas):
+        # Every frame keeps its own opening and closing flag,
+        # since byte-wise decoders on the other end will not
+        # treat a shared flag as the start of the next frame.
+        segments = []
+        for data in datas: segments.extend((HDLC.FLAG_BYTE, HDLC.escape(data), HDLC.FLAG_BYTE))
+        return b"".join(segments)
+
+class KISS():
+    FEND              = 0xC0
+    FESC              = 0xDB
+    TFEND             = 0xDC
+    TFESC             = 0xDD
+    CMD_DATA          = 0x00
+    CMD_UNKNOWN       = 0xFE
+
+    FEND_BYTE         = bytes([FEND])
+    FESC_BYTE         = bytes([FESC])
+    ESCAPED_FEND      = bytes([FESC, TFEND])
+    ESCAPED_FESC      = bytes([FESC, TFESC])
+
+    @staticmethod
+    def escape(data):
+        data = data.replace(KISS.FESC_BYTE, KISS.ESCAPED_FESC)
+        data = data.replace(KISS.FEND_BYTE, KISS.ESCAPED_FEND)
+        return data
+
+    @staticmethod
+    def unescape(data):
+        if not KISS.FESC_BYTE in data: return data
+        data = data.replace(KISS.ESCAPED_FEND, KISS.FEND_BYTE)
+        data = data.replace(KISS.ESCAPED_FESC, KISS.FESC_BYTE)
+        return data
+
+    @staticmethod
+    def frame(data, command=CMD_DATA):
+        return b"".join((KISS.FEND_BYTE, bytes([command]), KISS.escape(data), KISS.FEND_BYTE))
+
+    @staticmethod
+    def frames(datas, command=CMD_DATA):
+        header   = bytes([KISS.FEND, command])
+        segments = []
+        for data in datas: segments.extend((header, KISS.escape(data), KISS.FEND_BYTE))
+        return b"".join(segments)
+
+class FrameDecoder():
+    """
+    Incremental decoder for delimiter-framed byte streams. Received data
+    is appended to a single buffer, and the search for the next frame
+    boundary continues where the previous one stopped, so data is only
+    scanned once. Frames are copied out of the buffer through a memory
+    view, consumed data is removed once per call instead of once for
+    every frame, and frames are only unescaped if they contain escapes.
+    """
+    def __init__(self, delimiter, unescape):
+        self.delimiter = bytes([delimiter])
+        self.unescape  = unescape
+        self.buffer    = bytearray()
+        self.scan      = 0
+
+    def __len__(self):
+        return len(self.buffer)
+
+    def feed(self, data, max_buffered):
+        frames    = []
+        buffer    = self.buffer
+        delimiter = self.delimiter
+        unescape  = self.unescape
+        buffer   += data
+
+        frame_start = buffer.find(delimiter)
+        if frame_start == -1:
+            self.reset()
+            return frames
+
+        position = max(frame_start+1, self.scan)
+        with memoryview(buffer) as view:
+            while True:
+                frame_end = buffer.find(delimiter, position)
+                if frame_end == -1: break
+                if frame_end > frame_start+1: frames.append(unescape(bytes(view[frame_start+1:frame_end])))
+                frame_start = frame_end
+                position    = frame_end+1
+
+        if frame_start > 0: del buffer[:frame_start]
+        if len(buffer) > max_buffered: self.reset()
+        else: self.scan = len(buffer)
+
+        return frames
+
+    def reset(self):
+        self.buffer.clear()
+        self.scan = 0
+
+class HDLCDecoder(FrameDecoder):
+    def __init__(self):
+        super().__init__(HDLC.FLAG, HDLC.unescape)
+
+class KISSDecoder(FrameDecoder):
+    """
+    Decoder for KISS framed streams. Decoded frames still start with
+    the KISS command byte, which the caller is expected to inspect.
+    """
+    def __init__(self):
+        super().__init__(KISS.FEND, KISS.unescape)
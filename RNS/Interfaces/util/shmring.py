@@ -0,0 +1,240 @@
+# Reticulum License
+#
+# Copyright (c) 2016-2025 Mark Qvist
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# - The Software shall not be used in any kind of system which includes amongst
+#   its functions the ability to purposefully do harm to human beings.
+#
+# - The Software shall not be used, directly or indirectly, in the creation of
+#   an artificial intelligence, machine learning or language model training
+#   dataset, including but not limited to any use that contributes to the
+#   training or development of such a model or algorithm.
+#
+# - The above copyright notice and this permission notice shall be included in
+#   all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import threading
+import platform
+import struct
+import os
+
+class SharedRing():
+    """
+    Single-producer, single-consumer ring of length-prefixed frames, laid
+    out in a region of shared memory. The write and read indices only ever
+    increase, and are stored in the region header, so both processes can
+    determine the fill level without any other coordination.
+
+    The lock is local to each process, and only serialises threads using
+    the same end of the ring. Between processes, the ring relies on the
+    memory ordering of the processor: stores must become visible to the
+    other process in the order they were made, and loads must not be
+    reordered with other loads, so a consumer that sees an updated write
+    index also sees the frame written before it. x86 processors guarantee
+    this, and :py:meth:`SharedMemoryChannel.supported` is false on other
+    architectures. The only reordering x86 allows is a load passing an
+    earlier store, which the wakeup checks in ``put`` and ``drain`` must
+    prevent. Releasing and taking the lock between the two executes an
+    atomic read-modify-write instruction, which is a full barrier on x86.
+    """
+    HEADER_SIZE  = 64
+    WRITE_OFFSET = 0
+    READ_OFFSET  = 8
+    SIZE_OFFSET  = 16
+
+    INDEX        = struct.Struct("<Q")
+    LENGTH       = struct.Struct("<I")
+
+    def __init__(self, view, capacity=None):
+        if capacity == None: capacity = SharedRing.INDEX.unpack_from(view, SharedRing.SIZE_OFFSET)[0]
+        else:
+            SharedRing.INDEX.pack_into(view, SharedRing.WRITE_OFFSET, 0)
+            SharedRing.INDEX.pack_into(view, SharedRing.READ_OFFSET, 0)
+            SharedRing.INDEX.pack_into(view, SharedRing.SIZE_OFFSET, capacity)
+
+        if capacity <= SharedRing.LENGTH.size or SharedRing.HEADER_SIZE+capacity > len(view):
+            raise ValueError(f"Invalid shared ring capacity {capacity}")
+
+        self.capacity = capacity
+        self.view     = view[:SharedRing.HEADER_SIZE+capacity]
+        self.data     = self.view[SharedRing.HEADER_SIZE:]
+        self.lock     = threading.Lock()
+        self.closed   = False
+
+    def __len__(self):
+        with self.lock:
+            if self.closed: return 0
+            return self.write_index()-self.read_index()
+
+    def write_index(self): return SharedRing.INDEX.unpack_from(self.view, SharedRing.WRITE_OFFSET)[0]
+    def read_index(self):  return SharedRing.INDEX.unpack_from(self.view, SharedRing.READ_OFFSET)[0]
+
+    def copy_in(self, index, data):
+        position = index % self.capacity
+        first = min(len(data), self.capacity-position)
+        self.data[position:position+first] = data[:first]
+        if first < len(data): self.data[:len(data)-first] = data[first:]
+
+    def copy_out(self, index, length):
+        position = index % self.capacity
+        if position+length <= self.capacity: return bytes(self.data[position:position+length])
+        else: return bytes(self.data[position:])+bytes(self.data[:length-(self.capacity-position)])
+
+    def put(self, frame):
+        """
+        Writes a frame into the ring.
+
+        :returns: ``None`` if the frame did not fit, otherwise a boolean indicating whether the consumer had already drained everything before this frame, and must be woken up to process it.
+        """
+        needed = SharedRing.LENGTH.size+len(frame)
+        with self.lock:
+            if self.closed: return None
+            write_index = self.write_index()
+            if needed > self.capacity-(write_index-self.read_index()): return None
+            position = write_index % self.capacity
+            if position+needed <= self.capacity:
+                SharedRing.LENGTH.pack_into(self.data, position, len(frame))
+                self.data[position+SharedRing.LENGTH.size:position+needed] = frame
+            else:
+                self.copy_in(write_index, SharedRing.LENGTH.pack(len(frame)))
+                self.copy_in(write_index+SharedRing.LENGTH.size, memoryview(frame))
+
+            SharedRing.INDEX.pack_into(self.view, SharedRing.WRITE_OFFSET, write_index+needed)
+
+        # The read index must be loaded after the write index was published,
+        # or a wakeup could be lost against a consumer finishing its drain.
+        with self.lock:
+            if self.closed: return False
+            return self.read_index() == write_index
+
+    def drain(self):
+        """
+        Reads all frames currently available in the ring.
+
+        :returns: A list of frames as *bytes*.
+        """
+        frames = []
+        while True:
+            with self.lock:
+                if self.closed: return frames
+                read_index = self.read_index()
+                write_index = self.write_index()
+                while read_index != write_index:
+                    position = read_index % self.capacity
+                    if position+SharedRing.LENGTH.size <= self.capacity: length = SharedRing.LENGTH.unpack_from(self.data, position)[0]
+                    else: length = SharedRing.LENGTH.unpack(self.copy_out(read_index, SharedRing.LENGTH.size))[0]
+                    if SharedRing.LENGTH.size+length > write_index-read_index: raise ValueError("Corrupt frame length in shared ring")
+                    frames.append(self.copy_out(read_index+SharedRing.LENGTH.size, length))
+                    read_index += SharedRing.LENGTH.size+length
+
+                SharedRing.INDEX.pack_into(self.view, SharedRing.READ_OFFSET, read_index)
+
+            # Check once more after publishing the read index, since a
+            # producer may have written in between without waking us.
+            with self.lock:
+                if self.closed or self.write_index() == self.read_index(): return frames
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            self.data.release()
+            self.view.release()
+
+class SharedMemoryChannel():
+    """
+    A bidirectional frame channel between two processes on the same host,
+    consisting of two rings in a single shared memory segment. The
+    initiating side creates the segment and sends its name to the peer,
+    which attaches to it. Once the peer has attached, the initiator
+    unlinks the name, so the memory is released as soon as both sides have
+    closed the channel, even if one of them exits uncleanly.
+    """
+    RING_SIZE = 1024*1024
+    NAME_PREFIX = "rns"
+    ORDERED_ARCHITECTURES = ["x86_64", "amd64", "i386", "i486", "i586", "i686", "x86"]
+    created = set()
+
+    @staticmethod
+    def supported():
+        # The rings depend on the ordering guarantees of x86, see SharedRing
+        if not platform.machine().lower() in SharedMemoryChannel.ORDERED_ARCHITECTURES: return False
+        try:
+            from importlib.util import find_spec
+            return find_spec("multiprocessing.shared_memory") != None
+        except Exception: return False
+
+    @staticmethod
+    def create(ring_size=RING_SIZE):
+        from multiprocessing import shared_memory
+        name = SharedMemoryChannel.NAME_PREFIX+os.urandom(6).hex()
+        segment = shared_memory.SharedMemory(name=name, create=True, size=2*(SharedRing.HEADER_SIZE+ring_size))
+        SharedMemoryChannel.created.add(name)
+        view = segment.buf
+        tx = SharedRing(view[:SharedRing.HEADER_SIZE+ring_size], ring_size)
+        rx = SharedRing(view[SharedRing.HEADER_SIZE+ring_size:], ring_size)
+        return SharedMemoryChannel(segment, tx, rx, initiator=True)
+
+    @staticmethod
+    def attach(name):
+        if not name.startswith(SharedMemoryChannel.NAME_PREFIX) or not name[len(SharedMemoryChannel.NAME_PREFIX):].isalnum():
+            raise ValueError(f"Invalid shared memory segment name {name}")
+
+        from multiprocessing import shared_memory
+        try: segment = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Before Python 3.13, attaching always registers the segment with
+            # the resource tracker, which would unlink it when we exit. If the
+            # segment was created by this process, the creator still owns the
+            # registration until it unlinks the segment.
+            segment = shared_memory.SharedMemory(name=name)
+            if not name in SharedMemoryChannel.created:
+                try:
+                    from multiprocessing import resource_tracker
+                    resource_tracker.unregister(segment._name, "shared_memory")
+                except Exception: pass
+
+        try:
+            view = segment.buf
+            rx = SharedRing(view)
+            tx = SharedRing(view[SharedRing.HEADER_SIZE+rx.capacity:])
+            return SharedMemoryChannel(segment, tx, rx, initiator=False)
+
+        except Exception as e:
+            segment.close()
+            raise e
+
+    def __init__(self, segment, tx, rx, initiator):
+        self.segment   = segment
+        self.name      = segment.name.lstrip("/")
+        self.tx        = tx
+        self.rx        = rx
+        self.initiator = initiator
+        self.linked    = initiator
+
+    def unlink(self):
+        if self.linked:
+            self.linked = False
+            SharedMemoryChannel.created.discard(self.name)
+            try: self.segment.unlink()
+            except FileNotFoundError: pass
+
+    def close(self):
+        self.tx.close()
+        self.rx.close()
+        try: self.unlink()
+        finally: self.segment.close()
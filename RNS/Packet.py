@@ -118,6 +118,7 @@ class Packet:
     __slots__ += "transport_id", "data", "flags", "raw", "packed", "sent", "create_receipt", "receipt", "fromPacked", "MTU"
     __slots__ += "sent_at", "packet_hash", "ratchet_id", "attached_interface", "receiving_interface", "rssi", "snr", "q"
     __slots__ += "ciphertext", "plaintext", "destination_hash", "destination_type", "link", "map_hash", "is_outbound_pr"
+    __slots__ += "validated_announce",
 
     def __init__(self, destination, data, packet_type = DATA, context = NONE, transport_type = RNS.Transport.BROADCAST,
                  header_type = HEADER_1, transport_id = None, attached_interface = None, create_receipt = True, context_flag=FLAG_UNSET):
@@ -162,6 +163,7 @@ class Packet:
         self.attached_interface = attached_interface
         self.receiving_interface = None
         self.is_outbound_pr = False
+        self.validated_announce = None
         self.rssi = None
         self.snr = None
         self.q = None
@@ -552,6 +554,7 @@ class PacketReceipt:
         :param timeout: The timeout in seconds.
         """
         self.timeout = float(timeout)
+        if self.status == PacketReceipt.SENT: RNS.Transport.reschedule_receipt(self)
 
     def set_delivery_callback(self, callback):
         """
@@ -284,6 +284,17 @@ class Reticulum:
         Reticulum.__ic_held_release_interval          = None
         Reticulum.__ec_pr_freq                        = None
         Reticulum.__egress_control                    = None
+        Reticulum.__announce_verification_workers     = 0
+        Reticulum.__announce_verification_processes   = False
+        Reticulum.__identity_cache_size               = None
+        Reticulum.__inbound_pipeline                  = False
+        Reticulum.__inbound_queue_size                = None
+        Reticulum.__inbound_queue_policy              = None
+        Reticulum.__egress_queues                     = False
+        Reticulum.__egress_queue_size                 = None
+        Reticulum.__backbone_workers                  = None
+        Reticulum.__backbone_worker_assign            = None
+        Reticulum.__local_shared_memory               = False
 
         Reticulum.panic_on_interface_error = False
 
@@ -341,8 +352,14 @@ class Reticulum:
         RNS.log(f"Utilising cryptography backend \"{RNS.Cryptography.Provider.backend()}\"", RNS.LOG_DEBUG)
         RNS.log(f"Configuration loaded from {self.configpath}", RNS.LOG_VERBOSE)
 
+        if Reticulum.__identity_cache_size != None: RNS.Identity.set_identity_cache_size(Reticulum.__identity_cache_size)
         RNS.Identity.load_known_destinations()
         if not self.is_connected_to_shared_instance: RNS.Identity._clean_ratchets()
+        if not self.is_connected_to_shared_instance and Reticulum.__announce_verification_workers > 0:
+            RNS.Transport.enable_announce_verifier(Reticulum.__announce_verification_workers, use_processes=Reticulum.__announce_verification_processes)
+        if Reticulum.__inbound_pipeline:
+            RNS.Transport.enable_inbound_pipeline(queue_size=Reticulum.__inbound_queue_size, policy=Reticulum.__inbound_queue_policy)
+
         RNS.Transport.start(self)
 
         if self.use_af_unix:
@@ -696,6 +713,55 @@ class Reticulum:
                     v = self.config["reticulum"].as_float(option)
                     if v >= 0: Reticulum.__ic_held_release_interval = v
 
+                if option == "announce_verification_workers":
+                    v = self.config["reticulum"].as_int(option)
+                    if v >= 0: Reticulum.__announce_verification_workers = v
+
+                if option == "announce_verification_processes":
+                    v = self.config["reticulum"].as_bool(option)
+                    if v == True: Reticulum.__announce_verification_processes = True
+
+                if option == "identity_cache_size":
+                    v = self.config["reticulum"].as_int(option)
+                    if v >= 0: Reticulum.__identity_cache_size = v
+
+                if option == "inbound_pipeline":
+                    v = self.config["reticulum"].as_bool(option)
+                    if v == True: Reticulum.__inbound_pipeline = True
+
+                if option == "inbound_queue_size":
+                    v = self.config["reticulum"].as_int(option)
+                    if v > 0: Reticulum.__inbound_queue_size = v
+
+                if option == "inbound_queue_policy":
+                    from RNS.Transport import InboundPipeline
+                    v = self.config["reticulum"][option].lower()
+                    if v == "drop":    Reticulum.__inbound_queue_policy = InboundPipeline.DROP
+                    elif v == "block": Reticulum.__inbound_queue_policy = InboundPipeline.BLOCK
+                    else: RNS.log(f"Invalid inbound queue policy \"{v}\" in configuration, using default", RNS.LOG_WARNING)
+
+                if option == "egress_queues":
+                    v = self.config["reticulum"].as_bool(option)
+                    if v == True: Reticulum.__egress_queues = True
+
+                if option == "egress_queue_size":
+                    v = self.config["reticulum"].as_int(option)
+                    if v > 0: Reticulum.__egress_queue_size = v
+
+                if option == "backbone_workers":
+                    v = self.config["reticulum"].as_int(option)
+                    if v > 0: Reticulum.__backbone_workers = v
+
+                if option == "backbone_worker_assignment":
+                    v = self.config["reticulum"][option].lower().replace("_", "").replace("-", "")
+                    if v == "roundrobin": Reticulum.__backbone_worker_assign = BackboneInterface.BackboneInterface.ASSIGN_ROUND_ROBIN
+                    elif v == "load":     Reticulum.__backbone_worker_assign = BackboneInterface.BackboneInterface.ASSIGN_LOAD
+                    else: RNS.log(f"Invalid backbone worker assignment \"{v}\" in configuration, using default", RNS.LOG_WARNING)
+
+                if option == "local_shared_memory":
+                    v = self.config["reticulum"].as_bool(option)
+                    if v == True: Reticulum.__local_shared_memory = True
+
 
         if RNS.compiled: RNS.log("Reticulum running in compiled mode", RNS.LOG_DEBUG)
         else: RNS.log("Reticulum running in interpreted mode", RNS.LOG_DEBUG)
@@ -713,6 +779,9 @@ class Reticulum:
         if self.local_socket_path == None and self.use_af_unix:
             self.local_socket_path = "default"
 
+        if Reticulum.__backbone_workers != None and RNS.vendor.platformutils.use_epoll():
+            BackboneInterface.BackboneInterface.set_workers(Reticulum.__backbone_workers, Reticulum.__backbone_worker_assign)
+
         self.__start_local_interface()
 
         if self.is_shared_instance or self.is_standalone_instance:
@@ -1175,6 +1244,10 @@ class Reticulum:
     def _default_egress_control(self):
         return self.__egress_control or RNS.Interfaces.Interface.Interface.EGRESS_CONTROL
 
+    def _default_egress_queue_size(self):
+        if not self.__egress_queues: return 0
+        else: return self.__egress_queue_size or RNS.Interfaces.Interface.Interface.EGRESS_QUEUE_SIZE
+
     def _default_ic_new_time(self):
         return self.__ic_new_time or RNS.Interfaces.Interface.Interface.IC_NEW_TIME
 
@@ -1460,6 +1533,16 @@ class Reticulum:
                     if interface.announce_queue != None: ifstats["announce_queue"] = len(interface.announce_queue)
                     else:                                ifstats["announce_queue"] = None
 
+                if hasattr(interface, "egress_queue") and interface.egress_queue != None:
+                    egress_stats = interface.egress_queue.stats()
+                    ifstats["egress_queue"]   = egress_stats["queued"]
+                    ifstats["egress_dropped"] = egress_stats["dropped"]
+
+                if RNS.Transport.inbound_pipeline != None:
+                    ingress_stats = RNS.Transport.inbound_pipeline.interface_stats(interface)
+                    ifstats["ingress_queue"]   = ingress_stats["queued"]
+                    ifstats["ingress_dropped"] = ingress_stats["dropped"]
+
                 if hasattr(interface, "blocked_ip_count"):
                     ifstats["blocked_ips"] = interface.blocked_ip_count
 
@@ -1498,6 +1581,9 @@ class Reticulum:
             stats["rxs"]        = RNS.Transport.speed_rx
             stats["txs"]        = RNS.Transport.speed_tx
 
+            if RNS.vendor.platformutils.use_epoll() and len(BackboneInterface.BackboneInterface.workers) > 0:
+                stats["backbone_workers"] = BackboneInterface.BackboneInterface.worker_stats()
+
             if Reticulum.transport_enabled():
                 stats["transport_id"] = RNS.Transport.identity.hash
                 stats["network_id"] = RNS.Transport.network_identity.hash if RNS.Transport.network_identity else None
@@ -1775,6 +1861,49 @@ class Reticulum:
         """
         return Reticulum.__link_mtu_discovery
 
+    @staticmethod
+    def announce_verification_workers():
+        """
+        Returns the number of workers used for parallel announce
+        signature verification. If this is zero, announces are
+        verified directly by the thread that received them.
+
+        :returns: The number of announce verification workers as an integer.
+        """
+        return Reticulum.__announce_verification_workers
+
+    @staticmethod
+    def identity_cache_size():
+        """
+        Returns the number of recalled identities kept ready for use.
+
+        :returns: The identity cache size as an integer.
+        """
+        if Reticulum.__identity_cache_size != None: return Reticulum.__identity_cache_size
+        else: return RNS.Identity.IDENTITY_CACHE_SIZE
+
+    @staticmethod
+    def inbound_pipeline_enabled():
+        """
+        Returns whether inbound frames are processed by the staged
+        inbound pipeline, instead of directly by the thread of the
+        interface that received them.
+
+        :returns: True if the inbound pipeline is enabled, False if not.
+        """
+        return Reticulum.__inbound_pipeline
+
+    @staticmethod
+    def local_shared_memory_enabled():
+        """
+        Returns whether frames between the shared instance and
+        its local clients are carried over shared memory, when
+        both sides support it.
+
+        :returns: True if the shared memory transport is enabled, False if not.
+        """
+        return Reticulum.__local_shared_memory
+
     @staticmethod
     def remote_management_enabled():
         """
@@ -1948,6 +2077,72 @@ instance_name = default
 # panic_on_interface_error = No
 
 
+# On busy transport nodes, announce signature verification
+# can be performed in parallel by a pool of workers. Set
+# the number of workers to enable this. By default, worker
+# threads are used, but these only verify in parallel if
+# the cryptography backend releases the interpreter lock
+# while verifying. The internal backend does not, and with
+# it, worker processes must be used to make use of more
+# than one processor core.
+
+# announce_verification_workers = 4
+# announce_verification_processes = No
+
+
+# Recalled identities are kept ready for use in a cache,
+# so they don't need to be reconstructed on every use.
+# The number of cached identities can be adjusted here.
+
+# identity_cache_size = 4096
+
+
+# Received frames are normally processed directly by the
+# thread of the interface that received them. You can
+# enable a staged inbound pipeline instead, where each
+# interface has a bounded queue of received frames, and
+# announces and other traffic are processed by separate
+# workers. When a queue is full, new frames are either
+# dropped, or the interface waits for room in the queue.
+
+# inbound_pipeline = No
+# inbound_queue_size = 256
+# inbound_queue_policy = drop
+
+
+# Frames are normally written to interfaces directly by
+# the thread sending them. With egress queues enabled,
+# each interface instead gets a bounded queue of outgoing
+# frames, which it writes in batches. Link requests, link
+# request proofs and keepalives are sent first, then other
+# data, and finally announces and path requests.
+
+# egress_queues = No
+# egress_queue_size = 256
+
+
+# On Linux, backbone and TCP interfaces and local
+# client connections are handled by a single I/O
+# worker by default. You can spread connections
+# over several workers, each running its own event
+# loop. New connections are assigned to workers in
+# turn, or to the worker with the fewest connections.
+
+# backbone_workers = 1
+# backbone_worker_assignment = roundrobin
+
+
+# Programs connected to the shared instance normally
+# exchange all frames with it over the local socket.
+# With this option enabled, frames are instead passed
+# through ring buffers in shared memory, and the socket
+# is only used to wake up the other side. This is only
+# supported on x86 systems. Programs and instances
+# without support keep using the socket.
+
+# local_shared_memory = No
+
+
 # If you're connecting to a large external network, you
 # can use one or more external blackhole list to block
 # spammy and excessive announces onto your network. This
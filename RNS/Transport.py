@@ -29,17 +29,23 @@
 # SOFTWARE.
 
 import os
+import sys
 import gc
 import RNS
+import mmap
 import time
 import math
+import array
+import heapq
 import struct
 import inspect
 import threading
 from time import sleep
 from threading import Lock
 from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from .vendor import umsgpack as umsgpack
+from RNS.Interfaces.Interface import Interface, AnnounceQueue, QueuedAnnounce, AnnounceScheduler
 from RNS.Interfaces.BackboneInterface import BackboneInterface
 
 class Transport:
@@ -60,6 +66,12 @@ class Transport:
 
     APP_NAME = "rnstransport"
 
+    # Packet contexts used for link control, which are sent
+    # first from interface egress queues. These are KEEPALIVE,
+    # LRRTT and LRPROOF. Other link packets, such as LINKCLOSE
+    # and LINKIDENTIFY, must stay in order with link data.
+    CONTROL_CONTEXTS            = frozenset([0xFA, 0xFE, 0xFF])
+
     PATHFINDER_M                = 128          # Max hops
     """
     Maximum amount of hops that Reticulum will transport a packet.
@@ -104,9 +116,14 @@ class Transport:
     destinations_map            = {}           # Destination hash map of active destinations
     pending_links               = []           # Links that are being established
     active_links                = []           # Links that are active
-    packet_hashlist             = set()        # A list of packet hashes for duplicate detection
-    packet_hashlist_prev        = set()
-    receipts                    = []           # Receipts of all outgoing packets for proof processing
+    pending_links_map           = {}           # Link ID map of links that are being established
+    active_links_map            = {}           # Link ID map of links that are active
+    packet_hashlist             = None         # A filter of packet hashes for duplicate detection
+    receipts                    = {}           # Receipts of all outgoing packets by packet hash for proof processing
+    receipts_truncated          = {}           # Receipts of all outgoing packets by truncated packet hash
+    receipt_timeouts            = []           # A deadline heap of outstanding receipts
+    receipt_count               = 0
+    receipt_sequence            = 0
 
     # Notes on memory usage: 1 megabyte of memory can store approximately
     # 55.100 path table entries or approximately 22.300 link table entries.
@@ -117,6 +134,9 @@ class Transport:
     link_table                  = {}           # A lookup table containing hops for links
     held_announces              = {}           # A table containing temporarily held announce-table entries
     announce_handlers           = []           # A table storing externally registered announce handlers
+    announce_handler_index      = {}           # Announce handlers and their callback arity, indexed by name hash
+    announce_handlers_unfiltered= []           # Announce handlers without an aspect filter
+    announce_handlers_indexed   = []           # The announce handlers the index was last built from
     tunnels                     = {}           # A table storing tunnels to other transport instances
     announce_rate_table         = {}           # A table for keeping track of announce rates
     path_requests               = {}           # A table for storing path request timestamps
@@ -124,7 +144,27 @@ class Transport:
     blackholed_identities       = {}           # A table for keeping track of blackholed identities
     
     discovery_path_requests     = {}           # A table for keeping track of path requests on behalf of other nodes
-    discovery_pr_tags           = []           # A table for keeping track of tagged path requests
+    discovery_pr_tags           = None         # A table for keeping track of tagged path requests
+
+    path_table_expiry           = None         # Expiry indexes for the transport tables
+    reverse_table_expiry        = None
+    link_table_expiry           = None
+    path_requests_expiry        = None
+    discovery_pr_expiry         = None
+    tunnels_expiry              = None
+    tunnel_paths_expiry         = None
+
+    active_interfaces           = set()        # Set of currently attached interfaces for membership checks
+    removed_interfaces          = []           # Interfaces removed since tables were last culled
+    path_table_interfaces       = {}           # Interface indexes of the path, link and reverse tables
+    link_table_interfaces       = {}
+    reverse_table_interfaces    = {}
+
+    path_table_journal          = None         # Snapshot and journal storage for the path and tunnel tables
+    tunnels_journal             = None
+    path_table_dirty            = set()        # Keys changed since the tables were last journaled
+    tunnels_dirty               = set()
+
     max_pr_tags                 = 32000        # Maximum amount of unique path request tags to remember
     max_queued_discovery_prs    = 32           # Maximum amount of queued discovery path requests
 
@@ -142,6 +182,7 @@ class Transport:
     pending_links_lock          = Lock()
     tunnels_lock                = Lock()
     receipts_lock               = Lock()
+    receipt_timeouts_lock       = Lock()
     discovery_pr_lock           = Lock()
     discovery_pr_tags_lock      = Lock()
     path_requests_lock          = Lock()
@@ -190,6 +231,8 @@ class Transport:
     known_destinations_interval = 5*60
     tables_last_culled          = 0.0
     tables_cull_interval        = 5.0
+    journal_last_flushed        = 0.0
+    journal_interval            = 60.0
     interface_last_jobs         = 0.0
     interface_jobs_interval     = 5.0
     last_mgmt_announce          = 0
@@ -199,6 +242,9 @@ class Transport:
     interface_announcer         = None
     discovery_handler           = None
     blackhole_updater           = None
+    announce_verifier           = None
+    inbound_pipeline            = None
+    announce_dispatcher         = None
 
     traffic_rxb                 = 0
     traffic_txb                 = 0
@@ -215,9 +261,22 @@ class Transport:
     @staticmethod
     def internal_identity(): return Transport._identity
 
+    @staticmethod
+    def init_tables():
+        if Transport.packet_hashlist      == None: Transport.packet_hashlist      = PacketHashFilter(Transport.hashlist_maxsize//2)
+        if Transport.path_table_expiry    == None: Transport.path_table_expiry    = ExpiryIndex()
+        if Transport.reverse_table_expiry == None: Transport.reverse_table_expiry = ExpiryIndex()
+        if Transport.link_table_expiry    == None: Transport.link_table_expiry    = ExpiryIndex()
+        if Transport.path_requests_expiry == None: Transport.path_requests_expiry = ExpiryIndex()
+        if Transport.discovery_pr_expiry  == None: Transport.discovery_pr_expiry  = ExpiryIndex()
+        if Transport.discovery_pr_tags    == None: Transport.discovery_pr_tags    = BoundedSet(Transport.max_pr_tags)
+        if Transport.tunnels_expiry       == None: Transport.tunnels_expiry       = ExpiryIndex()
+        if Transport.tunnel_paths_expiry  == None: Transport.tunnel_paths_expiry  = ExpiryIndex()
+
     @staticmethod
     def start(reticulum_instance):
         Transport.owner = reticulum_instance
+        Transport.init_tables()
 
         if Transport.identity == None:
             transport_identity_path = RNS.Reticulum.storagepath+"/transport_identity"
@@ -242,16 +301,10 @@ class Transport:
         packet_hashlist_path = RNS.Reticulum.storagepath+"/packet_hashlist.raw"
         if RNS.Reticulum.transport_enabled() and not Transport.owner.is_connected_to_shared_instance:
             if os.path.isfile(packet_hashlist_path):
-                try:
-                    with open(packet_hashlist_path, "rb") as file:
-                        hashlen = RNS.Identity.HASHLENGTH//8
-                        done = False
-                        while not done:
-                            packet_hash = file.read(hashlen)
-                            if len(packet_hash) == hashlen: Transport.packet_hashlist.add(packet_hash)
-                            else: done = True
-
-                except Exception as e: RNS.log("Could not load packet hashlist from storage, the contained exception was: "+str(e), RNS.LOG_ERROR)
+                try: Transport.packet_hashlist.load(packet_hashlist_path)
+                except Exception as e:
+                    RNS.log("Could not load packet hashlist from storage, the contained exception was: "+str(e), RNS.LOG_ERROR)
+                    Transport.packet_hashlist.clear()
 
         Transport.reload_blackhole()
 
@@ -304,15 +357,13 @@ class Transport:
 
         # Load transport-related data
         if RNS.Reticulum.transport_enabled():
-            path_table_path = RNS.Reticulum.storagepath+"/destination_table"
-            tunnel_table_path = RNS.Reticulum.storagepath+"/tunnels"
+            Transport.path_table_journal = TableJournal(RNS.Reticulum.storagepath+"/destination_table")
+            Transport.tunnels_journal    = TableJournal(RNS.Reticulum.storagepath+"/tunnels")
 
-            if os.path.isfile(path_table_path) and not Transport.owner.is_connected_to_shared_instance:
+            if Transport.path_table_journal.exists() and not Transport.owner.is_connected_to_shared_instance:
                 serialised_destinations = []
                 try:
-                    file = open(path_table_path, "rb")
-                    serialised_destinations = umsgpack.unpackb(file.read())
-                    file.close()
+                    serialised_destinations = Transport.path_table_journal.load()
 
                     for serialised_entry in serialised_destinations:
                         destination_hash = serialised_entry[0]
@@ -340,7 +391,7 @@ class Transport:
                                 # increased hop-count.
                                 announce_packet.hops += 1
                                 with Transport.path_table_lock:
-                                    Transport.path_table[destination_hash] = [timestamp, received_from, hops, expires, random_blobs, receiving_interface, announce_packet.packet_hash]
+                                    Transport.set_path_entry(destination_hash, PathEntry(timestamp, received_from, hops, expires, random_blobs, receiving_interface, announce_packet.packet_hash))
                                 RNS.log("Loaded path table entry for "+RNS.prettyhexrep(destination_hash)+" from storage", RNS.LOG_PATHING) if RNS.sl(RNS.LOG_PATHING) else None
                             else:
                                 RNS.log("Could not reconstruct path table entry from storage for "+RNS.prettyhexrep(destination_hash), RNS.LOG_PATHING) if RNS.sl(RNS.LOG_PATHING) else None
@@ -355,18 +406,17 @@ class Transport:
                     else:                              specifier = "entries"
 
                     RNS.log("Loaded "+str(len(Transport.path_table))+" path table "+specifier+" from storage", RNS.LOG_VERBOSE) if RNS.sl(RNS.LOG_VERBOSE) else None
+                    with Transport.path_table_lock: Transport.path_table_dirty.clear()
                     gc.collect()
 
                 except Exception as e:
                     RNS.log("Could not load destination table from storage, the contained exception was: "+str(e), RNS.LOG_ERROR)
                     gc.collect()
 
-            if os.path.isfile(tunnel_table_path) and not Transport.owner.is_connected_to_shared_instance:
+            if Transport.tunnels_journal.exists() and not Transport.owner.is_connected_to_shared_instance:
                 serialised_tunnels = []
                 try:
-                    file = open(tunnel_table_path, "rb")
-                    serialised_tunnels = umsgpack.unpackb(file.read())
-                    file.close()
+                    serialised_tunnels = Transport.tunnels_journal.load()
 
                     for serialised_tunnel in serialised_tunnels:
                         tunnel_id = serialised_tunnel[IDX_TT_TUNNEL_ID]
@@ -398,7 +448,11 @@ class Transport:
 
                         if len(tunnel_paths) > 0:
                             tunnel = [tunnel_id, None, tunnel_paths, expires]
-                            with Transport.tunnels_lock: Transport.tunnels[tunnel_id] = tunnel
+                            with Transport.tunnels_lock:
+                                Transport.tunnels[tunnel_id] = tunnel
+                                Transport.tunnels_expiry.schedule(tunnel_id, Transport.tunnel_entry_expiry(tunnel))
+                                for destination_hash in tunnel_paths:
+                                    Transport.tunnel_paths_expiry.schedule((tunnel_id, destination_hash), tunnel_paths[destination_hash][0] + Transport.TUNNEL_PATH_TIMEOUT)
 
                     if len(Transport.tunnels) == 1: specifier = "entry"
                     else:                           specifier = "entries"
@@ -437,14 +491,130 @@ class Transport:
     @staticmethod
     def add_interface(interface):
         with Transport.interfaces_lock:
-            if not interface in Transport.interfaces:
+            if not interface in Transport.active_interfaces:
                 Transport.interfaces.append(interface)
+                Transport.active_interfaces.add(interface)
 
     @staticmethod
     def remove_interface(interface):
         with Transport.interfaces_lock:
-            if interface in Transport.interfaces:
+            if interface in Transport.active_interfaces:
                 Transport.interfaces.remove(interface)
+                Transport.active_interfaces.discard(interface)
+                Transport.removed_interfaces.append(interface)
+
+        # Removed interfaces are not used again,
+        # so their egress writer can be stopped
+        if getattr(interface, "egress_queue", None) != None: interface.egress_queue.stop()
+
+    @staticmethod
+    def path_entry_expiry(path_entry):
+        attached_interface = path_entry[IDX_PT_RVCD_IF]
+        if attached_interface != None and hasattr(attached_interface, "mode") and attached_interface.mode == RNS.Interfaces.Interface.Interface.MODE_ACCESS_POINT:
+            return path_entry[IDX_PT_TIMESTAMP] + Transport.AP_PATH_TIME
+        elif attached_interface != None and hasattr(attached_interface, "mode") and attached_interface.mode == RNS.Interfaces.Interface.Interface.MODE_ROAMING:
+            return path_entry[IDX_PT_TIMESTAMP] + Transport.ROAMING_PATH_TIME
+        else:
+            return path_entry[IDX_PT_TIMESTAMP] + Transport.DESTINATION_TIMEOUT
+
+    @staticmethod
+    def reverse_entry_expiry(reverse_entry): return reverse_entry[IDX_RT_TIMESTAMP] + Transport.REVERSE_TIMEOUT
+
+    @staticmethod
+    def link_entry_expiry(link_entry):
+        if link_entry[IDX_LT_VALIDATED] == True: return link_entry[IDX_LT_TIMESTAMP] + Transport.LINK_TIMEOUT
+        else:                                    return link_entry[IDX_LT_PROOF_TMO]
+
+    @staticmethod
+    def path_request_expiry(requested_at): return requested_at + Transport.PATH_REQUEST_GATE_TIMEOUT
+
+    @staticmethod
+    def index_entry(index, key, *interfaces):
+        for interface in interfaces:
+            if interface != None:
+                if not interface in index: index[interface] = set()
+                index[interface].add(key)
+
+    @staticmethod
+    def unindex_entry(index, key, *interfaces):
+        for interface in interfaces:
+            if interface in index:
+                index[interface].discard(key)
+                if len(index[interface]) == 0: index.pop(interface)
+
+    @staticmethod
+    def requeue_removed(*interfaces):
+        # Packets received on an interface can still be processed
+        # after it was removed. Any entries they create must be
+        # picked up by the next culling, so the interface is put
+        # back on the list of removed interfaces.
+        for interface in interfaces:
+            if interface != None and not interface in Transport.active_interfaces:
+                with Transport.interfaces_lock:
+                    if not interface in Transport.active_interfaces and not interface in Transport.removed_interfaces:
+                        Transport.removed_interfaces.append(interface)
+
+    # The following table entry methods must be
+    # called with the respective table lock held
+    @staticmethod
+    def set_path_entry(destination_hash, path_entry):
+        if destination_hash in Transport.path_table: Transport.pop_path_entry(destination_hash)
+        Transport.path_table[destination_hash] = path_entry
+        Transport.path_table_dirty.add(destination_hash)
+        Transport.index_entry(Transport.path_table_interfaces, destination_hash, path_entry[IDX_PT_RVCD_IF])
+        Transport.requeue_removed(path_entry[IDX_PT_RVCD_IF])
+        Transport.path_table_expiry.schedule(destination_hash, Transport.path_entry_expiry(path_entry))
+
+    @staticmethod
+    def pop_path_entry(destination_hash):
+        path_entry = Transport.path_table.pop(destination_hash)
+        Transport.path_table_dirty.add(destination_hash)
+        Transport.unindex_entry(Transport.path_table_interfaces, destination_hash, path_entry[IDX_PT_RVCD_IF])
+        return path_entry
+
+    @staticmethod
+    def set_link_entry(link_id, link_entry):
+        if link_id in Transport.link_table: Transport.pop_link_entry(link_id)
+        Transport.link_table[link_id] = link_entry
+        Transport.index_entry(Transport.link_table_interfaces, link_id, link_entry[IDX_LT_NH_IF], link_entry[IDX_LT_RCVD_IF])
+        Transport.requeue_removed(link_entry[IDX_LT_NH_IF], link_entry[IDX_LT_RCVD_IF])
+        Transport.link_table_expiry.schedule(link_id, Transport.link_entry_expiry(link_entry))
+
+    @staticmethod
+    def pop_link_entry(link_id):
+        link_entry = Transport.link_table.pop(link_id)
+        Transport.unindex_entry(Transport.link_table_interfaces, link_id, link_entry[IDX_LT_NH_IF], link_entry[IDX_LT_RCVD_IF])
+        return link_entry
+
+    @staticmethod
+    def set_reverse_entry(truncated_packet_hash, reverse_entry):
+        if truncated_packet_hash in Transport.reverse_table: Transport.pop_reverse_entry(truncated_packet_hash)
+        Transport.reverse_table[truncated_packet_hash] = reverse_entry
+        Transport.index_entry(Transport.reverse_table_interfaces, truncated_packet_hash, reverse_entry[IDX_RT_RCVD_IF], reverse_entry[IDX_RT_OUTB_IF])
+        Transport.requeue_removed(reverse_entry[IDX_RT_RCVD_IF], reverse_entry[IDX_RT_OUTB_IF])
+        Transport.reverse_table_expiry.schedule(truncated_packet_hash, Transport.reverse_entry_expiry(reverse_entry))
+
+    @staticmethod
+    def pop_reverse_entry(truncated_packet_hash):
+        reverse_entry = Transport.reverse_table.pop(truncated_packet_hash)
+        Transport.unindex_entry(Transport.reverse_table_interfaces, truncated_packet_hash, reverse_entry[IDX_RT_RCVD_IF], reverse_entry[IDX_RT_OUTB_IF])
+        return reverse_entry
+
+    @staticmethod
+    def clear_tables():
+        Transport.path_table               = {}
+        Transport.reverse_table            = {}
+        Transport.link_table               = {}
+        Transport.path_table_interfaces    = {}
+        Transport.reverse_table_interfaces = {}
+        Transport.link_table_interfaces    = {}
+
+    @staticmethod
+    def tunnel_entry_expiry(tunnel_entry):
+        # Tunnels with an excessive expiry are culled immediately
+        expires = tunnel_entry[IDX_TT_EXPIRES]
+        if expires > time.time() + Transport.TUNNEL_TIMEOUT*2: return 0
+        else:                                                  return expires
 
     @staticmethod
     def set_network_identity(identity):
@@ -479,6 +649,25 @@ class Transport:
             Transport.blackhole_updater = RNS.Discovery.BlackholeUpdater()
             Transport.blackhole_updater.start()
 
+    @staticmethod
+    def enable_inbound_pipeline(queue_size=None, policy=None):
+        if not Transport.inbound_pipeline:
+            if queue_size == None: queue_size = InboundPipeline.QUEUE_SIZE
+            if policy == None: policy = InboundPipeline.DROP
+            Transport.inbound_pipeline = InboundPipeline(Transport.classify_inbound, Transport.process_inbound, queue_size=queue_size, policy=policy)
+            Transport.inbound_pipeline.start()
+
+    @staticmethod
+    def inbound_pipeline_stats():
+        if Transport.inbound_pipeline == None: return None
+        else: return Transport.inbound_pipeline.stats()
+
+    @staticmethod
+    def enable_announce_verifier(workers, use_processes=False):
+        if not Transport.announce_verifier:
+            Transport.announce_verifier = AnnounceVerifier(workers, use_processes=use_processes, callback=Transport.inbound_packet)
+            Transport.announce_verifier.start()
+
     @staticmethod
     def count_traffic_loop():
         while True:
@@ -532,7 +721,7 @@ class Transport:
                 if time.time() > Transport.links_last_checked+Transport.links_check_interval:
 
                     with Transport.pending_links_lock:
-                        for link in Transport.pending_links:
+                        for link in Transport.pending_links.copy():
                             if link.status == RNS.Link.CLOSED:
                                 # If we are not a Transport Instance, finding a pending link
                                 # that was never activated will trigger an expiry of the path
@@ -556,33 +745,43 @@ class Transport:
                                                 path_requests[link.destination.hash] = blocked_if
 
                                 Transport.pending_links.remove(link)
+                                Transport.unmap_link(Transport.pending_links_map, link)
 
                     with Transport.active_links_lock:
                         closed_links = []
                         for link in Transport.active_links:
                             if link.status == RNS.Link.CLOSED: closed_links.append(link)
 
-                        for closed_link in closed_links: Transport.active_links.remove(closed_link)
+                        for closed_link in closed_links:
+                            Transport.active_links.remove(closed_link)
+                            Transport.unmap_link(Transport.active_links_map, closed_link)
 
                     Transport.links_last_checked = time.time()
 
                 # Process receipts list for timed-out packets
                 if time.time() > Transport.receipts_last_checked+Transport.receipts_check_interval:
                     with Transport.receipts_lock:
-                        while len(Transport.receipts) > Transport.MAX_RECEIPTS:
-                            culled_receipt = Transport.receipts.pop(0)
+                        while Transport.receipt_count > Transport.MAX_RECEIPTS:
+                            culled_receipt = Transport.receipts[next(iter(Transport.receipts))][0]
                             culled_receipt.timeout = -1
                             culled_receipt.check_timeout()
+                            Transport.remove_receipt(culled_receipt)
                             should_collect = True
 
                     with Transport.receipts_lock:
-                        expired_receipts = []
-                        for receipt in Transport.receipts:
-                            receipt.check_timeout()
-                            if receipt.status != RNS.PacketReceipt.SENT: expired_receipts.append(receipt)
-
-                        for expired_receipt in expired_receipts:
-                            if expired_receipt in Transport.receipts: Transport.receipts.remove(expired_receipt)
+                        # Only receipts whose deadline has actually passed
+                        # are visited here. Entries for receipts that have
+                        # already concluded are simply discarded, and if a
+                        # timeout was extended without rescheduling, the
+                        # receipt is put back on the heap.
+                        now = time.time()
+                        while len(Transport.receipt_timeouts) > 0 and Transport.receipt_timeouts[0][0] <= now:
+                            with Transport.receipt_timeouts_lock: deadline, sequence, receipt = heapq.heappop(Transport.receipt_timeouts)
+                            if receipt.status == RNS.PacketReceipt.SENT:
+                                if receipt.is_timed_out(): receipt.check_timeout()
+                                else: Transport.schedule_receipt(receipt)
+
+                            if receipt.status != RNS.PacketReceipt.SENT: Transport.remove_receipt(receipt)
 
                     Transport.receipts_last_checked = time.time()
 
@@ -652,17 +851,12 @@ class Transport:
                     Transport.announces_last_checked = time.time()
 
 
-                # Cull the packet hashlist if it has reached its max size
-                if len(Transport.packet_hashlist) > Transport.hashlist_maxsize//2:
-                    Transport.packet_hashlist_prev = Transport.packet_hashlist
-                    Transport.packet_hashlist = set()
-
                 # Cull invalidated path requests
                 if time.time() > Transport.pending_prs_last_checked+Transport.pending_prs_check_interval:
                     stale_local_prs = []
                     with Transport.pending_local_prs_lock:
                         for destination_hash in Transport.pending_local_path_requests:
-                            if not Transport.pending_local_path_requests[destination_hash] in Transport.interfaces:
+                            if not Transport.pending_local_path_requests[destination_hash] in Transport.active_interfaces:
                                 stale_local_prs.append(destination_hash)
                         
                         for destination_hash in stale_local_prs:
@@ -670,11 +864,6 @@ class Transport:
 
                     Transport.pending_prs_last_checked = time.time()
 
-                # Cull the path request tags list if it has reached its max size
-                if len(Transport.discovery_pr_tags) > Transport.max_pr_tags:
-                    with Transport.discovery_pr_tags_lock:
-                        Transport.discovery_pr_tags = Transport.discovery_pr_tags[len(Transport.discovery_pr_tags)-Transport.max_pr_tags:len(Transport.discovery_pr_tags)-1]
-
                 if time.time() > Transport.tables_last_culled + Transport.tables_cull_interval:
                     # Remove unneeded path state entries
                     stale_path_states = []
@@ -684,192 +873,194 @@ class Transport:
                                 stale_path_states.append(destination_hash)
 
                     # Cull the reverse table according to timeout
-                    stale_reverse_entries = []
+                    now = time.time()
                     with Transport.reverse_table_lock:
-                        for truncated_packet_hash in Transport.reverse_table:
-                            reverse_entry = Transport.reverse_table[truncated_packet_hash]
-                            if time.time() > reverse_entry[IDX_RT_TIMESTAMP] + Transport.REVERSE_TIMEOUT: stale_reverse_entries.append(truncated_packet_hash)
-                            elif not reverse_entry[IDX_RT_OUTB_IF] in Transport.interfaces:               stale_reverse_entries.append(truncated_packet_hash)
-                            elif not reverse_entry[IDX_RT_RCVD_IF] in Transport.interfaces:               stale_reverse_entries.append(truncated_packet_hash)
+                        stale_reverse_entries = Transport.reverse_table_expiry.expired(now, Transport.reverse_table, Transport.reverse_entry_expiry)
 
                     # Cull the link table according to timeout
                     stale_links = []
                     with Transport.link_table_lock:
-                        for link_id in Transport.link_table:
+                        for link_id in Transport.link_table_expiry.expired(now, Transport.link_table, Transport.link_entry_expiry):
                             link_entry = Transport.link_table[link_id]
-
-                            if link_entry[IDX_LT_VALIDATED] == True:
-                                if time.time() > link_entry[IDX_LT_TIMESTAMP] + Transport.LINK_TIMEOUT: stale_links.append(link_id)
-                                elif not link_entry[IDX_LT_NH_IF] in Transport.interfaces:              stale_links.append(link_id)
-                                elif not link_entry[IDX_LT_RCVD_IF] in Transport.interfaces:            stale_links.append(link_id)
-                            
-                            else:
-                                if time.time() > link_entry[IDX_LT_PROOF_TMO]:
-                                    stale_links.append(link_id)
-
-                                    last_path_request = 0
+                            stale_links.append(link_id)
+
+                            if link_entry[IDX_LT_VALIDATED] != True:
+                                last_path_request = 0
+                                with Transport.path_requests_lock:
+                                    if link_entry[IDX_LT_DSTHASH] in Transport.path_requests:
+                                        last_path_request = Transport.path_requests[link_entry[IDX_LT_DSTHASH]]
+
+                                lr_taken_hops = link_entry[IDX_LT_HOPS]
+
+                                path_request_throttle = time.time() - last_path_request < Transport.PATH_REQUEST_MI
+                                path_request_conditions = False
+
+                                # If the path has been invalidated between the time of
+                                # making the link request and now, try to rediscover it
+                                if not Transport.has_path(link_entry[IDX_LT_DSTHASH]):
+                                    RNS.log("Trying to rediscover path for "+RNS.prettyhexrep(link_entry[IDX_LT_DSTHASH])+" since an attempted link was never established, and path is now missing", RNS.LOG_PATHING) if RNS.sl(RNS.LOG_PATHING) else None
+                                    path_request_conditions = True
+
+                                # If this link request was originated from a local client
+                                # attempt to rediscover a path to the destination, if this
+                                # has not already happened recently.
+                                elif not path_request_throttle and lr_taken_hops == 0:
+                                    RNS.log("Trying to rediscover path for "+RNS.prettyhexrep(link_entry[IDX_LT_DSTHASH])+" since an attempted local client link was never established", RNS.LOG_PATHING) if RNS.sl(RNS.LOG_PATHING) else None
+                                    path_request_conditions = True
+
+                                # If the link destination was previously only 1 hop
+                                # away, this likely means that it was local to one
+                                # of our interfaces, and that it roamed somewhere else.
+                                # In that case, try to discover a new path, and mark
+                                # the old one as unresponsive.
+                                elif not path_request_throttle and Transport.hops_to(link_entry[IDX_LT_DSTHASH]) == 1:
+                                    RNS.log("Trying to rediscover path for "+RNS.prettyhexrep(link_entry[IDX_LT_DSTHASH])+" since an attempted link was never established, and destination was previously local to an interface on this instance", RNS.LOG_PATHING) if RNS.sl(RNS.LOG_PATHING) else None
+                                    path_request_conditions = True
+                                    blocked_if = link_entry[IDX_LT_RCVD_IF]
+
+                                    # TODO: This might result in the path re-resolution
+                                    # only being able to happen once, since new path found
+                                    # after allowing update from higher hop-count path, after
+                                    # marking old path unresponsive, might be more than 1 hop away,
+                                    # thus dealocking us into waiting for a new announce all-together.
+                                    # Is this problematic, or does it actually not matter?
+                                    # Best would be to have full support for alternative paths,
+                                    # and score them according to number of unsuccessful tries or
+                                    # similar.
+                                    if RNS.Reticulum.transport_enabled():
+                                        if hasattr(link_entry[IDX_LT_RCVD_IF], "mode") and link_entry[IDX_LT_RCVD_IF].mode != RNS.Interfaces.Interface.Interface.MODE_BOUNDARY:
+                                            Transport.mark_path_unresponsive(link_entry[IDX_LT_DSTHASH])
+
+                                # If the link initiator is only 1 hop away,
+                                # this likely means that network topology has
+                                # changed. In that case, we try to discover a new path,
+                                # and mark the old one as potentially unresponsive.
+                                elif not path_request_throttle and lr_taken_hops == 1:
+                                    RNS.log("Trying to rediscover path for "+RNS.prettyhexrep(link_entry[IDX_LT_DSTHASH])+" since an attempted link was never established, and link initiator is local to an interface on this instance", RNS.LOG_PATHING) if RNS.sl(RNS.LOG_PATHING) else None
+                                    path_request_conditions = True
+                                    blocked_if = link_entry[IDX_LT_RCVD_IF]
+
+                                    if RNS.Reticulum.transport_enabled():
+                                        if hasattr(link_entry[IDX_LT_RCVD_IF], "mode") and link_entry[IDX_LT_RCVD_IF].mode != RNS.Interfaces.Interface.Interface.MODE_BOUNDARY:
+                                            Transport.mark_path_unresponsive(link_entry[IDX_LT_DSTHASH])
+
+                                if path_request_conditions:
                                     with Transport.path_requests_lock:
-                                        if link_entry[IDX_LT_DSTHASH] in Transport.path_requests:
-                                            last_path_request = Transport.path_requests[link_entry[IDX_LT_DSTHASH]]
-
-                                    lr_taken_hops = link_entry[IDX_LT_HOPS]
-
-                                    path_request_throttle = time.time() - last_path_request < Transport.PATH_REQUEST_MI
-                                    path_request_conditions = False
-                                    
-                                    # If the path has been invalidated between the time of
-                                    # making the link request and now, try to rediscover it
-                                    if not Transport.has_path(link_entry[IDX_LT_DSTHASH]):
-                                        RNS.log("Trying to rediscover path for "+RNS.prettyhexrep(link_entry[IDX_LT_DSTHASH])+" since an attempted link was never established, and path is now missing", RNS.LOG_PATHING) if RNS.sl(RNS.LOG_PATHING) else None
-                                        path_request_conditions = True
-
-                                    # If this link request was originated from a local client
-                                    # attempt to rediscover a path to the destination, if this
-                                    # has not already happened recently.
-                                    elif not path_request_throttle and lr_taken_hops == 0:
-                                        RNS.log("Trying to rediscover path for "+RNS.prettyhexrep(link_entry[IDX_LT_DSTHASH])+" since an attempted local client link was never established", RNS.LOG_PATHING) if RNS.sl(RNS.LOG_PATHING) else None
-                                        path_request_conditions = True
-
-                                    # If the link destination was previously only 1 hop
-                                    # away, this likely means that it was local to one
-                                    # of our interfaces, and that it roamed somewhere else.
-                                    # In that case, try to discover a new path, and mark
-                                    # the old one as unresponsive.
-                                    elif not path_request_throttle and Transport.hops_to(link_entry[IDX_LT_DSTHASH]) == 1:
-                                        RNS.log("Trying to rediscover path for "+RNS.prettyhexrep(link_entry[IDX_LT_DSTHASH])+" since an attempted link was never established, and destination was previously local to an interface on this instance", RNS.LOG_PATHING) if RNS.sl(RNS.LOG_PATHING) else None
-                                        path_request_conditions = True
-                                        blocked_if = link_entry[IDX_LT_RCVD_IF]
-
-                                        # TODO: This might result in the path re-resolution
-                                        # only being able to happen once, since new path found
-                                        # after allowing update from higher hop-count path, after
-                                        # marking old path unresponsive, might be more than 1 hop away,
-                                        # thus dealocking us into waiting for a new announce all-together.
-                                        # Is this problematic, or does it actually not matter?
-                                        # Best would be to have full support for alternative paths,
-                                        # and score them according to number of unsuccessful tries or
-                                        # similar.
-                                        if RNS.Reticulum.transport_enabled():
-                                            if hasattr(link_entry[IDX_LT_RCVD_IF], "mode") and link_entry[IDX_LT_RCVD_IF].mode != RNS.Interfaces.Interface.Interface.MODE_BOUNDARY:
-                                                Transport.mark_path_unresponsive(link_entry[IDX_LT_DSTHASH])
-
-                                    # If the link initiator is only 1 hop away,
-                                    # this likely means that network topology has
-                                    # changed. In that case, we try to discover a new path,
-                                    # and mark the old one as potentially unresponsive.
-                                    elif not path_request_throttle and lr_taken_hops == 1:
-                                        RNS.log("Trying to rediscover path for "+RNS.prettyhexrep(link_entry[IDX_LT_DSTHASH])+" since an attempted link was never established, and link initiator is local to an interface on this instance", RNS.LOG_PATHING) if RNS.sl(RNS.LOG_PATHING) else None
-                                        path_request_conditions = True
-                                        blocked_if = link_entry[IDX_LT_RCVD_IF]
-
-                                        if RNS.Reticulum.transport_enabled():
-                                            if hasattr(link_entry[IDX_LT_RCVD_IF], "mode") and link_entry[IDX_LT_RCVD_IF].mode != RNS.Interfaces.Interface.Interface.MODE_BOUNDARY:
-                                                Transport.mark_path_unresponsive(link_entry[IDX_LT_DSTHASH])
-
-                                    if path_request_conditions:
-                                        with Transport.path_requests_lock:
-                                            if not link_entry[IDX_LT_DSTHASH] in path_requests:
-                                                path_requests[link_entry[IDX_LT_DSTHASH]] = blocked_if
+                                        if not link_entry[IDX_LT_DSTHASH] in path_requests:
+                                            path_requests[link_entry[IDX_LT_DSTHASH]] = blocked_if
 
-                                        if not RNS.Reticulum.transport_enabled():
-                                            # Drop current path if we are not a transport instance, to
-                                            # allow using higher-hop count paths or reused announces
-                                            # from newly adjacent transport instances.
-                                            Transport.expire_path(link_entry[IDX_LT_DSTHASH])
+                                    if not RNS.Reticulum.transport_enabled():
+                                        # Drop current path if we are not a transport instance, to
+                                        # allow using higher-hop count paths or reused announces
+                                        # from newly adjacent transport instances.
+                                        Transport.expire_path(link_entry[IDX_LT_DSTHASH])
 
                     # Cull the path table
                     stale_paths = []
                     with Transport.path_table_lock:
-                        for destination_hash in Transport.path_table:
-                            destination_entry = Transport.path_table[destination_hash]
-                            attached_interface = destination_entry[IDX_PT_RVCD_IF]
-
-                            if attached_interface != None and hasattr(attached_interface, "mode") and attached_interface.mode == RNS.Interfaces.Interface.Interface.MODE_ACCESS_POINT:
-                                destination_expiry = destination_entry[IDX_PT_TIMESTAMP] + Transport.AP_PATH_TIME
-                            elif attached_interface != None and hasattr(attached_interface, "mode") and attached_interface.mode == RNS.Interfaces.Interface.Interface.MODE_ROAMING:
-                                destination_expiry = destination_entry[IDX_PT_TIMESTAMP] + Transport.ROAMING_PATH_TIME
-                            else:
-                                destination_expiry = destination_entry[IDX_PT_TIMESTAMP] + Transport.DESTINATION_TIMEOUT
-
-                            if time.time() > destination_expiry:
-                                stale_paths.append(destination_hash)
-                                should_collect = True
-                                RNS.log("Path to "+RNS.prettyhexrep(destination_hash)+" timed out and was removed", RNS.LOG_PATHING) if RNS.sl(RNS.LOG_PATHING) else None
-                            elif not attached_interface in Transport.interfaces:
-                                stale_paths.append(destination_hash)
-                                should_collect = True
-                                RNS.log("Path to "+RNS.prettyhexrep(destination_hash)+" was removed since the attached interface no longer exists", RNS.LOG_PATHING) if RNS.sl(RNS.LOG_PATHING) else None
+                        for destination_hash in Transport.path_table_expiry.expired(now, Transport.path_table, Transport.path_entry_expiry):
+                            stale_paths.append(destination_hash)
+                            should_collect = True
+                            RNS.log("Path to "+RNS.prettyhexrep(destination_hash)+" timed out and was removed", RNS.LOG_PATHING) if RNS.sl(RNS.LOG_PATHING) else None
 
                     # Cull the pending path requests table
                     stale_path_requests = []
                     with Transport.path_requests_lock:
-                        try:
-                            for destination_hash in Transport.path_requests:
-                                if time.time() > Transport.path_requests[destination_hash] + Transport.PATH_REQUEST_GATE_TIMEOUT:
-                                    stale_path_requests.append(destination_hash)
-                                    RNS.log("Path request entry for "+RNS.prettyhexrep(destination_hash)+" timed out and was removed", RNS.LOG_EXTREME) if RNS.sl(RNS.LOG_EXTREME) else None
-
-                        except Exception as e:
-                            RNS.log(f"Could not complete stale path request enumeration in this job round, retrying later: {e}", RNS.LOG_WARNING)
+                        for destination_hash in Transport.path_requests_expiry.expired(now, Transport.path_requests, Transport.path_request_expiry):
+                            stale_path_requests.append(destination_hash)
+                            RNS.log("Path request entry for "+RNS.prettyhexrep(destination_hash)+" timed out and was removed", RNS.LOG_EXTREME) if RNS.sl(RNS.LOG_EXTREME) else None
 
                     # Cull the pending discovery path requests table
                     stale_discovery_path_requests = []
                     with Transport.discovery_pr_lock:
-                        for destination_hash in Transport.discovery_path_requests:
-                            entry = Transport.discovery_path_requests[destination_hash]
-
-                            if time.time() > entry["timeout"]:
-                                stale_discovery_path_requests.append(destination_hash)
-                                should_collect = True
-                                RNS.log("Waiting path request for "+RNS.prettyhexrep(destination_hash)+" timed out and was removed", RNS.LOG_EXTREME) if RNS.sl(RNS.LOG_EXTREME) else None
+                        for destination_hash in Transport.discovery_pr_expiry.expired(now, Transport.discovery_path_requests, lambda entry: entry["timeout"]):
+                            stale_discovery_path_requests.append(destination_hash)
+                            should_collect = True
+                            RNS.log("Waiting path request for "+RNS.prettyhexrep(destination_hash)+" timed out and was removed", RNS.LOG_EXTREME) if RNS.sl(RNS.LOG_EXTREME) else None
 
                     # Cull the tunnel table
                     stale_tunnels = []; ti = 0
                     with Transport.tunnels_lock:
-                        for tunnel_id in Transport.tunnels:
-                            tunnel_entry = Transport.tunnels[tunnel_id]
-
-                            expires = tunnel_entry[IDX_TT_EXPIRES]
-                            if expires > time.time() + Transport.TUNNEL_TIMEOUT*2:
-                                stale_tunnels.append(tunnel_id); should_collect = True
+                        for tunnel_id in Transport.tunnels_expiry.expired(now, Transport.tunnels, Transport.tunnel_entry_expiry):
+                            stale_tunnels.append(tunnel_id); should_collect = True
+                            if Transport.tunnels[tunnel_id][IDX_TT_EXPIRES] > now + Transport.TUNNEL_TIMEOUT*2:
                                 RNS.log("Tunnel "+RNS.prettyhexrep(tunnel_id)+" with excessive expiry was removed", RNS.LOG_EXTREME) if RNS.sl(RNS.LOG_EXTREME) else None
-
-                            elif time.time() > expires:
-                                stale_tunnels.append(tunnel_id); should_collect = True
-                                RNS.log("Tunnel "+RNS.prettyhexrep(tunnel_id)+" timed out and was removed", RNS.LOG_EXTREME) if RNS.sl(RNS.LOG_EXTREME) else None
-                            
                             else:
-                                if tunnel_entry[IDX_TT_IF] and not tunnel_entry[IDX_TT_IF] in Transport.interfaces:
-                                    RNS.log(f"Removing non-existent tunnel interface {tunnel_entry[IDX_TT_IF]}", RNS.LOG_EXTREME) if RNS.sl(RNS.LOG_EXTREME) else None
-                                    tunnel_entry[IDX_TT_IF] = None
-
-                                stale_tunnel_paths = []
-                                tunnel_paths = tunnel_entry[IDX_TT_PATHS]
-                                for tunnel_path in tunnel_paths:
-                                    tunnel_path_entry = tunnel_paths[tunnel_path]
+                                RNS.log("Tunnel "+RNS.prettyhexrep(tunnel_id)+" timed out and was removed", RNS.LOG_EXTREME) if RNS.sl(RNS.LOG_EXTREME) else None
 
-                                    if time.time() > tunnel_path_entry[0] + Transport.TUNNEL_PATH_TIMEOUT:
-                                        stale_tunnel_paths.append(tunnel_path); should_collect = True
-                                        RNS.log("Tunnel path to "+RNS.prettyhexrep(tunnel_path)+" timed out and was removed", RNS.LOG_EXTREME) if RNS.sl(RNS.LOG_EXTREME) else None
+                        # Tunnel paths are indexed by tunnel ID and
+                        # destination hash. Paths superseded by a more
+                        # recent active path are removed when they come
+                        # due, since restoring a tunnel re-checks this.
+                        for tunnel_id, tunnel_path in Transport.tunnel_paths_expiry.pop_due(now):
+                            if not tunnel_id in Transport.tunnels or tunnel_id in stale_tunnels: continue
+                            tunnel_paths = Transport.tunnels[tunnel_id][IDX_TT_PATHS]
+                            if not tunnel_path in tunnel_paths: continue
+
+                            tunnel_path_entry = tunnel_paths[tunnel_path]
+                            should_remove = False
+                            if now > tunnel_path_entry[0] + Transport.TUNNEL_PATH_TIMEOUT:
+                                should_remove = True
+                                RNS.log("Tunnel path to "+RNS.prettyhexrep(tunnel_path)+" timed out and was removed", RNS.LOG_EXTREME) if RNS.sl(RNS.LOG_EXTREME) else None
 
-                                    else:
-                                        active_path = None
-                                        with Transport.path_table_lock:
-                                            if tunnel_path in Transport.path_table: active_path = Transport.path_table[tunnel_path]
-                                        
-                                        if active_path:
-                                            random_blobs             = tunnel_path_entry[4]
-                                            current_random_blobs     = active_path[IDX_PT_RANDBLOBS]
-                                            current_path_timebase    = Transport.timebase_from_random_blobs(current_random_blobs)
-                                            tunnel_announce_timebase = Transport.timebase_from_random_blobs(random_blobs)
-                                            
-                                            if current_path_timebase > tunnel_announce_timebase:
-                                                stale_tunnel_paths.append(tunnel_path); should_collect = True
-                                                RNS.log("Tunnel path to "+RNS.prettyhexrep(tunnel_path)+" was removed due to more recent active path", RNS.LOG_EXTREME) if RNS.sl(RNS.LOG_EXTREME) else None
-
-                                for tunnel_path in stale_tunnel_paths:
-                                    tunnel_paths.pop(tunnel_path)
-                                    ti += 1
+                            else:
+                                active_path = None
+                                with Transport.path_table_lock:
+                                    if tunnel_path in Transport.path_table: active_path = Transport.path_table[tunnel_path]
+                                
+                                if active_path:
+                                    random_blobs             = tunnel_path_entry[4]
+                                    current_random_blobs     = active_path[IDX_PT_RANDBLOBS]
+                                    current_path_timebase    = Transport.timebase_from_random_blobs(current_random_blobs)
+                                    tunnel_announce_timebase = Transport.timebase_from_random_blobs(random_blobs)
+                                    
+                                    if current_path_timebase > tunnel_announce_timebase:
+                                        should_remove = True
+                                        RNS.log("Tunnel path to "+RNS.prettyhexrep(tunnel_path)+" was removed due to more recent active path", RNS.LOG_EXTREME) if RNS.sl(RNS.LOG_EXTREME) else None
+
+                                if not should_remove: Transport.tunnel_paths_expiry.schedule((tunnel_id, tunnel_path), tunnel_path_entry[0] + Transport.TUNNEL_PATH_TIMEOUT)
+
+                            if should_remove:
+                                tunnel_paths.pop(tunnel_path); should_collect = True
+                                Transport.tunnels_dirty.add(tunnel_id)
+                                ti += 1
+
+                    # If interfaces have been removed since the last
+                    # culling, remove the entries that refer to them.
+                    with Transport.interfaces_lock:
+                        removed_interfaces = [i for i in Transport.removed_interfaces if not i in Transport.active_interfaces]
+                        Transport.removed_interfaces = []
+
+                    if len(removed_interfaces) > 0:
+                        expired_reverse_entries = set(stale_reverse_entries)
+                        expired_links = set(stale_links)
+                        expired_paths = set(stale_paths)
+                        for interface in removed_interfaces:
+                            with Transport.reverse_table_lock:
+                                for truncated_packet_hash in Transport.reverse_table_interfaces.get(interface, []):
+                                    if not truncated_packet_hash in expired_reverse_entries:
+                                        stale_reverse_entries.append(truncated_packet_hash)
+                                        expired_reverse_entries.add(truncated_packet_hash)
+
+                            with Transport.link_table_lock:
+                                for link_id in Transport.link_table_interfaces.get(interface, []):
+                                    if Transport.link_table[link_id][IDX_LT_VALIDATED] == True and not link_id in expired_links:
+                                        stale_links.append(link_id)
+                                        expired_links.add(link_id)
+
+                            with Transport.path_table_lock:
+                                for destination_hash in Transport.path_table_interfaces.get(interface, []):
+                                    if not destination_hash in expired_paths:
+                                        stale_paths.append(destination_hash)
+                                        expired_paths.add(destination_hash)
+                                        should_collect = True
+                                        RNS.log("Path to "+RNS.prettyhexrep(destination_hash)+" was removed since the attached interface no longer exists", RNS.LOG_PATHING) if RNS.sl(RNS.LOG_PATHING) else None
+
+                            if hasattr(interface, "tunnel_id") and interface.tunnel_id != None:
+                                with Transport.tunnels_lock:
+                                    if interface.tunnel_id in Transport.tunnels and Transport.tunnels[interface.tunnel_id][IDX_TT_IF] == interface:
+                                        RNS.log(f"Removing non-existent tunnel interface {interface}", RNS.LOG_EXTREME) if RNS.sl(RNS.LOG_EXTREME) else None
+                                        Transport.tunnels[interface.tunnel_id][IDX_TT_IF] = None
 
                     if ti > 0:
                         if ti == 1: RNS.log("Removed "+str(ti)+" tunnel path", RNS.LOG_EXTREME) if RNS.sl(RNS.LOG_EXTREME) else None
@@ -878,7 +1069,7 @@ class Transport:
                     i = 0
                     with Transport.reverse_table_lock:
                         for truncated_packet_hash in stale_reverse_entries:
-                            if truncated_packet_hash in Transport.reverse_table: Transport.reverse_table.pop(truncated_packet_hash)
+                            if truncated_packet_hash in Transport.reverse_table: Transport.pop_reverse_entry(truncated_packet_hash)
                             i += 1
 
                     if i > 0:
@@ -888,7 +1079,7 @@ class Transport:
                     i = 0
                     with Transport.link_table_lock:
                         for link_id in stale_links:
-                            Transport.link_table.pop(link_id)
+                            if link_id in Transport.link_table: Transport.pop_link_entry(link_id)
                             i += 1
 
                     if i > 0:
@@ -898,7 +1089,7 @@ class Transport:
                     i = 0
                     with Transport.path_table_lock:
                         for destination_hash in stale_paths:
-                            if destination_hash in Transport.path_table: Transport.path_table.pop(destination_hash)
+                            if destination_hash in Transport.path_table: Transport.pop_path_entry(destination_hash)
                             i += 1
 
                     if i > 0:
@@ -929,6 +1120,7 @@ class Transport:
                     with Transport.tunnels_lock:
                         for tunnel_id in stale_tunnels:
                             Transport.tunnels.pop(tunnel_id)
+                            Transport.tunnels_dirty.add(tunnel_id)
                             i += 1
 
                     if i > 0:
@@ -947,6 +1139,11 @@ class Transport:
 
                     Transport.tables_last_culled = time.time()
 
+                # Journal path and tunnel table changes
+                if time.time() > Transport.journal_last_flushed + Transport.journal_interval:
+                    Transport.journal_last_flushed = time.time()
+                    if Transport.owner != None and not Transport.owner.is_connected_to_shared_instance: Transport.journal_tables()
+
                 # Run interface-related jobs
                 if time.time() > Transport.interface_last_jobs + Transport.interface_jobs_interval:
                     Transport.prioritize_interfaces()
@@ -1073,38 +1270,63 @@ class Transport:
                 ifac = interface.ifac_identity.sign(raw)[-interface.ifac_size:]
 
                 # Generate mask
-                mask = RNS.Cryptography.hkdf(length=len(raw)+interface.ifac_size,
-                                             derive_from=ifac,
-                                             salt=interface.ifac_key,
-                                             context=None)
+                mask = Transport.ifac_mask(interface, ifac, len(raw)+interface.ifac_size)
+
                 # Set IFAC flag
                 new_header = bytes([raw[0] | 0x80, raw[1]])
 
                 # Assemble new payload with IFAC
                 new_raw    = new_header+ifac+raw[2:]
                 
-                # Mask payload
-                i = 0; masked_raw = b""
-                for byte in new_raw:
-                    # Mask first header byte, but make sure the
-                    # IFAC flag is still set
-                    if i == 0: masked_raw += bytes([byte ^ mask[i] | 0x80])
-                    
-                    # Mask second header byte and payload
-                    elif i == 1 or i > interface.ifac_size+1: masked_raw += bytes([byte ^ mask[i]])
-                    
-                    # Don't mask the IFAC itself
-                    else: masked_raw += bytes([byte])
-                    
-                    i += 1
+                # Mask header and payload, the IFAC itself
+                # is left as-is, since the mask is zero there.
+                masked_raw = bytearray((int.from_bytes(new_raw, "big") ^ int.from_bytes(mask, "big")).to_bytes(len(new_raw), "big"))
+
+                # Make sure the IFAC flag is still set
+                masked_raw[0] |= 0x80
+                data = bytes(masked_raw)
 
-                # Send it
-                interface.process_outgoing(masked_raw)
+            else: data = raw
 
-            else: interface.process_outgoing(raw)
+            # If the interface has an egress queue, the frame is
+            # queued according to its priority class, otherwise
+            # it is sent directly.
+            if getattr(interface, "egress_queue", None) != None: interface.enqueue_outgoing(data, Transport.egress_priority(raw))
+            else: interface.process_outgoing(data)
 
         except Exception as e: RNS.log("Error while transmitting on "+str(interface)+". The contained exception was: "+str(e), RNS.LOG_ERROR)
 
+    @staticmethod
+    def egress_priority(raw):
+        # Link requests and link control packets are sent first,
+        # then other data, and finally announces and path requests
+        packet_type = raw[0] & 0b00000011
+        if   packet_type == RNS.Packet.LINKREQUEST: return Interface.PRIORITY_CONTROL
+        elif packet_type == RNS.Packet.ANNOUNCE:    return Interface.PRIORITY_ANNOUNCE
+
+        dst_len = RNS.Reticulum.TRUNCATED_HASHLENGTH//8
+        if (raw[0] & 0b01000000) >> 6 == RNS.Packet.HEADER_2: dst_start = 2+dst_len
+        else:                                                dst_start = 2
+        if len(raw) <= dst_start+dst_len: return Interface.PRIORITY_DATA
+
+        if raw[dst_start+dst_len] in Transport.CONTROL_CONTEXTS: return Interface.PRIORITY_CONTROL
+        elif raw[dst_start:dst_start+dst_len] in Transport.control_hashes: return Interface.PRIORITY_ANNOUNCE
+        else: return Interface.PRIORITY_DATA
+
+    @staticmethod
+    def ifac_mask(interface, ifac, length):
+        # Generates the IFAC mask for a packet of the specified length.
+        # The HMAC keyed with the interface IFAC key, which is the HKDF
+        # salt, is cached on the interface. The bytes covering the IFAC
+        # itself are zeroed, so the mask can be applied to the entire
+        # packet at once.
+        if not hasattr(interface, "ifac_salt_hmac") or interface.ifac_salt_hmac[0] != interface.ifac_key:
+            interface.ifac_salt_hmac = (interface.ifac_key, RNS.Cryptography.HMAC.new(interface.ifac_key))
+
+        mask = bytearray(RNS.Cryptography.hkdf(length=length, derive_from=ifac, salt=interface.ifac_key, salt_hmac=interface.ifac_salt_hmac[1]))
+        mask[2:2+interface.ifac_size] = bytes(interface.ifac_size)
+        return mask
+
     @staticmethod
     def outbound(packet):
         sent = False
@@ -1129,7 +1351,7 @@ class Transport:
 
             if generate_receipt:
                 packet.receipt = RNS.PacketReceipt(packet)
-                with Transport.receipts_lock: Transport.receipts.append(packet.receipt)
+                Transport.register_receipt(packet.receipt)
             
             # TODO: Enable when caching has been redesigned
             # Transport.cache(packet)
@@ -1160,6 +1382,7 @@ class Transport:
                     packet_sent(packet)
                     Transport.transmit(outbound_interface, new_raw)
                     path_entry[IDX_PT_TIMESTAMP] = time.time()
+                    Transport.path_table_dirty.add(packet.destination_hash)
                     sent = True
 
             # In the special case where we are connected to a local shared
@@ -1276,7 +1499,7 @@ class Transport:
 
                                     if not hasattr(interface, "announce_cap"):        interface.announce_cap = RNS.Reticulum.ANNOUNCE_CAP
                                     if not hasattr(interface, "announce_allowed_at"): interface.announce_allowed_at = 0
-                                    if not hasattr(interface, "announce_queue"):      interface.announce_queue = []
+                                    if not hasattr(interface, "announce_queue"):      interface.announce_queue = AnnounceQueue()
 
                                     queued_announces = True if len(interface.announce_queue) > 0 else False
                                     if not queued_announces and outbound_time > interface.announce_allowed_at and interface.bitrate != None and interface.bitrate != 0:
@@ -1286,54 +1509,21 @@ class Transport:
                                     
                                     else:
                                         should_transmit = False
-                                        if not len(interface.announce_queue) >= RNS.Reticulum.MAX_QUEUED_ANNOUNCES:
-                                            should_queue = True
-
-                                            already_queued = False
-                                            for e in interface.announce_queue:
-                                                if e["destination"] == packet.destination_hash:
-                                                    already_queued = True
-                                                    existing_entry = e
-
+                                        existing_entry = interface.announce_queue.get(packet.destination_hash)
+                                        if existing_entry != None or not len(interface.announce_queue) >= RNS.Reticulum.MAX_QUEUED_ANNOUNCES:
                                             emission_timestamp = Transport.announce_emitted(packet)
-                                            if already_queued:
-                                                should_queue = False
-
-                                                if emission_timestamp > existing_entry["emitted"]:
-                                                    e["time"] = outbound_time
-                                                    e["hops"] = packet.hops
-                                                    e["emitted"] = emission_timestamp
-                                                    e["raw"] = packet.raw
-
-                                            if should_queue:
-                                                entry = { "destination": packet.destination_hash,
-                                                          "time": outbound_time,
-                                                          "hops": packet.hops,
-                                                          "emitted": Transport.announce_emitted(packet),
-                                                          "raw": packet.raw }
+                                            if existing_entry == None or emission_timestamp > existing_entry.emitted:
+                                                interface.announce_queue.put(QueuedAnnounce(packet.destination_hash, outbound_time, packet.hops, emission_timestamp, packet.raw))
 
-                                                queued_announces = True if len(interface.announce_queue) > 0 else False
-                                                interface.announce_queue.append(entry)
+                                            if existing_entry == None:
+                                                wait_time = max(interface.announce_allowed_at - time.time(), 0)
+                                                if not queued_announces: AnnounceScheduler.schedule(interface, interface.announce_allowed_at)
 
-                                                if not queued_announces:
-                                                    wait_time = max(interface.announce_allowed_at - time.time(), 0)
-                                                    timer = threading.Timer(wait_time, interface.process_announce_queue)
-                                                    timer.start()
+                                                if wait_time < 1: wait_time_str = str(round(wait_time*1000,2))+"ms"
+                                                else:             wait_time_str = str(round(wait_time*1,2))+"s"
 
-                                                    if wait_time < 1: wait_time_str = str(round(wait_time*1000,2))+"ms"
-                                                    else:             wait_time_str = str(round(wait_time*1,2))+"s"
-
-                                                    ql_str = str(len(interface.announce_queue))
-                                                    RNS.log("Added announce to queue (height "+ql_str+") on "+str(interface)+" for processing in "+wait_time_str, RNS.LOG_EXTREME) if RNS.sl(RNS.LOG_EXTREME) else None
-
-                                                else:
-                                                    wait_time = max(interface.announce_allowed_at - time.time(), 0)
-
-                                                    if wait_time < 1: wait_time_str = str(round(wait_time*1000,2))+"ms"
-                                                    else:             wait_time_str = str(round(wait_time*1,2))+"s"
-
-                                                    ql_str = str(len(interface.announce_queue))
-                                                    RNS.log("Added announce to queue (height "+ql_str+") on "+str(interface)+" for processing in "+wait_time_str, RNS.LOG_EXTREME) if RNS.sl(RNS.LOG_EXTREME) else None
+                                                ql_str = str(len(interface.announce_queue))
+                                                RNS.log("Added announce to queue (height "+ql_str+") on "+str(interface)+" for processing in "+wait_time_str, RNS.LOG_EXTREME) if RNS.sl(RNS.LOG_EXTREME) else None
 
                                         else: pass
                                 
@@ -1414,7 +1604,7 @@ class Transport:
                 RNS.log("Dropped invalid GROUP announce packet", RNS.LOG_DEBUG) if RNS.sl(RNS.LOG_DEBUG) else None
                 return False
 
-        if not packet.packet_hash in Transport.packet_hashlist and not packet.packet_hash in Transport.packet_hashlist_prev: return True
+        if not packet.packet_hash in Transport.packet_hashlist: return True
         else:
             if packet.packet_type == RNS.Packet.ANNOUNCE:
                 if packet.destination_type == RNS.Destination.SINGLE:
@@ -1436,6 +1626,18 @@ class Transport:
                     RNS.log("Inbound packet timed out waiting for transport startup, dropping", RNS.LOG_WARNING)
                     return
 
+        # If the staged inbound pipeline is enabled, frames are
+        # queued for it, and the receiving interface can return
+        # to reading immediately.
+        if Transport.inbound_pipeline != None and not Transport.inbound_pipeline.is_stage_thread():
+            Transport.inbound_pipeline.ingress(raw, interface, Transport.interface_link_stats(interface))
+            return
+
+        packet = Transport.classify_inbound(raw, interface)
+        if packet != None: Transport.process_inbound(packet, interface)
+
+    @staticmethod
+    def classify_inbound(raw, interface=None):
         # If interface access codes are enabled,
         # we must authenticate each packet.
         if len(raw) > 2:
@@ -1447,18 +1649,11 @@ class Transport:
                         ifac = raw[2:2+interface.ifac_size]
 
                         # Generate mask
-                        mask = RNS.Cryptography.hkdf(length=len(raw), derive_from=ifac,
-                                                     salt=interface.ifac_key, context=None)
-                        # Unmask payload
-                        i = 0; unmasked_raw = b""
-                        for byte in raw:
-                            # Unmask header bytes and payload
-                            if i <= 1 or i > interface.ifac_size+1: unmasked_raw += bytes([byte ^ mask[i]])
-                            # Don't unmask IFAC itself
-                            else: unmasked_raw += bytes([byte])
-                            i += 1
-                        
-                        raw = unmasked_raw
+                        mask = Transport.ifac_mask(interface, ifac, len(raw))
+
+                        # Unmask header bytes and payload, the
+                        # IFAC itself is unaffected by the mask.
+                        raw = (int.from_bytes(raw, "big") ^ int.from_bytes(mask, "big")).to_bytes(len(raw), "big")
 
                         # Unset IFAC flag
                         new_header = bytes([raw[0] & 0x7f, raw[1]])
@@ -1491,31 +1686,55 @@ class Transport:
             
         packet = RNS.Packet(None, raw)
         if not packet.unpack(): return
-            
+        else: return packet
+
+    @staticmethod
+    def process_inbound(packet, interface=None, link_stats=None):
+        # If parallel announce verification is enabled, announces
+        # are handed to the verification stage, which will resume
+        # processing of them once their signatures are checked.
+        # Announces the packet filter would drop are not queued.
+        if packet.packet_type == RNS.Packet.ANNOUNCE and Transport.announce_verifier != None:
+            if Transport.packet_filter(packet): Transport.announce_verifier.enqueue(packet, interface, link_stats)
+        else: Transport.inbound_packet(packet, interface, link_stats=link_stats)
+
+    @staticmethod
+    def interface_link_stats(interface):
+        # Returns the signal statistics reported by the interface
+        # for the most recently received frame, if it has any
+        rssi = snr = q = None
+        if interface != None:
+            if hasattr(interface, "r_stat_rssi"): rssi = interface.r_stat_rssi
+            if hasattr(interface, "r_stat_snr") and rssi != None: snr = interface.r_stat_snr
+            if hasattr(interface, "r_stat_q"): q = interface.r_stat_q
+
+        return rssi, snr, q
+
+    @staticmethod
+    def inbound_packet(packet, interface=None, link_stats=None):
         packet.receiving_interface = interface
         packet.hops += 1
 
         if interface != None:
-            if hasattr(interface, "r_stat_rssi"):
-                if interface.r_stat_rssi != None:
-                    packet.rssi = interface.r_stat_rssi
-                    Transport.local_client_rssi_cache.append([packet.packet_hash, packet.rssi])
-                    while len(Transport.local_client_rssi_cache) > Transport.LOCAL_CLIENT_CACHE_MAXSIZE:
-                        Transport.local_client_rssi_cache.pop(0)
-
-            if hasattr(interface, "r_stat_snr"):
-                if interface.r_stat_rssi != None:
-                    packet.snr = interface.r_stat_snr
-                    Transport.local_client_snr_cache.append([packet.packet_hash, packet.snr])
-                    while len(Transport.local_client_snr_cache) > Transport.LOCAL_CLIENT_CACHE_MAXSIZE:
-                        Transport.local_client_snr_cache.pop(0)
-
-            if hasattr(interface, "r_stat_q"):
-                if interface.r_stat_q != None:
-                    packet.q = interface.r_stat_q
-                    Transport.local_client_q_cache.append([packet.packet_hash, packet.q])
-                    while len(Transport.local_client_q_cache) > Transport.LOCAL_CLIENT_CACHE_MAXSIZE:
-                        Transport.local_client_q_cache.pop(0)
+            if link_stats == None: link_stats = Transport.interface_link_stats(interface)
+            rssi, snr, q = link_stats
+            if rssi != None:
+                packet.rssi = rssi
+                Transport.local_client_rssi_cache.append([packet.packet_hash, packet.rssi])
+                while len(Transport.local_client_rssi_cache) > Transport.LOCAL_CLIENT_CACHE_MAXSIZE:
+                    Transport.local_client_rssi_cache.pop(0)
+
+            if rssi != None and hasattr(interface, "r_stat_snr"):
+                packet.snr = snr
+                Transport.local_client_snr_cache.append([packet.packet_hash, packet.snr])
+                while len(Transport.local_client_snr_cache) > Transport.LOCAL_CLIENT_CACHE_MAXSIZE:
+                    Transport.local_client_snr_cache.pop(0)
+
+            if q != None:
+                packet.q = q
+                Transport.local_client_q_cache.append([packet.packet_hash, packet.q])
+                while len(Transport.local_client_q_cache) > Transport.LOCAL_CLIENT_CACHE_MAXSIZE:
+                    Transport.local_client_q_cache.pop(0)
 
         if len(Transport.local_client_interfaces) > 0:
             if Transport.is_local_client_interface(interface): packet.hops -= 1
@@ -1678,7 +1897,7 @@ class Transport:
                                                 False,                          # 7: Validated
                                                 proof_timeout ]                 # 8: Proof timeout timestamp
 
-                                with Transport.link_table_lock: Transport.link_table[RNS.Link.link_id_from_lr_packet(packet)] = link_entry
+                                with Transport.link_table_lock: Transport.set_link_entry(RNS.Link.link_id_from_lr_packet(packet), link_entry)
                                 link_request_handled = True
 
                             else:
@@ -1687,11 +1906,13 @@ class Transport:
                                                   outbound_interface,           # 1: Outbound interface
                                                   time.time() ]                 # 2: Timestamp
 
-                                with Transport.reverse_table_lock: Transport.reverse_table[packet.getTruncatedHash()] = reverse_entry
+                                with Transport.reverse_table_lock: Transport.set_reverse_entry(packet.getTruncatedHash(), reverse_entry)
 
                             if Transport.local_hops_delta != 0 and from_local_client and not to_local_client: new_raw = Transport.mangle_hops(new_raw, Transport.local_hops_delta)
                             Transport.transmit(outbound_interface, new_raw)
-                            with Transport.path_table_lock: Transport.path_table[packet.destination_hash][IDX_PT_TIMESTAMP] = time.time()
+                            with Transport.path_table_lock:
+                                Transport.path_table[packet.destination_hash][IDX_PT_TIMESTAMP] = time.time()
+                                Transport.path_table_dirty.add(packet.destination_hash)
 
                         else:
                             # TODO: There should probably be some kind of REJECT
@@ -2048,8 +2269,8 @@ class Transport:
                                     new_announce.send()
 
                                 if not Transport.owner.is_connected_to_shared_instance: Transport.cache(packet, force_cache=True, packet_type="announce")
-                                path_table_entry = [now, received_from, announce_hops, expires, random_blobs, packet.receiving_interface, packet.packet_hash]
-                                with Transport.path_table_lock: Transport.path_table[packet.destination_hash] = path_table_entry
+                                path_table_entry = PathEntry(now, received_from, announce_hops, expires, random_blobs, packet.receiving_interface, packet.packet_hash)
+                                with Transport.path_table_lock: Transport.set_path_entry(packet.destination_hash, path_table_entry)
                                 Transport.mark_path_unknown_state(packet.destination_hash)
                                 RNS.log("Destination "+RNS.prettyhexrep(packet.destination_hash)+" is now "+str(announce_hops)+" hops away via "+RNS.prettyhexrep(received_from)+" on "+str(packet.receiving_interface), RNS.LOG_PATHING) if RNS.sl(RNS.LOG_PATHING) else None
                                 if packet.destination_hash in Transport.path_requests:
@@ -2064,65 +2285,30 @@ class Transport:
                                             tunnel_entry = Transport.tunnels[packet.receiving_interface.tunnel_id]
                                             paths = tunnel_entry[IDX_TT_PATHS]
                                             paths[packet.destination_hash] = [now, received_from, announce_hops, expires, random_blobs, None, packet.packet_hash]
+                                            Transport.tunnel_paths_expiry.schedule((packet.receiving_interface.tunnel_id, packet.destination_hash), now + Transport.TUNNEL_PATH_TIMEOUT)
                                             expires = time.time() + Transport.TUNNEL_TIMEOUT
                                             tunnel_entry[IDX_TT_EXPIRES] = expires
+                                            Transport.tunnels_dirty.add(packet.receiving_interface.tunnel_id)
                                             RNS.log("Path to "+RNS.prettyhexrep(packet.destination_hash)+" associated with tunnel "+RNS.prettyhexrep(packet.receiving_interface.tunnel_id), RNS.LOG_PATHING) if RNS.sl(RNS.LOG_PATHING) else None
 
                                 # Call externally registered callbacks from apps
                                 # wanting to know when an announce arrives
-                                with Transport.announce_handler_lock:
-                                    for handler in Transport.announce_handlers:
-                                        try:
-                                            # Check that the announced destination matches
-                                            # the handlers aspect filter
-                                            execute_callback = False
-                                            announce_identity = RNS.Identity.recall(packet.destination_hash, _no_use=True)
-
-                                            # If the handlers aspect filter is set to
-                                            # None, we execute the callback in all cases
-                                            if handler.aspect_filter == None: execute_callback = True
-                                            else:
-                                                handler_expected_hash = RNS.Destination.hash_from_name_and_identity(handler.aspect_filter, announce_identity)
-                                                if packet.destination_hash == handler_expected_hash: execute_callback = True
-
-                                            # If this is a path response, check whether the
-                                            # handler wants to receive it.
-                                            if packet.context == RNS.Packet.PATH_RESPONSE:
-                                                if hasattr(handler, "receive_path_responses") and handler.receive_path_responses == True: pass
-                                                else: execute_callback = False
-
-                                            if execute_callback:
-                                                if len(inspect.signature(handler.received_announce).parameters) == 3:
-                                                    def job(handler=handler, packet=packet, announce_identity=announce_identity):
-                                                        handler.received_announce(destination_hash=packet.destination_hash,
-                                                                                  announced_identity=announce_identity,
-                                                                                  app_data=RNS.Identity.recall_app_data(packet.destination_hash, _no_use=True))
-                                                    threading.Thread(target=job, daemon=True).start()
-                                                
-                                                elif len(inspect.signature(handler.received_announce).parameters) == 4:
-                                                    def job(handler=handler, packet=packet, announce_identity=announce_identity):
-                                                        handler.received_announce(destination_hash=packet.destination_hash,
-                                                                                  announced_identity=announce_identity,
-                                                                                  app_data=RNS.Identity.recall_app_data(packet.destination_hash, _no_use=True),
-                                                                                  announce_packet_hash = packet.packet_hash)
-                                                    threading.Thread(target=job, daemon=True).start()
-                                                
-                                                elif len(inspect.signature(handler.received_announce).parameters) == 5:
-                                                    def job(handler=handler, packet=packet, announce_identity=announce_identity):
-                                                        handler.received_announce(destination_hash=packet.destination_hash,
-                                                                                  announced_identity=announce_identity,
-                                                                                  app_data=RNS.Identity.recall_app_data(packet.destination_hash, _no_use=True),
-                                                                                  announce_packet_hash = packet.packet_hash,
-                                                                                  is_path_response = packet.context == RNS.Packet.PATH_RESPONSE)
-                                                    threading.Thread(target=job, daemon=True).start()
-
-                                                else:
-                                                    raise TypeError("Invalid signature for announce handler callback")
+                                handlers = Transport.matching_announce_handlers(packet)
+                                if len(handlers) > 0:
+                                    try:
+                                        announce_identity = RNS.Identity.recall(packet.destination_hash, _no_use=True)
+                                        app_data = RNS.Identity.recall_app_data(packet.destination_hash, _no_use=True)
+                                        is_path_response = packet.context == RNS.Packet.PATH_RESPONSE
+                                        for handler, arity in handlers:
+                                            callback_args = {"destination_hash": packet.destination_hash, "announced_identity": announce_identity, "app_data": app_data}
+                                            if arity >= 4: callback_args["announce_packet_hash"] = packet.packet_hash
+                                            if arity == 5: callback_args["is_path_response"] = is_path_response
+                                            Transport.announce_dispatcher.dispatch(handler, callback_args)
 
-                                        except Exception as e:
-                                            RNS.log("Error while processing external announce callback.", RNS.LOG_ERROR)
-                                            RNS.log("The contained exception was: "+str(e), RNS.LOG_ERROR)
-                                            RNS.trace_exception(e)
+                                    except Exception as e:
+                                        RNS.log("Error while processing external announce callback.", RNS.LOG_ERROR)
+                                        RNS.log("The contained exception was: "+str(e), RNS.LOG_ERROR)
+                                        RNS.trace_exception(e)
 
             # Handling for link requests to local destinations
             elif packet.packet_type == RNS.Packet.LINKREQUEST and not link_request_handled:
@@ -2160,31 +2346,28 @@ class Transport:
             # Handling for local data packets
             elif packet.packet_type == RNS.Packet.DATA:
                 if packet.destination_type == RNS.Destination.LINK:
-                    with Transport.active_links_lock:
-                        for link in Transport.active_links:
-                            if link.link_id == packet.destination_hash:
-                                if link.attached_interface == packet.receiving_interface:
-                                    packet.link = link
-                                    if packet.context == RNS.Packet.CACHE_REQUEST:
-                                        cached_packet = Transport.get_cached_packet(packet.data)
-                                        if cached_packet != None:
-                                            if not cached_packet.unpack(): return
-                                            RNS.Packet(destination=link, data=cached_packet.data,
-                                                       packet_type=cached_packet.packet_type, context=cached_packet.context).send()
-                                    
-                                    else: link.receive(packet)
-                                    break
-                                
-                                else:
-                                    # In the strange and rare case that an interface
-                                    # is partly malfunctioning, and a link-associated
-                                    # packet is being received on an interface that
-                                    # has failed sending, and transport has failed over
-                                    # to another path, we remove this packet hash from
-                                    # the filter hashlist so the link can receive the
-                                    # packet when it finally arrives over another path.
-                                    while packet.packet_hash in Transport.packet_hashlist:
-                                        Transport.packet_hashlist.remove(packet.packet_hash)
+                    link = Transport.find_active_link(packet.destination_hash)
+                    if link != None:
+                        if link.attached_interface == packet.receiving_interface:
+                            packet.link = link
+                            if packet.context == RNS.Packet.CACHE_REQUEST:
+                                cached_packet = Transport.get_cached_packet(packet.data)
+                                if cached_packet != None:
+                                    if not cached_packet.unpack(): return
+                                    RNS.Packet(destination=link, data=cached_packet.data,
+                                               packet_type=cached_packet.packet_type, context=cached_packet.context).send()
+                            
+                            else: link.receive(packet)
+                        
+                        else:
+                            # In the strange and rare case that an interface
+                            # is partly malfunctioning, and a link-associated
+                            # packet is being received on an interface that
+                            # has failed sending, and transport has failed over
+                            # to another path, we remove this packet hash from
+                            # the filter hashlist so the link can receive the
+                            # packet when it finally arrives over another path.
+                            Transport.packet_hashlist.remove(packet.packet_hash)
                 else:
                     destination = None
                     with Transport.destinations_map_lock:
@@ -2271,72 +2454,66 @@ class Transport:
                         # Check if we can deliver it to a local pending link
                         pending_link = None
                         with Transport.pending_links_lock:
-                            for link in Transport.pending_links:
-                                if link.link_id == packet.destination_hash:
-                                    if packet.hops != link.expected_hops and link.status == RNS.Link.PENDING and Transport.ALLOW_LINK_PATH_REBALANCE:
-                                        RNS.log(f"Unbalanced link path ({packet.hops}/{link.expected_hops}) detected on link {link}, validating signature for re-balancing...", REBALANCE_LOGLEVEL) if RNS.sl(REBALANCE_LOGLEVEL) else None
-                                        try:
-                                            if len(packet.data) == RNS.Identity.SIGLENGTH//8+RNS.Link.ECPUBSIZE//2 or len(packet.data) == RNS.Identity.SIGLENGTH//8+RNS.Link.ECPUBSIZE//2+RNS.Link.LINK_MTU_SIZE:
-                                                packet_data = packet.data
-                                                signalling_bytes = b""
-                                                confirmed_mtu = None
-                                                mode = RNS.Link.mode_from_lp_packet(packet)
-                                                if mode != link.mode: raise TypeError(f"Invalid link mode {mode} in link request proof")
-                                                if len(packet_data) == RNS.Identity.SIGLENGTH//8+RNS.Link.ECPUBSIZE//2+RNS.Link.LINK_MTU_SIZE:
-                                                    confirmed_mtu = RNS.Link.mtu_from_lp_packet(packet)
-                                                    signalling_bytes = RNS.Link.signalling_bytes(confirmed_mtu, mode)
-                                                    packet_data = packet_data[:RNS.Identity.SIGLENGTH//8+RNS.Link.ECPUBSIZE//2]
-
-                                                peer_pub_bytes = packet_data[RNS.Identity.SIGLENGTH//8:RNS.Identity.SIGLENGTH//8+RNS.Link.ECPUBSIZE//2]
-                                                peer_sig_pub_bytes = link.destination.identity.get_public_key()[RNS.Link.ECPUBSIZE//2:RNS.Link.ECPUBSIZE]
-
-                                                signed_data = link.link_id+peer_pub_bytes+peer_sig_pub_bytes+signalling_bytes
-                                                signature = packet_data[:RNS.Identity.SIGLENGTH//8]
-
-                                                if link.destination.identity.validate(signature, signed_data):
-                                                    with Transport.path_table_lock:
-                                                        if not link.rebalanced:
-                                                            RNS.log(f"Re-balancing path to {RNS.prettyhexrep(link.destination.hash)} at link terminus ({link.expected_hops}->{packet.hops})", REBALANCE_LOGLEVEL) if RNS.sl(REBALANCE_LOGLEVEL) else None
-                                                            link.rebalanced = time.time()
-                                                            link.expected_hops = packet.hops
-                                                            if link.destination.hash in Transport.path_table:
-                                                                path_entry = Transport.path_table[link.destination.hash]
-                                                                path_entry[IDX_PT_HOPS] = packet.hops
-                                                                RNS.log(f"Path table re-balanced for {RNS.prettyhexrep(link.destination.hash)}", REBALANCE_LOGLEVEL) if RNS.sl(REBALANCE_LOGLEVEL) else None
-
-                                                else: RNS.log(f"Aborting path re-balancing at link terminus for {RNS.prettyhexrep(link.destination.hash)} on link {link} due to invalid signature", REBALANCE_LOGLEVEL) if RNS.sl(REBALANCE_LOGLEVEL) else None
-                                        except Exception as e: RNS.log("Error while validating link request proof for path re-balancing at link terminus. The contained exception was: "+str(e), REBALANCE_LOGLEVEL) if RNS.sl(REBALANCE_LOGLEVEL) else None
-
-                                    if packet.hops == link.expected_hops:
-                                        # Add this packet to the filter hashlist if we
-                                        # have determined that it's actually destined
-                                        # for this system, and then validate the proof
-                                        Transport.add_packet_hash(packet.packet_hash)
-                                        pending_link = link
-                                        break
+                            if packet.destination_hash in Transport.pending_links_map:
+                                link = Transport.pending_links_map[packet.destination_hash]
+                                if packet.hops != link.expected_hops and link.status == RNS.Link.PENDING and Transport.ALLOW_LINK_PATH_REBALANCE:
+                                    RNS.log(f"Unbalanced link path ({packet.hops}/{link.expected_hops}) detected on link {link}, validating signature for re-balancing...", REBALANCE_LOGLEVEL) if RNS.sl(REBALANCE_LOGLEVEL) else None
+                                    try:
+                                        if len(packet.data) == RNS.Identity.SIGLENGTH//8+RNS.Link.ECPUBSIZE//2 or len(packet.data) == RNS.Identity.SIGLENGTH//8+RNS.Link.ECPUBSIZE//2+RNS.Link.LINK_MTU_SIZE:
+                                            packet_data = packet.data
+                                            signalling_bytes = b""
+                                            confirmed_mtu = None
+                                            mode = RNS.Link.mode_from_lp_packet(packet)
+                                            if mode != link.mode: raise TypeError(f"Invalid link mode {mode} in link request proof")
+                                            if len(packet_data) == RNS.Identity.SIGLENGTH//8+RNS.Link.ECPUBSIZE//2+RNS.Link.LINK_MTU_SIZE:
+                                                confirmed_mtu = RNS.Link.mtu_from_lp_packet(packet)
+                                                signalling_bytes = RNS.Link.signalling_bytes(confirmed_mtu, mode)
+                                                packet_data = packet_data[:RNS.Identity.SIGLENGTH//8+RNS.Link.ECPUBSIZE//2]
+
+                                            peer_pub_bytes = packet_data[RNS.Identity.SIGLENGTH//8:RNS.Identity.SIGLENGTH//8+RNS.Link.ECPUBSIZE//2]
+                                            peer_sig_pub_bytes = link.destination.identity.get_public_key()[RNS.Link.ECPUBSIZE//2:RNS.Link.ECPUBSIZE]
+
+                                            signed_data = link.link_id+peer_pub_bytes+peer_sig_pub_bytes+signalling_bytes
+                                            signature = packet_data[:RNS.Identity.SIGLENGTH//8]
+
+                                            if link.destination.identity.validate(signature, signed_data):
+                                                with Transport.path_table_lock:
+                                                    if not link.rebalanced:
+                                                        RNS.log(f"Re-balancing path to {RNS.prettyhexrep(link.destination.hash)} at link terminus ({link.expected_hops}->{packet.hops})", REBALANCE_LOGLEVEL) if RNS.sl(REBALANCE_LOGLEVEL) else None
+                                                        link.rebalanced = time.time()
+                                                        link.expected_hops = packet.hops
+                                                        if link.destination.hash in Transport.path_table:
+                                                            path_entry = Transport.path_table[link.destination.hash]
+                                                            path_entry[IDX_PT_HOPS] = packet.hops
+                                                            RNS.log(f"Path table re-balanced for {RNS.prettyhexrep(link.destination.hash)}", REBALANCE_LOGLEVEL) if RNS.sl(REBALANCE_LOGLEVEL) else None
+
+                                            else: RNS.log(f"Aborting path re-balancing at link terminus for {RNS.prettyhexrep(link.destination.hash)} on link {link} due to invalid signature", REBALANCE_LOGLEVEL) if RNS.sl(REBALANCE_LOGLEVEL) else None
+                                    except Exception as e: RNS.log("Error while validating link request proof for path re-balancing at link terminus. The contained exception was: "+str(e), REBALANCE_LOGLEVEL) if RNS.sl(REBALANCE_LOGLEVEL) else None
+
+                                if packet.hops == link.expected_hops:
+                                    # Add this packet to the filter hashlist if we
+                                    # have determined that it's actually destined
+                                    # for this system, and then validate the proof
+                                    Transport.add_packet_hash(packet.packet_hash)
+                                    pending_link = link
 
                         if pending_link: pending_link.validate_proof(packet)
 
                 elif packet.context == RNS.Packet.RESOURCE_PRF:
-                    with Transport.active_links_lock:
-                        for link in Transport.active_links:
-                            if link.link_id == packet.destination_hash:
-                                link.receive(packet)
-                                break
+                    link = Transport.find_active_link(packet.destination_hash)
+                    if link != None: link.receive(packet)
+
                 else:
                     if packet.destination_type == RNS.Destination.LINK:
-                        with Transport.active_links_lock:
-                            for link in Transport.active_links:
-                                if link.link_id == packet.destination_hash:
-                                    packet.link = link
-                                    break
+                        link = Transport.find_active_link(packet.destination_hash)
+                        if link != None: packet.link = link
                                 
                     if len(packet.data) == RNS.PacketReceipt.EXPL_LENGTH: proof_hash = packet.data[:RNS.Identity.HASHLENGTH//8]
                     else:                                                 proof_hash = None
 
                     # Check if this proof needs to be transported
                     if (RNS.Reticulum.transport_enabled() or from_local_client or proof_for_local_client) and packet.destination_hash in Transport.reverse_table:
-                        with Transport.reverse_table_lock: reverse_entry = Transport.reverse_table.pop(packet.destination_hash)
+                        with Transport.reverse_table_lock: reverse_entry = Transport.pop_reverse_entry(packet.destination_hash)
                         if packet.receiving_interface == reverse_entry[IDX_RT_OUTB_IF]:
                             RNS.log("Proof received on correct interface, transporting it via "+str(reverse_entry[IDX_RT_RCVD_IF]), RNS.LOG_EXTREME) if RNS.sl(RNS.LOG_EXTREME) else None
                             new_raw = packet.raw[0:1]
@@ -2347,20 +2524,16 @@ class Transport:
                             RNS.log("Proof received on wrong interface, not transporting it.", RNS.LOG_DEBUG) if RNS.sl(RNS.LOG_DEBUG) else None
 
                     with Transport.receipts_lock:
-                        for receipt in Transport.receipts:
-                            receipt_validated = False
-                            if proof_hash != None:
-                                # Only test validation if hash matches
-                                if receipt.hash == proof_hash:
-                                    receipt_validated = receipt.validate_proof_packet(packet)
-                            else:
-                                # In case of an implicit proof, we have
-                                # to check every single outstanding receipt
-                                receipt_validated = receipt.validate_proof_packet(packet)
+                        # Explicit proofs carry the full hash of the proved
+                        # packet. Implicit proofs are addressed to the proof
+                        # destination of the packet, which is its truncated
+                        # hash, so only matching receipts need to be tested.
+                        if proof_hash != None: candidates = Transport.receipts.get(proof_hash, None)
+                        else:                  candidates = Transport.receipts_truncated.get(packet.destination_hash, None)
 
-                            if receipt_validated:
-                                if receipt in Transport.receipts:
-                                    Transport.receipts.remove(receipt)
+                        if candidates != None:
+                            for receipt in candidates.copy():
+                                if receipt.validate_proof_packet(packet): Transport.remove_receipt(receipt)
 
     @staticmethod
     def synthesize_tunnel(interface):
@@ -2427,11 +2600,14 @@ class Transport:
                 tunnel_entry = [tunnel_id, interface, paths, expires]
                 interface.tunnel_id = tunnel_id
                 Transport.tunnels[tunnel_id] = tunnel_entry
+                Transport.tunnels_dirty.add(tunnel_id)
+                Transport.tunnels_expiry.schedule(tunnel_id, Transport.tunnel_entry_expiry(tunnel_entry))
         else:
             RNS.log("Tunnel endpoint "+RNS.prettyhexrep(tunnel_id)+" reappeared. Restoring paths...", RNS.LOG_PATHING) if RNS.sl(RNS.LOG_PATHING) else None
             tunnel_entry = Transport.tunnels[tunnel_id]
             tunnel_entry[IDX_TT_IF] = interface
             tunnel_entry[IDX_TT_EXPIRES] = expires
+            Transport.tunnels_dirty.add(tunnel_id)
             interface.tunnel_id = tunnel_id
             paths = tunnel_entry[IDX_TT_PATHS]
 
@@ -2444,7 +2620,7 @@ class Transport:
                     random_blobs = list(set(path_entry[4]))
                     receiving_interface = interface
                     packet_hash = path_entry[6]
-                    new_entry = [time.time(), received_from, announce_hops, expires, random_blobs, receiving_interface, packet_hash]
+                    new_entry = PathEntry(time.time(), received_from, announce_hops, expires, random_blobs, receiving_interface, packet_hash)
 
                     should_add = False
                     with Transport.path_table_lock:
@@ -2465,7 +2641,7 @@ class Transport:
                             else: RNS.log("Did not restore path to "+RNS.prettyhexrep(destination_hash)+" because it has expired", RNS.LOG_PATHING) if RNS.sl(RNS.LOG_PATHING) else None
 
                     if should_add:
-                        with Transport.path_table_lock: Transport.path_table[destination_hash] = new_entry
+                        with Transport.path_table_lock: Transport.set_path_entry(destination_hash, new_entry)
                         RNS.log("Restored path to "+RNS.prettyhexrep(destination_hash)+" is now "+str(announce_hops)+" hops away via "+RNS.prettyhexrep(received_from)+" on "+str(receiving_interface), RNS.LOG_PATHING) if RNS.sl(RNS.LOG_PATHING) else None
                     
                     else: deprecated_paths.append(destination_hash)
@@ -2473,6 +2649,7 @@ class Transport:
             for deprecated_path in deprecated_paths:
                 RNS.log("Removing path to "+RNS.prettyhexrep(deprecated_path)+" from tunnel "+RNS.prettyhexrep(tunnel_id), RNS.LOG_PATHING) if RNS.sl(RNS.LOG_PATHING) else None
                 with Transport.tunnels_lock: paths.pop(deprecated_path)
+                Transport.tunnels_dirty.add(tunnel_id)
 
     @staticmethod
     def clean_destinations_map():
@@ -2529,9 +2706,13 @@ class Transport:
     def register_link(link):
         RNS.log("Registering link "+str(link), RNS.LOG_EXTREME) if RNS.sl(RNS.LOG_EXTREME) else None
         if link.initiator:
-            with Transport.pending_links_lock: Transport.pending_links.append(link)
+            with Transport.pending_links_lock:
+                Transport.pending_links.append(link)
+                Transport.pending_links_map[link.link_id] = link
         else:
-            with Transport.active_links_lock: Transport.active_links.append(link)
+            with Transport.active_links_lock:
+                Transport.active_links.append(link)
+                Transport.active_links_map[link.link_id] = link
 
     @staticmethod
     def activate_link(link):
@@ -2540,11 +2721,72 @@ class Transport:
             if link in Transport.pending_links:
                 if link.status != RNS.Link.ACTIVE: raise IOError("Invalid link state for link activation: "+str(link.status))
                 Transport.pending_links.remove(link)
-                with Transport.active_links_lock: Transport.active_links.append(link)
+                Transport.unmap_link(Transport.pending_links_map, link)
+                with Transport.active_links_lock:
+                    Transport.active_links.append(link)
+                    Transport.active_links_map[link.link_id] = link
                 link.status = RNS.Link.ACTIVE
             else:
                 RNS.log("Attempted to activate a link that was not in the pending table", RNS.LOG_ERROR)
 
+    @staticmethod
+    def unmap_link(links_map, link):
+        # Only remove the map entry if it still refers to
+        # this exact link, since a newer link instance may
+        # have been registered under the same link ID.
+        if link.link_id in links_map and links_map[link.link_id] == link: links_map.pop(link.link_id)
+
+    @staticmethod
+    def find_active_link(link_id):
+        with Transport.active_links_lock:
+            if link_id in Transport.active_links_map: return Transport.active_links_map[link_id]
+            else: return None
+
+    @staticmethod
+    def find_pending_link(link_id):
+        with Transport.pending_links_lock:
+            if link_id in Transport.pending_links_map: return Transport.pending_links_map[link_id]
+            else: return None
+
+    @staticmethod
+    def register_receipt(receipt):
+        with Transport.receipts_lock:
+            if not receipt.hash in Transport.receipts: Transport.receipts[receipt.hash] = []
+            if not receipt.truncated_hash in Transport.receipts_truncated: Transport.receipts_truncated[receipt.truncated_hash] = []
+            Transport.receipts[receipt.hash].append(receipt)
+            Transport.receipts_truncated[receipt.truncated_hash].append(receipt)
+            Transport.receipt_count += 1
+            Transport.schedule_receipt(receipt)
+
+    @staticmethod
+    def schedule_receipt(receipt):
+        with Transport.receipt_timeouts_lock:
+            Transport.receipt_sequence += 1
+            heapq.heappush(Transport.receipt_timeouts, (receipt.sent_at+receipt.timeout, Transport.receipt_sequence, receipt))
+
+    @staticmethod
+    def reschedule_receipt(receipt):
+        # Timeouts are often changed from within callers that
+        # hold their own locks, such as channels, while proof
+        # validation calls back into them with receipts_lock
+        # held. Only the deadline heap is locked here, so the
+        # two lock orders can never deadlock each other.
+        if receipt in Transport.receipts.get(receipt.hash, ()): Transport.schedule_receipt(receipt)
+
+    @staticmethod
+    def remove_receipt(receipt):
+        # Must be called with receipts_lock held. Any
+        # entries left on the deadline heap for this
+        # receipt are discarded when they come due.
+        if receipt.hash in Transport.receipts and receipt in Transport.receipts[receipt.hash]:
+            Transport.receipts[receipt.hash].remove(receipt)
+            if len(Transport.receipts[receipt.hash]) == 0: Transport.receipts.pop(receipt.hash)
+            Transport.receipt_count -= 1
+
+        if receipt.truncated_hash in Transport.receipts_truncated and receipt in Transport.receipts_truncated[receipt.truncated_hash]:
+            Transport.receipts_truncated[receipt.truncated_hash].remove(receipt)
+            if len(Transport.receipts_truncated[receipt.truncated_hash]) == 0: Transport.receipts_truncated.pop(receipt.truncated_hash)
+
     @staticmethod
     def register_announce_handler(handler):
         """
@@ -2558,7 +2800,13 @@ class Transport:
         """
         with Transport.announce_handler_lock:
             if hasattr(handler, "received_announce") and callable(handler.received_announce):
-                if hasattr(handler, "aspect_filter"): Transport.announce_handlers.append(handler)
+                if hasattr(handler, "aspect_filter"):
+                    if Transport.announce_handler_arity(handler) == None:
+                        RNS.log(f"Invalid signature for announce handler callback {handler.received_announce}, not registering handler", RNS.LOG_ERROR)
+                        return
+
+                    Transport.announce_handlers.append(handler)
+                    Transport.index_announce_handlers()
 
     @staticmethod
     def deregister_announce_handler(handler):
@@ -2569,9 +2817,63 @@ class Transport:
         """
         with Transport.announce_handler_lock:
             while handler in Transport.announce_handlers: Transport.announce_handlers.remove(handler)
+            Transport.index_announce_handlers()
+            if Transport.announce_dispatcher != None: Transport.announce_dispatcher.discard(handler)
 
         gc.collect()
 
+    @staticmethod
+    def announce_handler_arity(handler):
+        try:
+            arity = len(inspect.signature(handler.received_announce).parameters)
+            if arity >= 3 and arity <= 5: return arity
+            else: return None
+        except Exception: return None
+
+    @staticmethod
+    def index_announce_handlers():
+        # Must be called with the announce handler lock held.
+        # Rebuilds the name hash index, so matching handlers
+        # can be found directly for each received announce.
+        index = {}; unfiltered = []
+        for handler in Transport.announce_handlers:
+            arity = Transport.announce_handler_arity(handler)
+            if arity == None or not hasattr(handler, "aspect_filter"): continue
+            if handler.aspect_filter == None: unfiltered.append((handler, arity))
+            else:
+                app_name, aspects = RNS.Destination.app_and_aspects_from_name(handler.aspect_filter)
+                name_hash = RNS.Identity.full_hash(RNS.Destination.expand_name(None, app_name, *aspects).encode("utf-8"))[:RNS.Identity.NAME_HASH_LENGTH//8]
+                if not name_hash in index: index[name_hash] = []
+                index[name_hash].append((handler, arity))
+
+        Transport.announce_handler_index = index
+        Transport.announce_handlers_unfiltered = unfiltered
+        Transport.announce_handlers_indexed = list(Transport.announce_handlers)
+        if len(Transport.announce_handlers) > 0 and Transport.announce_dispatcher == None: Transport.announce_dispatcher = AnnounceDispatcher()
+
+    @staticmethod
+    def matching_announce_handlers(packet):
+        # Announces have already been validated against their
+        # name hash, so a matching name hash means the announced
+        # destination matches the aspect filter of the handler.
+        if len(Transport.announce_handlers) == 0: return []
+        keysize = RNS.Identity.KEYSIZE//8
+        name_hash = packet.data[keysize:keysize+RNS.Identity.NAME_HASH_LENGTH//8]
+        with Transport.announce_handler_lock:
+            # Handlers may also have been added to or removed from the
+            # handler list directly, in which case the index is rebuilt
+            if Transport.announce_handlers != Transport.announce_handlers_indexed: Transport.index_announce_handlers()
+            candidates = Transport.announce_handlers_unfiltered+Transport.announce_handler_index.get(name_hash, [])
+
+        if packet.context == RNS.Packet.PATH_RESPONSE:
+            return [c for c in candidates if hasattr(c[0], "receive_path_responses") and c[0].receive_path_responses == True]
+        else: return candidates
+
+    @staticmethod
+    def announce_handler_stats():
+        if Transport.announce_dispatcher == None: return None
+        else: return Transport.announce_dispatcher.stats()
+
     @staticmethod
     def interface_hashes():
         return {interface.get_hash() for interface in Transport.interfaces}
@@ -2800,6 +3102,8 @@ class Transport:
         with Transport.path_table_lock:
             if destination_hash in Transport.path_table:
                 Transport.path_table[destination_hash][IDX_PT_TIMESTAMP] = 0
+                Transport.path_table_dirty.add(destination_hash)
+                Transport.path_table_expiry.schedule(destination_hash, 0)
                 Transport.tables_last_culled = 0
                 return True
             
@@ -2877,7 +3181,7 @@ class Transport:
         if on_interface != None and recursive:
             if not hasattr(on_interface, "announce_cap"):        on_interface.announce_cap = RNS.Reticulum.ANNOUNCE_CAP
             if not hasattr(on_interface, "announce_allowed_at"): on_interface.announce_allowed_at = 0
-            if not hasattr(on_interface, "announce_queue"):      on_interface.announce_queue = []
+            if not hasattr(on_interface, "announce_queue"):      on_interface.announce_queue = AnnounceQueue()
 
             queued_announces = True if len(on_interface.announce_queue) > 0 else False
             if queued_announces:
@@ -2896,7 +3200,10 @@ class Transport:
         packet.is_outbound_pr = True
         packet.send()
 
-        with Transport.path_requests_lock: Transport.path_requests[destination_hash] = time.time()
+        with Transport.path_requests_lock:
+            requested_at = time.time()
+            Transport.path_requests[destination_hash] = requested_at
+            Transport.path_requests_expiry.schedule(destination_hash, Transport.path_request_expiry(requested_at))
 
     @staticmethod
     def remote_status_handler(path, data, request_id, link_id, remote_identity, requested_at):
@@ -2981,17 +3288,15 @@ class Transport:
                     unique_tag = destination_hash+tag_bytes
 
                     if packet.receiving_interface: packet.receiving_interface.received_path_request()
-                    with Transport.discovery_pr_tags_lock:
-                        if not unique_tag in Transport.discovery_pr_tags:
-                            Transport.discovery_pr_tags.append(unique_tag)
-
-                            Transport.path_request(destination_hash,
-                                                   Transport.from_local_client(packet),
-                                                   packet.receiving_interface,
-                                                   requestor_transport_id = requesting_transport_instance,
-                                                   tag=tag_bytes)
-
-                        else: RNS.log("Ignoring duplicate path request for "+RNS.prettyhexrep(destination_hash)+" with tag "+RNS.prettyhexrep(unique_tag), RNS.LOG_EXTREME) if RNS.sl(RNS.LOG_EXTREME) else None
+                    with Transport.discovery_pr_tags_lock: new_tag = Transport.discovery_pr_tags.add(unique_tag)
+                    if new_tag:
+                        Transport.path_request(destination_hash,
+                                               Transport.from_local_client(packet),
+                                               packet.receiving_interface,
+                                               requestor_transport_id = requesting_transport_instance,
+                                               tag=tag_bytes)
+
+                    else: RNS.log("Ignoring duplicate path request for "+RNS.prettyhexrep(destination_hash)+" with tag "+RNS.prettyhexrep(unique_tag), RNS.LOG_EXTREME) if RNS.sl(RNS.LOG_EXTREME) else None
                 else: RNS.log("Ignoring tagless path request for "+RNS.prettyhexrep(destination_hash), RNS.LOG_PATHING) if RNS.sl(RNS.LOG_PATHING) else None
         except Exception as e: RNS.log(f"Error while handling path request. The contained exception was: {e}", RNS.LOG_ERROR)
 
@@ -3122,7 +3427,9 @@ class Transport:
                 # except the requestor interface
                 RNS.log("Attempting to discover unknown path to "+RNS.prettyhexrep(destination_hash)+" on behalf of path request"+interface_str, RNS.LOG_PATHING) if RNS.sl(RNS.LOG_PATHING) else None
                 pr_entry = { "destination_hash": destination_hash, "timeout": time.time()+Transport.PATH_REQUEST_TIMEOUT, "requesting_interface": attached_interface }
-                with Transport.discovery_pr_lock: Transport.discovery_path_requests[destination_hash] = pr_entry
+                with Transport.discovery_pr_lock:
+                    Transport.discovery_path_requests[destination_hash] = pr_entry
+                    Transport.discovery_pr_expiry.schedule(destination_hash, pr_entry["timeout"])
 
                 for interface in Transport.interfaces:
                     if search_mode_filter and not interface.mode in search_mode_filter: continue
@@ -3242,11 +3549,9 @@ class Transport:
             for link in Transport.pending_links: link.teardown()
 
         Transport.announce_table    = {}
-        Transport.path_table        = {}
-        Transport.reverse_table     = {}
-        Transport.link_table        = {}
         Transport.held_announces    = {}
         Transport.tunnels           = {}
+        Transport.clear_tables()
 
     @staticmethod
     def shared_connection_reappeared():
@@ -3263,7 +3568,7 @@ class Transport:
                 if na > 0:
                     if na == 1: na_str = "1 announce"
                     else: na_str = str(na)+" announces"
-                    interface.announce_queue = []
+                    interface.announce_queue.clear()
                     RNS.log("Dropped "+na_str+" on "+str(interface), RNS.LOG_VERBOSE) if RNS.sl(RNS.LOG_VERBOSE) else None
 
         gc.collect()
@@ -3309,19 +3614,8 @@ class Transport:
                 if RNS.Reticulum.transport_enabled(): RNS.log("Saving packet hashlist to storage...", RNS.LOG_DEBUG) if RNS.sl(RNS.LOG_DEBUG) else None
                 else: return
 
-                round_started_at = save_start
-                yield_threshold  = 0.010
-
                 packet_hashlist_path = RNS.Reticulum.storagepath+"/packet_hashlist.raw"
-                with open(packet_hashlist_path, "wb") as file:
-                    for packet_hash in Transport.packet_hashlist.copy():
-                        if background:
-                            if time.time() - round_started_at > yield_threshold:
-                                # Low priority, yield thread
-                                round_started_at = time.time()
-                                time.sleep(0.001)
-
-                        file.write(packet_hash)
+                Transport.packet_hashlist.save(packet_hashlist_path)
 
                 RNS.log(f"Saved packet hashlist in {RNS.prettyshorttime(time.time()-save_start)}", RNS.LOG_DEBUG) if RNS.sl(RNS.LOG_DEBUG) else None
 
@@ -3332,8 +3626,44 @@ class Transport:
 
 
     @staticmethod
-    def save_path_table(background=False):
+    def serialise_path_entry(destination_hash, path_entry):
+        return [ destination_hash,
+                 path_entry[IDX_PT_TIMESTAMP],
+                 path_entry[IDX_PT_NEXT_HOP],
+                 path_entry[IDX_PT_HOPS],
+                 path_entry[IDX_PT_EXPIRES],
+                 path_entry[IDX_PT_RANDBLOBS],
+                 path_entry[IDX_PT_RVCD_IF].get_hash(),
+                 path_entry[IDX_PT_PACKET] ]
+
+    @staticmethod
+    def serialise_tunnel(tunnel_id, tunnel_entry):
+        interface = tunnel_entry[IDX_TT_IF]
+        if interface != None: interface_hash = interface.get_hash()
+        else: interface_hash = None
+
+        serialised_paths = []
+        tunnel_paths = tunnel_entry[IDX_TT_PATHS].copy()
+        for destination_hash in tunnel_paths:
+            de = tunnel_paths[destination_hash]
+            serialised_paths.append([ destination_hash,
+                                      de[0],
+                                      de[1],
+                                      de[2],
+                                      de[3],
+                                      de[4][-Transport.PERSIST_RANDOM_BLOBS:],
+                                      interface_hash,
+                                      de[6] ])
+
+            # TODO: Reevaluate whether there are any cases where this is needed
+            # Transport.cache(de[6], force_cache=True)
+
+        return [tunnel_id, interface_hash, serialised_paths, tunnel_entry[IDX_TT_EXPIRES]]
+
+    @staticmethod
+    def save_path_table(background=False, journal_only=False):
         if not Transport.owner.is_connected_to_shared_instance:
+            if Transport.path_table_journal == None: return
             if hasattr(Transport, "saving_path_table"):
                 wait_interval = 0.2
                 wait_timeout = 5
@@ -3344,86 +3674,84 @@ class Transport:
                         RNS.log("Could not save path table to storage, waiting for previous save operation timed out.", RNS.LOG_ERROR)
                         return False
 
+            compacted = False
             try:
                 Transport.saving_path_table = True
-                save_start = time.time()
-                RNS.log("Saving path table to storage...", RNS.LOG_DEBUG) if RNS.sl(RNS.LOG_DEBUG) else None
-
-                serialised_destinations     = []
-                path_table                  = Transport.path_table.copy()
-                interface_hashes_updated_at = 0
-                round_started_at            = save_start
-                yield_threshold             = 0.010
-
-                for destination_hash in path_table:
-                    if background:
-                        if time.time() - round_started_at > yield_threshold:
-                            # Low priority, yield thread
-                            round_started_at = time.time()
-                            time.sleep(0.001)
-                    try:
-                        # Throttle interface hash lookup to 2 seconds
-                        if time.time() > interface_hashes_updated_at + 2:
-                            interface_hashes = Transport.interface_hashes()
+                save_start       = time.time()
+                round_started_at = save_start
+                yield_threshold  = 0.010
+                interface_hashes = Transport.interface_hashes()
 
-                        # Get the destination entry from the destination table
-                        de        = path_table[destination_hash]
-                        interface = de[IDX_PT_RVCD_IF]
+                if journal_only or not Transport.path_table_journal.should_compact(len(Transport.path_table)):
+                    # Only journal entries that changed since the
+                    # table was last journaled or snapshotted
+                    with Transport.path_table_lock:
+                        changed_paths = Transport.path_table_dirty
+                        Transport.path_table_dirty = set()
 
-                        # Only store destination table entry if the associated
-                        # interface is still active
-                        if not interface.get_hash() in interface_hashes: RNS.log(f"Skipping persist for path table entry {RNS.prettyhexrep(destination_hash)}, interface {interface} no longer active", RNS.LOG_DEBUG) if RNS.sl(RNS.LOG_DEBUG) else None
-                        else:
-                            # Get the destination entry from the destination table
-                            if not destination_hash in path_table:
-                                RNS.log(f"Skipping persist for path table entry {RNS.prettyhexrep(destination_hash)}, no longer in table", RNS.LOG_PATHING) if RNS.sl(RNS.LOG_PATHING) else None
-
-                            de             = path_table[destination_hash]
-                            timestamp      = de[IDX_PT_TIMESTAMP]
-                            received_from  = de[IDX_PT_NEXT_HOP]
-                            hops           = de[IDX_PT_HOPS]
-                            expires        = de[IDX_PT_EXPIRES]
-                            random_blobs   = de[IDX_PT_RANDBLOBS]
-                            packet_hash    = de[IDX_PT_PACKET]
-                            interface_hash = interface.get_hash()
-
-                            serialised_entry = [ destination_hash,
-                                                 timestamp,
-                                                 received_from,
-                                                 hops,
-                                                 expires,
-                                                 random_blobs,
-                                                 interface_hash,
-                                                 packet_hash ]
-
-                            serialised_destinations.append(serialised_entry)
+                    changes = []
+                    for destination_hash in changed_paths:
+                        if background:
+                            if time.time() - round_started_at > yield_threshold:
+                                round_started_at = time.time()
+                                time.sleep(0.001)
+                        try:
+                            de = Transport.path_table.get(destination_hash, None)
+                            if de != None and de[IDX_PT_RVCD_IF].get_hash() in interface_hashes:
+                                changes.append((destination_hash, Transport.serialise_path_entry(destination_hash, de)))
+                            else: changes.append((destination_hash, None))
+
+                        except Exception as e: RNS.log(f"Skipping journal for path table entry due to error: {e}", RNS.LOG_ERROR)
+
+                    Transport.path_table_journal.append(changes)
+                    if len(changes) > 0: RNS.log(f"Journaled {len(changes)} path table changes in {RNS.prettyshorttime(time.time()-save_start)}", RNS.LOG_DEBUG) if RNS.sl(RNS.LOG_DEBUG) else None
+
+                else:
+                    RNS.log("Saving path table to storage...", RNS.LOG_DEBUG) if RNS.sl(RNS.LOG_DEBUG) else None
+                    with Transport.path_table_lock:
+                        Transport.path_table_dirty = set()
+                        path_table = Transport.path_table.copy()
+
+                    serialised_destinations = []
+                    for destination_hash in path_table:
+                        if background:
+                            if time.time() - round_started_at > yield_threshold:
+                                # Low priority, yield thread
+                                round_started_at = time.time()
+                                time.sleep(0.001)
+                        try:
+                            # Only store destination table entry if the associated
+                            # interface is still active
+                            de        = path_table[destination_hash]
+                            interface = de[IDX_PT_RVCD_IF]
+                            if not interface.get_hash() in interface_hashes: RNS.log(f"Skipping persist for path table entry {RNS.prettyhexrep(destination_hash)}, interface {interface} no longer active", RNS.LOG_DEBUG) if RNS.sl(RNS.LOG_DEBUG) else None
+                            else: serialised_destinations.append(Transport.serialise_path_entry(destination_hash, de))
 
                             # TODO: Reevaluate whether there is any cases where this is needed
                             # Transport.cache(de[IDX_PT_PACKET], force_cache=True)
 
-                    except Exception as e: RNS.log(f"Skipping persist for path table entry due to error: {e}", RNS.LOG_ERROR)
+                        except Exception as e: RNS.log(f"Skipping persist for path table entry due to error: {e}", RNS.LOG_ERROR)
 
-                path_table_path = RNS.Reticulum.storagepath+"/destination_table"
-                file = open(path_table_path, "wb")
-                file.write(umsgpack.packb(serialised_destinations))
-                file.close()
+                    Transport.path_table_journal.write_snapshot(serialised_destinations)
+                    compacted = True
 
-                save_time = time.time() - save_start
-                if save_time < 1: time_str = str(round(save_time*1000,2))+"ms"
-                else: time_str = str(round(save_time,2))+"s"
-                RNS.log("Saved "+str(len(serialised_destinations))+" path table entries in "+time_str, RNS.LOG_DEBUG) if RNS.sl(RNS.LOG_DEBUG) else None
+                    save_time = time.time() - save_start
+                    if save_time < 1: time_str = str(round(save_time*1000,2))+"ms"
+                    else: time_str = str(round(save_time,2))+"s"
+                    RNS.log("Saved "+str(len(serialised_destinations))+" path table entries in "+time_str, RNS.LOG_DEBUG) if RNS.sl(RNS.LOG_DEBUG) else None
 
             except Exception as e:
                 RNS.log("Could not save path table to storage, the contained exception was: "+str(e), RNS.LOG_ERROR)
                 RNS.trace_exception(e)
 
             Transport.saving_path_table = False
-            gc.collect()
+            if compacted: gc.collect()
 
 
     @staticmethod
-    def save_tunnel_table(background=False):
+    def save_tunnel_table(background=False, journal_only=False):
         if not Transport.owner.is_connected_to_shared_instance:
+            if Transport.tunnels_journal == None: return
             if hasattr(Transport, "saving_tunnel_table"):
                 wait_interval = 0.2
                 wait_timeout = 5
@@ -3434,75 +3762,56 @@ class Transport:
                         RNS.log("Could not save tunnel table to storage, waiting for previous save operation timed out.", RNS.LOG_ERROR)
                         return False
 
+            compacted = False
             try:
                 Transport.saving_tunnel_table = True
-                save_start = time.time()
-                RNS.log("Saving tunnel table to storage...", RNS.LOG_DEBUG) if RNS.sl(RNS.LOG_DEBUG) else None
+                save_start       = time.time()
+                round_started_at = save_start
+                yield_threshold  = 0.010
 
-                serialised_tunnels = []
-                round_started_at   = save_start
-                yield_threshold    = 0.010
-
-                for tunnel_id in Transport.tunnels.copy():
-                    if background:
-                        if time.time() - round_started_at > yield_threshold:
-                            # Low priority, yield thread
-                            round_started_at = time.time()
-                            time.sleep(0.001)
-
-                    te = Transport.tunnels[tunnel_id]
-                    interface = te[1]
-                    tunnel_paths = te[2].copy()
-                    expires = te[3]
-
-                    if interface != None: interface_hash = interface.get_hash()
-                    else: interface_hash = None
-
-                    serialised_paths = []
-                    for destination_hash in tunnel_paths:
-                        de = tunnel_paths[destination_hash]
-
-                        timestamp = de[0]
-                        received_from = de[1]
-                        hops = de[2]
-                        expires = de[3]
-                        random_blobs = de[4][-Transport.PERSIST_RANDOM_BLOBS:]
-                        packet_hash = de[6]
-
-                        serialised_entry = [
-                            destination_hash,
-                            timestamp,
-                            received_from,
-                            hops,
-                            expires,
-                            random_blobs,
-                            interface_hash,
-                            packet_hash
-                        ]
-
-                        serialised_paths.append(serialised_entry)
-
-                        # TODO: Reevaluate whether there are any cases where this is needed
-                        # Transport.cache(de[6], force_cache=True)
-
-                    serialised_tunnel = [tunnel_id, interface_hash, serialised_paths, expires]
-                    serialised_tunnels.append(serialised_tunnel)
-
-                tunnels_path = RNS.Reticulum.storagepath+"/tunnels"
-                file = open(tunnels_path, "wb")
-                file.write(umsgpack.packb(serialised_tunnels))
-                file.close()
+                if journal_only or not Transport.tunnels_journal.should_compact(len(Transport.tunnels)):
+                    with Transport.tunnels_lock:
+                        changed_tunnels = Transport.tunnels_dirty
+                        Transport.tunnels_dirty = set()
+
+                    changes = []
+                    for tunnel_id in changed_tunnels:
+                        te = Transport.tunnels.get(tunnel_id, None)
+                        if te != None: changes.append((tunnel_id, Transport.serialise_tunnel(tunnel_id, te)))
+                        else:          changes.append((tunnel_id, None))
+
+                    Transport.tunnels_journal.append(changes)
+                    if len(changes) > 0: RNS.log(f"Journaled {len(changes)} tunnel table changes in {RNS.prettyshorttime(time.time()-save_start)}", RNS.LOG_DEBUG) if RNS.sl(RNS.LOG_DEBUG) else None
+
+                else:
+                    RNS.log("Saving tunnel table to storage...", RNS.LOG_DEBUG) if RNS.sl(RNS.LOG_DEBUG) else None
+                    with Transport.tunnels_lock:
+                        Transport.tunnels_dirty = set()
+                        tunnels = Transport.tunnels.copy()
+
+                    serialised_tunnels = []
+                    for tunnel_id in tunnels:
+                        if background:
+                            if time.time() - round_started_at > yield_threshold:
+                                # Low priority, yield thread
+                                round_started_at = time.time()
+                                time.sleep(0.001)
+
+                        serialised_tunnels.append(Transport.serialise_tunnel(tunnel_id, tunnels[tunnel_id]))
+
+                    Transport.tunnels_journal.write_snapshot(serialised_tunnels)
+                    compacted = True
+
+                    save_time = time.time() - save_start
+                    if save_time < 1: time_str = str(round(save_time*1000,2))+"ms"
+                    else: time_str = str(round(save_time,2))+"s"
+                    RNS.log("Saved "+str(len(serialised_tunnels))+" tunnel table entries in "+time_str, RNS.LOG_DEBUG) if RNS.sl(RNS.LOG_DEBUG) else None
 
-                save_time = time.time() - save_start
-                if save_time < 1: time_str = str(round(save_time*1000,2))+"ms"
-                else: time_str = str(round(save_time,2))+"s"
-                RNS.log("Saved "+str(len(serialised_tunnels))+" tunnel table entries in "+time_str, RNS.LOG_DEBUG) if RNS.sl(RNS.LOG_DEBUG) else None
-            
             except Exception as e:
                 RNS.log("Could not save tunnel table to storage, the contained exception was: "+str(e), RNS.LOG_ERROR)
 
             Transport.saving_tunnel_table = False
-            gc.collect()
+            if compacted: gc.collect()
 
     @staticmethod
     def persist_data(background=False):
@@ -3511,17 +3820,31 @@ class Transport:
             Transport.save_packet_hashlist(background=background)
             Transport.save_path_table(background=background)
             Transport.save_tunnel_table(background=background)
-            gc.collect()
+
+    @staticmethod
+    def journal_tables():
+        if Transport.persist_lock.locked(): return
+        with Transport.persist_lock:
+            Transport.save_path_table(journal_only=True)
+            Transport.save_tunnel_table(journal_only=True)
 
     @staticmethod
     def void_queues():
         Transport.held_announces = {}
-        Transport.receipts = []
-        Transport.reverse_table = {}
+        with Transport.receipts_lock:
+            Transport.receipts = {}
+            Transport.receipts_truncated = {}
+            with Transport.receipt_timeouts_lock: Transport.receipt_timeouts = []
+            Transport.receipt_count = 0
+        with Transport.reverse_table_lock:
+            Transport.reverse_table = {}
+            Transport.reverse_table_interfaces = {}
 
     @staticmethod
     def exit_handler():
         Transport._should_run = False
+        if Transport.announce_verifier: Transport.announce_verifier.stop()
+        if Transport.inbound_pipeline: Transport.inbound_pipeline.stop()
         Transport.void_queues()
         if not Transport.owner.is_connected_to_shared_instance:
             Transport.persist_data()
@@ -3625,7 +3948,7 @@ class Transport:
         for destination_hash in drop_destinations:
             try:
                 with Transport.path_table_lock:
-                    if destination_hash in Transport.path_table: Transport.path_table.pop(destination_hash)
+                    if destination_hash in Transport.path_table: Transport.pop_path_entry(destination_hash)
             except Exception as e:
                 RNS.log(f"Error while dropping blackhole-associated destination from path table: {e}", RNS.LOG_ERROR)
 
@@ -3704,4 +4027,799 @@ IDX_LT_PROOF_TMO = 8
 IDX_TT_TUNNEL_ID = 0
 IDX_TT_IF        = 1
 IDX_TT_PATHS     = 2
-IDX_TT_EXPIRES   = 3
\ No newline at end of file
+IDX_TT_EXPIRES   = 3
+
+class AnnounceVerifier():
+    BATCH_SIZE = 64
+    MAX_QUEUED = 8192
+
+    def __init__(self, workers, use_processes=False, callback=None):
+        self.workers       = max(1, workers)
+        self.use_processes = use_processes
+        self.callback      = callback
+        self.queue         = deque()
+        self.queue_lock    = Lock()
+        self.pending       = threading.Event()
+        self.should_run    = False
+        self.executor      = None
+        self.verified      = 0
+        self.deduplicated  = 0
+        self.dropped       = 0
+
+    def start(self):
+        if not self.should_run:
+            worker_type = "processes" if self.use_processes else "threads"
+            RNS.log(f"Starting announce verifier with {self.workers} worker {worker_type}", RNS.LOG_DEBUG)
+            if self.use_processes: self.executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:                  self.executor = ThreadPoolExecutor(max_workers=self.workers)
+            self.should_run = True
+            threading.Thread(target=self.job, daemon=True).start()
+
+    def stop(self):
+        self.should_run = False
+        self.pending.set()
+        if self.executor: self.executor.shutdown(wait=False)
+
+    def enqueue(self, packet, interface, link_stats=None):
+        # Signal statistics must be captured along with the frame,
+        # since the interface will have moved on to other frames
+        # by the time the verified announce is processed.
+        if link_stats == None: link_stats = Transport.interface_link_stats(interface)
+        with self.queue_lock:
+            if len(self.queue) < self.MAX_QUEUED: self.queue.append((packet, interface, link_stats))
+            else:
+                self.dropped += 1
+                RNS.log(f"Announce verification queue full, dropping announce for {RNS.prettyhexrep(packet.destination_hash)}", RNS.LOG_EXTREME) if RNS.sl(RNS.LOG_EXTREME) else None
+
+            self.pending.set()
+
+    def job(self):
+        while self.should_run:
+            self.pending.wait()
+            batch = []
+            with self.queue_lock:
+                while len(self.queue) > 0 and len(batch) < self.BATCH_SIZE: batch.append(self.queue.popleft())
+                if len(self.queue) == 0: self.pending.clear()
+
+            if len(batch) > 0:
+                try: self.process(batch)
+                except Exception as e:
+                    RNS.log(f"Error while processing announce verification batch: {e}", RNS.LOG_ERROR)
+                    RNS.trace_exception(e)
+
+    def process(self, batch):
+        # Signatures for the batch are verified in parallel, and
+        # the verified announces are then passed on for regular
+        # inbound processing in the order they were received.
+        # The unpacked announces are kept on the verified packets,
+        # so they are not unpacked or checked again by Transport.
+        # Copies of the same announce heard over several
+        # interfaces are only verified once per batch.
+        materials = []; results = [None]*len(batch); jobs = []; copies = {}; first = {}
+        for i in range(0, len(batch)):
+            packet, interface, link_stats = batch[i]
+            try:
+                public_key, name_hash, random_hash, ratchet, signature, app_data, signed_data = RNS.Identity.unpack_announce(packet)
+                identity_hash = RNS.Identity.truncated_hash(public_key)
+                materials.append((public_key, name_hash, random_hash, ratchet, signature, app_data, signed_data, identity_hash))
+                announce_id = (packet.destination_hash, signature, signed_data)
+                if identity_hash in Transport.blackholed_identities: results[i] = False
+                elif announce_id in first: copies[i] = first[announce_id]
+                elif RNS.Identity.is_verified_announce(packet.destination_hash, signature, signed_data): results[i] = True
+                else:
+                    first[announce_id] = i
+                    jobs.append(i)
+
+            except Exception:
+                materials.append(None)
+                results[i] = False
+
+        if len(jobs) > 0:
+            verified = self.executor.map(RNS.Identity.verify_signature, [materials[i][0] for i in jobs],
+                                         [materials[i][4] for i in jobs], [materials[i][6] for i in jobs])
+            for i, result in zip(jobs, verified): results[i] = result
+
+        for i in copies: results[i] = results[copies[i]]
+        self.deduplicated += len(copies)
+
+        for i in range(0, len(batch)):
+            packet, interface, link_stats = batch[i]
+            if results[i]:
+                signature = materials[i][4]; signed_data = materials[i][6]
+                RNS.Identity.remember_verified_announce(packet.destination_hash, signature, signed_data)
+                packet.validated_announce = materials[i]
+                self.verified += 1
+                if self.callback:
+                    try: self.callback(packet, interface, link_stats=link_stats)
+                    except Exception as e:
+                        RNS.log(f"Error while processing verified announce for {RNS.prettyhexrep(packet.destination_hash)}: {e}", RNS.LOG_ERROR)
+                        RNS.trace_exception(e)
+
+            else: RNS.log(f"Dropped announce for {RNS.prettyhexrep(packet.destination_hash)} with invalid signature", RNS.LOG_EXTREME) if RNS.sl(RNS.LOG_EXTREME) else None
+
+class PacketHashFilter():
+    """
+    Compact duplicate filter for packet hashes. Entries are kept as integer
+    fingerprints in two open-addressed generations backed by flat arrays,
+    which grow as needed up to a fixed maximum size. When the current
+    generation reaches its capacity, it becomes the previous generation and
+    a fresh one is started, so the filter remembers between ``capacity``
+    and ``2*capacity`` of the most recently added hashes. The probability
+    of a false positive per lookup is approximately
+    ``2*capacity*2**-fingerprint_bits``.
+
+    Removed entries leave tombstones in the table, and the current
+    generation is rehashed whenever live entries and tombstones together
+    pass the load limit, so probes always end at an empty slot. Saved
+    filters store their slots in little-endian byte order.
+    """
+    MAGIC     = b"RNSPHF"
+    VERSION   = 0x01
+    HEADER    = "!BBQQQQ"
+    EMPTY     = 0
+    MIN_SLOTS = 1024
+
+    def __init__(self, capacity, fingerprint_bits=64):
+        if fingerprint_bits < 16 or fingerprint_bits > 64: raise ValueError("Fingerprint size must be between 16 and 64 bits")
+        self.capacity         = max(1, capacity)
+        self.fingerprint_bits = fingerprint_bits
+        self.fingerprint_mask = (1<<fingerprint_bits)-1
+        self.tombstone        = self.fingerprint_mask
+        self.max_slots        = max(self.MIN_SLOTS, 1<<(self.capacity*2-1).bit_length())
+        self.lock             = Lock()
+        self.clear()
+
+    def __fingerprint(self, packet_hash):
+        if len(packet_hash) < 8: packet_hash = RNS.Identity.full_hash(packet_hash)
+        fingerprint = int.from_bytes(packet_hash[:8], "little") & self.fingerprint_mask
+        if   fingerprint == self.EMPTY:     fingerprint = 1
+        elif fingerprint == self.tombstone: fingerprint = self.tombstone-1
+        return fingerprint
+
+    @staticmethod
+    def __find(slots, fingerprint):
+        mask = len(slots)-1; index = fingerprint & mask
+        while True:
+            value = slots[index]
+            if value == fingerprint: return index
+            if value == 0:           return None
+            index = (index+1) & mask
+
+    @staticmethod
+    def __insert(slots, fingerprint, tombstone):
+        # Returns whether a tombstone was reused
+        mask = len(slots)-1; index = fingerprint & mask
+        while slots[index] != 0 and slots[index] != tombstone: index = (index+1) & mask
+        reused = slots[index] == tombstone
+        slots[index] = fingerprint
+        return reused
+
+    def __rehash(self, size):
+        # Must be called with the filter lock held. Rebuilds
+        # the current generation without its tombstones.
+        slots = array.array("Q", bytes(8*size))
+        for fingerprint in self.current:
+            if fingerprint != self.EMPTY and fingerprint != self.tombstone: self.__insert(slots, fingerprint, self.tombstone)
+        self.current = slots
+        self.current_tombstones = 0
+
+    def __len__(self): return self.current_count+self.previous_count
+
+    def __contains__(self, packet_hash):
+        fingerprint = self.__fingerprint(packet_hash)
+        with self.lock:
+            if self.__find(self.current, fingerprint) != None: return True
+            if self.__find(self.previous, fingerprint) != None: return True
+            return False
+
+    def add(self, packet_hash):
+        fingerprint = self.__fingerprint(packet_hash)
+        with self.lock:
+            if self.__find(self.current, fingerprint) != None: return
+            if self.current_count >= self.capacity: self.rotate()
+            if (self.current_count+1)*2 > len(self.current) and len(self.current) < self.max_slots: self.__rehash(len(self.current)*2)
+            elif (self.current_count+self.current_tombstones+1)*4 > len(self.current)*3: self.__rehash(len(self.current))
+
+            if self.__insert(self.current, fingerprint, self.tombstone): self.current_tombstones -= 1
+            self.current_count += 1
+
+    def remove(self, packet_hash):
+        fingerprint = self.__fingerprint(packet_hash)
+        with self.lock:
+            index = self.__find(self.current, fingerprint)
+            if index != None:
+                self.current[index] = self.tombstone
+                self.current_count -= 1
+                self.current_tombstones += 1
+
+            index = self.__find(self.previous, fingerprint)
+            if index != None:
+                self.previous[index] = self.tombstone
+                self.previous_count -= 1
+
+    def rotate(self):
+        # Must be called with the filter lock held. The previous
+        # generation only ever loses entries, so its tombstones
+        # can never fill the slots left empty when it was current.
+        self.previous           = self.current
+        self.previous_count     = self.current_count
+        self.current            = array.array("Q", bytes(8*self.MIN_SLOTS))
+        self.current_count      = 0
+        self.current_tombstones = 0
+
+    def clear(self):
+        with self.lock:
+            self.current  = array.array("Q", bytes(8*self.MIN_SLOTS)); self.current_count  = 0
+            self.previous = array.array("Q", bytes(8*self.MIN_SLOTS)); self.previous_count = 0
+            self.current_tombstones = 0
+
+    def save(self, path):
+        with self.lock:
+            current  = array.array("Q", self.current);  current_count  = self.current_count
+            previous = array.array("Q", self.previous); previous_count = self.previous_count
+
+        if sys.byteorder != "little": current.byteswap(); previous.byteswap()
+        header = self.MAGIC+struct.pack(self.HEADER, self.VERSION, self.fingerprint_bits, len(current), current_count, len(previous), previous_count)
+        with open(path, "wb") as file:
+            file.write(header)
+            current.tofile(file)
+            previous.tofile(file)
+
+    def load(self, path):
+        # Filter state is mapped from disk and copied into the
+        # slot arrays in bulk. Files in the legacy format, which
+        # is a plain concatenation of packet hashes, are also
+        # accepted, and their hashes are added individually.
+        if os.path.getsize(path) == 0: return
+        header_length = len(self.MAGIC)+struct.calcsize(self.HEADER)
+        with open(path, "rb") as file:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                if mapped[:len(self.MAGIC)] != self.MAGIC:
+                    hashlen = RNS.Identity.HASHLENGTH//8
+                    for offset in range(0, len(mapped)-hashlen+1, hashlen): self.add(mapped[offset:offset+hashlen])
+
+                else:
+                    version, fingerprint_bits, current_slots, current_count, previous_slots, previous_count = struct.unpack(self.HEADER, mapped[len(self.MAGIC):header_length])
+                    if version != self.VERSION:                   raise ValueError(f"Unsupported packet hash filter version {version}")
+                    if fingerprint_bits != self.fingerprint_bits: raise ValueError("Stored packet hash filter fingerprint size does not match the configured filter")
+                    for slots in [current_slots, previous_slots]:
+                        if slots < self.MIN_SLOTS or slots > self.max_slots or slots & (slots-1) != 0: raise ValueError("Invalid packet hash filter size")
+                    if len(mapped) != header_length+8*(current_slots+previous_slots): raise ValueError("Invalid packet hash filter length")
+
+                    current_end = header_length+8*current_slots
+                    current  = array.array("Q"); current.frombytes(mapped[header_length:current_end])
+                    previous = array.array("Q"); previous.frombytes(mapped[current_end:current_end+8*previous_slots])
+                    if sys.byteorder != "little": current.byteswap(); previous.byteswap()
+                    if current.count(self.EMPTY) == 0 or previous.count(self.EMPTY) == 0: raise ValueError("Invalid packet hash filter state")
+                    with self.lock:
+                        self.current,  self.current_count  = current,  current_count
+                        self.previous, self.previous_count = previous, previous_count
+                        self.current_tombstones = current.count(self.tombstone)
+
+class ExpiryIndex():
+    """
+    Deadline index for table entries. Keys are kept on a min-heap ordered
+    by their scheduled deadline, so finding expired entries only touches
+    entries that are actually due. Since table entries are refreshed in
+    place in many locations, deadlines are re-evaluated when they come
+    due, and entries that are still alive are simply rescheduled.
+    """
+    def __init__(self):
+        self.heap      = []
+        self.scheduled = {}
+        self.sequence  = 0
+
+    def __len__(self): return len(self.scheduled)
+
+    def schedule(self, key, deadline):
+        # Only keep the earliest deadline for any key,
+        # later ones are found when it is re-evaluated.
+        if key in self.scheduled and self.scheduled[key] <= deadline: return
+        self.scheduled[key] = deadline
+        self.sequence += 1
+        heapq.heappush(self.heap, (deadline, self.sequence, key))
+
+    def pop_due(self, now):
+        due = []
+        while len(self.heap) > 0 and self.heap[0][0] <= now:
+            deadline, sequence, key = heapq.heappop(self.heap)
+            if key in self.scheduled and self.scheduled[key] == deadline:
+                self.scheduled.pop(key)
+                due.append(key)
+
+        return due
+
+    def expired(self, now, table, deadline_for):
+        expired = []
+        for key in self.pop_due(now):
+            if key in table:
+                deadline = deadline_for(table[key])
+                if now > deadline: expired.append(key)
+                else:              self.schedule(key, deadline)
+
+        return expired
+
+    def clear(self):
+        self.heap      = []
+        self.scheduled = {}
+
+class BoundedSet():
+    """
+    Set that remembers at most ``max_size`` of the most recently added
+    entries. Entries are kept in an insertion-ordered dict, so membership
+    checks are constant time, and the oldest entry is evicted when a new
+    one is added to a full set.
+    """
+    def __init__(self, max_size):
+        self.max_size = max(1, max_size)
+        self.entries  = {}
+
+    def __len__(self): return len(self.entries)
+
+    def __contains__(self, entry): return entry in self.entries
+
+    def add(self, entry):
+        # Returns True if the entry was not already in the set
+        if entry in self.entries: return False
+        if len(self.entries) >= self.max_size: del self.entries[next(iter(self.entries))]
+        self.entries[entry] = None
+        return True
+
+    def clear(self):
+        self.entries = {}
+
+class PathEntry():
+    """
+    Compact path table record. Entries can be indexed with the IDX_PT_*
+    constants just like the plain lists used for other tables, but only
+    hold fixed slots, and keep all random blobs for the destination in a
+    single byte string of fixed-width blobs.
+    """
+    __slots__ = ("timestamp", "next_hop", "hops", "expires", "blobs", "interface", "packet_hash")
+
+    BLOB_LENGTH = 10
+    FIELDS      = ("timestamp", "next_hop", "hops", "expires", "random_blobs", "interface", "packet_hash")
+
+    def __init__(self, timestamp, next_hop, hops, expires, random_blobs, interface, packet_hash):
+        self.timestamp    = timestamp
+        self.next_hop     = next_hop
+        self.hops         = hops
+        self.expires      = expires
+        self.random_blobs = random_blobs
+        self.interface    = interface
+        self.packet_hash  = packet_hash
+
+    @property
+    def random_blobs(self):
+        bl = PathEntry.BLOB_LENGTH
+        return [self.blobs[i:i+bl] for i in range(0, len(self.blobs), bl)]
+
+    @random_blobs.setter
+    def random_blobs(self, random_blobs):
+        self.blobs = b"".join([blob for blob in random_blobs if len(blob) == PathEntry.BLOB_LENGTH])
+
+    def __getitem__(self, index): return getattr(self, PathEntry.FIELDS[index])
+    def __setitem__(self, index, value): setattr(self, PathEntry.FIELDS[index], value)
+    def __len__(self): return len(PathEntry.FIELDS)
+    def __iter__(self): return iter([getattr(self, field) for field in PathEntry.FIELDS])
+    def __repr__(self): return f"<PathEntry {RNS.prettyhexrep(self.next_hop)} {self.hops} hops on {self.interface}>"
+
+class TableJournal():
+    """
+    Snapshot and append-only journal storage for a persisted table. The
+    snapshot is a msgpacked list of serialised entries, keyed by their
+    first element, and is written in the same format as before. Changes
+    since the last snapshot are appended to the journal as length-prefixed
+    records, and the journal is folded into a new snapshot once it grows
+    larger than the table itself.
+
+    Each journal starts with a record holding a digest of the snapshot it
+    extends. If the process stops after a new snapshot was moved into place,
+    but before the old journal was removed, the old journal no longer
+    matches the snapshot, and is discarded instead of being replayed.
+    """
+    SET                 = 0x01
+    REMOVE              = 0x02
+    BASE                = 0x03
+    MIN_COMPACT_RECORDS = 1024
+    HEADER              = "!I"
+    HEADER_LENGTH       = struct.calcsize(HEADER)
+    NO_SNAPSHOT         = b""
+
+    def __init__(self, path):
+        self.path            = path
+        self.journal_path    = path+".journal"
+        self.records         = 0
+        self.snapshot_digest = None
+
+    def exists(self): return os.path.isfile(self.path) or os.path.isfile(self.journal_path)
+
+    def should_compact(self, table_size):
+        if not os.path.isfile(self.path): return True
+        else: return self.records > max(TableJournal.MIN_COMPACT_RECORDS, table_size)
+
+    @staticmethod
+    def digest(snapshot): return RNS.Identity.full_hash(snapshot)[:RNS.Reticulum.TRUNCATED_HASHLENGTH//8]
+
+    def current_snapshot_digest(self):
+        if self.snapshot_digest == None:
+            if os.path.isfile(self.path):
+                with open(self.path, "rb") as file: self.snapshot_digest = TableJournal.digest(file.read())
+            else: self.snapshot_digest = TableJournal.NO_SNAPSHOT
+
+        return self.snapshot_digest
+
+    def load(self):
+        entries = {}
+        self.snapshot_digest = TableJournal.NO_SNAPSHOT
+        if os.path.isfile(self.path):
+            with open(self.path, "rb") as file: snapshot = file.read()
+            self.snapshot_digest = TableJournal.digest(snapshot)
+            for serialised_entry in umsgpack.unpackb(snapshot): entries[serialised_entry[0]] = serialised_entry
+
+        self.records = 0
+        if os.path.isfile(self.journal_path):
+            with open(self.journal_path, "rb") as file: journal = file.read()
+            offset = 0; hl = TableJournal.HEADER_LENGTH
+            while offset+hl <= len(journal):
+                length = struct.unpack(TableJournal.HEADER, journal[offset:offset+hl])[0]
+                if offset+hl+length > len(journal):
+                    RNS.log(f"Ignoring truncated record at end of {self.journal_path}", RNS.LOG_WARNING)
+                    break
+
+                try: op, key, value = umsgpack.unpackb(journal[offset+hl:offset+hl+length])
+                except Exception as e:
+                    RNS.log(f"Ignoring invalid record at end of {self.journal_path}: {e}", RNS.LOG_WARNING)
+                    break
+
+                if op == TableJournal.BASE:
+                    if key != self.snapshot_digest:
+                        RNS.log(f"Discarding {self.journal_path}, since it does not extend the current snapshot", RNS.LOG_WARNING)
+                        os.unlink(self.journal_path); self.records = 0
+                        break
+
+                elif op == TableJournal.SET:    entries[key] = value; self.records += 1
+                elif op == TableJournal.REMOVE: entries.pop(key, None); self.records += 1
+                offset += hl+length
+
+        return list(entries.values())
+
+    def append(self, changes):
+        # Changes are (key, serialised_entry) tuples, where
+        # an entry of None records removal of the key.
+        if len(changes) == 0: return
+        records = []; change_count = len(changes)
+        if not os.path.isfile(self.journal_path) or os.path.getsize(self.journal_path) == 0:
+            changes = [(TableJournal.BASE, self.current_snapshot_digest())]+changes
+
+        for key, serialised_entry in changes:
+            if key == TableJournal.BASE:   record = umsgpack.packb([TableJournal.BASE, serialised_entry, None])
+            elif serialised_entry == None: record = umsgpack.packb([TableJournal.REMOVE, key, None])
+            else:                          record = umsgpack.packb([TableJournal.SET, key, serialised_entry])
+            records.append(struct.pack(TableJournal.HEADER, len(record))+record)
+
+        with open(self.journal_path, "ab") as file:
+            file.write(b"".join(records))
+            file.flush()
+
+        self.records += change_count
+
+    def write_snapshot(self, serialised_entries):
+        snapshot = umsgpack.packb(serialised_entries)
+        snapshot_path = self.path+".tmp"
+        with open(snapshot_path, "wb") as file:
+            file.write(snapshot)
+            file.flush()
+            os.fsync(file.fileno())
+
+        os.replace(snapshot_path, self.path)
+        self.snapshot_digest = TableJournal.digest(snapshot)
+        if os.path.isfile(self.journal_path): os.unlink(self.journal_path)
+        self.records = 0
+
+class AnnounceDispatcher():
+    """
+    Delivers announces to registered announce handlers. Every handler has
+    a bounded queue and a worker thread of its own, so a slow or blocking
+    handler only holds up its own deliveries. If a handler can not keep up,
+    announces for it are dropped once ``MAX_QUEUED`` deliveries are waiting,
+    and the number of dropped deliveries is counted, instead of starting a
+    thread for every callback. Workers exit after ``IDLE_TIMEOUT`` seconds
+    without deliveries.
+    """
+    MAX_QUEUED        = 1024
+    IDLE_TIMEOUT      = 30
+    DROP_LOG_INTERVAL = 10
+
+    def __init__(self, max_queued=MAX_QUEUED, idle_timeout=IDLE_TIMEOUT):
+        self.max_queued     = max(1, max_queued)
+        self.idle_timeout   = idle_timeout
+        self.lock           = Lock()
+        self.queues         = {}
+        self.wakeups        = {}
+        self.threads        = {}
+        self.busy           = 0
+        self.dispatched     = 0
+        self.delivered      = 0
+        self.failed         = 0
+        self.dropped        = 0
+        self.max_depth      = 0
+        self.unlogged_drops = 0
+        self.last_drop_log  = 0
+
+    def dispatch(self, handler, callback_args):
+        # Handlers are keyed by identity, since they are not
+        # required to be hashable. While a handler is queued
+        # or being called, its worker holds a reference to it.
+        key = id(handler); log_drops = 0
+        with self.lock:
+            if not key in self.queues:
+                self.queues[key] = deque()
+                self.wakeups[key] = threading.Condition(self.lock)
+
+            queue = self.queues[key]
+            if len(queue) >= self.max_queued:
+                self.dropped += 1; self.unlogged_drops += 1
+                now = time.time()
+                if now > self.last_drop_log+AnnounceDispatcher.DROP_LOG_INTERVAL:
+                    log_drops = self.unlogged_drops
+                    self.unlogged_drops = 0
+                    self.last_drop_log = now
+
+            else:
+                queue.append(callback_args)
+                self.dispatched += 1
+                if len(queue) > self.max_depth: self.max_depth = len(queue)
+                if not key in self.threads:
+                    thread = threading.Thread(target=self.job, args=(key, handler), daemon=True)
+                    self.threads[key] = thread
+                    thread.start()
+
+                self.wakeups[key].notify()
+                return True
+
+        if log_drops > 0: RNS.log(f"Announce handler {handler} can not keep up, dropped {log_drops} announce deliveries", RNS.LOG_WARNING)
+        return False
+
+    def discard(self, handler):
+        # Drops any deliveries still waiting for a deregistered
+        # handler, and lets its worker exit immediately
+        key = id(handler)
+        with self.lock:
+            if key in self.queues:
+                self.queues[key].clear()
+                self.wakeups[key].notify()
+
+    def job(self, key, handler):
+        while True:
+            with self.lock:
+                queue = self.queues[key]
+                if len(queue) == 0: self.wakeups[key].wait(self.idle_timeout)
+                if len(queue) == 0:
+                    self.queues.pop(key); self.wakeups.pop(key); self.threads.pop(key)
+                    return
+
+                callback_args = queue.popleft()
+                self.busy += 1
+
+            delivered = False
+            try:
+                handler.received_announce(**callback_args)
+                delivered = True
+
+            except Exception as e:
+                RNS.log("Error while processing external announce callback.", RNS.LOG_ERROR)
+                RNS.log("The contained exception was: "+str(e), RNS.LOG_ERROR)
+                RNS.trace_exception(e)
+
+            finally:
+                with self.lock:
+                    self.busy -= 1
+                    if delivered: self.delivered += 1
+                    else:         self.failed += 1
+
+    def stats(self):
+        with self.lock:
+            return {"workers": len(self.threads), "busy": self.busy, "queued": sum([len(q) for q in self.queues.values()]), "max_queued": self.max_depth,
+                    "dispatched": self.dispatched, "delivered": self.delivered, "failed": self.failed, "dropped": self.dropped}
+
+class InboundPipeline():
+    """
+    Staged processing of inbound frames. Interfaces hand received frames
+    to a bounded ingress queue of their own, and can return to reading
+    immediately. A classifier stage services the ingress queues in turn,
+    checks interface access codes and unpacks the frames. The resulting
+    packets are then processed by separate worker stages for announces
+    and for all other traffic, so a burst of announces does not hold up
+    data and link traffic.
+
+    When an ingress queue is full, newly received frames are dropped with
+    the ``DROP`` policy. With the ``BLOCK`` policy, the receiving interface
+    waits for room in the queue for up to ``BLOCK_TIMEOUT`` seconds first.
+    The announce stage always drops announces it has no room for, while
+    the classifier waits for room in the traffic stage for as long as it
+    takes, which in turn fills up the ingress queues. Data and link
+    traffic is thereby only ever dropped at ingress.
+    """
+    DROP          = 0x00
+    BLOCK         = 0x01
+    policies      = [DROP, BLOCK]
+
+    QUEUE_SIZE    = 256
+    STAGE_SIZE    = 1024
+    BATCH_SIZE    = 16
+    BLOCK_TIMEOUT = 5.0
+
+    def __init__(self, classify, process, queue_size=QUEUE_SIZE, policy=DROP, stage_size=STAGE_SIZE):
+        self.classify       = classify
+        self.queue_size     = max(1, queue_size)
+        self.policy         = policy if policy in InboundPipeline.policies else InboundPipeline.DROP
+        self.ingress_queues = {}
+        self.lock           = Lock()
+        self.pending        = threading.Condition(self.lock)
+        self.space          = threading.Condition(self.lock)
+        self.queued         = 0
+        self.classified     = 0
+        self.discarded      = 0
+        self.should_run     = False
+        self.thread_ids     = set()
+        self.announces      = PipelineStage(self, process, stage_size, InboundPipeline.DROP)
+        self.traffic        = PipelineStage(self, process, stage_size, InboundPipeline.BLOCK)
+
+    def start(self):
+        if not self.should_run:
+            RNS.log(f"Starting staged inbound pipeline with ingress queues of {self.queue_size} frames", RNS.LOG_DEBUG)
+            self.should_run = True
+            self.announces.start()
+            self.traffic.start()
+            threading.Thread(target=self.job, daemon=True).start()
+
+    def stop(self):
+        self.should_run = False
+        with self.lock:
+            self.pending.notify_all()
+            self.space.notify_all()
+
+        self.announces.stop()
+        self.traffic.stop()
+
+    def is_stage_thread(self):
+        return threading.get_ident() in self.thread_ids
+
+    def ingress(self, raw, interface, link_stats=None):
+        with self.lock:
+            if not interface in self.ingress_queues: self.ingress_queues[interface] = IngressQueue()
+            ingress = self.ingress_queues[interface]
+            ingress.received += 1
+            if len(ingress.queue) >= self.queue_size and self.policy == InboundPipeline.BLOCK:
+                deadline = time.time()+InboundPipeline.BLOCK_TIMEOUT
+                while len(ingress.queue) >= self.queue_size and self.should_run and time.time() < deadline:
+                    self.space.wait(deadline-time.time())
+
+            if len(ingress.queue) >= self.queue_size:
+                ingress.dropped += 1
+                RNS.log(f"Ingress queue for {interface} full, dropping frame", RNS.LOG_EXTREME) if RNS.sl(RNS.LOG_EXTREME) else None
+                return False
+
+            ingress.queue.append((raw, link_stats))
+            if len(ingress.queue) > ingress.max_depth: ingress.max_depth = len(ingress.queue)
+            self.queued += 1
+            self.pending.notify()
+            return True
+
+    def job(self):
+        self.thread_ids.add(threading.get_ident())
+        while self.should_run:
+            batch = []
+            with self.lock:
+                while self.queued == 0 and self.should_run: self.pending.wait()
+
+                # Take a batch from each ingress queue in turn, so
+                # one busy interface can not starve the others
+                for interface in list(self.ingress_queues.keys()):
+                    ingress = self.ingress_queues[interface]
+                    for i in range(0, min(len(ingress.queue), InboundPipeline.BATCH_SIZE)):
+                        raw, link_stats = ingress.queue.popleft()
+                        batch.append((raw, interface, link_stats))
+                        self.queued -= 1
+
+                    if len(ingress.queue) == 0 and getattr(interface, "detached", False): self.ingress_queues.pop(interface)
+
+                self.space.notify_all()
+
+            for raw, interface, link_stats in batch:
+                try:
+                    packet = self.classify(raw, interface)
+                    if packet == None: self.discarded += 1
+                    else:
+                        self.classified += 1
+                        if packet.packet_type == RNS.Packet.ANNOUNCE: self.announces.put((packet, interface, link_stats))
+                        else:                                         self.traffic.put((packet, interface, link_stats))
+
+                except Exception as e:
+                    RNS.log(f"Error while classifying inbound frame from {interface}: {e}", RNS.LOG_ERROR)
+                    RNS.trace_exception(e)
+
+    def interface_stats(self, interface):
+        with self.lock:
+            if not interface in self.ingress_queues: return {"queued": 0, "max_queued": 0, "received": 0, "dropped": 0}
+            else:
+                ingress = self.ingress_queues[interface]
+                return {"queued": len(ingress.queue), "max_queued": ingress.max_depth, "received": ingress.received, "dropped": ingress.dropped}
+
+    def stats(self):
+        interfaces = {}
+        for interface in list(self.ingress_queues.keys()): interfaces[str(interface)] = self.interface_stats(interface)
+        return {"interfaces": interfaces, "queued": self.queued, "classified": self.classified, "discarded": self.discarded,
+                "announces": self.announces.stats(), "traffic": self.traffic.stats()}
+
+class IngressQueue():
+    __slots__ = ("queue", "received", "dropped", "max_depth")
+
+    def __init__(self):
+        self.queue     = deque()
+        self.received  = 0
+        self.dropped   = 0
+        self.max_depth = 0
+
+class PipelineStage():
+    def __init__(self, pipeline, process, max_queued, policy):
+        self.pipeline   = pipeline
+        self.process    = process
+        self.max_queued = max(1, max_queued)
+        self.policy     = policy
+        self.queue      = deque()
+        self.lock       = Lock()
+        self.pending    = threading.Condition(self.lock)
+        self.space      = threading.Condition(self.lock)
+        self.should_run = False
+        self.processed  = 0
+        self.dropped    = 0
+        self.max_depth  = 0
+
+    def start(self):
+        if not self.should_run:
+            self.should_run = True
+            threading.Thread(target=self.job, daemon=True).start()
+
+    def stop(self):
+        self.should_run = False
+        with self.lock:
+            self.pending.notify_all()
+            self.space.notify_all()
+
+    def put(self, item):
+        with self.lock:
+            # Blocking stages push back on the classifier without a
+            # time limit, and only drop items when they are stopped
+            if self.policy == InboundPipeline.BLOCK:
+                while len(self.queue) >= self.max_queued and self.should_run: self.space.wait()
+
+            if len(self.queue) >= self.max_queued:
+                self.dropped += 1
+                return False
+
+            self.queue.append(item)
+            if len(self.queue) > self.max_depth: self.max_depth = len(self.queue)
+            self.pending.notify()
+            return True
+
+    def job(self):
+        self.pipeline.thread_ids.add(threading.get_ident())
+        while self.should_run:
+            with self.lock:
+                while len(self.queue) == 0 and self.should_run: self.pending.wait()
+                if not self.should_run: break
+                batch = [self.queue.popleft() for i in range(0, min(len(self.queue), InboundPipeline.BATCH_SIZE))]
+                self.space.notify_all()
+
+            for packet, interface, link_stats in batch:
+                try: self.process(packet, interface, link_stats)
+                except Exception as e:
+                    RNS.log(f"Error while processing inbound packet from {interface}: {e}", RNS.LOG_ERROR)
+                    RNS.trace_exception(e)
+
+                self.processed += 1
+
+    def stats(self):
+        with self.lock: return {"queued": len(self.queue), "max_queued": self.max_depth, "processed": self.processed, "dropped": self.dropped}
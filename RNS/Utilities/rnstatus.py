@@ -664,6 +664,13 @@ def program_setup(configdir, dispall=False, verbosity=0, name_filter=None, json=
             txstat  = txb_str+"  "+RNS.prettyspeed(stats["txs"])
             print(f"\n Totals       : {txstat}\n                {rxstat}")
 
+        if "backbone_workers" in stats and stats["backbone_workers"] != None and len(stats["backbone_workers"]) > 1:
+            print("")
+            for worker in stats["backbone_workers"]:
+                cs = "client" if worker["clients"] == 1 else "clients"
+                ws = f"I/O worker {worker['index']}"
+                print(f" {ws:<13}: {worker['clients']} {cs}, ↑{RNS.prettysize(worker['txb'])} ↓{RNS.prettysize(worker['rxb'])}, {round(worker['load']*100, 1)}% busy")
+
         if "transport_id" in stats and stats["transport_id"] != None:
             print("\n Transport Instance "+RNS.prettyhexrep(stats["transport_id"])+" running")
             if "network_id" in stats and stats["network_id"] != None:
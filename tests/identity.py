@@ -1,8 +1,10 @@
 import unittest
 
 import time
+import threading
 import RNS
 import os
+import tempfile
 
 signed_message = "e51a008b8b8ba855993d8892a40daad84a6fb69a7138e1b5f69b427fe03449826ab6ccb81f0d72b4725e8d55c814d3e8e151b495cf5b59702f197ec366d935ad04a98ca519d6964f96ea09910b020351d1cdff3befbad323a2a28a6ec7ced4d0d67f02c525f93b321d9b076d704408475bd2d123cd51916f7e49039246ac56add37ef87e32d7f9853ac44a7f77d26fedc83e4e67a45742b751c2599309f5eda6efa0dafd957f61af1f0e86c4d6c5052e0e5fa577db99846f2b7a0204c31cef4013ca51cb307506c9209fd18d0195a7c9ae628af1a1d9ee7a4cf30037ed190a9fdcaa4ce5bb7bea19803cb5b5cea8c21fdb98d8f73ff5aaad87f5f6c3b7bcfe8974e5b063cc1113d77b9e96bec1c9d10ed37b780c3f7349a34092bb3968daeced40eb0b5130c0d11595e30b9671896385d04289d067f671599386536eed8430a72e186fb95023d5ac5dd442443bfabfe13a84a38d060af73bf20f921f38a768672fdbcb1dfece7458166e2e15948d6b4fa81f42db48747d283c670f576a0b410b31a70d2594823d0e29135a488cb0408c9e5bc1e197ff99aef471924231ccc8e3eddc82dbcea4801f14c5fc7a389a26a52cc93cfe0770953ef595ff410b7033a6ed5c975dd922b3f48f9dffcfb412eeed5758f3aa51de7eb47cd2cb"
 sig_from_key_0 = "3020ef58f861591826a61c3d2d4a25b949cdb3094085ba6b1177a6f2a05f3cdd24d1095d6fdd078f0b2826e80b261c93c1ff97fbfd4857f25706d57dd073590c"
@@ -18,6 +20,27 @@ fixed_keys = [
     ("08bb35f92b06a0832991165a0d9b4fd91af7b7765ce4572aa6222070b11b767092b61b0fd18b3a59cae6deb9db6d4bfb1c7fcfe076cfd66eea7ddd5f877543b9", "d13712efc45ef87674fb5ac26c37c912"),
 ]
 
+class MockAnnounce:
+    def __init__(self, identity, app_data=b""):
+        name_hash   = RNS.Identity.full_hash(b"test.announce")[:RNS.Identity.NAME_HASH_LENGTH//8]
+        random_hash = os.urandom(10)
+        public_key  = identity.get_public_key()
+
+        self.packet_type         = RNS.Packet.ANNOUNCE
+        self.context_flag        = RNS.Packet.FLAG_UNSET
+        self.destination_hash    = RNS.Identity.full_hash(name_hash+identity.hash)[:RNS.Reticulum.TRUNCATED_HASHLENGTH//8]
+        self.transport_id        = None
+        self.receiving_interface = None
+        self.rssi                = None
+        self.snr                 = None
+        self.hops                = 1
+        self.validated_announce  = None
+
+        signature = identity.sign(self.destination_hash+public_key+name_hash+random_hash+app_data)
+        self.data = public_key+name_hash+random_hash+signature+app_data
+
+    def get_hash(self): return RNS.Identity.full_hash(self.data)
+
 class TestIdentity(unittest.TestCase):
 
     def test_0_create_from_bytes(self):
@@ -247,6 +270,383 @@ class TestIdentity(unittest.TestCase):
         print("    Max deviation from median: "+str(round(d_mpct, 1))+"%")
         print()
 
+    def test_3_announce_validation_cache(self):
+        identity = RNS.Identity()
+        announce = MockAnnounce(identity, app_data=b"app data")
+        stats = RNS.Identity.verified_announce_stats()
+
+        try:
+            # The signature is verified once, and later validation
+            # stages for the same packet reuse the unpacked announce
+            self.assertTrue(RNS.Identity.validate_announce(announce, only_validate_signature=True))
+            self.assertTrue(RNS.Identity.validate_announce(announce))
+            self.assertEqual(RNS.Identity.verified_announce_stats()["misses"], stats["misses"]+1)
+            self.assertEqual(RNS.Identity.verified_announce_stats()["hits"], stats["hits"])
+
+            # The same announce heard again is served from the cache
+            repeated = MockAnnounce(identity); repeated.data = announce.data
+            self.assertTrue(RNS.Identity.validate_announce(repeated))
+            self.assertEqual(RNS.Identity.verified_announce_stats()["misses"], stats["misses"]+1)
+            self.assertEqual(RNS.Identity.verified_announce_stats()["hits"], stats["hits"]+1)
+            self.assertEqual(RNS.Identity.recall(announce.destination_hash, _no_use=True).hash, identity.hash)
+
+            # Tampered announces must not validate from the cache
+            tampered = MockAnnounce(identity, app_data=b"app data")
+            tampered.data = announce.data[:-1]+b"x"
+            self.assertFalse(RNS.Identity.validate_announce(tampered))
+
+            forged = MockAnnounce(identity)
+            forged.data = forged.data[:-1]+bytes([forged.data[-1]^0x01])
+            self.assertFalse(RNS.Identity.validate_announce(forged))
+
+        finally:
+            RNS.Identity.known_destinations.pop(announce.destination_hash, None)
+
+    def test_4_known_destination_store(self):
+        print("")
+
+        from RNS.Identity import KnownDestinationStore
+        entries = 100000
+        now = time.time()
+        destination_hashes = [os.urandom(RNS.Reticulum.TRUNCATED_HASHLENGTH//8) for i in range(0, entries)]
+        with tempfile.TemporaryDirectory() as storage:
+            path = os.path.join(storage, "known_destinations.db")
+            store = KnownDestinationStore(path, cache_size=1024)
+
+            start = time.time()
+            for destination_hash in destination_hashes: store[destination_hash] = [now, os.urandom(32), os.urandom(64), b"app data", 0]
+            store.flush()
+            print(f"Stored {entries} known destinations in {round((time.time()-start)*1000, 2)}ms")
+            self.assertEqual(len(store.pending), 0)
+            self.assertEqual(len(store), entries)
+            self.assertEqual(len(store.cache), 1024)
+
+            # Modified entries are written behind, and
+            # read through from the database when evicted
+            entry = store[destination_hashes[0]]
+            entry[4] = -1
+            store[destination_hashes[0]] = entry
+            store.pop(destination_hashes[1])
+            self.assertFalse(destination_hashes[1] in store)
+            self.assertEqual(len(store), entries-1)
+            self.assertEqual(len([e for e in store.entries()]), entries-1)
+            store.close()
+
+            start = time.time()
+            store = KnownDestinationStore(path, cache_size=1024)
+            print(f"Opened store with {len(store)} known destinations in {round((time.time()-start)*1000, 2)}ms")
+            self.assertEqual(len(store), entries-1)
+            self.assertEqual(store[destination_hashes[0]][4], -1)
+            self.assertFalse(destination_hashes[1] in store)
+
+            start = time.time()
+            for destination_hash in destination_hashes[2:10002]: self.assertEqual(store[destination_hash][3], b"app data")
+            print(f"Uncached lookup took {round((time.time()-start)/10000*1e6, 2)}µs per destination")
+            self.assertEqual(len(store.cache), 1024)
+            store.close()
+
+    def test_4_known_destination_store_writer(self):
+        from unittest import mock
+        from RNS.Identity import KnownDestinationStore
+        now = time.time()
+        with tempfile.TemporaryDirectory() as storage:
+            path = os.path.join(storage, "known_destinations.db")
+            store = KnownDestinationStore(path)
+            reader = KnownDestinationStore(path, read_only=True)
+
+            def wait_for(condition, timeout=10):
+                deadline = time.time()+timeout
+                while not condition() and time.time() < deadline: time.sleep(0.05)
+                return condition()
+
+            # Changes are written shortly after they are made,
+            # and at once when a full batch is waiting
+            with mock.patch.object(KnownDestinationStore, "WRITE_DELAY", 0.1):
+                destination_hash = os.urandom(RNS.Reticulum.TRUNCATED_HASHLENGTH//8)
+                store[destination_hash] = [now, os.urandom(32), os.urandom(64), b"app data", 0]
+                self.assertTrue(wait_for(lambda: len(store.pending) == 0))
+                self.assertTrue(destination_hash in reader)
+
+            with mock.patch.object(KnownDestinationStore, "WRITE_DELAY", 60):
+                for i in range(0, KnownDestinationStore.BATCH_SIZE): store[os.urandom(RNS.Reticulum.TRUNCATED_HASHLENGTH//8)] = [now, os.urandom(32), os.urandom(64), None, 0]
+                self.assertTrue(wait_for(lambda: len(store.pending) == 0))
+                self.assertEqual(reader.db.execute("SELECT COUNT(*) FROM known_destinations").fetchone()[0], KnownDestinationStore.BATCH_SIZE+1)
+
+            store.close(); reader.close()
+
+    def test_4_known_destination_store_client(self):
+        from unittest import mock
+        from RNS.Identity import KnownDestinationStore
+        now = time.time()
+        destination_hashes = [os.urandom(RNS.Reticulum.TRUNCATED_HASHLENGTH//8) for i in range(0, 100)]
+        with tempfile.TemporaryDirectory() as storage, mock.patch.object(KnownDestinationStore, "WRITE_DELAY", 0.1):
+            path = os.path.join(storage, "known_destinations.db")
+            shared = KnownDestinationStore(path)
+            store = KnownDestinationStore(path, read_only=True)
+            public_key = os.urandom(64)
+            entries = {destination_hash: [now, os.urandom(32), public_key, b"app data", 0] for destination_hash in destination_hashes}
+            for destination_hash in destination_hashes: store[destination_hash] = entries[destination_hash]
+
+            # Changes in a client are never written by it, and
+            # are held until the shared instance has written
+            # the same destinations
+            for destination_hash in destination_hashes[:50]: shared[destination_hash] = list(entries[destination_hash])
+            shared.flush()
+            deadline = time.time()+10
+            while len(store.pending) > 50 and time.time() < deadline: time.sleep(0.05)
+            self.assertEqual(set(store.pending.keys()), set(destination_hashes[50:]))
+            time.sleep(0.3)
+            self.assertEqual(len(store.pending), 50)
+
+            store.cache.clear()
+            self.assertEqual(len(store), 100)
+            for destination_hash in destination_hashes: self.assertEqual(store[destination_hash][2], public_key)
+            self.assertEqual(set(store.destinations_for_identity(RNS.Identity.truncated_hash(public_key))), set(destination_hashes))
+            store.close()
+            self.assertEqual(shared.db.execute("SELECT COUNT(*) FROM known_destinations").fetchone()[0], 50)
+
+            # Storage errors are logged and treated as unknown
+            shared.db.close()
+            self.assertFalse(os.urandom(RNS.Reticulum.TRUNCATED_HASHLENGTH//8) in shared)
+            self.assertEqual(shared.destinations_for_identity(os.urandom(RNS.Reticulum.TRUNCATED_HASHLENGTH//8)), [])
+
+    def test_4_known_destination_store_import(self):
+        from unittest import mock
+        from RNS.vendor import umsgpack
+        from RNS.Identity import KnownDestinationStore
+        destination_hash = os.urandom(RNS.Reticulum.TRUNCATED_HASHLENGTH//8)
+        public_key = os.urandom(64)
+        with tempfile.TemporaryDirectory() as storage, \
+             mock.patch.object(RNS.Reticulum, "storagepath", storage), \
+             mock.patch.object(RNS.Reticulum, "get_instance", return_value=None), \
+             mock.patch.object(RNS.Identity, "known_destinations", {}), \
+             mock.patch.object(RNS.Identity, "known_identities", {}):
+            with open(os.path.join(storage, "known_destinations"), "wb") as file: umsgpack.dump({destination_hash: [time.time(), os.urandom(32), public_key, None, 0]}, file)
+
+            # A failed import falls back to the legacy file,
+            # and is retried on the next start
+            with mock.patch.object(KnownDestinationStore, "import_entries", side_effect=OSError("Disk full")):
+                RNS.Identity.load_known_destinations()
+            self.assertFalse(isinstance(RNS.Identity.known_destinations, KnownDestinationStore))
+            self.assertTrue(destination_hash in RNS.Identity.known_destinations)
+
+            RNS.Identity.known_destinations = {}
+            RNS.Identity.load_known_destinations()
+            store = RNS.Identity.known_destinations
+            self.assertTrue(isinstance(store, KnownDestinationStore))
+            self.assertTrue(store.legacy_imported())
+            self.assertEqual(store[destination_hash][2], public_key)
+            store.close()
+
+    def test_5_identity_hash_index(self):
+        print("")
+
+        entries = 1000000
+        known_destinations = RNS.Identity.known_destinations
+        known_identities = RNS.Identity.known_identities
+        RNS.Identity.known_destinations = {}
+        RNS.Identity.known_identities = {}
+
+        try:
+            public_keys = [os.urandom(RNS.Identity.KEYSIZE//8) for i in range(0, entries//2)]
+            start = time.time()
+            for i in range(0, entries): RNS.Identity.remember(os.urandom(32), os.urandom(RNS.Reticulum.TRUNCATED_HASHLENGTH//8), public_keys[i//2])
+            print(f"Remembered {entries} destinations in {round(time.time()-start, 2)}s")
+
+            identity_hashes = [RNS.Identity.truncated_hash(public_key) for public_key in public_keys[-1000:]]
+            start = time.time()
+            for identity_hash in identity_hashes:
+                identity = RNS.Identity.recall(identity_hash, from_identity_hash=True, _no_use=True)
+                self.assertEqual(identity.hash, identity_hash)
+            t = (time.time()-start)/len(identity_hashes)
+
+            start = time.time()
+            for destination_hash in list(RNS.Identity.known_destinations.keys()):
+                if identity_hashes[-1] == RNS.Identity.truncated_hash(RNS.Identity.known_destinations[destination_hash][2]): break
+            sweep_time = time.time()-start
+            print(f"Recall from identity hash at {entries} known destinations took {round(t*1e6, 2)}µs, a full table sweep took {round(sweep_time*1000, 2)}ms")
+
+            self.assertEqual(len(RNS.Identity._destinations_for_identity(identity_hashes[0])), 2)
+            self.assertEqual(RNS.Identity.recall(os.urandom(RNS.Reticulum.TRUNCATED_HASHLENGTH//8), from_identity_hash=True), None)
+
+        finally:
+            RNS.Identity.known_destinations = known_destinations
+            RNS.Identity.known_identities = known_identities
+
+    def test_6_identity_hash_index_store(self):
+        from RNS.Identity import KnownDestinationStore
+        with tempfile.TemporaryDirectory() as storage:
+            store = KnownDestinationStore(os.path.join(storage, "known_destinations.db"))
+            identity = RNS.Identity()
+            destination_hashes = [os.urandom(RNS.Reticulum.TRUNCATED_HASHLENGTH//8) for i in range(0, 3)]
+            for destination_hash in destination_hashes: store[destination_hash] = [time.time(), os.urandom(32), identity.get_public_key(), None, 0]
+            store[os.urandom(RNS.Reticulum.TRUNCATED_HASHLENGTH//8)] = [time.time(), os.urandom(32), RNS.Identity().get_public_key(), None, 0]
+
+            # Pending and flushed entries are both found
+            self.assertEqual(sorted(store.destinations_for_identity(identity.hash)), sorted(destination_hashes))
+            store.flush()
+            self.assertEqual(sorted(store.destinations_for_identity(identity.hash)), sorted(destination_hashes))
+            store.pop(destination_hashes[0])
+            self.assertEqual(sorted(store.destinations_for_identity(identity.hash)), sorted(destination_hashes[1:]))
+            store.flush()
+            self.assertEqual(sorted(store.destinations_for_identity(identity.hash)), sorted(destination_hashes[1:]))
+            store.close()
+
+    def test_7_identity_cache(self):
+        print("")
+
+        identity = RNS.Identity()
+        destination_hash = os.urandom(RNS.Reticulum.TRUNCATED_HASHLENGTH//8)
+        RNS.Identity.remember(os.urandom(32), destination_hash, identity.get_public_key(), b"app data")
+
+        try:
+            rounds = 2000
+            stats = RNS.Identity.identity_cache_stats()
+            start = time.time()
+            for i in range(0, rounds): recalled = RNS.Identity.recall(destination_hash, _no_use=True)
+            cached_time = (time.time()-start)/rounds
+            self.assertEqual(recalled.hash, identity.hash)
+            self.assertEqual(RNS.Identity.identity_cache_stats()["misses"], stats["misses"]+1)
+            self.assertEqual(RNS.Identity.identity_cache_stats()["hits"], stats["hits"]+rounds-1)
+
+            start = time.time()
+            for i in range(0, rounds):
+                uncached = RNS.Identity(create_keys=False)
+                uncached.load_public_key(identity.get_public_key())
+            uncached_time = (time.time()-start)/rounds
+            print(f"Cached recall took {round(cached_time*1e6, 2)}µs, constructing the identity took {round(uncached_time*1e6, 2)}µs")
+
+            # Changed app data invalidates the cached identity
+            RNS.Identity.remember(os.urandom(32), destination_hash, identity.get_public_key(), b"new app data")
+            self.assertEqual(RNS.Identity.recall(destination_hash, _no_use=True).app_data, b"new app data")
+            self.assertTrue(RNS.Identity.recall(destination_hash, _no_use=True) is RNS.Identity.recall(destination_hash, _no_use=True))
+
+            cache_size = RNS.Identity.identity_cache_size
+            RNS.Identity.set_identity_cache_size(0)
+            self.assertEqual(RNS.Identity.identity_cache_stats()["entries"], 0)
+            self.assertFalse(RNS.Identity.recall(destination_hash, _no_use=True) is RNS.Identity.recall(destination_hash, _no_use=True))
+            RNS.Identity.set_identity_cache_size(cache_size)
+
+        finally:
+            RNS.Identity.known_destinations.pop(destination_hash, None)
+            RNS.Identity._invalidate_cached_identity(destination_hash)
+
+    def test_8_ratchet_store(self):
+        print("")
+
+        from unittest import mock
+        from RNS.vendor import umsgpack
+        from RNS.Identity import RatchetStore
+        entries = 20000
+        now = time.time()
+        hash_length = RNS.Reticulum.TRUNCATED_HASHLENGTH//8
+        destination_hashes = [os.urandom(hash_length) for i in range(0, entries)]
+        with tempfile.TemporaryDirectory() as storage:
+            path = os.path.join(storage, "ratchets.db")
+            store = RatchetStore(path)
+
+            # Ratchets are queued and written in
+            # batches by a single writer thread
+            threads = threading.active_count()
+            start = time.time()
+            for destination_hash in destination_hashes: store.store(destination_hash, os.urandom(32), now)
+            print(f"Queued {entries} ratchets in {round((time.time()-start)*1000, 2)}ms")
+            self.assertLessEqual(threading.active_count(), threads+1)
+            self.assertEqual(store.load(destination_hashes[0])[1], now)
+
+            deadline = time.time()+10
+            while len(store.pending) > 0 and time.time() < deadline: time.sleep(0.1)
+            self.assertEqual(len(store.pending), 0)
+
+            expired_hashes = destination_hashes[:1000]
+            for destination_hash in expired_hashes: store.store(destination_hash, os.urandom(32), now-1000)
+            store.close()
+
+            # Legacy ratchet files are imported and removed
+            ratchetdir = os.path.join(storage, "ratchets")
+            os.makedirs(ratchetdir)
+            legacy_hash = os.urandom(hash_length)
+            legacy_ratchet = os.urandom(32)
+            with open(os.path.join(ratchetdir, legacy_hash.hex()), "wb") as rf: rf.write(umsgpack.packb({"ratchet": legacy_ratchet, "received": now}))
+
+            store = RatchetStore(path)
+            self.assertEqual(store.import_directory(ratchetdir), 1)
+            self.assertFalse(os.path.isdir(ratchetdir))
+            self.assertEqual(store.load(legacy_hash), (legacy_ratchet, now))
+
+            # Files are kept if writing the imported ratchets
+            # fails, and files that can not be imported are
+            # never removed
+            os.makedirs(ratchetdir)
+            failed_hash = os.urandom(hash_length)
+            with open(os.path.join(ratchetdir, failed_hash.hex()), "wb") as rf: rf.write(umsgpack.packb({"ratchet": legacy_ratchet, "received": now}))
+            with open(os.path.join(ratchetdir, os.urandom(hash_length).hex()), "wb") as rf: rf.write(b"corrupt")
+            with mock.patch.object(RatchetStore, "flush", side_effect=OSError("Disk full")):
+                self.assertRaises(OSError, store.import_directory, ratchetdir)
+            self.assertEqual(len(os.listdir(ratchetdir)), 2)
+            self.assertEqual(store.import_directory(ratchetdir), 1)
+            self.assertEqual(len(os.listdir(ratchetdir)), 1)
+            self.assertEqual(store.load(failed_hash), (legacy_ratchet, now))
+
+            unknown_hashes = set(destination_hashes[1000:2000])
+            start = time.time()
+            count, expired, not_known = store.clean(now-500, lambda destination_hash: not destination_hash in unknown_hashes)
+            print(f"Cleaned {count} ratchets in {round((time.time()-start)*1000, 2)}ms")
+            self.assertEqual((count, expired, not_known), (entries+2, 1000, 1000))
+            self.assertEqual(store.load(destination_hashes[0]), None)
+            self.assertEqual(store.load(destination_hashes[1000]), None)
+            self.assertEqual(len(store.load(destination_hashes[2000])[0]), 32)
+            store.close()
+
+    def test_9_ratchet_decryption(self):
+        print("")
+
+        class RatchetIDReceiver:
+            latest_ratchet_id = None
+
+        identity = RNS.Identity()
+        ratchets = [RNS.Identity._generate_ratchet() for i in range(0, 32)]
+        ratchet_keys = RNS.Identity._ratchet_keys(ratchets)
+        ratchet_ids = [RNS.Identity._get_ratchet_id(RNS.Identity._ratchet_public_bytes(ratchet)) for ratchet in ratchets]
+        self.assertEqual(list(ratchet_keys.keys()), ratchet_ids)
+
+        # Encrypt for the oldest retained ratchet
+        plaintext = os.urandom(128)
+        ciphertext = identity.encrypt(plaintext, ratchet=RNS.Identity._ratchet_public_bytes(ratchets[-1]))
+        receiver = RatchetIDReceiver()
+
+        start = time.time()
+        self.assertEqual(identity.decrypt(ciphertext, ratchets=ratchets, ratchet_id_receiver=receiver), plaintext)
+        print(f"Decryption with {len(ratchets)} ratchets took {round((time.time()-start)*1000, 2)}ms")
+        self.assertEqual(receiver.latest_ratchet_id, ratchet_ids[-1])
+
+        receiver.latest_ratchet_id = None
+        start = time.time()
+        self.assertEqual(identity.decrypt(ciphertext, ratchets=ratchet_keys, ratchet_id_receiver=receiver), plaintext)
+        print(f"Decryption with {len(ratchets)} precomputed ratchets took {round((time.time()-start)*1000, 2)}ms")
+        self.assertEqual(receiver.latest_ratchet_id, ratchet_ids[-1])
+
+        # Most recently used ratchets are attempted first
+        ratchet_keys.move_to_end(ratchet_ids[-1], last=False)
+        start = time.time()
+        self.assertEqual(identity.decrypt(ciphertext, ratchets=ratchet_keys, ratchet_id_receiver=receiver), plaintext)
+        print(f"Decryption with recently used ratchet took {round((time.time()-start)*1000, 2)}ms")
+
+        # A ratchet ID hint selects the right key directly,
+        # and an incorrect hint falls back to the other keys
+        ratchet_keys.move_to_end(ratchet_ids[-1])
+        start = time.time()
+        self.assertEqual(identity.decrypt(ciphertext, ratchets=ratchet_keys, ratchet_id_receiver=receiver, ratchet_id=ratchet_ids[-1]), plaintext)
+        print(f"Decryption with ratchet ID hint took {round((time.time()-start)*1000, 2)}ms")
+        receiver.latest_ratchet_id = None
+        self.assertEqual(identity.decrypt(ciphertext, ratchets=ratchet_keys, ratchet_id_receiver=receiver, ratchet_id=ratchet_ids[0]), plaintext)
+        self.assertEqual(receiver.latest_ratchet_id, ratchet_ids[-1])
+
+        # Enforced ratchets reject ciphertexts for unknown ratchets
+        del ratchet_keys[ratchet_ids[-1]]
+        self.assertEqual(identity.decrypt(ciphertext, ratchets=ratchet_keys, enforce_ratchets=True, ratchet_id_receiver=receiver), None)
+        self.assertEqual(receiver.latest_ratchet_id, None)
+
     def size_str(self, num, suffix='B'):
         units = ['','K','M','G','T','P','E','Z']
         last_unit = 'Y'
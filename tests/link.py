@@ -3,6 +3,7 @@
 
 import unittest
 
+import atexit
 import subprocess
 import shlex
 import threading
@@ -66,7 +67,10 @@ class TestLink(unittest.TestCase):
 
     @classmethod
     def tearDownClass(cls):
-        close_rns()
+        # The shared instance is stopped when the test process
+        # exits, since this instance exits as soon as it loses
+        # the connection, and would end any later tests with it
+        atexit.register(close_rns)
 
     @skipIf(os.getenv('SKIP_NORMAL_TESTS') != None, "Skipping")
     def test_00_valid_announce(self):
@@ -0,0 +1,1627 @@
+import unittest
+
+import os
+import time
+import tempfile
+import random
+import threading
+import struct
+import sys
+from concurrent.futures import ThreadPoolExecutor
+import RNS
+
+from RNS.Transport import AnnounceVerifier, PacketHashFilter, ExpiryIndex, PathEntry, TableJournal, AnnounceDispatcher, InboundPipeline
+from .identity import MockAnnounce
+
+class MockLink:
+    def __init__(self, initiator=False):
+        self.link_id = os.urandom(RNS.Reticulum.TRUNCATED_HASHLENGTH//8)
+        self.initiator = initiator
+        self.status = RNS.Link.ACTIVE
+        self.attached_interface = None
+
+class MockReceipt(RNS.PacketReceipt):
+    def __init__(self, timeout=10):
+        self.hash           = os.urandom(RNS.Identity.HASHLENGTH//8)
+        self.truncated_hash = self.hash[:RNS.Reticulum.TRUNCATED_HASHLENGTH//8]
+        self.sent_at        = time.time()
+        self.timeout        = timeout
+        self.status         = RNS.PacketReceipt.SENT
+
+class MockIFACInterface:
+    def __init__(self):
+        self.ifac_size = 16
+        self.ifac_key = RNS.Cryptography.hkdf(length=64, derive_from=RNS.Identity.full_hash(b"ifac_test"), salt=RNS.Reticulum.IFAC_SALT, context=None)
+        self.ifac_identity = RNS.Identity.from_bytes(self.ifac_key)
+        self.transmitted = None
+
+    def process_outgoing(self, data): self.transmitted = data
+
+def legacy_hdlc_deframe(frame_buffer, data_in, frames):
+    from RNS.Interfaces.util.framing import HDLC
+    frame_buffer += data_in
+    while True:
+        frame_start = frame_buffer.find(HDLC.FLAG)
+        if frame_start == -1: return b""
+        frame_end = frame_buffer.find(HDLC.FLAG, frame_start+1)
+        if frame_end == -1: return frame_buffer
+        frame = frame_buffer[frame_start+1:frame_end]
+        frame = frame.replace(bytes([HDLC.ESC, HDLC.FLAG ^ HDLC.ESC_MASK]), bytes([HDLC.FLAG]))
+        frame = frame.replace(bytes([HDLC.ESC, HDLC.ESC  ^ HDLC.ESC_MASK]), bytes([HDLC.ESC]))
+        if len(frame) != 0: frames.append(frame)
+        frame_buffer = frame_buffer[frame_end:]
+
+def legacy_kiss_deframe(data_in, frames):
+    from RNS.Interfaces.util.framing import KISS
+    in_frame = False; escape = False; command = KISS.CMD_UNKNOWN; data_buffer = b""
+    for byte in data_in:
+        if (in_frame and byte == KISS.FEND and command == KISS.CMD_DATA):
+            in_frame = False
+            frames.append(data_buffer)
+        elif (byte == KISS.FEND):
+            in_frame = True
+            command = KISS.CMD_UNKNOWN
+            data_buffer = b""
+        elif in_frame:
+            if (len(data_buffer) == 0 and command == KISS.CMD_UNKNOWN): command = byte & 0x0F
+            elif (command == KISS.CMD_DATA):
+                if (byte == KISS.FESC): escape = True
+                else:
+                    if (escape):
+                        if (byte == KISS.TFEND): byte = KISS.FEND
+                        if (byte == KISS.TFESC): byte = KISS.FESC
+                        escape = False
+                    data_buffer = data_buffer+bytes([byte])
+
+class MockBackboneClient:
+    def __init__(self, client_socket, remote):
+        from RNS.Interfaces.BackboneInterface import BackboneInterface, TransmitBuffer
+        from RNS.Interfaces.util.framing import HDLCDecoder
+        self.socket = client_socket
+        self.remote = remote
+        self.HW_MTU = BackboneInterface.HW_MTU
+        self.deframer = HDLCDecoder()
+        self.transmit_buffer = TransmitBuffer()
+        self.detached = False
+        self.parent_interface = None
+        self.txb = 0
+        self.received = 0
+        self.closed = threading.Event()
+
+    def receive(self, data_in):
+        from RNS.Interfaces.BackboneInterface import BackboneInterface
+        from RNS.Interfaces.util.framing import HDLC
+        if len(data_in) == 0: self.closed.set(); return
+        received = self.deframer.feed(data_in, self.HW_MTU*2)
+        for frame in received: self.transmit_buffer.append(HDLC.FLAG_BYTE, HDLC.escape(frame), HDLC.FLAG_BYTE)
+        self.received += len(received)
+        if len(received): BackboneInterface.tx_ready(self)
+
+class MockEchoOwner:
+    # Echoes every inbound frame back
+    # over the interface it arrived on
+    def inbound(self, data, interface): interface.process_outgoing(data)
+
+def mock_tcp_client(client_socket, kiss_framing=False, epoll_backend=True):
+    # Sets up a TCPClientInterface on a connected
+    # socket, without a running Reticulum instance
+    from RNS.Interfaces.TCPInterface import TCPClientInterface, TCPInterface
+    from RNS.Interfaces.BackboneInterface import TransmitBuffer
+    from RNS.Interfaces.util.framing import HDLCDecoder, KISSDecoder
+    interface = TCPClientInterface.__new__(TCPClientInterface)
+    interface.socket = client_socket
+    interface.owner = MockEchoOwner()
+    interface.name = "Mock"
+    interface.target_ip = "127.0.0.1"
+    interface.target_port = "0"
+    interface.HW_MTU = TCPInterface.HW_MTU
+    interface.ifac_size = None
+    interface.rxb = 0; interface.txb = 0
+    interface.online = True; interface.detached = False; interface.initiator = False; interface.writing = False
+    interface.parent_interface = None
+    interface.kiss_framing = kiss_framing
+    interface.decoder = KISSDecoder() if kiss_framing else HDLCDecoder()
+    interface.transmit_buffer = TransmitBuffer()
+    interface.epoll_backend = epoll_backend
+    return interface
+
+def reticulum_instance():
+    # Real interfaces take their defaults from the running
+    # instance, which is started here if this module runs
+    # on its own
+    if RNS.Reticulum.get_instance() == None:
+        from .link import init_rns
+        init_rns()
+
+    return RNS.Reticulum.get_instance()
+
+def backbone_echo(test, connections, frames_per_connection, frames, keep_open=False):
+    # Sends frames over a number of local socket pairs, which
+    # are echoed back by mock clients on the backbone engine
+    import socket
+    from RNS.Interfaces.BackboneInterface import BackboneInterface
+    from RNS.Interfaces.util.framing import HDLC
+
+    clients = []
+    for i in range(0, connections):
+        local, remote = socket.socketpair()
+        local.setblocking(0)
+        client = MockBackboneClient(local, remote)
+        clients.append(client)
+        BackboneInterface.add_client_socket(local, client)
+
+    payloads = [b"".join([HDLC.frame(random.choice(frames)) for i in range(0, frames_per_connection)]) for client in clients]
+    total_bytes = sum([len(payload) for payload in payloads])
+
+    def read_echo(remote, expected):
+        echoed = b""
+        while len(echoed) < expected:
+            data = remote.recv(65536)
+            if not data: break
+            echoed += data
+        return echoed
+
+    start = time.time()
+    for client, payload in zip(clients, payloads): client.remote.sendall(payload)
+    echoed = [read_echo(client.remote, len(payload)) for client, payload in zip(clients, payloads)]
+    echo_time = time.time()-start
+
+    test.assertEqual(echoed, payloads)
+    test.assertEqual(sum([client.received for client in clients]), connections*frames_per_connection)
+
+    if not keep_open:
+        for client in clients: client.remote.close()
+        for client in clients: test.assertTrue(client.closed.wait(5))
+        for client in clients: test.assertFalse(client in client.backbone_worker.clients.values())
+
+    return clients, echo_time, total_bytes
+
+def legacy_ifac_mask(interface, raw):
+    ifac = interface.ifac_identity.sign(raw)[-interface.ifac_size:]
+    mask = RNS.Cryptography.hkdf(length=len(raw)+interface.ifac_size, derive_from=ifac, salt=interface.ifac_key, context=None)
+    new_raw = bytes([raw[0] | 0x80, raw[1]])+ifac+raw[2:]
+    i = 0; masked_raw = b""
+    for byte in new_raw:
+        if i == 0: masked_raw += bytes([byte ^ mask[i] | 0x80])
+        elif i == 1 or i > interface.ifac_size+1: masked_raw += bytes([byte ^ mask[i]])
+        else: masked_raw += bytes([byte])
+        i += 1
+
+    return masked_raw
+
+class TestTransport(unittest.TestCase):
+
+    def test_0_link_dispatch(self):
+        print("")
+
+        rounds = 20000
+        timings = {}
+        for link_count in [10, 1000, 10000]:
+            links = [MockLink() for i in range(0, link_count)]
+            for link in links: RNS.Transport.register_link(link)
+
+            try:
+                link_ids = [random.choice(links).link_id for i in range(0, rounds)]
+                start = time.time()
+                for link_id in link_ids:
+                    link = RNS.Transport.find_active_link(link_id)
+                    self.assertNotEqual(link, None)
+                t = time.time() - start
+                timings[link_count] = t/rounds
+                print(f"Link dispatch with {link_count} active links: {round(timings[link_count]*1e6, 3)}µs per packet")
+
+            finally:
+                for link in links:
+                    RNS.Transport.active_links.remove(link)
+                    RNS.Transport.unmap_link(RNS.Transport.active_links_map, link)
+
+        self.assertEqual(RNS.Transport.find_active_link(os.urandom(RNS.Reticulum.TRUNCATED_HASHLENGTH//8)), None)
+
+        # Lookup time should stay flat as the link count grows,
+        # allow for generous timing jitter on loaded machines
+        self.assertLess(timings[10000], timings[10]*10)
+
+        pending_link = MockLink(initiator=True)
+        pending_link.status = RNS.Link.PENDING
+        RNS.Transport.register_link(pending_link)
+        self.assertEqual(RNS.Transport.find_pending_link(pending_link.link_id), pending_link)
+        self.assertEqual(RNS.Transport.find_active_link(pending_link.link_id), None)
+
+        pending_link.status = RNS.Link.ACTIVE
+        RNS.Transport.activate_link(pending_link)
+        self.assertEqual(RNS.Transport.find_pending_link(pending_link.link_id), None)
+        self.assertEqual(RNS.Transport.find_active_link(pending_link.link_id), pending_link)
+
+        RNS.Transport.active_links.remove(pending_link)
+        RNS.Transport.unmap_link(RNS.Transport.active_links_map, pending_link)
+
+    def test_1_receipt_registry(self):
+        receipts = [MockReceipt() for i in range(0, 10000)]
+        for receipt in receipts: RNS.Transport.register_receipt(receipt)
+
+        try:
+            self.assertEqual(RNS.Transport.receipt_count, len(receipts))
+            receipt = random.choice(receipts)
+            self.assertEqual(RNS.Transport.receipts[receipt.hash], [receipt])
+            self.assertEqual(RNS.Transport.receipts_truncated[receipt.truncated_hash], [receipt])
+
+            deadline = RNS.Transport.receipt_timeouts[0][0]
+            receipt.set_timeout(0.5)
+            self.assertEqual(RNS.Transport.receipt_timeouts[0][0], receipt.sent_at+0.5)
+            self.assertLess(RNS.Transport.receipt_timeouts[0][0], deadline)
+
+            # Timeouts can be changed while receipts_lock is held
+            # by proof validation, which calls back into channels
+            with RNS.Transport.receipts_lock:
+                rescheduler = threading.Thread(target=receipt.set_timeout, args=(0.25,), daemon=True)
+                rescheduler.start(); rescheduler.join(timeout=2)
+                self.assertFalse(rescheduler.is_alive())
+            self.assertEqual(RNS.Transport.receipt_timeouts[0][0], receipt.sent_at+0.25)
+
+            with RNS.Transport.receipts_lock: RNS.Transport.remove_receipt(receipt)
+            self.assertFalse(receipt.hash in RNS.Transport.receipts)
+            self.assertFalse(receipt.truncated_hash in RNS.Transport.receipts_truncated)
+            self.assertEqual(RNS.Transport.receipt_count, len(receipts)-1)
+
+        finally:
+            with RNS.Transport.receipts_lock:
+                for receipt in receipts: RNS.Transport.remove_receipt(receipt)
+                RNS.Transport.receipt_timeouts = []
+
+        self.assertEqual(RNS.Transport.receipt_count, 0)
+        self.assertEqual(len(RNS.Transport.receipts), 0)
+
+    def test_2_ifac_masking(self):
+        print("")
+
+        interface = MockIFACInterface()
+        for mtu in [500, 8192]:
+            raw = bytes([0x00, 0x00])+os.urandom(mtu-2)
+            ifac = os.urandom(interface.ifac_size)
+            expected_mask = bytearray(RNS.Cryptography.hkdf(length=mtu, derive_from=ifac, salt=interface.ifac_key, context=None))
+            expected_mask[2:2+interface.ifac_size] = bytes(interface.ifac_size)
+            self.assertEqual(RNS.Transport.ifac_mask(interface, ifac, mtu), expected_mask)
+
+            RNS.Transport.transmit(interface, raw)
+            self.assertEqual(interface.transmitted, legacy_ifac_mask(interface, raw))
+
+            rounds = 50
+            start = time.time()
+            for i in range(0, rounds): legacy_ifac_mask(interface, raw)
+            legacy_time = (time.time()-start)/rounds
+
+            start = time.time()
+            for i in range(0, rounds): RNS.Transport.transmit(interface, raw)
+            current_time = (time.time()-start)/rounds
+
+            print(f"IFAC masking at {mtu} byte MTU: {round(legacy_time*1e6, 1)}µs per packet before, {round(current_time*1e6, 1)}µs after")
+
+    def test_3_announce_verifier(self):
+        print("")
+
+        import copy
+        identity  = RNS.Identity()
+        announces = [MockAnnounce(identity) for i in range(0, 48)]
+        forged    = MockAnnounce(identity)
+        forged.data = forged.data[:-1]+bytes([forged.data[-1]^0x01])
+
+        # Thread workers only verify in parallel with a cryptography
+        # backend that releases the interpreter lock, worker processes
+        # do with any backend, if there are cores to run them on
+        print(f"Verifying announces on {os.cpu_count()} CPU cores")
+        for workers, use_processes in [(1, False), (2, False), (4, False), (8, False), (2, True), (4, True)]:
+            RNS.Identity.verified_announces.clear()
+            delivered = []
+            verifier = AnnounceVerifier(workers, use_processes=use_processes, callback=lambda packet, interface, link_stats=None: delivered.append(packet))
+            verifier.start()
+
+            try:
+                list(verifier.executor.map(abs, range(0, workers)))
+                batch = [(packet, None, (None, None, None)) for packet in announces]
+                batch.insert(len(batch)//2, (forged, None, (None, None, None)))
+                start = time.time()
+                verifier.process(batch)
+                t = time.time() - start
+
+            finally: verifier.stop()
+
+            # Verified announces must be delivered in
+            # their original order, and forged ones dropped
+            self.assertEqual(delivered, announces)
+            print(f"Announce verification with {workers} worker {'processes' if use_processes else 'threads'}: {round(len(batch)/t, 1)} announces/s")
+
+        for packet in announces:
+            public_key, name_hash, random_hash, ratchet, signature, app_data, signed_data = RNS.Identity.unpack_announce(packet)
+            self.assertTrue(RNS.Identity.is_verified_announce(packet.destination_hash, signature, signed_data))
+            self.assertEqual(packet.validated_announce[6], signed_data)
+        self.assertIsNone(forged.validated_announce)
+
+        # Copies of an announce heard on several interfaces
+        # are verified once per batch, and all delivered
+        RNS.Identity.verified_announces.clear()
+        delivered = []
+        verifier = AnnounceVerifier(1, callback=lambda packet, interface, link_stats=None: delivered.append(packet))
+        verifier.executor = ThreadPoolExecutor(max_workers=1)
+        copies = [copy.copy(announces[0]) for i in range(0, 3)]
+        forged_copy = copy.copy(forged)
+        verifier.process([(packet, None, (None, None, None)) for packet in [announces[0]]+copies+[forged, forged_copy]])
+        verifier.executor.shutdown()
+        self.assertEqual(delivered, [announces[0]]+copies)
+        self.assertEqual(verifier.deduplicated, 4)
+
+        # Signal statistics are taken from the interface when the
+        # announce is queued, not when the verified batch is processed
+        RNS.Identity.verified_announces.clear()
+        delivered = []
+        verifier = AnnounceVerifier(1, callback=lambda packet, interface, link_stats=None: delivered.append(link_stats))
+        interface = MockIFACInterface(); interface.r_stat_rssi = -90; interface.r_stat_snr = 5.5; interface.r_stat_q = 80
+        verifier.enqueue(announces[0], interface)
+        interface.r_stat_rssi = -30; interface.r_stat_snr = 12.0; interface.r_stat_q = 100
+        verifier.enqueue(announces[1], interface, link_stats=(-60, 8.0, 90))
+        verifier.executor = ThreadPoolExecutor(max_workers=1)
+        verifier.process([verifier.queue.popleft() for i in range(0, 2)])
+        verifier.executor.shutdown()
+        self.assertEqual(delivered, [(-90, 5.5, 80), (-60, 8.0, 90)])
+
+        RNS.Identity.verified_announces.clear()
+
+    def test_4_packet_hash_filter(self):
+        print("")
+
+        capacity = 50000
+        hashes = [RNS.Identity.full_hash(os.urandom(16)) for i in range(0, capacity*3)]
+        hash_filter = PacketHashFilter(capacity)
+
+        start = time.time()
+        for packet_hash in hashes[:capacity]: hash_filter.add(packet_hash)
+        t = time.time() - start
+        print(f"Packet hash filter insert: {round(t/capacity*1e6, 3)}µs per hash")
+
+        self.assertEqual(len(hash_filter), capacity)
+        for packet_hash in hashes[:capacity]: self.assertTrue(packet_hash in hash_filter)
+        for packet_hash in hashes[capacity*2:]: self.assertFalse(packet_hash in hash_filter)
+
+        # Adding another generation of hashes rotates the
+        # filter, and keeps the most recent hashes only.
+        for packet_hash in hashes[capacity:capacity*2]: hash_filter.add(packet_hash)
+        hash_filter.add(hashes[capacity*2])
+        self.assertFalse(hashes[0] in hash_filter)
+        self.assertTrue(hashes[capacity] in hash_filter)
+        self.assertTrue(hashes[capacity*2] in hash_filter)
+
+        hash_filter.remove(hashes[capacity+1])
+        self.assertFalse(hashes[capacity+1] in hash_filter)
+        self.assertTrue(hashes[capacity+2] in hash_filter)
+
+        with tempfile.TemporaryDirectory() as storage:
+            path = os.path.join(storage, "packet_hashlist.raw")
+            hash_filter.save(path)
+            loaded_filter = PacketHashFilter(capacity)
+            start = time.time()
+            loaded_filter.load(path)
+            print(f"Packet hash filter with {len(loaded_filter)} entries loaded in {round((time.time()-start)*1000, 3)}ms")
+            self.assertEqual(len(loaded_filter), len(hash_filter))
+            self.assertTrue(hashes[capacity*2] in loaded_filter)
+            self.assertFalse(hashes[capacity+1] in loaded_filter)
+
+            # Legacy hashlists are loaded as well
+            with open(path, "wb") as file:
+                for packet_hash in hashes[:100]: file.write(packet_hash)
+            legacy_filter = PacketHashFilter(capacity)
+            legacy_filter.load(path)
+            self.assertEqual(len(legacy_filter), 100)
+            self.assertTrue(hashes[99] in legacy_filter)
+
+            # Slots are stored in little-endian byte order
+            hash_filter.save(path)
+            with open(path, "rb") as file: stored = file.read()
+            header_length = len(PacketHashFilter.MAGIC)+struct.calcsize(PacketHashFilter.HEADER)
+            slot = next(i for i in range(0, len(hash_filter.current)) if hash_filter.current[i] != 0)
+            self.assertEqual(int.from_bytes(stored[header_length+8*slot:header_length+8*slot+8], "little"), hash_filter.current[slot])
+
+        # Insert and remove churn must not fill the table
+        # with tombstones, or lookups would never terminate
+        churn_filter = PacketHashFilter(600)
+        for packet_hash in hashes[:capacity]:
+            churn_filter.add(packet_hash)
+            churn_filter.remove(packet_hash)
+            self.assertLessEqual((churn_filter.current_count+churn_filter.current_tombstones)*4, len(churn_filter.current)*3)
+
+        self.assertEqual(len(churn_filter), 0)
+        self.assertFalse(hashes[capacity] in churn_filter)
+
+    def test_5_expiry_index(self):
+        print("")
+
+        entries = 100000
+        now = time.time()
+        table = {}
+        expiry_index = ExpiryIndex()
+        for i in range(0, entries):
+            key = i.to_bytes(16, "big")
+            table[key] = [now+i]
+            expiry_index.schedule(key, now+i)
+
+        self.assertEqual(len(expiry_index), entries)
+
+        # Only due entries are returned, and an earlier
+        # deadline for a key supersedes a later one.
+        expiry_index.schedule((entries-1).to_bytes(16, "big"), now-1)
+        self.assertEqual(expiry_index.pop_due(now-1), [(entries-1).to_bytes(16, "big")])
+        expiry_index.schedule((entries-1).to_bytes(16, "big"), now+entries-1)
+
+        # Entries refreshed in place are rescheduled rather
+        # than expired, and removed entries are skipped.
+        table[(10).to_bytes(16, "big")][0] = now+entries
+        table.pop((20).to_bytes(16, "big"))
+        start = time.time()
+        expired = expiry_index.expired(now+100.5, table, lambda entry: entry[0])
+        t = time.time() - start
+        print(f"Found {len(expired)} expired entries out of {len(table)} in {round(t*1000, 3)}ms")
+
+        self.assertEqual(len(expired), 99)
+        self.assertFalse((10).to_bytes(16, "big") in expired)
+        self.assertFalse((20).to_bytes(16, "big") in expired)
+        self.assertFalse((101).to_bytes(16, "big") in expired)
+        self.assertEqual(expiry_index.expired(now+100.5, table, lambda entry: entry[0]), [])
+        self.assertEqual(expiry_index.expired(now+entries+1, table, lambda entry: entry[0])[-1], (10).to_bytes(16, "big"))
+        self.assertEqual(len(expiry_index), 0)
+
+    def test_6_interface_table_indexes(self):
+        print("")
+
+        RNS.Transport.init_tables()
+        interfaces = [MockIFACInterface() for i in range(0, 4)]
+        for interface in interfaces: RNS.Transport.add_interface(interface)
+
+        try:
+            now = time.time()
+            entries = 2000
+            keys = []
+            for i in range(0, entries):
+                interface = interfaces[i%len(interfaces)]
+                next_interface = interfaces[(i+1)%len(interfaces)]
+                key = RNS.Identity.full_hash(i.to_bytes(4, "big"))[:RNS.Reticulum.TRUNCATED_HASHLENGTH//8]
+                keys.append(key)
+                with RNS.Transport.path_table_lock: RNS.Transport.set_path_entry(key, PathEntry(now, key, 1, now+60, [], interface, key))
+                with RNS.Transport.link_table_lock: RNS.Transport.set_link_entry(key, [now, key, next_interface, 1, interface, 1, key, True, now+60])
+                with RNS.Transport.reverse_table_lock: RNS.Transport.set_reverse_entry(key, [interface, next_interface, now])
+
+            # Replacing an entry moves it to the new interface
+            with RNS.Transport.path_table_lock: RNS.Transport.set_path_entry(key, PathEntry(now, key, 1, now+60, [], interfaces[0], key))
+            self.assertTrue(key in RNS.Transport.path_table_interfaces[interfaces[0]])
+            self.assertFalse(key in RNS.Transport.path_table_interfaces[interfaces[-1]])
+
+            removed_interface = interfaces[1]
+            RNS.Transport.remove_interface(removed_interface)
+            self.assertFalse(removed_interface in RNS.Transport.active_interfaces)
+            self.assertTrue(removed_interface in RNS.Transport.removed_interfaces)
+
+            start = time.time()
+            with RNS.Transport.path_table_lock:
+                for destination_hash in list(RNS.Transport.path_table_interfaces[removed_interface]):
+                    RNS.Transport.pop_path_entry(destination_hash)
+            t = time.time() - start
+            print(f"Evicted {entries//len(interfaces)} paths for removed interface in {round(t*1000, 3)}ms")
+
+            # A running instance may add its own paths, so only ours are counted
+            self.assertEqual(len([k for k in keys if k in RNS.Transport.path_table]), entries-entries//len(interfaces))
+            self.assertFalse(removed_interface in RNS.Transport.path_table_interfaces)
+            for destination_hash in RNS.Transport.path_table:
+                self.assertNotEqual(RNS.Transport.path_table[destination_hash][5], removed_interface)
+
+            # Links and reverse entries are indexed on both interfaces
+            self.assertEqual(len(RNS.Transport.link_table_interfaces[removed_interface]), 2*entries//len(interfaces))
+            self.assertEqual(len(RNS.Transport.reverse_table_interfaces[removed_interface]), 2*entries//len(interfaces))
+            with RNS.Transport.link_table_lock:
+                for link_id in list(RNS.Transport.link_table_interfaces[removed_interface]): RNS.Transport.pop_link_entry(link_id)
+            self.assertEqual(len([k for k in keys if k in RNS.Transport.link_table]), entries//2)
+            self.assertEqual(sum([len(RNS.Transport.link_table_interfaces[i]) for i in interfaces if i in RNS.Transport.link_table_interfaces]), entries)
+
+            # Entries created for a removed interface after it was
+            # culled put the interface back up for culling
+            RNS.Transport.removed_interfaces = []
+            with RNS.Transport.path_table_lock: RNS.Transport.set_path_entry(key, PathEntry(now, key, 1, now+60, [], removed_interface, key))
+            self.assertEqual(RNS.Transport.removed_interfaces, [removed_interface])
+            with RNS.Transport.reverse_table_lock: RNS.Transport.set_reverse_entry(key, [removed_interface, interfaces[0], now])
+            self.assertEqual(RNS.Transport.removed_interfaces, [removed_interface])
+            with RNS.Transport.link_table_lock: RNS.Transport.set_link_entry(key, [now, key, interfaces[0], 1, interfaces[2], 1, key, True, now+60])
+            self.assertEqual(RNS.Transport.removed_interfaces, [removed_interface])
+
+        finally:
+            for interface in interfaces: RNS.Transport.remove_interface(interface)
+            RNS.Transport.removed_interfaces = []
+            RNS.Transport.clear_tables()
+
+    def test_7_path_entry_memory(self):
+        print("")
+
+        def entry_size(entry, fields):
+            size = sys.getsizeof(entry)
+            for field in fields:
+                # Interfaces are shared between entries
+                if not isinstance(field, MockIFACInterface): size += sys.getsizeof(field)
+                if isinstance(field, list): size += sum([sys.getsizeof(e) for e in field])
+            return size
+
+        interface = MockIFACInterface()
+        blob_count = 8
+        for entries in [100000, 1000000]:
+            legacy_size = 0; compact_size = 0
+            for i in range(0, entries):
+                now = time.time()
+                next_hop = os.urandom(RNS.Reticulum.TRUNCATED_HASHLENGTH//8)
+                packet_hash = os.urandom(RNS.Identity.HASHLENGTH//8)
+                random_blobs = [os.urandom(5)+int(now-n).to_bytes(5, "big") for n in range(0, blob_count)]
+                legacy_entry = [now, next_hop, 3, now+60, random_blobs, interface, packet_hash]
+                compact_entry = PathEntry(now, next_hop, 3, now+60, random_blobs, interface, packet_hash)
+                legacy_size += entry_size(legacy_entry, legacy_entry)
+                compact_size += entry_size(compact_entry, [compact_entry.timestamp, next_hop, 3, compact_entry.expires, compact_entry.blobs, interface, packet_hash])
+
+            print(f"Path table memory for {entries} entries: {round(legacy_size/1024/1024, 1)}MB as lists, {round(compact_size/1024/1024, 1)}MB as compact records")
+            self.assertLess(compact_size, legacy_size*0.6)
+
+        # Compact entries behave like the list entries they replace
+        self.assertEqual(list(compact_entry), legacy_entry)
+        self.assertEqual(compact_entry[4], random_blobs)
+        self.assertEqual(compact_entry[5], interface)
+        compact_entry[0] = 0
+        self.assertEqual(compact_entry.timestamp, 0)
+        self.assertEqual(RNS.Transport.timebase_from_random_blobs(compact_entry[4]), RNS.Transport.timebase_from_random_blobs(random_blobs))
+
+    def test_8_table_journal(self):
+        print("")
+
+        entries = 100000
+        now = time.time()
+        def serialised_entry(destination_hash, hops):
+            return [destination_hash, now, os.urandom(16), hops, now+60, [os.urandom(10) for i in range(0, 8)], os.urandom(32), os.urandom(32)]
+
+        destination_hashes = [os.urandom(16) for i in range(0, entries)]
+        with tempfile.TemporaryDirectory() as storage:
+            journal = TableJournal(os.path.join(storage, "destination_table"))
+            self.assertFalse(journal.exists())
+            self.assertTrue(journal.should_compact(0))
+
+            start = time.time()
+            journal.write_snapshot([serialised_entry(destination_hash, 1) for destination_hash in destination_hashes])
+            snapshot_time = time.time() - start
+            self.assertFalse(journal.should_compact(entries))
+
+            changes = [(destination_hash, serialised_entry(destination_hash, 2)) for destination_hash in destination_hashes[:100]]
+            changes += [(destination_hash, None) for destination_hash in destination_hashes[100:150]]
+            start = time.time()
+            journal.append(changes)
+            journal_time = time.time() - start
+            print(f"Snapshot of {entries} entries took {round(snapshot_time*1000, 2)}ms, journaling {len(changes)} changes took {round(journal_time*1000, 2)}ms")
+            self.assertEqual(journal.records, 150)
+
+            # Replaying the snapshot and journal
+            # yields the current table state
+            loaded = {e[0]: e for e in journal.load()}
+            self.assertEqual(journal.records, 150)
+            self.assertEqual(len(loaded), entries-50)
+            self.assertEqual(loaded[destination_hashes[0]][3], 2)
+            self.assertEqual(loaded[destination_hashes[200]][3], 1)
+            self.assertFalse(destination_hashes[120] in loaded)
+
+            # A truncated record at the end of the journal,
+            # for example after a crash, is ignored
+            with open(journal.journal_path, "ab") as file: file.write(b"\x00\x00\x01\x00\x93\x01")
+            self.assertEqual(len(journal.load()), entries-50)
+
+            journal.write_snapshot(list(loaded.values()))
+            self.assertFalse(os.path.isfile(journal.journal_path))
+            self.assertEqual(len(journal.load()), entries-50)
+
+            # If the process stops after a new snapshot is moved into
+            # place, but before the journal is removed, the stale
+            # journal must not be replayed over the newer snapshot
+            journal.append([(destination_hashes[0], None)])
+            with open(journal.journal_path, "rb") as file: stale_journal = file.read()
+            journal.write_snapshot([serialised_entry(destination_hash, 3) for destination_hash in destination_hashes[:10]])
+            with open(journal.journal_path, "wb") as file: file.write(stale_journal)
+            loaded = {e[0]: e for e in journal.load()}
+            self.assertEqual(len(loaded), 10)
+            self.assertEqual(loaded[destination_hashes[0]][3], 3)
+            self.assertFalse(os.path.isfile(journal.journal_path))
+
+            # Journals written without a snapshot are
+            # folded into the first snapshot written
+            os.unlink(journal.path)
+            fresh = TableJournal(journal.path)
+            fresh.append([(destination_hashes[0], serialised_entry(destination_hashes[0], 4))])
+            self.assertEqual(len(fresh.load()), 1)
+            with open(fresh.journal_path, "rb") as file: stale_journal = file.read()
+            fresh.write_snapshot([])
+            with open(fresh.journal_path, "wb") as file: file.write(stale_journal)
+            self.assertEqual(len(fresh.load()), 0)
+
+    def test_9_announce_handler_dispatch(self):
+        print("")
+
+        import threading
+        class Handler:
+            def __init__(self, aspect_filter, receive_path_responses=False):
+                self.aspect_filter = aspect_filter
+                self.receive_path_responses = receive_path_responses
+                self.received = []
+
+        class Handler3(Handler):
+            def received_announce(self, destination_hash, announced_identity, app_data): self.received.append(destination_hash)
+        class Handler5(Handler):
+            def received_announce(self, destination_hash, announced_identity, app_data, announce_packet_hash, is_path_response): self.received.append(is_path_response)
+        class InvalidHandler(Handler):
+            def received_announce(self, destination_hash): pass
+
+        matching   = Handler3("test.announce")
+        other      = Handler3("other.app")
+        unfiltered = Handler5(None, receive_path_responses=True)
+        invalid    = InvalidHandler(None)
+        many       = [Handler3(f"app.handler{i}") for i in range(0, 50)]
+
+        try:
+            for handler in [matching, other, unfiltered, invalid]+many: RNS.Transport.register_announce_handler(handler)
+            self.assertFalse(invalid in RNS.Transport.announce_handlers)
+
+            announce = MockAnnounce(RNS.Identity())
+            announce.context = RNS.Packet.NONE
+            handlers = RNS.Transport.matching_announce_handlers(announce)
+            self.assertEqual([h[0] for h in handlers], [unfiltered, matching])
+            self.assertEqual([h[1] for h in handlers], [5, 3])
+
+            announce.context = RNS.Packet.PATH_RESPONSE
+            self.assertEqual([h[0] for h in RNS.Transport.matching_announce_handlers(announce)], [unfiltered])
+
+            rounds = 10000
+            start = time.time()
+            for i in range(0, rounds): RNS.Transport.matching_announce_handlers(announce)
+            print(f"Matching announce against {len(RNS.Transport.announce_handlers)} handlers took {round((time.time()-start)/rounds*1e6, 2)}µs")
+
+            RNS.Transport.deregister_announce_handler(matching)
+            announce.context = RNS.Packet.NONE
+            self.assertEqual([h[0] for h in RNS.Transport.matching_announce_handlers(announce)], [unfiltered])
+
+        finally:
+            for handler in [matching, other, unfiltered]+many: RNS.Transport.deregister_announce_handler(handler)
+
+        # Handlers added to the handler list directly
+        # are picked up on the next announce
+        direct = Handler3("test.announce")
+        try:
+            RNS.Transport.announce_handlers.append(direct)
+            self.assertEqual([h[0] for h in RNS.Transport.matching_announce_handlers(announce)], [direct])
+            RNS.Transport.announce_handlers.remove(direct)
+            self.assertEqual(RNS.Transport.matching_announce_handlers(announce), [])
+
+        finally:
+            while direct in RNS.Transport.announce_handlers: RNS.Transport.announce_handlers.remove(direct)
+
+        # Every handler has its own bounded queue and worker, so a
+        # blocking handler only drops deliveries meant for itself
+        from unittest import mock
+        dispatcher = AnnounceDispatcher(max_queued=4)
+        release = threading.Event()
+        class BlockingHandler:
+            def __init__(self): self.received = 0
+            def received_announce(self, destination_hash, announced_identity, app_data):
+                release.wait()
+                self.received += 1
+
+        class CountingHandler:
+            def __init__(self): self.received = 0
+            def received_announce(self, destination_hash, announced_identity, app_data): self.received += 1
+
+        def wait_for(condition, timeout=5):
+            deadline = time.time()+timeout
+            while not condition() and time.time() < deadline: time.sleep(0.01)
+            return condition()
+
+        handler = BlockingHandler()
+        other = CountingHandler()
+        callback_args = {"destination_hash": os.urandom(16), "announced_identity": None, "app_data": None}
+        self.assertTrue(dispatcher.dispatch(handler, callback_args))
+        self.assertTrue(wait_for(lambda: dispatcher.stats()["busy"] == 1))
+
+        with mock.patch("RNS.log") as log:
+            results = [dispatcher.dispatch(handler, callback_args) for i in range(0, 10)]
+            self.assertEqual(results.count(True), 4)
+            self.assertEqual(results.count(False), 6)
+            # Drops are logged as warnings, but rate-limited
+            warnings = [c for c in log.call_args_list if len(c.args) > 1 and c.args[1] == RNS.LOG_WARNING]
+            self.assertEqual(len(warnings), 1)
+
+        results = [dispatcher.dispatch(other, callback_args) for i in range(0, 4)]
+        self.assertEqual(results.count(True), 4)
+        self.assertTrue(wait_for(lambda: other.received == 4))
+        self.assertEqual(handler.received, 0)
+
+        stats = dispatcher.stats()
+        self.assertEqual(stats["workers"], 2)
+        self.assertEqual((stats["dispatched"], stats["dropped"]), (9, 6))
+
+        release.set()
+        self.assertTrue(wait_for(lambda: dispatcher.stats()["delivered"] == stats["dispatched"]))
+        self.assertEqual(handler.received, 5)
+        self.assertEqual(dispatcher.stats()["queued"], 0)
+
+        # Workers of discarded handlers exit
+        dispatcher.discard(handler); dispatcher.discard(other)
+        self.assertTrue(wait_for(lambda: dispatcher.stats()["workers"] == 0))
+
+    def test_10_inbound_pipeline(self):
+        print("")
+
+        import threading
+        class MockPacket:
+            def __init__(self, packet_type): self.packet_type = packet_type
+
+        def classify(raw, interface):
+            if raw[0] == 0xff: return None
+            else: return MockPacket(raw[0])
+
+        processed = {RNS.Packet.ANNOUNCE: 0, RNS.Packet.DATA: 0}
+        data_done = threading.Event()
+        announce_gate = threading.Event(); announce_gate.set()
+        traffic_gate = threading.Event(); traffic_gate.set()
+        def process(packet, interface, link_stats):
+            # Announce processing is made much more
+            # expensive than processing other traffic
+            if packet.packet_type == RNS.Packet.ANNOUNCE:
+                announce_gate.wait()
+                for i in range(0, 100): RNS.Identity.full_hash(b"announce")
+            else: traffic_gate.wait()
+            processed[packet.packet_type] += 1
+            if processed[RNS.Packet.DATA] == data_frames: data_done.set()
+
+        # Ingress queues drop frames beyond their size
+        pipeline = InboundPipeline(classify, process, queue_size=4)
+        interface = MockIFACInterface()
+        results = [pipeline.ingress(bytes([RNS.Packet.DATA]), interface) for i in range(0, 10)]
+        self.assertEqual(results.count(True), 4)
+        stats = pipeline.interface_stats(interface)
+        self.assertEqual((stats["queued"], stats["received"], stats["dropped"]), (4, 10, 6))
+
+        # Mixed load from several interfaces
+        interfaces = [MockIFACInterface() for i in range(0, 4)]
+        announce_frames = 2000; data_frames = 8000
+        frames = [bytes([RNS.Packet.ANNOUNCE])]*announce_frames+[bytes([RNS.Packet.DATA])]*data_frames+[b"\xff"]*100
+        random.shuffle(frames)
+
+        def feed(deliver):
+            threads = []; ingress_times = []
+            def feeder(interface, frames):
+                start = time.time()
+                for raw in frames: deliver(raw, interface)
+                ingress_times.append(time.time()-start)
+
+            for i in range(0, len(interfaces)): threads.append(threading.Thread(target=feeder, args=(interfaces[i], frames[i::len(interfaces)])))
+            start = time.time()
+            for thread in threads: thread.start()
+            for thread in threads: thread.join()
+            return start, max(ingress_times)
+
+        def direct(raw, interface):
+            packet = classify(raw, interface)
+            if packet != None: process(packet, interface, None)
+
+        start, ingress_time = feed(direct)
+        direct_time = time.time()-start
+        print(f"Direct processing of {len(frames)} frames took {round(direct_time*1000, 2)}ms, interfaces were busy for {round(ingress_time*1000, 2)}ms")
+
+        # Announce processing is held back until all data traffic
+        # has been processed, which it must not hold up. Interfaces
+        # only hand frames to the pipeline, so all of them are
+        # accepted before any announce was processed.
+        processed = {RNS.Packet.ANNOUNCE: 0, RNS.Packet.DATA: 0}
+        data_done.clear(); announce_gate.clear()
+        pipeline = InboundPipeline(classify, process, queue_size=len(frames), stage_size=len(frames))
+        pipeline.start()
+        start, ingress_time = feed(pipeline.ingress)
+        self.assertEqual(processed[RNS.Packet.ANNOUNCE], 0)
+        for interface in interfaces:
+            stats = pipeline.interface_stats(interface)
+            self.assertEqual((stats["received"], stats["dropped"]), (len(frames[interfaces.index(interface)::len(interfaces)]), 0))
+
+        self.assertTrue(data_done.wait(30))
+        data_time = time.time()-start
+        self.assertEqual(processed[RNS.Packet.ANNOUNCE], 0)
+        announce_gate.set()
+        deadline = time.time()+30
+        while processed[RNS.Packet.ANNOUNCE] < announce_frames and time.time() < deadline: time.sleep(0.01)
+        pipeline_time = time.time()-start
+        print(f"Pipelined processing of {len(frames)} frames took {round(pipeline_time*1000, 2)}ms, interfaces were busy for {round(ingress_time*1000, 2)}ms, data traffic completed in {round(data_time*1000, 2)}ms")
+        print(f"Pipeline throughput was {round(len(frames)/pipeline_time)} frames per second")
+
+        stats = pipeline.stats()
+        self.assertEqual(processed[RNS.Packet.ANNOUNCE], announce_frames)
+        self.assertEqual(processed[RNS.Packet.DATA], data_frames)
+        self.assertEqual(stats["classified"], announce_frames+data_frames)
+        self.assertEqual(stats["discarded"], 100)
+        self.assertEqual(stats["announces"]["dropped"]+stats["traffic"]["dropped"], 0)
+        pipeline.stop()
+
+        # When the traffic stage is full, the classifier waits for
+        # room for as long as it takes, and frames back up into the
+        # ingress queues instead of being dropped after processing
+        from unittest import mock
+        processed = {RNS.Packet.ANNOUNCE: 0, RNS.Packet.DATA: 0}
+        data_frames = 20; data_done.clear(); traffic_gate.clear()
+        with mock.patch.object(InboundPipeline, "BLOCK_TIMEOUT", 0.1):
+            pipeline = InboundPipeline(classify, process, queue_size=data_frames, stage_size=2)
+            pipeline.start()
+            results = [pipeline.ingress(bytes([RNS.Packet.DATA]), interface) for i in range(0, data_frames)]
+            self.assertEqual(results.count(True), data_frames)
+            time.sleep(0.5)
+            self.assertEqual(processed[RNS.Packet.DATA], 0)
+            self.assertEqual(pipeline.stats()["traffic"]["dropped"], 0)
+            traffic_gate.set()
+            self.assertTrue(data_done.wait(30))
+            self.assertEqual(pipeline.stats()["traffic"]["dropped"], 0)
+            self.assertEqual(pipeline.stats()["traffic"]["processed"], data_frames)
+            pipeline.stop()
+
+    def test_11_egress_queue(self):
+        print("")
+
+        import socket
+        from RNS.Interfaces.Interface import Interface, EgressQueue
+        from RNS.Interfaces.util.framing import HDLC, HDLCDecoder
+
+        dst_len = RNS.Reticulum.TRUNCATED_HASHLENGTH//8
+        def raw_packet(packet_type, context=RNS.Packet.NONE, header_type=RNS.Packet.HEADER_1, destination_hash=None):
+            if destination_hash == None: destination_hash = os.urandom(dst_len)
+            transport_id = os.urandom(dst_len) if header_type == RNS.Packet.HEADER_2 else b""
+            return bytes([header_type << 6 | packet_type, 0])+transport_id+destination_hash+bytes([context])+os.urandom(32)
+
+        # Only link establishment and keepalives jump the queue,
+        # other link packets stay in order with link data
+        self.assertEqual(RNS.Transport.egress_priority(raw_packet(RNS.Packet.LINKREQUEST)), Interface.PRIORITY_CONTROL)
+        self.assertEqual(RNS.Transport.egress_priority(raw_packet(RNS.Packet.PROOF, RNS.Packet.LRPROOF)), Interface.PRIORITY_CONTROL)
+        self.assertEqual(RNS.Transport.egress_priority(raw_packet(RNS.Packet.DATA, RNS.Packet.LRRTT, RNS.Packet.HEADER_2)), Interface.PRIORITY_CONTROL)
+        self.assertEqual(RNS.Transport.egress_priority(raw_packet(RNS.Packet.DATA, RNS.Packet.KEEPALIVE)), Interface.PRIORITY_CONTROL)
+        self.assertEqual(RNS.Transport.egress_priority(raw_packet(RNS.Packet.DATA, RNS.Packet.LINKCLOSE, RNS.Packet.HEADER_2)), Interface.PRIORITY_DATA)
+        self.assertEqual(RNS.Transport.egress_priority(raw_packet(RNS.Packet.DATA, RNS.Packet.LINKIDENTIFY)), Interface.PRIORITY_DATA)
+        self.assertEqual(RNS.Transport.egress_priority(raw_packet(RNS.Packet.PROOF)), Interface.PRIORITY_DATA)
+        self.assertEqual(RNS.Transport.egress_priority(raw_packet(RNS.Packet.DATA)), Interface.PRIORITY_DATA)
+        self.assertEqual(RNS.Transport.egress_priority(raw_packet(RNS.Packet.DATA, RNS.Packet.RESOURCE, RNS.Packet.HEADER_2)), Interface.PRIORITY_DATA)
+        self.assertEqual(RNS.Transport.egress_priority(raw_packet(RNS.Packet.ANNOUNCE)), Interface.PRIORITY_ANNOUNCE)
+
+        class GatedSocket:
+            # Holds back writes until released, so
+            # frames queue up behind the first one
+            def __init__(self, sock):
+                self.sock = sock
+                self.release = threading.Event()
+            def sendall(self, data):
+                self.release.wait()
+                self.sock.sendall(data)
+
+        def read_frames(remote, count, frames):
+            decoder = HDLCDecoder()
+            while len(frames) < count:
+                data = remote.recv(65536)
+                if not data: break
+                frames.extend(decoder.feed(data, 262144))
+
+        # Frames sent through Transport on a TCP client interface
+        # are written in batches, in priority order, and lower
+        # priority frames are dropped first when the queue is full
+        local, remote = socket.socketpair()
+        interface = mock_tcp_client(local, epoll_backend=False)
+        interface.socket = GatedSocket(local)
+        queue = interface.egress_queue = EgressQueue(interface, 31)
+        first = raw_packet(RNS.Packet.DATA)
+        RNS.Transport.transmit(interface, first)
+        deadline = time.time()+5
+        while queue.queued > 0 and time.time() < deadline: time.sleep(0.01)
+        writer = queue.writer
+
+        link_id = os.urandom(dst_len)
+        announces = [raw_packet(RNS.Packet.ANNOUNCE) for i in range(0, 12)]
+        data      = [raw_packet(RNS.Packet.DATA, destination_hash=link_id) for i in range(0, 16)]
+        linkclose = raw_packet(RNS.Packet.DATA, RNS.Packet.LINKCLOSE, destination_hash=link_id)
+        control   = [raw_packet(RNS.Packet.PROOF, RNS.Packet.LRPROOF), raw_packet(RNS.Packet.DATA, RNS.Packet.KEEPALIVE)]
+        for raw in announces+data+[linkclose]+control: RNS.Transport.transmit(interface, raw)
+        stats = queue.stats()
+        self.assertEqual(stats["classes"], [2, 17, 12])
+        self.assertEqual(stats["dropped_classes"], [0, 0, 0])
+        RNS.Transport.transmit(interface, raw_packet(RNS.Packet.DATA))
+        self.assertEqual(queue.stats()["dropped_classes"], [0, 0, 1])
+
+        received = []
+        reader = threading.Thread(target=read_frames, args=(remote, 32, received), daemon=True)
+        reader.start()
+        interface.socket.release.set()
+        reader.join(5)
+        self.assertEqual(received[0], first)
+        self.assertEqual(received[1:3], control)
+        self.assertEqual(received[3:20], data+[linkclose])
+        self.assertEqual(received[21:], announces[:-1])
+        deadline = time.time()+5
+        while queue.stats()["sent"] < 32 and time.time() < deadline: time.sleep(0.01)
+        stats = queue.stats()
+        self.assertEqual(stats["queued"], 0)
+        self.assertEqual(stats["batches"], 2)
+        self.assertEqual(interface.txb, sum([len(HDLC.frame(frame)) for frame in received]))
+
+        # The same writer serves later bursts, and
+        # exits when the interface is removed
+        RNS.Transport.transmit(interface, first)
+        received = []
+        read_frames(remote, 1, received)
+        self.assertEqual(received, [first])
+        self.assertTrue(queue.writer is writer and writer.is_alive())
+        RNS.Transport.remove_interface(interface)
+        writer.join(5)
+        self.assertFalse(writer.is_alive())
+        self.assertFalse(interface.enqueue_outgoing(first))
+        local.close(); remote.close()
+
+        # Compare transmitting through Transport directly on
+        # the interface, and through its egress queue
+        frames = [raw_packet(RNS.Packet.DATA)+os.urandom(random.randint(100, 400)) for i in range(0, 20000)]
+        for queued in [False, True]:
+            local, remote = socket.socketpair()
+            interface = mock_tcp_client(local, epoll_backend=False)
+            interface.egress_queue = EgressQueue(interface, len(frames)) if queued else None
+            received = []
+            reader = threading.Thread(target=read_frames, args=(remote, len(frames), received), daemon=True)
+            reader.start()
+            start = time.time()
+            for raw in frames: RNS.Transport.transmit(interface, raw)
+            reader.join(30)
+            transmit_time = time.time()-start
+            self.assertEqual(received, frames)
+            if queued:
+                self.assertEqual(interface.egress_queue.stats()["queued"], 0)
+                batches = interface.egress_queue.stats()["batches"]
+                RNS.Transport.remove_interface(interface)
+                print(f"Transmitting {len(frames)} frames through the egress queue took {round(transmit_time*1000, 2)}ms in {batches} batches")
+            else:
+                print(f"Transmitting {len(frames)} frames directly took {round(transmit_time*1000, 2)}ms")
+            local.close(); remote.close()
+
+    def test_12_announce_queue(self):
+        print("")
+
+        import threading
+        from RNS.Interfaces.Interface import AnnounceQueue, QueuedAnnounce, AnnounceScheduler
+
+        # Announces are dequeued by hop count, then by queue
+        # time, and each destination is only queued once
+        queue = AnnounceQueue()
+        now = time.time()
+        destinations = [os.urandom(16) for i in range(0, 4)]
+        queue.put(QueuedAnnounce(destinations[0], now+1, 3, 1, b"a"))
+        queue.put(QueuedAnnounce(destinations[1], now+2, 1, 1, b"b"))
+        queue.put(QueuedAnnounce(destinations[2], now+3, 1, 1, b"c"))
+        queue.put(QueuedAnnounce(destinations[3], now+4, 2, 1, b"d"))
+        queue.put(QueuedAnnounce(destinations[1], now+5, 2, 2, b"e"))
+        self.assertEqual(len(queue), 4)
+        self.assertEqual(queue.get(destinations[1]).raw, b"e")
+        self.assertEqual([queue.pop().raw for i in range(0, 4)], [b"c", b"d", b"e", b"a"])
+        self.assertEqual(queue.pop(), None)
+
+        for i in range(0, 4): queue.put(QueuedAnnounce(destinations[i], now+i, 1, 1, bytes([i])))
+        self.assertEqual(queue.expire(now+2), 2)
+        self.assertEqual([queue.pop().raw for i in range(0, 2)], [bytes([2]), bytes([3])])
+
+        # A single scheduler thread services all interfaces
+        class MockCappedInterface:
+            def __init__(self):
+                self.detached = False
+                self.announce_cap = 1.0
+                self.bitrate = 8*1000*1000
+                self.announce_queue = AnnounceQueue()
+                self.sent = []
+                self.done = threading.Event()
+            def process_outgoing(self, data):
+                self.sent.append(data)
+                if len(self.announce_queue) == 0: self.done.set()
+            def sent_announce(self): pass
+            process_announce_queue = RNS.Interfaces.Interface.Interface.process_announce_queue
+
+        threads = threading.active_count()
+        interfaces = [MockCappedInterface() for i in range(0, 8)]
+        for interface in interfaces:
+            for i in range(0, 16): interface.announce_queue.put(QueuedAnnounce(os.urandom(16), time.time(), 16-i, 1, bytes([16-i])*100))
+            AnnounceScheduler.schedule(interface, time.time()+0.05)
+            AnnounceScheduler.schedule(interface, time.time()+1)
+
+        self.assertLessEqual(threading.active_count(), threads+1)
+        for interface in interfaces:
+            self.assertTrue(interface.done.wait(5))
+            self.assertEqual([data[0] for data in interface.sent], list(range(1, 17)))
+
+        # Queueing and dequeueing a large number of announces
+        count = 16384
+        entries = [QueuedAnnounce(os.urandom(16), now+i, random.randint(1, 16), 1, os.urandom(160)) for i in range(0, count)]
+        start = time.time()
+        for entry in entries: queue.put(entry)
+        queue.expire(now)
+        while queue.pop() != None: pass
+        print(f"Queueing and dequeueing {count} announces took {round((time.time()-start)*1000, 2)}ms")
+
+    def test_13_path_request_tags(self):
+        print("")
+
+        from RNS.Transport import BoundedSet
+
+        # The oldest tags are evicted first
+        tags = BoundedSet(4)
+        for i in range(0, 4): self.assertTrue(tags.add(bytes([i])))
+        self.assertFalse(tags.add(bytes([0])))
+        self.assertTrue(tags.add(bytes([4])))
+        self.assertEqual(len(tags), 4)
+        self.assertFalse(bytes([0]) in tags)
+        self.assertTrue(bytes([1]) in tags and bytes([4]) in tags)
+
+        # Flooding the path request handler with duplicate
+        # requests while the tag table is at its maximum size
+        RNS.Transport.init_tables()
+        hash_len = RNS.Reticulum.TRUNCATED_HASHLENGTH//8
+        class MockPacket:
+            receiving_interface = None
+
+        requests = [os.urandom(hash_len*3) for i in range(0, RNS.Transport.max_pr_tags)]
+        previous_tags = RNS.Transport.discovery_pr_tags
+        RNS.Transport.discovery_pr_tags = BoundedSet(RNS.Transport.max_pr_tags)
+        try:
+            for data in requests: RNS.Transport.discovery_pr_tags.add(data[:hash_len]+data[hash_len*2:])
+            flood = [random.choice(requests) for i in range(0, 20000)]
+
+            start = time.time()
+            for data in flood: RNS.Transport.path_request_handler(data, MockPacket())
+            handler_time = time.time()-start
+            self.assertEqual(len(RNS.Transport.discovery_pr_tags), RNS.Transport.max_pr_tags)
+
+            tag_list = list(RNS.Transport.discovery_pr_tags.entries)
+            start = time.time()
+            for data in flood[:1000]: data[:hash_len]+data[hash_len*2:] in tag_list
+            list_time = (time.time()-start)*len(flood)/1000
+
+        finally: RNS.Transport.discovery_pr_tags = previous_tags
+
+        print(f"Handled {len(flood)} duplicate path requests in {round(handler_time*1000, 2)}ms, list lookups alone would take {round(list_time*1000, 2)}ms")
+        self.assertLess(handler_time, list_time)
+
+    def test_14_backbone_io(self):
+        print("")
+
+        import select
+        if not hasattr(select, "epoll"): self.skipTest("No epoll available on this platform")
+        from RNS.Interfaces.BackboneInterface import BackboneInterface, TransmitBuffer
+        from RNS.Interfaces.util.framing import HDLC, HDLCDecoder
+
+        frames = [os.urandom(random.randint(64, 500)) for i in range(0, 4000)]
+        frames.append(bytes([HDLC.FLAG, HDLC.ESC])*100)
+        stream = b"".join([HDLC.frame(frame) for frame in frames])
+        chunks = []; position = 0
+        while position < len(stream):
+            chunk_len = random.randint(1, 1500)
+            chunks.append(stream[position:position+chunk_len])
+            position += chunk_len
+
+        # The incremental deframer yields the same frames
+        # as the previous deframing, for any chunking
+        deframer = HDLCDecoder(); deframed = []
+        start = time.time()
+        for chunk in chunks: deframed.extend(deframer.feed(chunk, BackboneInterface.HW_MTU*2))
+        deframer_time = time.time()-start
+
+        frame_buffer = b""; legacy_deframed = []
+        start = time.time()
+        for chunk in chunks: frame_buffer = legacy_hdlc_deframe(frame_buffer, chunk, legacy_deframed)
+        legacy_time = time.time()-start
+
+        self.assertEqual(deframed, frames)
+        self.assertEqual(legacy_deframed, frames)
+        print(f"Deframed {len(frames)} frames in {round(deframer_time*1000, 2)}ms, previously {round(legacy_time*1000, 2)}ms")
+
+        # Partially written segments are resumed where they stopped
+        class PartialSocket:
+            def __init__(self): self.written = b""
+            def send(self, data): return self.sendmsg([data])
+            def sendmsg(self, buffers):
+                data = b"".join([bytes(buffer) for buffer in buffers])[:7]
+                self.written += data
+                return len(data)
+
+        transmit_buffer = TransmitBuffer(); partial_socket = PartialSocket()
+        for frame in frames[:16]: transmit_buffer.append(HDLC.FLAG_BYTE, HDLC.escape(frame), HDLC.FLAG_BYTE)
+        while len(transmit_buffer) > 0: transmit_buffer.send(partial_socket)
+        self.assertEqual(partial_socket.written, b"".join([HDLC.frame(frame) for frame in frames[:16]]))
+
+        # Echo frames from a large number of local client
+        # sockets through the backbone I/O engine
+        clients, echo_time, total_bytes = backbone_echo(self, 256, 64, frames)
+        print(f"Echoed {256*64} frames over 256 connections in {round(echo_time*1000, 2)}ms, {RNS.prettyspeed(total_bytes*2*8/echo_time)}")
+
+    def test_15_backbone_workers(self):
+        print("")
+
+        import select
+        if not hasattr(select, "epoll"): self.skipTest("No epoll available on this platform")
+        from RNS.Interfaces.BackboneInterface import BackboneInterface, BackboneWorker
+
+        frames = [os.urandom(random.randint(64, 500)) for i in range(0, 1000)]
+        previous_workers = BackboneInterface.workers
+        previous_assign = BackboneInterface.worker_assign
+        try:
+            for assign in [BackboneInterface.ASSIGN_ROUND_ROBIN, BackboneInterface.ASSIGN_LOAD]:
+                BackboneInterface.workers = [BackboneWorker(index) for index in range(0, 4)]
+                BackboneInterface.worker_assign = assign
+
+                # Connections are spread evenly over the workers, and
+                # frames are echoed in order on every connection
+                clients, echo_time, total_bytes = backbone_echo(self, 256, 64, frames, keep_open=True)
+                deadline = time.time()+5
+                while sum([stats["txb"] for stats in BackboneInterface.worker_stats()]) < total_bytes and time.time() < deadline: time.sleep(0.01)
+                worker_stats = BackboneInterface.worker_stats()
+                self.assertEqual([stats["clients"] for stats in worker_stats], [64, 64, 64, 64])
+                self.assertEqual(sum([stats["rxb"] for stats in worker_stats]), total_bytes)
+                self.assertEqual(sum([stats["txb"] for stats in worker_stats]), total_bytes)
+                for client in clients: self.assertTrue(client.socket.fileno() in client.backbone_worker.clients)
+
+                assign_str = "round-robin" if assign == BackboneInterface.ASSIGN_ROUND_ROBIN else "load-based"
+                print(f"Echoed {256*64} frames over 256 connections on 4 workers with {assign_str} assignment in {round(echo_time*1000, 2)}ms, {RNS.prettyspeed(total_bytes*2*8/echo_time)}")
+                for stats in worker_stats: print(f"  Worker {stats['index']}: {stats['clients']} clients, {stats['events']} events, {RNS.prettysize(stats['rxb'])} received")
+
+                for client in clients: client.remote.close()
+                for client in clients: self.assertTrue(client.closed.wait(5))
+                self.assertEqual(sum([stats["clients"] for stats in BackboneInterface.worker_stats()]), 0)
+
+        finally:
+            BackboneInterface.workers = previous_workers
+            BackboneInterface.worker_assign = previous_assign
+
+    def test_16_framing_codec(self):
+        print("")
+
+        from RNS.Interfaces.util.framing import HDLC, KISS, HDLCDecoder, KISSDecoder
+        plain_frames   = [os.urandom(random.randint(64, 500)).replace(bytes([HDLC.FLAG]), b"").replace(bytes([HDLC.ESC]), b"").replace(bytes([KISS.FEND]), b"").replace(bytes([KISS.FESC]), b"") for i in range(0, 2000)]
+        escaped_frames = [bytes([HDLC.FLAG, HDLC.ESC, KISS.FEND, KISS.FESC])*random.randint(16, 125) for i in range(0, 2000)]
+        mixed_frames   = [os.urandom(random.randint(64, 500)) for i in range(0, 2000)]
+
+        def chunked(stream):
+            chunks = []; position = 0
+            while position < len(stream):
+                chunk_len = random.randint(1, 4096)
+                chunks.append(stream[position:position+chunk_len])
+                position += chunk_len
+            return chunks
+
+        for codec, decoder_class in [(HDLC, HDLCDecoder), (KISS, KISSDecoder)]:
+            for description, frames in [("escape-free", plain_frames), ("escape-heavy", escaped_frames), ("random", mixed_frames)]:
+                payload_bytes = sum([len(frame) for frame in frames])
+
+                start = time.time()
+                stream = codec.frames(frames)
+                encode_time = time.time()-start
+                self.assertEqual(stream, b"".join([codec.frame(frame) for frame in frames]))
+
+                chunks = chunked(stream); decoder = decoder_class(); decoded = []
+                start = time.time()
+                for chunk in chunks: decoded.extend(decoder.feed(chunk, 262144*2))
+                decode_time = time.time()-start
+                if codec == KISS:
+                    self.assertTrue(all([frame[0] == KISS.CMD_DATA for frame in decoded]))
+                    decoded = [frame[1:] for frame in decoded]
+
+                self.assertEqual(decoded, frames)
+                print(f"{codec.__name__} {description}: encoded at {round(payload_bytes/encode_time/1e6, 1)} MB/s, decoded at {round(payload_bytes/decode_time/1e6, 1)} MB/s")
+
+                # Compare against the previous byte-wise and
+                # frame-by-frame decoding of the same stream
+                legacy_decoded = []
+                start = time.time()
+                if codec == KISS: legacy_kiss_deframe(stream, legacy_decoded)
+                else:
+                    frame_buffer = b""
+                    for chunk in chunks: frame_buffer = legacy_hdlc_deframe(frame_buffer, chunk, legacy_decoded)
+                legacy_time = time.time()-start
+                self.assertEqual(legacy_decoded, frames)
+                print(f"  Previous decoding ran at {round(payload_bytes/legacy_time/1e6, 1)} MB/s")
+
+        # Frames exceeding the buffer limit are discarded,
+        # and decoding resumes at the next frame boundary
+        decoder = HDLCDecoder()
+        self.assertEqual(decoder.feed(HDLC.FLAG_BYTE+bytes(1024), 512), [])
+        self.assertEqual(len(decoder), 0)
+        self.assertEqual(decoder.feed(HDLC.frame(b"resumed"), 512), [b"resumed"])
+
+        # Non-data KISS commands are passed on to the caller
+        decoder = KISSDecoder()
+        self.assertEqual(decoder.feed(KISS.frame(bytes([0x01]), command=0x0F)+KISS.frame(b"data"), 512), [bytes([0x0F, 0x01]), bytes([KISS.CMD_DATA])+b"data"])
+
+    def test_17_tcp_event_loop(self):
+        print("")
+
+        import select
+        import socket
+        if not hasattr(select, "epoll"): self.skipTest("No epoll available on this platform")
+        from RNS.Interfaces.BackboneInterface import BackboneInterface
+        from RNS.Interfaces.util.framing import HDLC, KISS
+
+        connections = 128; frames_per_connection = 64
+        frames = [os.urandom(random.randint(64, 500)) for i in range(0, 512)]
+
+        def echo(epoll_backend):
+            interfaces = []; local_sockets = []; remotes = []
+            threads_before = threading.active_count()
+            for i in range(0, connections):
+                local, remote = socket.socketpair()
+                kiss_framing = i%2 == 1
+                interface = mock_tcp_client(local, kiss_framing=kiss_framing, epoll_backend=epoll_backend)
+                if epoll_backend:
+                    local.setblocking(0)
+                    BackboneInterface.add_client_socket(local, interface)
+                else: threading.Thread(target=interface.read_loop, daemon=True).start()
+                interfaces.append(interface); local_sockets.append(local); remotes.append(remote)
+
+            codecs   = [KISS if interface.kiss_framing else HDLC for interface in interfaces]
+            selected = [[random.choice(frames) for i in range(0, frames_per_connection)] for codec in codecs]
+            payloads = [codecs[i].frames(selected[i]) for i in range(0, connections)]
+            total_bytes = sum([len(payload) for payload in payloads])
+            threads_used = threading.active_count()-threads_before
+
+            def read_echo(remote, expected, results):
+                echoed = b""
+                while len(echoed) < len(expected):
+                    data = remote.recv(65536)
+                    if not data: break
+                    echoed += data
+                results.append(echoed == expected)
+
+            results = []
+            readers = [threading.Thread(target=read_echo, args=(remotes[i], payloads[i], results), daemon=True) for i in range(0, connections)]
+            for reader in readers: reader.start()
+            start = time.time()
+            for i in range(0, connections): remotes[i].sendall(payloads[i])
+            for reader in readers: reader.join(30)
+            echo_time = time.time()-start
+
+            self.assertEqual(len(results), connections)
+            self.assertTrue(all(results))
+            self.assertEqual(sum([interface.rxb for interface in interfaces]), sum([len(frame) for connection_frames in selected for frame in connection_frames]))
+            # Transmitted bytes are counted after the write
+            # completes, which may be after they were read
+            deadline = time.time()+5
+            while sum([interface.txb for interface in interfaces]) < total_bytes and time.time() < deadline: time.sleep(0.01)
+            self.assertEqual(sum([interface.txb for interface in interfaces]), total_bytes)
+
+            for remote in remotes: remote.close()
+            deadline = time.time()+5
+            while any([interface.online for interface in interfaces]) and time.time() < deadline: time.sleep(0.01)
+            self.assertFalse(any([interface.online for interface in interfaces]))
+            for local in local_sockets: local.close()
+            return echo_time, total_bytes, threads_used
+
+        BackboneInterface.ensure_workers()
+        threaded_time, total_bytes, threaded_threads = echo(epoll_backend=False)
+        epoll_time, total_bytes, epoll_threads = echo(epoll_backend=True)
+        self.assertTrue(epoll_threads <= len(BackboneInterface.workers))
+        print(f"Echoed {connections*frames_per_connection} HDLC and KISS frames over {connections} TCP client interfaces")
+        print(f"  Thread per connection: {threaded_threads} threads, {round(threaded_time*1000, 2)}ms, {RNS.prettyspeed(total_bytes*2*8/threaded_time)}")
+        print(f"  Backbone I/O workers:  {epoll_threads} threads, {round(epoll_time*1000, 2)}ms, {RNS.prettyspeed(total_bytes*2*8/epoll_time)}")
+
+    def test_18_shared_memory_ring(self):
+        print("")
+
+        import socket
+        from RNS.Interfaces.util.shmring import SharedMemoryChannel
+        from RNS.Interfaces.util.framing import HDLC, HDLCDecoder
+        if not SharedMemoryChannel.supported(): self.skipTest("No shared memory available on this platform")
+
+        # Frames wrap around the end of a small ring, a full
+        # ring rejects frames, and the consumer only needs a
+        # wakeup for the first frame written after it drained.
+        initiator = SharedMemoryChannel.create(ring_size=256)
+        peer = SharedMemoryChannel.attach(initiator.name)
+        initiator.unlink()
+        self.assertEqual(peer.rx.capacity, 256)
+        for i in range(0, 50):
+            frames = [os.urandom(random.randint(1, 60)) for j in range(0, 3)]
+            wakeups = [initiator.tx.put(frame) for frame in frames]
+            self.assertEqual(wakeups, [True, False, False])
+            self.assertEqual(peer.rx.drain(), frames)
+            self.assertEqual(len(peer.rx), 0)
+
+        self.assertEqual(peer.tx.put(bytes(200)), True)
+        self.assertEqual(peer.tx.put(bytes(64)), None)
+        self.assertEqual(initiator.rx.drain(), [bytes(200)])
+        self.assertEqual(peer.tx.put(bytes(64)), True)
+        self.assertEqual(initiator.rx.drain(), [bytes(64)])
+
+        peer.close(); initiator.close()
+        self.assertEqual(peer.tx.put(b"closed"), None)
+        self.assertEqual(peer.rx.drain(), [])
+        self.assertRaises(FileNotFoundError, SharedMemoryChannel.attach, initiator.name)
+        self.assertRaises(ValueError, SharedMemoryChannel.attach, "../"+initiator.name)
+
+        # Compare passing frames between threads through the
+        # rings, with a doorbell on the socket when needed,
+        # against sending them HDLC-framed over the socket.
+        frames = [os.urandom(random.randint(64, 500)) for i in range(0, 20000)]
+        payload_bytes = sum([len(frame) for frame in frames])
+        doorbell = HDLC.frame(bytes([0xFF, 0x04]))
+
+        def transfer(use_shm):
+            local, remote = socket.socketpair()
+            initiator = SharedMemoryChannel.create(); peer = SharedMemoryChannel.attach(initiator.name); initiator.unlink()
+            received = []; doorbells = [0]
+
+            def receiver():
+                decoder = HDLCDecoder()
+                while len(received) < len(frames):
+                    data = remote.recv(65536)
+                    if not data: break
+                    for frame in decoder.feed(data, 262144*2):
+                        if len(frame) > RNS.Reticulum.HEADER_MINSIZE: received.append(frame)
+                        else:
+                            doorbells[0] += 1
+                            received.extend(peer.rx.drain())
+
+            thread = threading.Thread(target=receiver, daemon=True)
+            start = time.time()
+            thread.start()
+            for frame in frames:
+                if use_shm:
+                    wakeup = initiator.tx.put(frame)
+                    if wakeup == None: local.sendall(HDLC.frame(frame))
+                    elif wakeup: local.sendall(doorbell)
+                else: local.sendall(HDLC.frame(frame))
+
+            thread.join(30)
+            transfer_time = time.time()-start
+            self.assertEqual(received, frames)
+            local.close(); remote.close(); peer.close(); initiator.close()
+            return transfer_time, doorbells[0]
+
+        socket_time, _ = transfer(use_shm=False)
+        shm_time, doorbells = transfer(use_shm=True)
+        print(f"Transferred {len(frames)} frames between threads")
+        print(f"  HDLC over socket: {round(socket_time*1000, 2)}ms, {round(payload_bytes/socket_time/1e6, 1)} MB/s")
+        print(f"  Shared memory:    {round(shm_time*1000, 2)}ms, {round(payload_bytes/shm_time/1e6, 1)} MB/s, {doorbells} doorbells")
+
+    def test_19_tcp_server_interface(self):
+        print("")
+
+        import select
+        import socket
+        if not hasattr(select, "epoll"): self.skipTest("No epoll available on this platform")
+        from RNS.Interfaces.Interface import Interface
+        from RNS.Interfaces.TCPInterface import TCPServerInterface, TCPClientInterface
+        from RNS.Interfaces.BackboneInterface import BackboneInterface
+        from RNS.Interfaces.util.framing import HDLC, HDLCDecoder
+        reticulum_instance()
+
+        def wait_for(condition, timeout=5):
+            deadline = time.time()+timeout
+            while not condition() and time.time() < deadline: time.sleep(0.01)
+            return condition()
+
+        probe = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        probe.bind(("127.0.0.1", 0)); port = probe.getsockname()[1]; probe.close()
+        server = TCPServerInterface(RNS.Transport, {"name": "Listener Test", "listen_ip": "127.0.0.1", "listen_port": port})
+        self.assertTrue(server.epoll_backend and server.online)
+        listeners = [fileno for fileno in BackboneInterface.listener_filenos if BackboneInterface.listener_filenos[fileno][0] == server]
+        self.assertEqual(len(listeners), 1)
+
+        server.mode = Interface.MODE_GATEWAY
+        server.bitrate = 12_345_678
+        server.announce_rate_target = 3600; server.announce_rate_grace = 2; server.announce_rate_penalty = 600
+        server.ingress_control = False; server.ic_burst_freq = 42
+        server.ifac_size = 16; server.ifac_netname = "listener test"; server.ifac_netkey = None
+
+        # A burst of connections is accepted without waiting
+        # for SYN retransmissions, and each one spawns a client
+        # interface with the settings of the listener
+        connections = 64
+        start = time.time()
+        clients = [socket.create_connection(("127.0.0.1", port)) for i in range(0, connections)]
+        self.assertTrue(wait_for(lambda: server.clients == connections))
+        print(f"Accepted {connections} connections in {round((time.time()-start)*1000, 2)}ms")
+
+        spawned = {int(interface.target_port): interface for interface in server.spawned_interfaces}
+        self.assertEqual(set(spawned.keys()), set([client.getsockname()[1] for client in clients]))
+        for interface in spawned.values():
+            self.assertTrue(isinstance(interface, TCPClientInterface))
+            self.assertTrue(interface.online and interface.epoll_backend and not interface.initiator)
+            self.assertTrue(interface.parent_interface is server)
+            self.assertTrue(interface in RNS.Transport.interfaces)
+            self.assertEqual(interface.target_ip, "127.0.0.1")
+            self.assertEqual((interface.mode, interface.bitrate, interface.HW_MTU), (server.mode, server.bitrate, server.HW_MTU))
+            self.assertEqual((interface.announce_rate_target, interface.announce_rate_grace, interface.announce_rate_penalty), (3600, 2, 600))
+            self.assertEqual((interface.ingress_control, interface.ic_burst_freq), (False, 42))
+            self.assertEqual(interface.ifac_size, 16)
+            self.assertEqual(interface.ifac_identity.hash, spawned[clients[0].getsockname()[1]].ifac_identity.hash)
+
+        # Frames are received and transmitted through the
+        # backbone I/O workers, and counted on the listener
+        client = clients[0]; interface = spawned[client.getsockname()[1]]
+        frame = os.urandom(200)
+        client.sendall(HDLC.frame(frame))
+        self.assertTrue(wait_for(lambda: interface.rxb == len(frame)))
+        interface.process_outgoing(frame)
+        decoder = HDLCDecoder(); received = []
+        client.settimeout(5)
+        while len(received) == 0: received.extend(decoder.feed(client.recv(4096), 4096))
+        self.assertEqual(received, [frame])
+        self.assertTrue(wait_for(lambda: interface.txb == len(HDLC.frame(frame))))
+        self.assertEqual(server.txb, interface.txb)
+
+        # Frames are dropped once the transmit buffer is
+        # full, instead of the buffer growing unbounded
+        interface.transmit_buffer.max_pending = 0
+        interface.process_outgoing(frame)
+        self.assertEqual(interface.transmit_buffer.dropped, 1)
+        interface.transmit_buffer.max_pending = interface.transmit_buffer.MAX_PENDING
+
+        # Closed connections are removed from the listener,
+        # Transport and the I/O workers
+        def registered(interface): return any([interface in worker.clients.values() for worker in BackboneInterface.workers])
+        closed = [spawned[client.getsockname()[1]] for client in clients[:connections//2]]
+        for client in clients[:connections//2]: client.close()
+        self.assertTrue(wait_for(lambda: server.clients == connections//2))
+        for interface in closed:
+            self.assertFalse(interface.online)
+            self.assertFalse(interface in RNS.Transport.interfaces)
+            self.assertFalse(registered(interface))
+
+        # Detaching the listener closes it, and remaining
+        # clients are cleaned up as they disconnect
+        server.detach()
+        self.assertTrue(wait_for(lambda: not any([BackboneInterface.listener_filenos[fileno][0] == server for fileno in BackboneInterface.listener_filenos])))
+        self.assertRaises(ConnectionRefusedError, socket.create_connection, ("127.0.0.1", port))
+        remaining = list(server.spawned_interfaces)
+        for client in clients[connections//2:]: client.close()
+        self.assertTrue(wait_for(lambda: server.clients == 0))
+        self.assertFalse(any([interface in RNS.Transport.interfaces or registered(interface) for interface in remaining]))
+
+    def test_20_local_interface_shared_memory(self):
+        print("")
+
+        import select
+        import socket
+        from unittest import mock
+        if not hasattr(select, "epoll"): self.skipTest("No epoll available on this platform")
+        from RNS.Interfaces.LocalInterface import LocalServerInterface, LocalClientInterface
+        from RNS.Interfaces.BackboneInterface import BackboneInterface
+        from RNS.Interfaces.util.shmring import SharedMemoryChannel
+        if not SharedMemoryChannel.supported(): self.skipTest("No shared memory transport on this platform")
+        reticulum_instance()
+
+        def wait_for(condition, timeout=5):
+            deadline = time.time()+timeout
+            while not condition() and time.time() < deadline: time.sleep(0.01)
+            return condition()
+
+        def free_port():
+            probe = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            probe.bind(("127.0.0.1", 0)); port = probe.getsockname()[1]; probe.close()
+            return port
+
+        # The spawned interfaces are known to Transport, which
+        # may send its own traffic over them, so only frames
+        # from this test are recorded
+        marker = b"shm test frame"
+        class RecordingOwner:
+            def __init__(self):
+                self.frames = []
+                self.release = threading.Event(); self.release.set()
+
+            def inbound(self, data, interface):
+                if data.startswith(marker):
+                    self.release.wait(10)
+                    self.frames.append(data)
+
+        def frame(size): return marker+os.urandom(size)
+
+        def connect(port):
+            owner = RecordingOwner()
+            client = LocalClientInterface(owner, "Shared Memory Test", target_port=port)
+            client.owner = owner
+            return client, owner
+
+        def close(client):
+            # Stop the client from exiting the process when
+            # it loses its connection
+            client.is_connected_to_shared_instance = False
+            client.detach()
+
+        server_owner = RecordingOwner()
+        with mock.patch.object(RNS.Reticulum, "local_shared_memory_enabled", staticmethod(lambda: True)):
+            port = free_port()
+            server = LocalServerInterface(server_owner, bindport=port)
+            self.assertTrue(server.epoll_backend)
+            clients = []
+            try:
+                # The client offers a segment with SHM_ATTACH, the
+                # server attaches and answers with SHM_ACCEPT, and
+                # the name is unlinked once both sides have it
+                client, client_owner = connect(port); clients.append(client)
+                self.assertTrue(wait_for(lambda: server.clients == 1))
+                spawned = RNS.Transport.local_client_interfaces[-1]
+                self.assertTrue(spawned.parent_interface is server)
+                self.assertTrue(wait_for(lambda: client.shm_channel != None and spawned.shm_channel != None))
+                self.assertEqual(client.shm_pending, None)
+                self.assertEqual(client.shm_channel.name, spawned.shm_channel.name)
+                self.assertRaises(FileNotFoundError, SharedMemoryChannel.attach, client.shm_channel.name)
+
+                # Frames pass through the rings in both directions,
+                # with a doorbell on the socket to wake the reader
+                sent = [frame(200) for i in range(0, 10)]
+                for data in sent: client.process_outgoing(data)
+                self.assertTrue(wait_for(lambda: len(server_owner.frames) == len(sent)))
+                self.assertEqual(server_owner.frames, sent)
+                self.assertEqual(client.shm_channel.tx.write_index(), sum([len(data)+4 for data in sent]))
+                self.assertEqual(spawned.rxb, sum([len(data) for data in sent]))
+
+                returned = [frame(300) for i in range(0, 10)]
+                for data in returned: spawned.process_outgoing(data)
+                self.assertTrue(wait_for(lambda: len(client_owner.frames) == len(returned)))
+                self.assertEqual(client_owner.frames, returned)
+                self.assertTrue(spawned.shm_channel.tx.write_index() >= sum([len(data)+4 for data in returned]))
+
+                # When the reader stalls and the ring fills up, the
+                # rest is sent over the socket, behind a doorbell
+                # that drains the ring first, so order is kept, also
+                # while the reader catches up and frees the ring
+                server_owner.frames = []; server_owner.release.clear()
+                sent = [frame(32*1024) for i in range(0, 400)]
+                try:
+                    for data in sent[:100]: client.process_outgoing(data)
+                    self.assertTrue(client.shm_channel.tx.closed)
+                finally: server_owner.release.set()
+                for data in sent[100:]: client.process_outgoing(data)
+                self.assertTrue(wait_for(lambda: len(server_owner.frames) == len(sent), timeout=10))
+                self.assertEqual(server_owner.frames, sent)
+
+                # Closing the client releases the channels on both
+                # sides, and the server removes the spawned interface
+                close(client)
+                self.assertEqual((client.shm_channel, client.shm_pending), (None, None))
+                self.assertTrue(wait_for(lambda: server.clients == 0))
+                self.assertEqual(spawned.shm_channel, None)
+                self.assertFalse(spawned in RNS.Transport.interfaces)
+                self.assertFalse(spawned in RNS.Transport.local_client_interfaces)
+
+                # If the server can not attach, it answers with
+                # SHM_REJECT, and the client keeps using the socket
+                server_owner.frames = []
+                with mock.patch.object(SharedMemoryChannel, "attach", side_effect=OSError("Attach failed")):
+                    client, client_owner = connect(port); clients.append(client)
+                    self.assertTrue(wait_for(lambda: server.clients == 1))
+                    self.assertTrue(wait_for(lambda: client.shm_pending == None))
+                self.assertEqual(client.shm_channel, None)
+                sent = [frame(200) for i in range(0, 10)]
+                for data in sent: client.process_outgoing(data)
+                self.assertTrue(wait_for(lambda: len(server_owner.frames) == len(sent)))
+                self.assertEqual(server_owner.frames, sent)
+                close(client)
+                self.assertTrue(wait_for(lambda: server.clients == 0))
+
+                # A server that never answers leaves the offer to
+                # time out, after which the segment is released
+                listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                listener.bind(("127.0.0.1", 0)); listener.listen(1)
+                try:
+                    with mock.patch.object(LocalClientInterface, "SHM_ACCEPT_TIMEOUT", 0.25):
+                        client, client_owner = connect(listener.getsockname()[1]); clients.append(client)
+                        self.assertNotEqual(client.shm_pending, None)
+                        name = client.shm_pending.name
+                        self.assertTrue(wait_for(lambda: client.shm_pending == None))
+                    self.assertEqual(client.shm_channel, None)
+                    self.assertRaises(FileNotFoundError, SharedMemoryChannel.attach, name)
+                    close(client)
+                finally: listener.close()
+
+            finally:
+                for client in clients: close(client)
+                for owner_interface, listener_socket in list(BackboneInterface.listener_filenos.values()):
+                    if owner_interface == server: listener_socket.shutdown(socket.SHUT_RDWR)
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)